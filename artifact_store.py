@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# Copyright 2026 The Chromium Authors
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+"""A machine-wide, content-addressed store of downloaded artifacts.
+
+Like the git cache's mirrors, the store lets several checkouts on one machine
+share what was already downloaded. Objects are addressed by their sha1 or
+sha256 digest, so a checkout that needs an object another checkout already
+fetched gets a reflink or, where those aren't supported, a copy of it instead
+of downloading it again. Objects are never hardlinked, so that editing a
+checkout can't change the store. The store is bounded in size; the least
+recently used objects are evicted first.
+"""
+
+import logging
+import os
+import shutil
+import sys
+import time
+
+import lockfile
+
+# Enables the store, in the given directory.
+ARTIFACT_STORE_DIR_ENV_VAR = 'DEPOT_TOOLS_ARTIFACT_STORE_DIR'
+# Overrides DEFAULT_MAX_SIZE, in bytes.
+ARTIFACT_STORE_MAX_SIZE_ENV_VAR = 'DEPOT_TOOLS_ARTIFACT_STORE_MAX_SIZE'
+DEFAULT_MAX_SIZE = 50 * 1024 * 1024 * 1024
+
+# How long to wait for another process to finish adding objects.
+LOCK_TIMEOUT = 300
+
+ALGORITHMS = ('sha1', 'sha256')
+
+# The ioctl to clone a file's extents (FICLONE from linux/fs.h).
+_FICLONE = 0x40049409
+
+
+def _reflink(src, dst):
+    """Makes |dst| a copy-on-write clone of |src|, where supported."""
+    if not sys.platform.startswith('linux'):
+        raise OSError('reflinks are not supported on %s' % sys.platform)
+    import fcntl
+    with open(src, 'rb') as s, open(dst, 'wb') as d:
+        try:
+            fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            os.remove(dst)
+            raise
+    shutil.copymode(src, dst)
+
+
+def reflink_or_copy(src, dst):
+    """Makes |dst| a reflink of |src|, or a copy where reflinks aren't
+    supported."""
+    try:
+        _reflink(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
+
+
+class ArtifactStore(object):
+    """A content-addressed store of files, bounded to |max_size| bytes."""
+    def __init__(self, root, max_size=DEFAULT_MAX_SIZE):
+        self.root = os.path.abspath(root)
+        self.max_size = max_size
+
+    @classmethod
+    def from_environment(cls):
+        """Returns the store configured in the environment, or None."""
+        root = os.environ.get(ARTIFACT_STORE_DIR_ENV_VAR)
+        if not root:
+            return None
+        max_size = os.environ.get(ARTIFACT_STORE_MAX_SIZE_ENV_VAR)
+        return cls(root, int(max_size) if max_size else DEFAULT_MAX_SIZE)
+
+    def _path(self, algorithm, digest):
+        if algorithm not in ALGORITHMS:
+            raise ValueError('Unsupported algorithm %s' % algorithm)
+        digest = digest.lower()
+        return os.path.join(self.root, algorithm, digest[:2], digest)
+
+    def contains(self, algorithm, digest):
+        return os.path.isfile(self._path(algorithm, digest))
+
+    def fetch(self, algorithm, digest, output_filename):
+        """Places the object with |digest| at |output_filename|.
+
+        Returns False if the store doesn't have the object. An existing
+        |output_filename| is replaced.
+        """
+        path = self._path(algorithm, digest)
+        temp_filename = '%s.%d.tmp' % (output_filename, os.getpid())
+        try:
+            reflink_or_copy(path, temp_filename)
+            os.replace(temp_filename, output_filename)
+        except OSError:
+            # The object is missing, or was evicted while it was copied.
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+            return False
+        self._touch(path)
+        return True
+
+    def add(self, algorithm, digest, filename):
+        """Adds |filename|, whose contents have the given |digest|.
+
+        The caller is responsible for having verified the digest. Evicts the
+        least recently used objects if the store grows beyond its size.
+        Failures are logged rather than raised, since the store is only a
+        cache. Returns whether the object was added.
+        """
+        try:
+            self._add(self._path(algorithm, digest), filename)
+        except (OSError, lockfile.LockError) as e:
+            logging.warning('Failed to add %s to the artifact store: %s',
+                            filename, e)
+            return False
+        return True
+
+    def _add(self, path, filename):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with lockfile.lock(os.path.join(self.root, 'store'), LOCK_TIMEOUT):
+            if os.path.isfile(path):
+                self._touch(path)
+                return
+            temp_filename = '%s.%d.tmp' % (path, os.getpid())
+            try:
+                reflink_or_copy(filename, temp_filename)
+                os.replace(temp_filename, path)
+            finally:
+                if os.path.exists(temp_filename):
+                    os.remove(temp_filename)
+            self._touch(path)
+            size = self._read_size()
+            if size is None:
+                size = sum(st.st_size for _, st in self._objects())
+            else:
+                size += os.stat(path).st_size
+            if size > self.max_size:
+                size = self._evict()
+            self._write_size(size)
+
+    def remove(self, algorithm, digest):
+        """Removes the object with |digest|, e.g. when it doesn't have that
+        digest anymore. Failures are logged rather than raised."""
+        path = self._path(algorithm, digest)
+        try:
+            with lockfile.lock(os.path.join(self.root, 'store'),
+                               LOCK_TIMEOUT):
+                size = os.stat(path).st_size
+                os.remove(path)
+                total_size = self._read_size()
+                if total_size is not None:
+                    self._write_size(max(total_size - size, 0))
+        except (OSError, lockfile.LockError) as e:
+            logging.warning('Failed to remove %s from the artifact store: %s',
+                            path, e)
+
+    def _read_size(self):
+        """Returns the total size of the objects, as recorded by the last
+        change to the store, or None if it isn't known."""
+        try:
+            with open(os.path.join(self.root, 'size')) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def _write_size(self, size):
+        with open(os.path.join(self.root, 'size'), 'w') as f:
+            f.write(str(size))
+
+    @staticmethod
+    def _touch(path):
+        # The access time records when an object was last used. It is set
+        # explicitly, so it works on noatime mounts.
+        try:
+            os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+        except OSError:
+            pass
+
+    def _objects(self):
+        """Yields the path and stat of every object in the store."""
+        for algorithm in ALGORITHMS:
+            for dirpath, _, filenames in os.walk(
+                    os.path.join(self.root, algorithm)):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        yield path, os.stat(path)
+                    except OSError:
+                        continue
+
+    def _evict(self):
+        """Evicts the least recently used objects until the store fits in its
+        size, and returns the size left."""
+        objects = []
+        total_size = 0
+        for path, st in self._objects():
+            objects.append((st.st_atime, st.st_size, path))
+            total_size += st.st_size
+        objects.sort()
+        for _, size, path in objects:
+            if total_size <= self.max_size:
+                break
+            logging.info('Evicting %s from the artifact store', path)
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
+        return total_size
@@ -43,20 +43,28 @@ same line, but it is far from perfect (in either direction).
 """
 
 import codecs
+import contextlib
 import copy
 import getopt
+import hashlib
+import io
+import json
 import math  # for log
+import multiprocessing
 import os
 import re
 import string
 import sys
+import tempfile
+import time
 import unicodedata
 
 
 _USAGE = r"""
 Syntax: cpplint.py [--verbose=#] [--output=vs7] [--filter=-x,+y,...]
                    [--counting=total|toplevel|detailed] [--root=subdir]
-                   [--linelength=digits]
+                   [--linelength=digits] [--jobs=#] [--profile-checks]
+                   [--cache-dir=dir]
         <file> [file] ...
 
   The style guidelines this tries to follow are those in
@@ -137,6 +145,27 @@ Syntax: cpplint.py [--verbose=#] [--output=vs7] [--filter=-x,+y,...]
       Examples:
         --extensions=hpp,cpp
 
+    jobs=#
+      Lint the files using a pool of # processes. Errors are still reported
+      in the order the files were given. The default is 1, which lints the
+      files one at a time in this process.
+
+      Examples:
+        --jobs=8
+
+    cache-dir=dir
+      Cache the errors found in each file in the given directory, and report
+      them from the cache while neither the file nor the settings it is
+      linted with change.
+
+      Examples:
+        --cache-dir=/tmp/cpplint_cache
+
+    profile-checks
+      Print how many times each check ran and how long it took, slowest
+      first, after the error counts. The time of a check includes the time
+      of the checks it calls.
+
     cpplint.py supports per-directory configurations specified in CPPLINT.cfg
     files. CPPLINT.cfg file can contain a number of key=value pairs.
     Currently the following options are supported:
@@ -783,6 +812,18 @@ _line_length = 80
 # This is set by --extensions flag.
 _valid_extensions = set(['cc', 'h', 'cpp', 'cu', 'cuh'])
 
+# The number of processes used to lint files.
+# This is set by --jobs flag.
+_jobs = 1
+
+# The directory where the errors found in each file are cached, if any.
+# This is set by --cache-dir flag.
+_cache_dir = None
+
+# The digest of this file, which invalidates cached errors when cpplint
+# changes.
+_cpplint_digest = None
+
 # {str, bool}: a map from error categories to booleans which indicate if the
 # category should be suppressed for every line.
 _global_error_suppressions = {}
@@ -1134,6 +1175,10 @@ class _CppLintState(object):
         # "vs7" - format that Microsoft Visual Studio 7 can parse
         self.output_format = 'emacs'
 
+        # {str, [int, float]}: number of calls and total seconds of each check,
+        # or None when checks are not profiled.
+        self.check_profile = None
+
     def SetOutputFormat(self, output_format):
         """Sets the output format for errors."""
         self.output_format = output_format
@@ -1201,6 +1246,30 @@ class _CppLintState(object):
                 self.errors_by_category[category] = 0
             self.errors_by_category[category] += 1
 
+    def MergeErrorCounts(self, error_count, errors_by_category):
+        """Adds the error statistic of another state to this one."""
+        self.error_count += error_count
+        for category, count in errors_by_category.items():
+            self.errors_by_category[category] = (
+                self.errors_by_category.get(category, 0) + count)
+
+    def SetCheckProfiling(self, enabled):
+        """Sets whether the time spent in each check is recorded."""
+        self.check_profile = {} if enabled else None
+
+    def RecordCheckTime(self, name, calls, seconds):
+        """Adds |calls| runs of check |name| taking |seconds| to the profile."""
+        entry = self.check_profile.setdefault(name, [0, 0.0])
+        entry[0] += calls
+        entry[1] += seconds
+
+    def MergeCheckProfile(self, check_profile):
+        """Adds the check profile of another state to this one."""
+        if self.check_profile is None or not check_profile:
+            return
+        for name, (calls, seconds) in check_profile.items():
+            self.RecordCheckTime(name, calls, seconds)
+
     def PrintErrorCounts(self):
         """Print a summary of errors by category, and the total."""
         for category, count in self.errors_by_category.items():
@@ -1208,10 +1277,34 @@ class _CppLintState(object):
                              (category, count))
         sys.stderr.write('Total errors found: %d\n' % self.error_count)
 
+    def PrintCheckProfile(self):
+        """Print the time spent in each check, slowest first."""
+        if self.check_profile is None:
+            return
+        sys.stderr.write('%-40s %10s %10s\n' % ('Check', 'Calls', 'Time (ms)'))
+        for name, (calls, seconds) in sorted(self.check_profile.items(),
+                                             key=lambda item: -item[1][1]):
+            sys.stderr.write('%-40s %10d %10.1f\n' %
+                             (name, calls, seconds * 1000))
+
 
 _cpplint_state = _CppLintState()
 
 
+def _RunCheck(check_fn, *args):
+    """Calls |check_fn| with |args|, recording its time in the check profile
+    when checks are profiled."""
+    if _cpplint_state.check_profile is None:
+        return check_fn(*args)
+    start = time.perf_counter()
+    try:
+        return check_fn(*args)
+    finally:
+        # Extra check functions may be any callable.
+        name = getattr(check_fn, '__qualname__', repr(check_fn))
+        _cpplint_state.RecordCheckTime(name, 1, time.perf_counter() - start)
+
+
 def _OutputFormat():
     """Gets the module's output format."""
     return _cpplint_state.output_format
@@ -1278,6 +1371,12 @@ def _RestoreFilters():
     _cpplint_state.RestoreFilters()
 
 
+def _SetCacheDir(cache_dir):
+    """Sets the directory where errors are cached, or None to not cache."""
+    global _cache_dir
+    _cache_dir = cache_dir
+
+
 class _FunctionState(object):
     """Tracks current function name and the number of lines in its body."""
 
@@ -1501,6 +1600,9 @@ def Error(filename, linenum, category, confidence, message):
                              (filename, linenum, message, category, confidence))
 
 
+# Matches preprocessor directives.
+_RE_PATTERN_PREPROCESSOR = re.compile(r'\s*#')
+
 # Matches standard C++ escape sequences per 2.13.2.3 of the C++ standard.
 _RE_PATTERN_CLEANSE_LINE_ESCAPES = re.compile(
     r'\\([abfnrtv?"\\\']|\d+|x[0-9a-fA-F]+)')
@@ -1688,6 +1790,12 @@ class CleansedLines(object):
     4) lines_without_raw_strings member is same as raw_lines, but with C++11 raw
         strings removed.
     All these members are of <type 'list'>, and of the same length.
+
+    It also indexes features of the elided lines, so that checks can cheaply
+    skip the lines they can't match:
+    1) elided_chars member contains the set of characters of each line.
+    2) is_preprocessor member tells whether each line is a preprocessor
+        directive.
     """
     def __init__(self, lines):
         self.elided = []
@@ -1701,6 +1809,10 @@ class CleansedLines(object):
             elided = self._CollapseStrings(
                 self.lines_without_raw_strings[linenum])
             self.elided.append(CleanseComments(elided))
+        self.elided_chars = [frozenset(line) for line in self.elided]
+        self.is_preprocessor = [
+            bool(_RE_PATTERN_PREPROCESSOR.match(line)) for line in self.elided
+        ]
 
     def NumLines(self):
         """Returns the number of lines represented."""
@@ -2389,6 +2501,9 @@ _THREADING_LIST = (
     ('strtok(', 'strtok_r(', _UNSAFE_FUNC_PREFIX + r'strtok\([^)]+\)'),
     ('ttyname(', 'ttyname_r(', _UNSAFE_FUNC_PREFIX + r'ttyname\([^)]+\)'),
 )
+# Matches lines that may call any of the functions in _THREADING_LIST.
+_RE_PATTERN_THREADING_FUNCS = re.compile(
+    '|'.join(re.escape(func) for func, _, _ in _THREADING_LIST))
 
 
 def CheckPosixThreading(filename, clean_lines, linenum, error):
@@ -2407,6 +2522,9 @@ def CheckPosixThreading(filename, clean_lines, linenum, error):
         error: The function to call with any errors found.
     """
     line = clean_lines.elided[linenum]
+    if ('(' not in clean_lines.elided_chars[linenum]
+            or not _RE_PATTERN_THREADING_FUNCS.search(line)):
+        return
     for single_thread_func, multithread_safe_func, pattern in _THREADING_LIST:
         # Additional pattern matching check to confirm that this is the
         # function we are looking for
@@ -2882,7 +3000,8 @@ class NestingState(object):
             self.previous_stack_top = None
 
         # Update pp_stack
-        self.UpdatePreprocessor(line)
+        if clean_lines.is_preprocessor[linenum]:
+            self.UpdatePreprocessor(line)
 
         # Count parentheses.  This is to avoid adding struct arguments to
         # the nesting stack.
@@ -3237,6 +3356,8 @@ def CheckSpacingForFunctionCall(filename, clean_lines, linenum, error):
         error: The function to call with any errors found.
     """
     line = clean_lines.elided[linenum]
+    if clean_lines.elided_chars[linenum].isdisjoint('()'):
+        return
 
     # Since function calls often occur inside if/for/while/switch
     # expressions - which have their own, more liberal conventions - we
@@ -3607,6 +3728,9 @@ def CheckOperatorSpacing(filename, clean_lines, linenum, error):
         error: The function to call with any errors found.
     """
     line = clean_lines.elided[linenum]
+    # Replacing the operators below only removes characters, so the checks
+    # that need an operator are skipped if the line has none of its characters.
+    chars = clean_lines.elided_chars[linenum]
 
     # Don't try to do spacing checks for operator methods.  Do this by
     # replacing the troublesome characters with something else,
@@ -3614,7 +3738,7 @@ def CheckOperatorSpacing(filename, clean_lines, linenum, error):
     #
     # The replacement is done repeatedly to avoid false positives from
     # operators that call operators.
-    while True:
+    while 'operator' in line:
         match = Match(r'^(.*\boperator\b)(\S+)(\s*\(.*)$', line)
         if match:
             line = match.group(1) + ('_' * len(match.group(2))) + match.group(3)
@@ -3625,7 +3749,7 @@ def CheckOperatorSpacing(filename, clean_lines, linenum, error):
     # Otherwise not.  Note we only check for non-spaces on *both* sides;
     # sometimes people put non-spaces on one side when aligning ='s among
     # many lines (not that this is behavior that I approve of...)
-    if ((Search(r'[\w.]=', line) or Search(r'=[\w.]', line))
+    if ('=' in chars and (Search(r'[\w.]=', line) or Search(r'=[\w.]', line))
             and not Search(r'\b(if|while|for) ', line)
             # Operators taken from [lex.operators] in C++11 standard.
             and not Search(
@@ -3649,9 +3773,11 @@ def CheckOperatorSpacing(filename, clean_lines, linenum, error):
     #
     # Note that && is not included here.  This is because there are too
     # many false positives due to RValue references.
-    match = Search(
-        r'[^<>=!\s](\+=|\-=|\*=|\/=|\%=|\^=|&=|\|=|'
-        r'==|!=|<=|>=|<=>|<<=|>>=|\|\|)[^<>=!\s,;\)]', line)
+    match = None
+    if not chars.isdisjoint('=|'):
+        match = Search(
+            r'[^<>=!\s](\+=|\-=|\*=|\/=|\%=|\^=|&=|\|=|'
+            r'==|!=|<=|>=|<=>|<<=|>>=|\|\|)[^<>=!\s,;\)]', line)
     if match:
         error(filename, linenum, 'whitespace/operators', 3,
               'Missing spaces around %s' % match.group(1))
@@ -3660,7 +3786,7 @@ def CheckOperatorSpacing(filename, clean_lines, linenum, error):
         # triggered if both sides are missing spaces, even though
         # technically should should flag if at least one side is missing a
         # space.  This is done to avoid some false positives with shifts.
-        match = Match(r'^(.*[^\s<])<[^\s=<,]', line)
+        match = '<' in chars and Match(r'^(.*[^\s<])<[^\s=<,]', line)
         if match:
             (_, _, end_pos) = CloseExpression(clean_lines, linenum,
                                               len(match.group(1)))
@@ -3671,7 +3797,7 @@ def CheckOperatorSpacing(filename, clean_lines, linenum, error):
         # Look for > that is not surrounded by spaces.  Similar to the
         # above, we only trigger if both sides are missing spaces to avoid
         # false positives with shifts.
-        match = Match(r'^(.*[^-\s>])>[^\s=>,]', line)
+        match = '>' in chars and Match(r'^(.*[^-\s>])>[^\s=>,]', line)
         if match:
             (_, _, start_pos) = ReverseCloseExpression(clean_lines, linenum,
                                                        len(match.group(1)))
@@ -3684,7 +3810,7 @@ def CheckOperatorSpacing(filename, clean_lines, linenum, error):
     #
     # We also allow operators following an opening parenthesis, since
     # those tend to be macros that deal with operators.
-    match = Search(
+    match = '<' in chars and Search(
         r'(operator|[^\s(<])(?:L|UL|LL|ULL|l|ul|ll|ull)?<<([^\s,=<])', line)
     if (match and not (match.group(1).isdigit() and match.group(2).isdigit())
             and not (match.group(1) == 'operator' and match.group(2) == ';')):
@@ -3703,13 +3829,14 @@ def CheckOperatorSpacing(filename, clean_lines, linenum, error):
     # follows would be part of an identifier, and there should still be
     # a space separating the template type and the identifier.
     #   type<type<type>> alpha
-    match = Search(r'>>[a-zA-Z_]', line)
+    match = '>' in chars and Search(r'>>[a-zA-Z_]', line)
     if match:
         error(filename, linenum, 'whitespace/operators', 3,
               'Missing spaces around >>')
 
     # There shouldn't be space around unary operators
-    match = Search(r'(!\s|~\s|[\s]--[\s;]|[\s]\+\+[\s;])', line)
+    match = (not chars.isdisjoint('!~-+')
+             and Search(r'(!\s|~\s|[\s]--[\s;]|[\s]\+\+[\s;])', line))
     if match:
         error(filename, linenum, 'whitespace/operators', 4,
               'Extra space for operator %s' % match.group(1))
@@ -4187,6 +4314,9 @@ def CheckTrailingSemicolon(filename, clean_lines, linenum, error):
     """
 
     line = clean_lines.elided[linenum]
+    # All the blocks below start on a line with a {.
+    if '{' not in clean_lines.elided_chars[linenum]:
+        return
 
     # Block bodies should not be followed by a semicolon.  Due to C++11
     # brace initialization and C++20 concepts, there are more places
@@ -4716,20 +4846,24 @@ def CheckStyle(filename, clean_lines, linenum, file_extension, nesting_state,
               'More than one command on the same line')
 
     # Some more style checks
-    CheckBraces(filename, clean_lines, linenum, error)
-    CheckTrailingSemicolon(filename, clean_lines, linenum, error)
-    CheckEmptyBlockBody(filename, clean_lines, linenum, error)
-    CheckSpacing(filename, clean_lines, linenum, nesting_state, error)
-    CheckOperatorSpacing(filename, clean_lines, linenum, error)
-    CheckParenthesisSpacing(filename, clean_lines, linenum, error)
-    CheckCommaSpacing(filename, clean_lines, linenum, error)
-    CheckBracesSpacing(filename, clean_lines, linenum, nesting_state, error)
-    CheckSpacingForFunctionCall(filename, clean_lines, linenum, error)
-    CheckCheck(filename, clean_lines, linenum, error)
-    CheckAltTokens(filename, clean_lines, linenum, error)
+    _RunCheck(CheckBraces, filename, clean_lines, linenum, error)
+    _RunCheck(CheckTrailingSemicolon, filename, clean_lines, linenum, error)
+    _RunCheck(CheckEmptyBlockBody, filename, clean_lines, linenum, error)
+    _RunCheck(CheckSpacing, filename, clean_lines, linenum, nesting_state,
+              error)
+    _RunCheck(CheckOperatorSpacing, filename, clean_lines, linenum, error)
+    _RunCheck(CheckParenthesisSpacing, filename, clean_lines, linenum, error)
+    _RunCheck(CheckCommaSpacing, filename, clean_lines, linenum, error)
+    _RunCheck(CheckBracesSpacing, filename, clean_lines, linenum,
+              nesting_state, error)
+    _RunCheck(CheckSpacingForFunctionCall, filename, clean_lines, linenum,
+              error)
+    _RunCheck(CheckCheck, filename, clean_lines, linenum, error)
+    _RunCheck(CheckAltTokens, filename, clean_lines, linenum, error)
     classinfo = nesting_state.InnermostClass()
     if classinfo:
-        CheckSectionSpacing(filename, clean_lines, classinfo, linenum, error)
+        _RunCheck(CheckSectionSpacing, filename, clean_lines, classinfo,
+                  linenum, error)
 
 
 _RE_PATTERN_INCLUDE = re.compile(r'^\s*#\s*include\s*([<"])([^>"]*)[>"].*$')
@@ -5014,7 +5148,8 @@ def CheckLanguage(filename, clean_lines, linenum, file_extension, include_state,
 
     match = _RE_PATTERN_INCLUDE.search(line)
     if match:
-        CheckIncludeLine(filename, clean_lines, linenum, include_state, error)
+        _RunCheck(CheckIncludeLine, filename, clean_lines, linenum,
+                  include_state, error)
         return
 
     # Reset include state across preprocessor directives.  This is meant
@@ -5027,9 +5162,9 @@ def CheckLanguage(filename, clean_lines, linenum, file_extension, include_state,
     fullname = os.path.abspath(filename).replace('\\', '/')
 
     # Perform other checks now that we are sure that this is not an include line
-    CheckCasts(filename, clean_lines, linenum, error)
-    CheckGlobalStatic(filename, clean_lines, linenum, error)
-    CheckPrintf(filename, clean_lines, linenum, error)
+    _RunCheck(CheckCasts, filename, clean_lines, linenum, error)
+    _RunCheck(CheckGlobalStatic, filename, clean_lines, linenum, error)
+    _RunCheck(CheckPrintf, filename, clean_lines, linenum, error)
 
     if file_extension == 'h':
         # TODO(unknown): check that 1-arg constructors are explicit.
@@ -5482,6 +5617,8 @@ def CheckCasts(filename, clean_lines, linenum, error):
         error: The function to call with any errors found.
     """
     line = clean_lines.elided[linenum]
+    if clean_lines.elided_chars[linenum].isdisjoint('(&'):
+        return
 
     # Check to see if they're using an conversion function cast.
     # I just try to capture the most common basic types, though there are more.
@@ -6186,28 +6323,32 @@ def ProcessLine(filename,
             clean_lines, line, error
     """
     raw_lines = clean_lines.raw_lines
-    ParseNolintSuppressions(filename, raw_lines, line, error)
-    nesting_state.Update(filename, clean_lines, line, error)
-    CheckForNamespaceIndentation(filename, nesting_state, clean_lines, line,
-                                 error)
+    _RunCheck(ParseNolintSuppressions, filename, raw_lines, line, error)
+    _RunCheck(nesting_state.Update, filename, clean_lines, line, error)
+    _RunCheck(CheckForNamespaceIndentation, filename, nesting_state,
+              clean_lines, line, error)
     if nesting_state.InAsmBlock(): return
-    CheckForFunctionLengths(filename, clean_lines, line, function_state, error)
-    CheckForMultilineCommentsAndStrings(filename, clean_lines, line, error)
-    CheckStyle(filename, clean_lines, line, file_extension, nesting_state,
-               error)
-    CheckLanguage(filename, clean_lines, line, file_extension, include_state,
-                  nesting_state, error)
-    CheckForNonConstReference(filename, clean_lines, line, nesting_state, error)
-    CheckForNonStandardConstructs(filename, clean_lines, line, nesting_state,
-                                  error)
-    CheckVlogArguments(filename, clean_lines, line, error)
-    CheckPosixThreading(filename, clean_lines, line, error)
-    CheckInvalidIncrement(filename, clean_lines, line, error)
-    CheckMakePairUsesDeduction(filename, clean_lines, line, error)
-    CheckRedundantVirtual(filename, clean_lines, line, error)
-    CheckRedundantOverrideOrFinal(filename, clean_lines, line, error)
+    _RunCheck(CheckForFunctionLengths, filename, clean_lines, line,
+              function_state, error)
+    _RunCheck(CheckForMultilineCommentsAndStrings, filename, clean_lines, line,
+              error)
+    _RunCheck(CheckStyle, filename, clean_lines, line, file_extension,
+              nesting_state, error)
+    _RunCheck(CheckLanguage, filename, clean_lines, line, file_extension,
+              include_state, nesting_state, error)
+    _RunCheck(CheckForNonConstReference, filename, clean_lines, line,
+              nesting_state, error)
+    _RunCheck(CheckForNonStandardConstructs, filename, clean_lines, line,
+              nesting_state, error)
+    _RunCheck(CheckVlogArguments, filename, clean_lines, line, error)
+    _RunCheck(CheckPosixThreading, filename, clean_lines, line, error)
+    _RunCheck(CheckInvalidIncrement, filename, clean_lines, line, error)
+    _RunCheck(CheckMakePairUsesDeduction, filename, clean_lines, line, error)
+    _RunCheck(CheckRedundantVirtual, filename, clean_lines, line, error)
+    _RunCheck(CheckRedundantOverrideOrFinal, filename, clean_lines, line,
+              error)
     for check_fn in extra_check_functions:
-        check_fn(filename, clean_lines, line, error)
+        _RunCheck(check_fn, filename, clean_lines, line, error)
 
 
 def FlagCxx11Features(filename, clean_lines, linenum, error):
@@ -6220,8 +6361,10 @@ def FlagCxx11Features(filename, clean_lines, linenum, error):
         error: The function to call with any errors found.
     """
     line = clean_lines.elided[linenum]
+    is_preprocessor = clean_lines.is_preprocessor[linenum]
 
-    include = Match(r'\s*#\s*include\s+[<"]([^<"]+)[">]', line)
+    include = is_preprocessor and Match(r'\s*#\s*include\s+[<"]([^<"]+)[">]',
+                                        line)
 
     # Flag unapproved C++ TR1 headers.
     if include and include.group(1).startswith('tr1/'):
@@ -6247,7 +6390,8 @@ def FlagCxx11Features(filename, clean_lines, linenum, error):
 
     # The only place where we need to worry about C++11 keywords and library
     # features in preprocessor directives is in macro definitions.
-    if Match(r'\s*#', line) and not Match(r'\s*#\s*define\b', line): return
+    if is_preprocessor and Match(r'\s*#(?!\s*define\b)', line): return
+    if 'std::' not in line: return
 
     # These are classes and free functions.  The classes are always
     # mentioned as std::*, but we only catch the free functions if
@@ -6310,31 +6454,32 @@ def ProcessFileData(filename,
 
     ResetNolintSuppressions()
 
-    CheckForCopyright(filename, lines, error)
-    ProcessGlobalSuppresions(lines)
-    RemoveMultiLineComments(filename, lines, error)
-    clean_lines = CleansedLines(lines)
+    _RunCheck(CheckForCopyright, filename, lines, error)
+    _RunCheck(ProcessGlobalSuppresions, lines)
+    _RunCheck(RemoveMultiLineComments, filename, lines, error)
+    clean_lines = _RunCheck(CleansedLines, lines)
 
     if file_extension == 'h':
-        CheckForHeaderGuard(filename, clean_lines, error)
+        _RunCheck(CheckForHeaderGuard, filename, clean_lines, error)
 
     for line in range(clean_lines.NumLines()):
         ProcessLine(filename, file_extension, clean_lines, line, include_state,
                     function_state, nesting_state, error, extra_check_functions)
-        FlagCxx11Features(filename, clean_lines, line, error)
+        _RunCheck(FlagCxx11Features, filename, clean_lines, line, error)
     nesting_state.CheckCompletedBlocks(filename, error)
 
-    CheckForIncludeWhatYouUse(filename, clean_lines, include_state, error)
+    _RunCheck(CheckForIncludeWhatYouUse, filename, clean_lines, include_state,
+              error)
 
     # Check that the .cc file has included its header if it exists.
     if _IsSourceExtension(file_extension):
-        CheckHeaderFileIncluded(filename, include_state, error)
+        _RunCheck(CheckHeaderFileIncluded, filename, include_state, error)
 
     # We check here rather than inside ProcessLine so that we see raw
     # lines rather than "cleaned" lines.
-    CheckForBadCharacters(filename, lines, error)
+    _RunCheck(CheckForBadCharacters, filename, lines, error)
 
-    CheckForNewlineAtEOF(filename, lines, error)
+    _RunCheck(CheckForNewlineAtEOF, filename, lines, error)
 
 
 def ProcessConfigOverrides(filename):
@@ -6416,6 +6561,122 @@ def ProcessConfigOverrides(filename):
     return True
 
 
+def _FileDigest(filename):
+    """Returns the sha256 of the contents of |filename|, or None if missing."""
+    try:
+        with open(filename, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except IOError:
+        return None
+
+
+def _GetCacheKey(filename, lines, crlf_lines, extra_check_functions):
+    """Returns the key of the cached errors of a file.
+
+    The key covers everything the errors depend on: the contents of the file
+    and of its header, cpplint itself, and the settings the file is linted
+    with, including the filters and line length set by CPPLINT.cfg files.
+
+    Args:
+        filename: The name of the file being linted.
+        lines: The lines of the file, without their trailing carriage returns.
+        crlf_lines: The numbers of the lines that ended with a carriage return.
+        extra_check_functions: The additional check functions run on the file.
+
+    Returns:
+        The key, as a hex string.
+    """
+    global _cpplint_digest
+    if _cpplint_digest is None:
+        _cpplint_digest = _FileDigest(__file__)
+
+    # CheckHeaderFileIncluded and CheckForIncludeWhatYouUse look at the
+    # header of a source file.
+    header = filename[:filename.rfind('.')] + '.h'
+    key = [
+        _cpplint_digest,
+        filename,
+        FileInfo(filename).RepositoryName(),
+        hashlib.sha256('\n'.join(lines).encode('utf-8')).hexdigest(),
+        crlf_lines,
+        _FileDigest(header) if header != filename else None,
+        _cpplint_state.verbose_level,
+        _cpplint_state.output_format,
+        _cpplint_state.counting,
+        _cpplint_state.filters,
+        _line_length,
+        sorted(_valid_extensions),
+        _root,
+        _project_root,
+        [header for _, _, header in _re_pattern_templates],
+        ['%s.%s' % (fn.__module__, fn.__qualname__)
+         for fn in extra_check_functions],
+    ]
+    return hashlib.sha256(json.dumps(key).encode('utf-8')).hexdigest()
+
+
+def _ReplayCachedErrors(cache_key):
+    """Reports the cached errors of a file, if any.
+
+    Returns:
+        True if the errors were found in the cache.
+    """
+    try:
+        with open(os.path.join(_cache_dir, cache_key)) as f:
+            cached = json.load(f)
+        output = cached['output']
+        error_count = cached['error_count']
+        errors_by_category = cached['errors_by_category']
+    except (IOError, ValueError, KeyError, TypeError):
+        return False
+    sys.stderr.write(output)
+    _cpplint_state.MergeErrorCounts(error_count, errors_by_category)
+    return True
+
+
+@contextlib.contextmanager
+def _CacheErrors(cache_key):
+    """Caches the errors reported within the context under |cache_key|.
+
+    Does nothing if |cache_key| is None.
+    """
+    if cache_key is None:
+        yield
+        return
+
+    error_count = _cpplint_state.error_count
+    errors_by_category = dict(_cpplint_state.errors_by_category)
+    stderr = sys.stderr
+    sys.stderr = io.StringIO()
+    try:
+        yield
+    finally:
+        output = sys.stderr.getvalue()
+        sys.stderr = stderr
+        sys.stderr.write(output)
+
+    cached = {
+        'output': output,
+        'error_count': _cpplint_state.error_count - error_count,
+        'errors_by_category': {
+            category: count - errors_by_category.get(category, 0)
+            for category, count in _cpplint_state.errors_by_category.items()
+            if count != errors_by_category.get(category, 0)
+        },
+    }
+    # The cache is only an optimization, so failing to write it is fine. The
+    # entry is renamed into place so that readers never see a partial one.
+    try:
+        if not os.path.isdir(_cache_dir):
+            os.makedirs(_cache_dir)
+        fd, temp_path = tempfile.mkstemp(dir=_cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cached, f)
+        os.replace(temp_path, os.path.join(_cache_dir, cache_key))
+    except OSError:
+        pass
+
+
 def ProcessFile(filename, vlevel, extra_check_functions=[]):
     """Does google-lint on a single file.
 
@@ -6479,30 +6740,130 @@ def ProcessFile(filename, vlevel, extra_check_functions=[]):
         sys.stderr.write('Ignoring %s; not a valid file name '
                          '(%s)\n' % (filename, ', '.join(_valid_extensions)))
     else:
-        ProcessFileData(filename, file_extension, lines, Error,
-                        extra_check_functions)
+        cache_key = None
+        if _cache_dir and filename != '-':
+            cache_key = _GetCacheKey(filename, lines, crlf_lines,
+                                     extra_check_functions)
+        if cache_key and _ReplayCachedErrors(cache_key):
+            _RestoreFilters()
+            return
 
-        # If end-of-line sequences are a mix of LF and CR-LF, issue
-        # warnings on the lines with CR.
-        #
-        # Don't issue any warnings if all lines are uniformly LF or CR-LF,
-        # since critique can handle these just fine, and the style guide
-        # doesn't dictate a particular end of line sequence.
-        #
-        # We can't depend on os.linesep to determine what the desired
-        # end-of-line sequence should be, since that will return the
-        # server-side end-of-line sequence.
-        if lf_lines and crlf_lines:
-            # Warn on every line with CR.  An alternative approach might be to
-            # check whether the file is mostly CRLF or just LF, and warn on the
-            # minority, we bias toward LF here since most tools prefer LF.
-            for linenum in crlf_lines:
-                Error(filename, linenum, 'whitespace/newline', 1,
-                      'Unexpected \\r (^M) found; better to use only \\n')
+        with _CacheErrors(cache_key):
+            ProcessFileData(filename, file_extension, lines, Error,
+                            extra_check_functions)
+
+            # If end-of-line sequences are a mix of LF and CR-LF, issue
+            # warnings on the lines with CR.
+            #
+            # Don't issue any warnings if all lines are uniformly LF or CR-LF,
+            # since critique can handle these just fine, and the style guide
+            # doesn't dictate a particular end of line sequence.
+            #
+            # We can't depend on os.linesep to determine what the desired
+            # end-of-line sequence should be, since that will return the
+            # server-side end-of-line sequence.
+            if lf_lines and crlf_lines:
+                # Warn on every line with CR.  An alternative approach might be
+                # to check whether the file is mostly CRLF or just LF, and warn
+                # on the minority, we bias toward LF here since most tools
+                # prefer LF.
+                for linenum in crlf_lines:
+                    Error(filename, linenum, 'whitespace/newline', 1,
+                          'Unexpected \\r (^M) found; better to use only \\n')
 
     _RestoreFilters()
 
 
+def _GetWorkerSettings():
+    """Returns the settings a worker process needs to lint like this one.
+
+    Worker processes are not guaranteed to be forked from this one, so every
+    module-wide setting that affects linting is passed along explicitly.
+    """
+    state = _CppLintState()
+    state.SetOutputFormat(_cpplint_state.output_format)
+    state.SetCountingStyle(_cpplint_state.counting)
+    state.filters = _cpplint_state.filters[:]
+    state.SetCheckProfiling(_cpplint_state.check_profile is not None)
+    return (state, _root, _root_debug, _project_root, _line_length,
+            _valid_extensions, _re_pattern_templates, _cache_dir)
+
+
+def _ProcessFileInWorker(args):
+    """Lints a single file with an isolated state. Runs in a worker process.
+
+    Args:
+        args: A (filename, vlevel, settings, extra_check_functions) tuple, where
+            settings was returned by _GetWorkerSettings.
+
+    Returns:
+        A (output, error_count, errors_by_category, check_profile) tuple for
+        the file.
+    """
+    global _cpplint_state, _root, _root_debug, _project_root, _line_length
+    global _valid_extensions, _re_pattern_templates, _cache_dir
+    filename, vlevel, settings, extra_check_functions = args
+    # Every task unpickles its own copy of the parent's settings, so neither
+    # errors nor CPPLINT.cfg overrides leak between the files a worker lints.
+    (_cpplint_state, _root, _root_debug, _project_root, _line_length,
+     _valid_extensions, _re_pattern_templates, _cache_dir) = settings
+    ResetNolintSuppressions()
+
+    stderr = sys.stderr
+    sys.stderr = io.StringIO()
+    try:
+        ProcessFile(filename, vlevel, extra_check_functions)
+        output = sys.stderr.getvalue()
+    finally:
+        sys.stderr = stderr
+    return (output, _cpplint_state.error_count,
+            _cpplint_state.errors_by_category, _cpplint_state.check_profile)
+
+
+def ProcessFiles(filenames, vlevel, jobs=1, extra_check_functions=[]):
+    """Does google-lint on several files, possibly in parallel.
+
+    Errors are reported and counted as if ProcessFile was called for each of
+    the files in order, regardless of the number of jobs.
+
+    Args:
+        filenames: The names of the files to parse.
+
+        vlevel: The level of errors to report, either a single level for all
+        the files or a list with the level of each file.
+
+        jobs: The number of processes used to lint the files.
+
+        extra_check_functions: An array of additional check functions that will be
+            run on each source line. They must be picklable when jobs > 1.
+    """
+    if isinstance(vlevel, int):
+        vlevels = [vlevel] * len(filenames)
+    else:
+        vlevels = list(vlevel)
+        assert len(vlevels) == len(filenames)
+
+    jobs = min(jobs, len(filenames))
+    # Reading from stdin can't be distributed to other processes.
+    if jobs <= 1 or '-' in filenames:
+        for filename, level in zip(filenames, vlevels):
+            ProcessFile(filename, level, extra_check_functions)
+        return
+
+    settings = _GetWorkerSettings()
+    tasks = [(filename, level, settings, extra_check_functions)
+             for filename, level in zip(filenames, vlevels)]
+    with multiprocessing.Pool(jobs) as pool:
+        # imap returns the results in the order of the files.
+        for (output, error_count, errors_by_category,
+             check_profile) in pool.imap(_ProcessFileInWorker, tasks):
+            sys.stderr.write(output)
+            _cpplint_state.MergeErrorCounts(error_count, errors_by_category)
+            _cpplint_state.MergeCheckProfile(check_profile)
+    # ProcessFile leaves the verbose level of the last file behind.
+    _SetVerboseLevel(vlevels[-1])
+
+
 def PrintUsage(message):
     """Prints a brief usage string and exits, optionally with an error message.
 
@@ -6551,7 +6912,10 @@ def ParseArguments(args):
                 'linelength=',
                 'extensions=',
                 'project_root=',
-                'repository='
+                'repository=',
+                'jobs=',
+                'profile-checks',
+                'cache-dir='
             ])
     except getopt.GetoptError as e:
         PrintUsage('Invalid arguments: {}'.format(e))
@@ -6560,6 +6924,7 @@ def ParseArguments(args):
     output_format = _OutputFormat()
     filters = ''
     counting_style = ''
+    cache_dir = None
 
     for (opt, val) in opts:
         if opt == '--help':
@@ -6601,6 +6966,18 @@ def ParseArguments(args):
                 _valid_extensions = set(val.split(','))
             except ValueError:
                 PrintUsage('Extensions must be comma separated list.')
+        elif opt == '--jobs':
+            global _jobs
+            try:
+                _jobs = int(val)
+            except ValueError:
+                PrintUsage('Jobs must be digits.')
+            if _jobs < 1:
+                PrintUsage('Jobs must be at least 1.')
+        elif opt == '--cache-dir':
+            cache_dir = val
+        elif opt == '--profile-checks':
+            _cpplint_state.SetCheckProfiling(True)
 
     if not filenames:
         PrintUsage('No files were specified.')
@@ -6609,6 +6986,7 @@ def ParseArguments(args):
     _SetVerboseLevel(verbosity)
     _SetFilters(filters)
     _SetCountingStyle(counting_style)
+    _SetCacheDir(cache_dir)
 
     return filenames
 
@@ -6625,9 +7003,9 @@ def main():
         codecs.getwriter('utf8'), 'replace')
 
     _cpplint_state.ResetErrorCounts()
-    for filename in filenames:
-        ProcessFile(filename, _cpplint_state.verbose_level)
+    ProcessFiles(filenames, _cpplint_state.verbose_level, _jobs)
     _cpplint_state.PrintErrorCounts()
+    _cpplint_state.PrintCheckProfile()
 
     sys.exit(_cpplint_state.error_count > 0)
 
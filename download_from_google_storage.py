@@ -5,6 +5,7 @@
 """Download files from Google Storage based on SHA1 sums."""
 
 import hashlib
+import json
 import optparse
 import os
 import queue
@@ -14,9 +15,12 @@ import shutil
 import stat
 import sys
 import tarfile
+import tempfile
 import threading
 import time
 
+import artifact_store as artifact_store_lib
+import gcs_download
 import subprocess2
 
 # Env vars that tempdir can be gotten from; minimally, this
@@ -37,6 +41,19 @@ PLATFORM_MAPPING = {
     'zos': 'zos',
 }
 
+# Directory of the digest cache used by get_digest(). An empty value disables
+# the cache.
+HASH_CACHE_DIR_ENV_VAR = 'DEPOT_TOOLS_HASH_CACHE_DIR'
+
+# Files modified this recently are not added to the digest cache, since a
+# further write within the filesystem's timestamp granularity would go
+# unnoticed.
+_HASH_CACHE_RACY_SECONDS = 2
+
+# How often entries of files which were deleted or changed are removed from
+# the digest cache.
+_HASH_CACHE_PRUNE_SECONDS = 24 * 60 * 60
+
 # (b/328065301): Remove when all GCS hooks are migrated to first class deps
 MIGRATION_TOGGLE_FILE_SUFFIX = '_is_first_class_gcs'
 
@@ -175,8 +192,8 @@ def check_platform(target):
     return check_platform(root)
 
 
-def get_sha1(filename):
-    sha1 = hashlib.sha1()
+def _hash_file(filename, algorithm):
+    digest = hashlib.new(algorithm)
     with open(filename, 'rb') as f:
         while True:
             # Read in 1mb chunks, so it doesn't all have to be loaded into
@@ -184,8 +201,114 @@ def get_sha1(filename):
             chunk = f.read(1024 * 1024)
             if not chunk:
                 break
-            sha1.update(chunk)
-    return sha1.hexdigest()
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _get_hash_cache_dir():
+    cache_dir = os.environ.get(HASH_CACHE_DIR_ENV_VAR)
+    if cache_dir is None:
+        cache_dir = os.path.join(
+            os.environ.get('XDG_CACHE_HOME')
+            or os.path.join(os.path.expanduser('~'), '.cache'), 'depot_tools',
+            'hashes')
+    return cache_dir
+
+
+def _get_hash_cache_entry(cache_file, path, stat_key):
+    try:
+        with open(cache_file) as f:
+            entry = json.load(f)
+    except (IOError, ValueError):
+        return {}
+    if (not isinstance(entry, dict) or entry.get('path') != path
+            or entry.get('stat') != stat_key):
+        return {}
+    return entry
+
+
+def _prune_hash_cache(cache_dir):
+    """Removes the entries of files which no longer exist or changed, at most
+    once every _HASH_CACHE_PRUNE_SECONDS, so the cache doesn't grow forever."""
+    marker = os.path.join(cache_dir, '.pruned')
+    try:
+        if time.time() - os.stat(marker).st_mtime < _HASH_CACHE_PRUNE_SECONDS:
+            return
+    except OSError:
+        pass
+    try:
+        with open(marker, 'w'):
+            pass
+        names = os.listdir(cache_dir)
+    except OSError:
+        return
+    for name in names:
+        # Skip the marker and the entries being written.
+        if not re.match(r'^[0-9a-f]{40}$', name):
+            continue
+        cache_file = os.path.join(cache_dir, name)
+        try:
+            with open(cache_file) as f:
+                entry = json.load(f)
+            st = os.stat(entry['path'])
+            if entry['stat'] == [st.st_size, st.st_mtime_ns, st.st_ino]:
+                continue
+        except (IOError, ValueError, TypeError, KeyError):
+            pass
+        try:
+            os.remove(cache_file)
+        except OSError:
+            pass
+
+
+def _put_hash_cache_entry(cache_file, entry):
+    # Write to a temporary file and rename it over the entry, so that
+    # concurrent processes only ever see complete entries.
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        _prune_hash_cache(os.path.dirname(cache_file))
+        fd, temp_file = tempfile.mkstemp(dir=os.path.dirname(cache_file))
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f)
+            os.replace(temp_file, cache_file)
+        except BaseException:
+            os.remove(temp_file)
+            raise
+    except OSError:
+        pass
+
+
+def get_digest(filename, algorithm):
+    """Returns the hex digest of the file, using the digest cache if possible.
+
+    Digests are cached on disk, keyed by the file's absolute path and validated
+    against its size, mtime and inode, so unchanged files aren't read again.
+    Any change in stat data falls back to hashing the file.
+    """
+    cache_dir = _get_hash_cache_dir()
+    if not cache_dir:
+        return _hash_file(filename, algorithm)
+
+    path = os.path.abspath(filename)
+    st = os.stat(path)
+    stat_key = [st.st_size, st.st_mtime_ns, st.st_ino]
+    cache_file = os.path.join(
+        cache_dir,
+        hashlib.sha1(path.encode('utf-8', 'surrogateescape')).hexdigest())
+    entry = _get_hash_cache_entry(cache_file, path, stat_key)
+    if algorithm in entry:
+        return entry[algorithm]
+
+    digest = _hash_file(filename, algorithm)
+    if st.st_mtime_ns < (time.time() - _HASH_CACHE_RACY_SECONDS) * 1e9:
+        entry.update({'path': path, 'stat': stat_key, algorithm: digest})
+        _put_hash_cache_entry(cache_file, entry)
+    return digest
+
+
+def get_sha1(filename):
+    return get_digest(filename, 'sha1')
 
 
 # Download-specific code starts here
@@ -253,24 +376,116 @@ def enumerate_input(input_filename, directory, recursive, ignore_errors, output,
                           file=sys.stderr)
 
 
+def _validate_tar_member(tarinfo, prefix):
+    """Returns false if the tarinfo is something we explicitly forbid."""
+    if tarinfo.issym() or tarinfo.islnk():
+        # For links, check if the destination is valid.
+        if os.path.isabs(tarinfo.linkname):
+            return False
+        link_target = os.path.normpath(
+            os.path.join(os.path.dirname(tarinfo.name), tarinfo.linkname))
+        if not link_target.startswith(prefix):
+            return False
+
+    if ('../' in tarinfo.name or '..\\' in tarinfo.name
+            or not tarinfo.name.startswith(prefix)):
+        return False
+    return True
+
+
 def _validate_tar_file(tar, prefix):
-    def _validate(tarinfo):
-        """Returns false if the tarinfo is something we explicitly forbid."""
-        if tarinfo.issym() or tarinfo.islnk():
-            # For links, check if the destination is valid.
-            if os.path.isabs(tarinfo.linkname):
-                return False
-            link_target = os.path.normpath(
-                os.path.join(os.path.dirname(tarinfo.name), tarinfo.linkname))
-            if not link_target.startswith(prefix):
-                return False
-
-        if ('../' in tarinfo.name or '..\\' in tarinfo.name
-                or not tarinfo.name.startswith(prefix)):
+    return all(
+        _validate_tar_member(tarinfo, prefix) for tarinfo in tar.getmembers())
+
+
+def _stream_download(thread_num, downloader, file_url, input_sha1_sum,
+                     output_filename, extract_dir, out_q, ret_codes):
+    """Downloads, verifies and extracts a file in a single pass.
+
+    Returns True on success, otherwise reports the error to out_q and
+    ret_codes.
+    """
+    if extract_dir and os.path.exists(extract_dir):
+        try:
+            shutil.rmtree(extract_dir)
+            out_q.put('%d> Removed %s...' % (thread_num, extract_dir))
+        except OSError:
+            out_q.put('%d> Warning: Can\'t delete: %s' %
+                      (thread_num, extract_dir))
+            ret_codes.put((1, 'Can\'t delete %s.' % (extract_dir)))
             return False
-        return True
+    prefix = os.path.basename(extract_dir) if extract_dir else None
+    try:
+        if extract_dir:
+            # See the worker thread: the flag file marks an unfinished
+            # extraction.
+            with open(extract_dir + '.tmp', 'a'):
+                pass
+        result = downloader.download(
+            file_url,
+            output_filename,
+            algorithms=('sha1', ),
+            expected_digests={'sha1': input_sha1_sum},
+            extract_dir=(os.path.dirname(os.path.abspath(output_filename))
+                         if extract_dir else None),
+            validate_member=lambda tarinfo: _validate_tar_member(
+                tarinfo, prefix),
+            require_archive=True)
+    except gcs_download.DownloadError as e:
+        if e.status == 404:
+            msg = 'File %s for %s does not exist.' % (file_url,
+                                                      output_filename)
+            code = 1
+        elif isinstance(e, gcs_download.VerificationError):
+            msg, code = str(e), 20
+        else:
+            msg = 'Failed to fetch file %s for %s. [Err: %s]' % (
+                file_url, output_filename, e)
+            code = 1
+        out_q.put('%d> %s' % (thread_num, msg))
+        ret_codes.put((code, msg))
+        return False
+    if extract_dir:
+        os.remove(extract_dir + '.tmp')
+        out_q.put('%d> Extracted %d entries from %s to %s' %
+                  (thread_num, len(result.members), output_filename,
+                   extract_dir))
+    if sys.platform == 'cygwin' or (sys.platform != 'win32'
+                                    and result.executable):
+        st = os.stat(output_filename)
+        os.chmod(output_filename, st.st_mode | stat.S_IEXEC)
+    return True
 
-    return all(map(_validate, tar.getmembers()))
+
+def _gsutil_download(thread_num, gsutil, file_url, output_filename, out_q,
+                     ret_codes):
+    """Downloads a file with gsutil cp.
+
+    Returns True on success, otherwise reports the error to out_q and
+    ret_codes.
+    """
+    code, _, err = gsutil.check_call('cp', file_url, output_filename)
+    if code == 0:
+        return True
+    if code == 404:
+        out_q.put('%d> File %s for %s does not exist, skipping.' %
+                  (thread_num, file_url, output_filename))
+        ret_codes.put(
+            (1, 'File %s for %s does not exist.' % (file_url, output_filename)))
+    elif code == 401:
+        out_q.put('%d> Failed to fetch file %s for %s due to unauthorized '
+                  'access, skipping. Try running `gsutil.py config`.' %
+                  (thread_num, file_url, output_filename))
+        ret_codes.put(
+            (1, 'Failed to fetch file %s for %s due to unauthorized access.' %
+             (file_url, output_filename)))
+    else:
+        # Other error, probably auth related (bad ~/.boto, etc).
+        out_q.put('%d> Failed to fetch file %s for %s, skipping. [Err: %s]' %
+                  (thread_num, file_url, output_filename, err))
+        ret_codes.put((code, 'Failed to fetch file %s for %s. [Err: %s]' %
+                       (file_url, output_filename, err)))
+    return False
 
 
 def _downloader_worker_thread(thread_num,
@@ -282,7 +497,9 @@ def _downloader_worker_thread(thread_num,
                               ret_codes,
                               verbose,
                               extract,
-                              delete=True):
+                              delete=True,
+                              downloader=None,
+                              artifact_store=None):
     while True:
         input_sha1_sum, output_filename = q.get()
         if input_sha1_sum is None:
@@ -343,36 +560,41 @@ def _downloader_worker_thread(thread_num,
             if os.path.exists(output_filename):
                 out_q.put('%d> Warning: deleting %s failed.' %
                           (thread_num, output_filename))
-        if verbose:
-            out_q.put('%d> Downloading %s@%s...' %
-                      (thread_num, output_filename, input_sha1_sum))
-        code, _, err = gsutil.check_call('cp', file_url, output_filename)
-        if code != 0:
-            if code == 404:
-                out_q.put('%d> File %s for %s does not exist, skipping.' %
-                          (thread_num, file_url, output_filename))
-                ret_codes.put((1, 'File %s for %s does not exist.' %
-                               (file_url, output_filename)))
-            elif code == 401:
-                out_q.put(
-                    '%d> Failed to fetch file %s for %s due to unauthorized '
-                    'access, skipping. Try running `gsutil.py config`.' %
-                    (thread_num, file_url, output_filename))
-                ret_codes.put((
-                    1,
-                    'Failed to fetch file %s for %s due to unauthorized access.'
-                    % (file_url, output_filename)))
-            else:
-                # Other error, probably auth related (bad ~/.boto, etc).
-                out_q.put(
-                    '%d> Failed to fetch file %s for %s, skipping. [Err: %s]' %
-                    (thread_num, file_url, output_filename, err))
-                ret_codes.put(
-                    (code, 'Failed to fetch file %s for %s. [Err: %s]' %
-                     (file_url, output_filename, err)))
-            continue
+        from_store = bool(
+            artifact_store
+            and artifact_store.fetch('sha1', input_sha1_sum, output_filename))
+        if from_store and get_sha1(output_filename) != input_sha1_sum:
+            # Don't let a corrupt object break every later download.
+            out_q.put('%d> Warning: %s in the artifact store is corrupt, '
+                      'downloading it again.' % (thread_num, input_sha1_sum))
+            artifact_store.remove('sha1', input_sha1_sum)
+            os.remove(output_filename)
+            from_store = False
+        if from_store:
+            if verbose:
+                out_q.put('%d> Using %s@%s from the artifact store...' %
+                          (thread_num, output_filename, input_sha1_sum))
+        else:
+            if verbose:
+                out_q.put('%d> Downloading %s@%s...' %
+                          (thread_num, output_filename, input_sha1_sum))
+            if downloader:
+                if _stream_download(thread_num, downloader, file_url,
+                                    input_sha1_sum, output_filename,
+                                    extract_dir, out_q, ret_codes):
+                    if artifact_store:
+                        artifact_store.add('sha1', input_sha1_sum,
+                                           output_filename)
+                    if os.path.exists(migration_file_name):
+                        os.remove(migration_file_name)
+                continue
+            if not _gsutil_download(thread_num, gsutil, file_url,
+                                    output_filename, out_q, ret_codes):
+                continue
 
-        remote_sha1 = get_sha1(output_filename)
+        # Objects from the store were verified when fetched.
+        remote_sha1 = input_sha1_sum if from_store else get_sha1(
+            output_filename)
         if remote_sha1 != input_sha1_sum:
             msg = (
                 '%d> ERROR remote sha1 (%s) does not match expected sha1 (%s).'
@@ -419,10 +641,16 @@ def _downloader_worker_thread(thread_num,
                 os.remove(extract_dir + '.tmp')
         if os.path.exists(migration_file_name):
             os.remove(migration_file_name)
+        if from_store:
+            # The executable bit was stored along with the object.
+            continue
         code, err = set_executable_bit(output_filename, file_url, gsutil)
         if code != 0:
             out_q.put('%d> %s' % (thread_num, err))
             ret_codes.put((code, err))
+            continue
+        if artifact_store:
+            artifact_store.add('sha1', input_sha1_sum, output_filename)
 
 
 class PrinterThread(threading.Thread):
@@ -473,7 +701,8 @@ def _data_exists(input_sha1_sum, output_filename, extract):
 def download_from_google_storage(input_filename, base_url, gsutil, num_threads,
                                  directory, recursive, force, output,
                                  ignore_errors, sha1_file, verbose,
-                                 auto_platform, extract):
+                                 auto_platform, extract, downloader=None,
+                                 artifact_store=None):
 
     # Tuples of sha1s and paths.
     input_data = list(
@@ -513,7 +742,7 @@ def download_from_google_storage(input_filename, base_url, gsutil, num_threads,
     # needs to be done if we'll process input data in parallel, which can lead
     # to a race in gsutil's self-update on the first call. Note, this causes a
     # network call, therefore any fast bailout should be done before this point.
-    if len(input_data) > 1:
+    if len(input_data) > 1 and not downloader:
         gsutil.check_call('version')
 
     # Start up all the worker threads.
@@ -528,7 +757,7 @@ def download_from_google_storage(input_filename, base_url, gsutil, num_threads,
                              args=[
                                  thread_num, work_queue, force, base_url,
                                  gsutil, stdout_queue, ret_codes, verbose,
-                                 extract
+                                 extract, True, downloader, artifact_store
                              ])
         t.daemon = True
         t.start()
@@ -744,7 +973,9 @@ def main(args):
             input_filename, base_url, gsutil, num_threads, options.directory,
             options.recursive, options.force, options.output,
             options.ignore_errors, options.sha1_file, options.verbose,
-            options.auto_platform, options.extract)
+            options.auto_platform, options.extract,
+            gcs_download.get_downloader(),
+            artifact_store_lib.ArtifactStore.from_environment())
     except FileNotFoundError as e:
         print("Fatal error: {}".format(e))
         return 1
@@ -15,6 +15,9 @@
 #   .gclient_entries : A cache constructed by 'update' command.  Format is a
 #                   Python script defining 'entries', a list of the names
 #                   of all modules in the client
+#   .gclient_deps_cache : Parsed DEPS files, keyed by their content and the
+#                   variables used to evaluate them. Reused by later runs unless
+#                   --no-deps-cache is passed.
 #   <module>/DEPS : Python script defining var 'deps' as a map from each
 #                   requisite submodule name to a URL where it can be found (via
 #                   one SCM)
@@ -93,6 +96,7 @@ import pprint
 import re
 import sys
 import shutil
+import stat
 import tarfile
 import tempfile
 import time
@@ -100,6 +104,7 @@ import urllib.parse
 
 from collections.abc import Collection, Mapping, Sequence
 
+import artifact_store
 import detect_host_arch
 import download_from_google_storage
 import git_common
@@ -107,6 +112,7 @@ import gclient_eval
 import gclient_paths
 import gclient_scm
 import gclient_utils
+import gcs_download
 import git_cache
 import metrics
 import metrics_utils
@@ -128,6 +134,7 @@ UNSET_CACHE_DIR = object()
 
 PREVIOUS_CUSTOM_VARS_FILE = '.gclient_previous_custom_vars'
 PREVIOUS_SYNC_COMMITS_FILE = '.gclient_previous_sync_commits'
+DEPS_CACHE_DIR = '.gclient_deps_cache'
 
 PREVIOUS_SYNC_COMMITS = 'GCLIENT_PREVIOUS_SYNC_COMMITS'
 
@@ -737,7 +744,6 @@ class Dependency(gclient_utils.WorkItem, DependencySettings):
         # type: (Mapping[str, Mapping[str, str]], bool) -> Sequence[Dependency]
         """Convert a deps dict to a list of Dependency objects."""
         deps_to_add = []
-        cached_conditions = {}
 
         # TODO(https://crbug.com/343199633): Remove once all packages no longer
         # place content in directories with git content, and all milestone
@@ -754,13 +760,16 @@ class Dependency(gclient_utils.WorkItem, DependencySettings):
             'src/tools/perf/page_sets/maps_perf_test/',
         ])
 
-        def _should_process(condition):
-            if not condition:
-                return True
-            if condition not in cached_conditions:
-                cached_conditions[condition] = gclient_eval.EvaluateCondition(
-                    condition, self.get_vars())
-            return cached_conditions[condition]
+        process_all_deps = self._get_option('process_all_deps', False)
+        condition_results = {}
+        if self.should_process and not process_all_deps:
+            # Evaluate each distinct condition once for all the deps. The deps
+            # of a dependency which isn't processed aren't either, so their
+            # conditions aren't evaluated.
+            condition_results = gclient_eval.EvaluateConditions(
+                (dep_value['condition'] for dep_value in deps.values()
+                 if dep_value is not None and dep_value.get('condition')),
+                self.get_vars())
 
         for name, dep_value in deps.items():
             should_process = self.should_process
@@ -770,8 +779,8 @@ class Dependency(gclient_utils.WorkItem, DependencySettings):
             condition = dep_value.get('condition')
             dep_type = dep_value.get('dep_type')
 
-            if not self._get_option('process_all_deps', False):
-                should_process = should_process and _should_process(condition)
+            if not process_all_deps and condition:
+                should_process = should_process and condition_results[condition]
 
             # The following option is only set by the 'revinfo' command.
             if dep_type in self._get_option('ignore_dep_type', []):
@@ -866,13 +875,41 @@ class Dependency(gclient_utils.WorkItem, DependencySettings):
                         should_recurse=name in self.recursedeps,
                         relative=use_relative_paths,
                         condition=condition,
-                        protocol=self.protocol))
+                        protocol=self.protocol,
+                        clone_filter=dep_value.get('clone_filter'),
+                        sparse_checkout=dep_value.get('sparse_checkout')))
 
         # TODO(crbug.com/1341285): Understand why we need this and remove
         # it if we don't.
         deps_to_add.sort(key=lambda x: x.name)
         return deps_to_add
 
+    def _ParseDepsContent(self, deps_content, filepath):
+        """Parses deps_content, reusing the result of a previous run from the
+        DEPS cache when neither the content nor the variables changed."""
+        vars_override = self.get_vars()
+        builtin_vars = self.get_builtin_vars()
+        deps_cache = None
+        if not self._get_option('no_deps_cache', False):
+            deps_cache = self.GetDepsCache()
+        if deps_cache:
+            local_scope = deps_cache.Get(deps_content, filepath, vars_override,
+                                         builtin_vars)
+            if local_scope is not None:
+                logging.info('ParseDepsFile(%s): using cached result',
+                             self.name)
+                return local_scope
+
+        try:
+            local_scope = gclient_eval.Parse(deps_content, filepath,
+                                             vars_override, builtin_vars)
+        except SyntaxError as e:
+            gclient_utils.SyntaxErrorToError(filepath, e)
+        if deps_cache:
+            deps_cache.Set(deps_content, filepath, vars_override, builtin_vars,
+                           local_scope)
+        return local_scope
+
     def ParseDepsFile(self):
         # type: () -> None
         """Parses the DEPS file for this dependency."""
@@ -905,12 +942,7 @@ class Dependency(gclient_utils.WorkItem, DependencySettings):
 
         local_scope = {}
         if deps_content:
-            try:
-                local_scope = gclient_eval.Parse(deps_content, filepath,
-                                                 self.get_vars(),
-                                                 self.get_builtin_vars())
-            except SyntaxError as e:
-                gclient_utils.SyntaxErrorToError(filepath, e)
+            local_scope = self._ParseDepsContent(deps_content, filepath)
 
         if 'git_dependencies' in local_scope:
             self.git_dependencies_state = local_scope['git_dependencies']
@@ -1508,6 +1540,13 @@ class Dependency(gclient_utils.WorkItem, DependencySettings):
             return None
         return self.root.GetGcsRoot()
 
+    def GetDepsCache(self):
+        if self.root is self:
+            # Let's not infinitely recurse. If this is root and isn't an
+            # instance of GClient, do nothing.
+            return None
+        return self.root.GetDepsCache()
+
     def subtree(self, include_all):
         """Breadth first recursion excluding root node."""
         dependencies = self.dependencies
@@ -1722,6 +1761,13 @@ class GitDependency(Dependency):
     """A Dependency object that represents a single git checkout."""
     _is_env_cog = None
 
+    def __init__(self, *args, clone_filter=None, sparse_checkout=None,
+                 **kwargs):
+        super(GitDependency, self).__init__(*args, **kwargs)
+        # How to make the initial clone cheaper, from the DEPS entry.
+        self._clone_filter = clone_filter
+        self._sparse_checkout = sparse_checkout
+
     @staticmethod
     def _IsCog():
         """Returns true if the env is cog"""
@@ -1740,6 +1786,23 @@ class GitDependency(Dependency):
 
         return re.sub('^([a-z]+):', protocol + ':', url)
 
+    #override
+    def ToLines(self):
+        # () -> Sequence[str]
+        """Returns strings representing the deps (info, graphviz line)"""
+        s = super(GitDependency, self).ToLines()
+        clone_part = []
+        if self._clone_filter:
+            clone_part.append('    "clone_filter": "%s",' %
+                              self._clone_filter)
+        if self._sparse_checkout:
+            clone_part.append(
+                '    "sparse_checkout": [%s],' %
+                ', '.join('"%s"' % d for d in self._sparse_checkout))
+        # Before the closing '  },' and the blank line.
+        s[-2:-2] = clone_part
+        return s
+
     #override
     def GetScmName(self):
         """Always 'git'."""
@@ -1756,7 +1819,9 @@ class GitDependency(Dependency):
                                       self.name,
                                       self.outbuf,
                                       out_cb,
-                                      print_outbuf=self.print_outbuf)
+                                      print_outbuf=self.print_outbuf,
+                                      clone_filter=self._clone_filter,
+                                      sparse_checkout=self._sparse_checkout)
 
 
 class GClient(GitDependency):
@@ -1833,6 +1898,7 @@ solutions = %(solution_list)s
         self._root_dir = root_dir
         self._cipd_root = None
         self._gcs_root = None
+        self._deps_cache = None
         self.config_content = None
 
     def _CheckConfig(self):
@@ -2647,6 +2713,12 @@ it or fix the checkout.
             self._gcs_root = gclient_scm.GcsRoot(self.root_dir)
         return self._gcs_root
 
+    def GetDepsCache(self):
+        if not self._deps_cache:
+            self._deps_cache = gclient_eval.ParseCache(
+                os.path.join(self.root_dir, DEPS_CACHE_DIR))
+        return self._deps_cache
+
     @property
     def root_dir(self):
         """Root directory of gclient checkout."""
@@ -2782,6 +2854,9 @@ class GcsDependency(Dependency):
         return False
 
     def ValidateTarFile(self, tar, prefixes):
+        return self.ValidateTarMembers(tar.getmembers(), prefixes)
+
+    def ValidateTarMembers(self, members, prefixes):
 
         def _validate(tarinfo):
             """Returns false if the tarinfo is something we explicitly forbid."""
@@ -2808,7 +2883,53 @@ class GcsDependency(Dependency):
                 return False
             return True
 
-        return all(map(_validate, tar.getmembers()))
+        return all(map(_validate, members))
+
+    @staticmethod
+    def TarFilter(member, path):
+        # Don't set mtime based on the archive metadata.
+        member.mtime = None
+        # Match the tarfile default filter.
+        default_filter = (tarfile.fully_trusted_filter if sys.version_info <
+                          (3, 14) else tarfile.data_filter)
+        return default_filter(member, path)
+
+    def StreamGoogleStorage(self, downloader):
+        """Downloads, verifies and extracts the object in a single pass."""
+
+        def ValidateMembers(members):
+            formatted_names = []
+            for member in members:
+                name = member.name
+                if name.startswith('./') and len(name) > 2:
+                    name = name[2:]
+                formatted_names.append(name)
+            possible_top_level_dirs = set(
+                name.split('/')[0] for name in formatted_names)
+            return self.ValidateTarMembers(members, possible_top_level_dirs)
+
+        result = downloader.download(
+            self.url,
+            self.artifact_output_file,
+            algorithms=('sha256', ),
+            expected_digests={'sha256': self.sha256sum},
+            expected_size=self.size_bytes,
+            extract_dir=self.output_dir,
+            validate_members=ValidateMembers,
+            tar_filter=self.TarFilter)
+
+        if result.members is not None:
+            tar_content_file = os.path.join(
+                self.output_dir, f'.{self.file_prefix}_content_names')
+            self.WriteToFile(
+                json.dumps([member.name for member in result.members]),
+                tar_content_file)
+        if sys.platform == 'cygwin' or (sys.platform != 'win32'
+                                        and result.executable):
+            st = os.stat(self.artifact_output_file)
+            os.chmod(self.artifact_output_file, st.st_mode | stat.S_IEXEC)
+        self.WriteToFile(result.digests['sha256'], self.hash_file)
+        self.WriteToFile(str(1), self.migration_toggle_file)
 
     def DownloadGoogleStorage(self):
         """Calls GCS."""
@@ -2829,6 +2950,28 @@ class GcsDependency(Dependency):
         # it, so exist_ok is used.
         os.makedirs(self.output_dir, exist_ok=True)
 
+        store = None
+        if os.getenv('GCLIENT_TEST') != '1':
+            store = artifact_store.ArtifactStore.from_environment()
+        from_store = bool(store and store.fetch(
+            'sha256', self.sha256sum, self.artifact_output_file))
+        if from_store and (upload_to_google_storage_first_class.get_sha256sum(
+                self.artifact_output_file) != self.sha256sum):
+            # Don't let a corrupt object break every later sync.
+            print('%s in the artifact store is corrupt, downloading it again.' %
+                  self.sha256sum)
+            store.remove('sha256', self.sha256sum)
+            os.remove(self.artifact_output_file)
+            from_store = False
+
+        downloader = gcs_download.get_downloader()
+        if (not from_store and downloader
+                and os.getenv('GCLIENT_TEST') != '1'):
+            self.StreamGoogleStorage(downloader)
+            if store:
+                store.add('sha256', self.sha256sum, self.artifact_output_file)
+            return
+
         gsutil = download_from_google_storage.Gsutil(
             download_from_google_storage.GSUTIL_DEFAULT_PATH)
         if os.getenv('GCLIENT_TEST') == '1':
@@ -2847,7 +2990,7 @@ class GcsDependency(Dependency):
                     f.write('extracted text')
                 with tarfile.open(self.artifact_output_file, "w:gz") as tar:
                     tar.add(copy_dir, arcname=os.path.basename(copy_dir))
-        else:
+        elif not from_store:
             code, _, err = gsutil.check_call('cp', self.url,
                                              self.artifact_output_file)
             if code and err:
@@ -2862,6 +3005,10 @@ class GcsDependency(Dependency):
         if os.getenv('GCLIENT_TEST') == '1':
             calculated_sha256sum = 'abcd123'
             calculated_size_bytes = 10000
+        elif from_store:
+            # Objects from the store were verified when fetched.
+            calculated_sha256sum = self.sha256sum
+            calculated_size_bytes = os.path.getsize(self.artifact_output_file)
         else:
             calculated_sha256sum = (
                 upload_to_google_storage_first_class.get_sha256sum(
@@ -2901,22 +3048,17 @@ class GcsDependency(Dependency):
                     self.output_dir, f'.{self.file_prefix}_content_names')
                 self.WriteToFile(json.dumps(tar.getnames()), tar_content_file)
 
-                def TarFilter(member, path):
-                    # Don't set mtime based on the archive metadata.
-                    member.mtime = None
-                    # Match the tarfile default filter.
-                    default_filter = (tarfile.fully_trusted_filter
-                                      if sys.version_info < (3, 14) else
-                                      tarfile.data_filter)
-                    return default_filter(member, path)
+                tar.extractall(path=self.output_dir, filter=self.TarFilter)
 
-                tar.extractall(path=self.output_dir, filter=TarFilter)
-
-        if os.getenv('GCLIENT_TEST') != '1':
+        # Objects from the store keep the executable bit they were added with.
+        if os.getenv('GCLIENT_TEST') != '1' and not from_store:
             code, err = download_from_google_storage.set_executable_bit(
                 self.artifact_output_file, self.url, gsutil)
             if code != 0:
                 raise Exception(f'{code}: {err}')
+            if store:
+                store.add('sha256', calculated_sha256sum,
+                          self.artifact_output_file)
 
         self.WriteToFile(calculated_sha256sum, self.hash_file)
         self.WriteToFile(str(1), self.migration_toggle_file)
@@ -4580,6 +4722,12 @@ class OptionParser(optparse.OptionParser):
                         default=False,
                         action='store_true',
                         help='Ignored for backwards compatibility.')
+        self.add_option('--no-deps-cache',
+                        default=False,
+                        action='store_true',
+                        help='Always parse DEPS files instead of reusing '
+                        'results cached in %s by previous runs.' %
+                        DEPS_CACHE_DIR)
 
     def parse_args(self, args=None, _values=None):
         """Integrates standard options processing."""
@@ -4,9 +4,16 @@
 
 import ast
 import collections
+import functools
+import hashlib
 from io import StringIO
+import json
 import logging
+import operator
+import os
 import sys
+import tempfile
+import time
 import tokenize
 
 import gclient_utils
@@ -119,6 +126,16 @@ _GCLIENT_DEPS_SCHEMA = _NodeDictSchema({
             str,
             schema.Optional('dep_type', default='git'):
             str,
+
+            # Optional partial clone filter, e.g. 'blob:none'. Used for clones
+            # that can't share the objects of a git cache mirror.
+            schema.Optional('clone_filter'):
+            str,
+
+            # Optional directories to check out, in sparse-checkout cone mode.
+            # They are set again on sync when they change. Removing the key
+            # leaves the checkout sparse.
+            schema.Optional('sparse_checkout'): [str],
         }),
         # CIPD package.
         _NodeDictSchema({
@@ -584,106 +601,332 @@ def Parse(content, filename, vars_override=None, builtin_vars=None):
     return result
 
 
-def EvaluateCondition(condition, variables, referenced_variables=None):
-    """Safely evaluates a boolean condition. Returns the result."""
-    if not referenced_variables:
-        referenced_variables = set()
-    _allowed_names = {'None': None, 'True': True, 'False': False}
-    main_node = ast.parse(condition, mode='eval')
-    if isinstance(main_node, ast.Expression):
-        main_node = main_node.body
+def _ToJsonValue(value):
+    """Converts a Parse() result to a JSON-serializable structure.
+
+    Every non-list value that JSON can't represent faithfully is wrapped in a
+    single-key dict tagging its type, so it can be restored by _FromJsonValue.
+    """
+    if isinstance(value, ConstantString):
+        return {'Str': value.value}
+    if isinstance(value, tuple):
+        return {'tuple': [_ToJsonValue(v) for v in value]}
+    if isinstance(value, list):
+        return [_ToJsonValue(v) for v in value]
+    if isinstance(value, collections.abc.Mapping):
+        return {
+            'dict': [[_ToJsonValue(k), _ToJsonValue(v)]
+                     for k, v in value.items()]
+        }
+    return value
+
+
+def _FromJsonValue(value):
+    """Reverses _ToJsonValue."""
+    if isinstance(value, list):
+        return [_FromJsonValue(v) for v in value]
+    if not isinstance(value, dict):
+        return value
+    (kind, data), = value.items()
+    if kind == 'Str':
+        return ConstantString(data)
+    if kind == 'tuple':
+        return tuple(_FromJsonValue(v) for v in data)
+    return {_FromJsonValue(k): _FromJsonValue(v) for k, v in data}
+
+
+class ParseCache(object):
+    """On-disk cache of Parse() results.
+
+    There is one entry per DEPS file path. Each entry records a key derived
+    from the DEPS content, the variables it was evaluated with and the code of
+    this module, so changing any of them invalidates the entry. Entries are
+    replaced atomically, so the cache can be shared by concurrent threads and
+    processes. The entries of DEPS files which no longer exist are pruned at
+    most once every PRUNE_SECONDS.
+    """
+    VERSION = 1
+    PRUNE_SECONDS = 24 * 60 * 60
+
+    _module_digest = None
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    @classmethod
+    def _ModuleDigest(cls):
+        """Returns a digest of this module, as parsing depends on it."""
+        if cls._module_digest is None:
+            with open(__file__, 'rb') as f:
+                cls._module_digest = hashlib.sha256(f.read()).hexdigest()
+        return cls._module_digest
+
+    def _EntryPath(self, filename):
+        name = hashlib.sha256(os.path.abspath(filename).encode()).hexdigest()
+        return os.path.join(self.cache_dir, name + '.json')
+
+    def _Key(self, content, vars_override, builtin_vars):
+        key = [
+            self.VERSION,
+            self._ModuleDigest(),
+            hashlib.sha256(content.encode('utf-8')).hexdigest(),
+            _ToJsonValue(sorted((vars_override or {}).items())),
+            _ToJsonValue(sorted((builtin_vars or {}).items())),
+        ]
+        return hashlib.sha256(
+            json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+    def Get(self, content, filename, vars_override=None, builtin_vars=None):
+        """Returns the cached result of Parse() for the same arguments, or None
+        if there is no valid entry."""
+        try:
+            with open(self._EntryPath(filename)) as f:
+                entry = json.load(f)
+            if entry['key'] != self._Key(content, vars_override, builtin_vars):
+                return None
+            return _FromJsonValue(entry['result'])
+        except FileNotFoundError:
+            return None
+        except (IOError, ValueError, KeyError, TypeError) as e:
+            logging.warning('Ignoring invalid DEPS cache entry for %s: %s',
+                            filename, e)
+            return None
+
+    def Prune(self):
+        """Removes the entries of DEPS files which no longer exist, and the
+        leftovers of interrupted writes, unless the cache was pruned in the
+        last PRUNE_SECONDS."""
+        marker = os.path.join(self.cache_dir, '.pruned')
+        now = time.time()
+        try:
+            if now - os.stat(marker).st_mtime < self.PRUNE_SECONDS:
+                return
+        except OSError:
+            pass
+        try:
+            with open(marker, 'w'):
+                pass
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            try:
+                if name.endswith('.tmp'):
+                    # Entries being written are recent.
+                    if now - os.stat(path).st_mtime < self.PRUNE_SECONDS:
+                        continue
+                elif name.endswith('.json'):
+                    with open(path) as f:
+                        if os.path.exists(json.load(f)['filename']):
+                            continue
+                else:
+                    continue
+            except FileNotFoundError:
+                continue
+            except (IOError, ValueError, KeyError, TypeError):
+                pass
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def Set(self, content, filename, vars_override, builtin_vars, result):
+        """Stores the result of Parse() called with the given arguments."""
+        entry = {
+            'filename': os.path.abspath(filename),
+            'key': self._Key(content, vars_override, builtin_vars),
+            'result': _ToJsonValue(result),
+        }
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.Prune()
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(entry, f)
+                os.replace(tmp_path, self._EntryPath(filename))
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        except (IOError, OSError) as e:
+            logging.warning('Failed to write DEPS cache entry for %s: %s',
+                            filename, e)
+
+
+_CONDITION_ALLOWED_NAMES = {'None': None, 'True': True, 'False': False}
+
+
+class _CompiledCondition(object):
+    """A condition string compiled into a tree of closures.
+
+    Evaluating it gives the same results, and raises the same errors in the
+    same order, as walking the AST of the condition would.
+    """
+    def __init__(self, condition):
+        self.condition = condition
+        # Names referenced by the condition, other than None/True/False.
+        self.referenced_names = set()
+        main_node = ast.parse(condition, mode='eval')
+        if isinstance(main_node, ast.Expression):
+            main_node = main_node.body
+        self._evaluate = self._Compile(main_node)
+
+    def __call__(self, variables, referenced_variables=None):
+        return self._evaluate(variables, referenced_variables or frozenset())
+
+    def _Compile(self, node, allow_tuple=False):
+        condition = self.condition
 
-    def _convert(node, allow_tuple=False):
         if isinstance(node, ast.Str):
-            return node.s
+            value = node.s
+            return lambda variables, referenced_variables: value
 
         if isinstance(node, ast.Tuple) and allow_tuple:
-            return tuple(map(_convert, node.elts))
+            elts = [self._Compile(elt) for elt in node.elts]
+            return lambda variables, referenced_variables: tuple(
+                elt(variables, referenced_variables) for elt in elts)
 
         if isinstance(node, ast.Name):
-            if node.id in referenced_variables:
-                raise ValueError('invalid cyclic reference to %r (inside %r)' %
-                                 (node.id, condition))
+            name = node.id
+            if name not in _CONDITION_ALLOWED_NAMES:
+                self.referenced_names.add(name)
 
-            if node.id in _allowed_names:
-                return _allowed_names[node.id]
+            def _name(variables, referenced_variables):
+                if name in referenced_variables:
+                    raise ValueError(
+                        'invalid cyclic reference to %r (inside %r)' %
+                        (name, condition))
 
-            if node.id in variables:
-                value = variables[node.id]
+                if name in _CONDITION_ALLOWED_NAMES:
+                    return _CONDITION_ALLOWED_NAMES[name]
 
-                # Allow using "native" types, without wrapping everything in
-                # strings. Note that schema constraints still apply to
-                # variables.
-                if not isinstance(value, str):
-                    return value
+                if name in variables:
+                    value = variables[name]
 
-                # Recursively evaluate the variable reference.
-                return EvaluateCondition(variables[node.id], variables,
-                                         referenced_variables.union([node.id]))
+                    # Allow using "native" types, without wrapping everything
+                    # in strings. Note that schema constraints still apply to
+                    # variables.
+                    if not isinstance(value, str):
+                        return value
 
-            # Implicitly convert unrecognized names to strings.
-            # If we want to change this, we'll need to explicitly distinguish
-            # between arguments for GN to be passed verbatim, and ones to
-            # be evaluated.
-            return node.id
+                    # Recursively evaluate the variable reference.
+                    return CompileCondition(value)(
+                        variables, referenced_variables.union([name]))
+
+                # Implicitly convert unrecognized names to strings.
+                # If we want to change this, we'll need to explicitly
+                # distinguish between arguments for GN to be passed verbatim,
+                # and ones to be evaluated.
+                return name
+
+            return _name
 
         if not sys.version_info[:2] < (3, 4) and isinstance(
                 node, ast.NameConstant):  # Since Python 3.4
-            return node.value
-
-        if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.Or):
-            bool_values = []
-            for value in node.values:
-                bool_values.append(_convert(value))
-                if not isinstance(bool_values[-1], bool):
-                    raise ValueError('invalid "or" operand %r (inside %r)' %
-                                     (bool_values[-1], condition))
-            return any(bool_values)
-
-        if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.And):
-            bool_values = []
-            for value in node.values:
-                bool_values.append(_convert(value))
-                if not isinstance(bool_values[-1], bool):
-                    raise ValueError('invalid "and" operand %r (inside %r)' %
-                                     (bool_values[-1], condition))
-            return all(bool_values)
+            value = node.value
+            return lambda variables, referenced_variables: value
+
+        if isinstance(node, ast.BoolOp) and isinstance(node.op,
+                                                       (ast.Or, ast.And)):
+            operands = [self._Compile(value) for value in node.values]
+            if isinstance(node.op, ast.Or):
+                op_name, reduce_fn = 'or', any
+            else:
+                op_name, reduce_fn = 'and', all
+
+            def _bool_op(variables, referenced_variables):
+                bool_values = []
+                for operand in operands:
+                    bool_values.append(operand(variables, referenced_variables))
+                    if not isinstance(bool_values[-1], bool):
+                        raise ValueError('invalid "%s" operand %r (inside %r)' %
+                                         (op_name, bool_values[-1], condition))
+                return reduce_fn(bool_values)
+
+            return _bool_op
 
         if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
-            value = _convert(node.operand)
-            if not isinstance(value, bool):
-                raise ValueError('invalid "not" operand %r (inside %r)' %
-                                 (value, condition))
-            return not value
+            operand = self._Compile(node.operand)
+
+            def _not(variables, referenced_variables):
+                value = operand(variables, referenced_variables)
+                if not isinstance(value, bool):
+                    raise ValueError('invalid "not" operand %r (inside %r)' %
+                                     (value, condition))
+                return not value
+
+            return _not
 
         if isinstance(node, ast.Compare):
             if len(node.ops) != 1:
-                raise ValueError(
+                return self._Raise(
                     'invalid compare: exactly 1 operator required (inside %r)' %
                     (condition))
             if len(node.comparators) != 1:
-                raise ValueError(
+                return self._Raise(
                     'invalid compare: exactly 1 comparator required (inside %r)'
                     % (condition))
 
-            left = _convert(node.left)
-            right = _convert(node.comparators[0],
-                             allow_tuple=isinstance(node.ops[0], ast.In))
+            op = node.ops[0]
+            left = self._Compile(node.left)
+            right = self._Compile(node.comparators[0],
+                                  allow_tuple=isinstance(op, ast.In))
+            if isinstance(op, ast.Eq):
+                compare = operator.eq
+            elif isinstance(op, ast.NotEq):
+                compare = operator.ne
+            elif isinstance(op, ast.In):
+                compare = lambda a, b: a in b
+            else:
+
+                def compare(_a, _b):
+                    raise ValueError('unexpected operator: %s %s (inside %r)' %
+                                     (op, ast.dump(node), condition))
+
+            return lambda variables, referenced_variables: compare(
+                left(variables, referenced_variables),
+                right(variables, referenced_variables))
+
+        return self._Raise('unexpected AST node: %s %s (inside %r)' %
+                           (node, ast.dump(node), condition))
+
+    @staticmethod
+    def _Raise(message):
+        """Returns a closure raising ValueError(message) when evaluated."""
+        def _raise(_variables, _referenced_variables):
+            raise ValueError(message)
+
+        return _raise
+
+
+@functools.lru_cache(maxsize=None)
+def CompileCondition(condition):
+    """Compiles a condition string, caching the result.
+
+    Returns a callable taking a variables dict, which evaluates the condition
+    like EvaluateCondition does. Its referenced_names attribute holds the names
+    of the variables the condition refers to.
+    """
+    return _CompiledCondition(condition)
 
-            if isinstance(node.ops[0], ast.Eq):
-                return left == right
-            if isinstance(node.ops[0], ast.NotEq):
-                return left != right
-            if isinstance(node.ops[0], ast.In):
-                return left in right
 
-            raise ValueError('unexpected operator: %s %s (inside %r)' %
-                             (node.ops[0], ast.dump(node), condition))
+def EvaluateCondition(condition, variables, referenced_variables=None):
+    """Safely evaluates a boolean condition. Returns the result."""
+    return CompileCondition(condition)(variables, referenced_variables)
 
-        raise ValueError('unexpected AST node: %s %s (inside %r)' %
-                         (node, ast.dump(node), condition))
 
-    return _convert(main_node)
+def EvaluateConditions(conditions, variables):
+    """Evaluates many conditions against the same variables.
+
+    Each distinct condition is evaluated once, in the order they first appear
+    in conditions. Returns a dict mapping each condition to its result.
+    """
+    results = {}
+    for condition in conditions:
+        if condition not in results:
+            results[condition] = CompileCondition(condition)(variables)
+    return results
 
 
 def RenderDEPSFile(gclient_dict):
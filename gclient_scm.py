@@ -182,6 +182,8 @@ class SCMWrapper(object):
     Args:
         force: bool; if True, delete the directory. Otherwise, just move it.
     """
+        # Processes running in the checkout would prevent this on Windows.
+        scm.GIT.CloseCatFileBatches(self.checkout_path)
         if force and os.environ.get('CHROME_HEADLESS') == '1':
             self.Print('_____ Conflicting directory found in %s. Removing.' %
                        self.checkout_path)
@@ -220,12 +222,26 @@ class GitWrapper(SCMWrapper):
         except RuntimeError:
             return None
 
-    def __init__(self, url=None, *args, **kwargs):
-        """Removes 'git+' fake prefix from git URL."""
+    def __init__(self,
+                 url=None,
+                 *args,
+                 clone_filter=None,
+                 sparse_checkout=None,
+                 **kwargs):
+        """Removes 'git+' fake prefix from git URL.
+
+        Args:
+            clone_filter: A partial clone filter, e.g. 'blob:none', for clones
+                that don't share the objects of a git cache mirror.
+            sparse_checkout: Directories to check out in sparse-checkout cone
+                mode when cloning, or None to check out everything.
+        """
         if url and (url.startswith('git+http://')
                     or url.startswith('git+https://')):
             url = url[4:]
         SCMWrapper.__init__(self, url, *args, **kwargs)
+        self.clone_filter = clone_filter
+        self.sparse_checkout = sparse_checkout
         filter_kwargs = {'time_throttle': 1, 'out_fh': self.out_fh}
         if self.out_cb:
             filter_kwargs['predicate'] = self.out_cb
@@ -865,6 +881,8 @@ class GitWrapper(SCMWrapper):
                        self.relpath)
             return self._Capture(['rev-parse', '--verify', 'HEAD'])
 
+        self._UpdateSparseCheckout(options)
+
         # Special case for rev_type = hash. If we use submodules, we can check
         # information already.
         if rev_type == 'hash':
@@ -1397,12 +1415,17 @@ class GitWrapper(SCMWrapper):
             self._Run(['remote', 'add', 'origin', url], options)
             revision = self._AutoFetchRef(options, revision, depth=1)
             remote_ref = scm.GIT.RefToRemoteRef(revision, self.remote)
+            self._SetSparseCheckout(options)
             self._Checkout(options, ''.join(remote_ref or revision), quiet=True)
         else:
             cfg = gclient_utils.DefaultIndexPackConfig(url)
             clone_cmd = cfg + ['clone', '--no-checkout', '--progress']
             if self.cache_dir:
                 clone_cmd.append('--shared')
+            elif self.clone_filter:
+                # Objects shared with the mirror cost nothing to clone, so the
+                # filter only helps when cloning from the remote.
+                clone_cmd.append('--filter=%s' % self.clone_filter)
             if options.verbose:
                 clone_cmd.append('--verbose')
             clone_cmd.append(url)
@@ -1436,6 +1459,7 @@ class GitWrapper(SCMWrapper):
             self._Fetch(options, prune=options.force)
             revision = self._AutoFetchRef(options, revision)
             remote_ref = scm.GIT.RefToRemoteRef(revision, self.remote)
+            self._SetSparseCheckout(options)
             self._Checkout(options, ''.join(remote_ref or revision), quiet=True)
 
         if self._GetCurrentBranch() is None:
@@ -1447,6 +1471,25 @@ class GitWrapper(SCMWrapper):
                 'create a new branch for your work.') % (revision, self.remote))
         return revision
 
+    def _SetSparseCheckout(self, options):
+        """Limits the checkout to |sparse_checkout|, before it's populated."""
+        if not self.sparse_checkout:
+            return
+        self._Run(['sparse-checkout', 'set', '--cone', '--'] +
+                  list(self.sparse_checkout), options)
+
+    def _UpdateSparseCheckout(self, options):
+        """Reapplies |sparse_checkout| if the checkout's directories differ."""
+        if not self.sparse_checkout:
+            return
+        try:
+            current = self._Capture(['sparse-checkout', 'list']).splitlines()
+        except subprocess2.CalledProcessError:
+            # The checkout isn't sparse.
+            current = []
+        if set(current) != {d.strip('/') for d in self.sparse_checkout}:
+            self._SetSparseCheckout(options)
+
     def _AskForData(self, prompt, options):
         if options.jobs > 1:
             self.Print(prompt)
@@ -9,6 +9,7 @@ import contextlib
 import datetime
 import errno
 import functools
+import heapq
 import io
 import logging
 import operator
@@ -880,6 +881,11 @@ class ExecutionQueue(object):
     This class manages that all the required dependencies are run
     before running each one.
 
+    Scheduling is event driven: each queued item keeps a count of its unmet
+    requirements, and items whose count drops to zero are pushed on a ready
+    heap ordered by enqueue order. Running items are indexed by the resources
+    they hold so conflicts are checked without scanning every running job.
+
     Methods of this class are thread safe.
     """
     def __init__(self, jobs, progress, ignore_requirements, verbose=False):
@@ -889,12 +895,28 @@ class ExecutionQueue(object):
         self.ready_cond = threading.Condition()
         # Maximum number of concurrent tasks.
         self.jobs = jobs
-        # List of WorkItem, for gclient, these are Dependency instances.
-        self.queued = []
+        # WorkItem not started yet, keyed by their enqueue sequence number. For
+        # gclient, these are Dependency instances.
+        self.queued = {}
         # List of strings representing each Dependency.name that was run.
         self.ran = []
+        # Same as self.ran, for constant time lookups.
+        self._ran_set = set()
         # List of items currently running.
         self.running = []
+        # Threads that completed but were not joined yet.
+        self._finished = collections.deque()
+        # Heap of (sequence number, WorkItem) with all requirements satisfied.
+        self._ready = []
+        # Number of unmet requirements of each blocked item, by sequence number.
+        self._unmet = {}
+        # Requirement name to the sequence numbers of items waiting on it.
+        self._waiting_on = collections.defaultdict(list)
+        # Resource to the set of running threads holding it.
+        self._resource_users = collections.defaultdict(set)
+        # Resource to the ready (sequence number, WorkItem) blocked on it.
+        self._resource_waiters = collections.defaultdict(list)
+        self._next_seq = 0
         # Exceptions thrown if any.
         self.exceptions = queue.Queue()
         # Progress status
@@ -914,7 +936,11 @@ class ExecutionQueue(object):
         assert isinstance(d, WorkItem)
         self.ready_cond.acquire()
         try:
-            self.queued.append(d)
+            seq = self._next_seq
+            self._next_seq += 1
+            self.queued[seq] = d
+            if self._wait_for_requirements(seq, d):
+                heapq.heappush(self._ready, (seq, d))
             total = len(self.queued) + len(self.ran) + len(self.running)
             if self.jobs == 1:
                 total += 1
@@ -946,14 +972,80 @@ class ExecutionQueue(object):
 ----------------------------------------""" % (task.name, comment, elapsed,
                                                task.outbuf.getvalue().strip())
 
-    def _is_conflict(self, job):
-        """Checks to see if a job will conflict with another running job."""
-        for running_job in self.running:
-            for used_resource in running_job.item.resources:
-                logging.debug('Checking resource %s' % used_resource)
-                if used_resource in job.resources:
-                    return True
-        return False
+    def _wait_for_requirements(self, seq, item):
+        """Registers item against its requirements that did not run yet.
+
+        Returns True if the item has no unmet requirements.
+        """
+        if self.ignore_requirements:
+            return True
+        unmet = set(item.requirements) - self._ran_set
+        for name in unmet:
+            self._waiting_on[name].append(seq)
+        if unmet:
+            self._unmet[seq] = len(unmet)
+        return not unmet
+
+    def _find_conflict(self, job):
+        """Returns a resource of job currently held by a running job, if any."""
+        for used_resource in job.resources:
+            if self._resource_users.get(used_resource):
+                logging.debug('Resource %s is busy' % used_resource)
+                return used_resource
+        return None
+
+    def _pop_ready(self):
+        """Removes and returns the next queued item that can start now, or None
+        if there is none."""
+        while self._ready:
+            seq, item = heapq.heappop(self._ready)
+            if seq not in self.queued:
+                continue
+            # Requirements may have grown since the item was enqueued, since
+            # they can depend on items enqueued later. Validate them again.
+            if not self._wait_for_requirements(seq, item):
+                continue
+            resource = self._find_conflict(item)
+            if resource is not None:
+                self._resource_waiters[resource].append((seq, item))
+                continue
+            del self.queued[seq]
+            return item
+        return None
+
+    def _mark_ran(self, name):
+        """Records that name ran and readies the items that were waiting on
+        it."""
+        self.ran.append(name)
+        self._ran_set.add(name)
+        for seq in self._waiting_on.pop(name, ()):
+            if seq not in self._unmet:
+                continue
+            self._unmet[seq] -= 1
+            if not self._unmet[seq]:
+                del self._unmet[seq]
+                heapq.heappush(self._ready, (seq, self.queued[seq]))
+
+    def _release_resources(self, thread):
+        """Frees the resources held by thread and readies the items that were
+        blocked on them."""
+        for used_resource in thread.item.resources:
+            users = self._resource_users.get(used_resource)
+            if users is None:
+                continue
+            users.discard(thread)
+            if not users:
+                del self._resource_users[used_resource]
+                for entry in self._resource_waiters.pop(used_resource, ()):
+                    heapq.heappush(self._ready, entry)
+
+    def _drop_queued(self):
+        """Forgets about all the items that were not started yet."""
+        self.queued = {}
+        self._ready = []
+        self._unmet.clear()
+        self._waiting_on.clear()
+        self._resource_waiters.clear()
 
     def flush(self, *args, **kwargs):
         """Runs all enqueued items until all are executed."""
@@ -967,7 +1059,7 @@ class ExecutionQueue(object):
                     if not self.exceptions.empty():
                         # Systematically flush the queue when an exception
                         # logged.
-                        self.queued = []
+                        self._drop_queued()
                     self._flush_terminated_threads()
                     if (not self.queued and not self.running
                             or self.jobs == len(self.running)):
@@ -975,22 +1067,13 @@ class ExecutionQueue(object):
                             'No more worker threads or can\'t queue anything.')
                         break
 
-                    # Check for new tasks to start.
-                    for i in range(len(self.queued)):
-                        # Verify its requirements.
-                        if (self.ignore_requirements
-                                or not (set(self.queued[i].requirements) -
-                                        set(self.ran))):
-                            if not self._is_conflict(self.queued[i]):
-                                # Start one work item: all its requirements are
-                                # satisfied.
-                                self._run_one_task(self.queued.pop(i), args,
-                                                   kwargs)
-                                break
-                    else:
+                    # Start one work item: all its requirements are satisfied.
+                    task_item = self._pop_ready()
+                    if task_item is None:
                         # Couldn't find an item that could run. Break out the
                         # outher loop.
                         break
+                    self._run_one_task(task_item, args, kwargs)
 
                 if not self.queued and not self.running:
                     # We're done.
@@ -1021,7 +1104,7 @@ class ExecutionQueue(object):
                         (self.jobs, len(self.queued), ', '.join(
                             self.ran), len(self.running)),
                         file=sys.stderr)
-                    for i in self.queued:
+                    for i in self.queued.values():
                         print('%s (not started): %s' %
                               (i.name, ', '.join(i.requirements)),
                               file=sys.stderr)
@@ -1048,24 +1131,21 @@ class ExecutionQueue(object):
 
     def _flush_terminated_threads(self):
         """Flush threads that have terminated."""
-        running = self.running
-        self.running = []
-        for t in running:
-            if t.is_alive():
-                self.running.append(t)
-            else:
-                t.join()
-                self.last_join = datetime.datetime.now()
-                sys.stdout.flush()
-                if self.verbose:
-                    print(self.format_task_output(t.item))
-                if self.progress:
-                    self.progress.update(1, t.item.name)
-                if t.item.name in self.ran:
-                    raise Error('gclient is confused, "%s" is already in "%s"' %
-                                (t.item.name, ', '.join(self.ran)))
-                if not t.item.name in self.ran:
-                    self.ran.append(t.item.name)
+        while self._finished:
+            t = self._finished.popleft()
+            t.join()
+            self.running.remove(t)
+            self._release_resources(t)
+            self.last_join = datetime.datetime.now()
+            sys.stdout.flush()
+            if self.verbose:
+                print(self.format_task_output(t.item))
+            if self.progress:
+                self.progress.update(1, t.item.name)
+            if t.item.name in self._ran_set:
+                raise Error('gclient is confused, "%s" is already in "%s"' %
+                            (t.item.name, ', '.join(self.ran)))
+            self._mark_ran(t.item.name)
 
     def _run_one_task(self, task_item, args, kwargs):
         if self.jobs > 1:
@@ -1073,6 +1153,8 @@ class ExecutionQueue(object):
             index = len(self.ran) + len(self.running) + 1
             new_thread = self._Worker(task_item, index, args, kwargs)
             self.running.append(new_thread)
+            for used_resource in task_item.resources:
+                self._resource_users[used_resource].add(new_thread)
             new_thread.start()
         else:
             # Run the 'thread' inside the main thread. Don't try to catch any
@@ -1085,7 +1167,7 @@ class ExecutionQueue(object):
                 task_item.finish = datetime.datetime.now()
                 print('[%s] Finished.' % Elapsed(task_item.finish),
                       file=task_item.outbuf)
-                self.ran.append(task_item.name)
+                self._mark_ran(task_item.name)
                 if self.verbose:
                     if self.progress:
                         print('')
@@ -1140,6 +1222,7 @@ class ExecutionQueue(object):
                 logging.info('_Worker.run(%s) done', self.item.name)
                 work_queue.ready_cond.acquire()
                 try:
+                    work_queue._finished.append(self)
                     work_queue.ready_cond.notifyAll()
                 finally:
                     work_queue.ready_cond.release()
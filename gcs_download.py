@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+# Copyright 2026 The Chromium Authors
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+"""Streams objects from Google Storage without going through gsutil.
+
+Objects are fetched over the XML API, in parallel ranged chunks when they are
+large. Every byte passes once through the digests, the size accounting, the
+output file and, optionally, tar extraction, instead of being written to disk
+and read back for each of them.
+"""
+
+import collections
+import concurrent.futures
+import hashlib
+import http.client
+import os
+import queue
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import auth
+
+GCS_API_URL = 'https://storage.googleapis.com'
+# Overrides GCS_API_URL, e.g. to point at a fake object server.
+GCS_API_URL_ENV_VAR = 'DEPOT_TOOLS_GCS_API_URL'
+# Set to 1 to download objects with StreamingDownloader instead of gsutil.
+NATIVE_DOWNLOAD_ENV_VAR = 'DEPOT_TOOLS_GCS_NATIVE_DOWNLOAD'
+OAUTH_SCOPE_READ_ONLY = 'https://www.googleapis.com/auth/devstorage.read_only'
+
+
+class DownloadError(Exception):
+    """Raised when an object can't be downloaded."""
+    def __init__(self, status, message):
+        super(DownloadError, self).__init__(message)
+        self.status = status
+
+
+class VerificationError(DownloadError):
+    """Raised when a downloaded object doesn't match its expected contents."""
+    def __init__(self, message):
+        super(VerificationError, self).__init__(None, message)
+
+
+@dataclass
+class DownloadResult:
+    size: int
+    digests: Dict[str, str]
+    # Whether the object has the x-goog-meta-executable metadata set.
+    executable: bool
+    # The members of the archive if it was extracted, else None.
+    members: Optional[List[tarfile.TarInfo]] = None
+
+
+def _is_safe_member(tarinfo):
+    """Returns False for members that would be extracted outside the target."""
+    names = [tarinfo.name]
+    if tarinfo.issym() or tarinfo.islnk():
+        if os.path.isabs(tarinfo.linkname):
+            return False
+        names.append(
+            os.path.join(os.path.dirname(tarinfo.name), tarinfo.linkname))
+    for name in names:
+        name = os.path.normpath(name.replace('\\', '/'))
+        if os.path.isabs(name) or name == '..' or name.startswith('../'):
+            return False
+    return True
+
+
+def _merge_tree(src, dst):
+    """Moves the contents of |src| into |dst|, replacing existing entries."""
+    for entry in os.scandir(src):
+        target = os.path.join(dst, entry.name)
+        if (entry.is_dir(follow_symlinks=False) and os.path.isdir(target)
+                and not os.path.islink(target)):
+            _merge_tree(entry.path, target)
+            continue
+        if os.path.islink(target) or os.path.isfile(target):
+            os.remove(target)
+        elif os.path.isdir(target):
+            shutil.rmtree(target)
+        os.replace(entry.path, target)
+
+
+class _ChunkPipe(object):
+    """A bounded in-memory pipe of byte chunks between two threads."""
+    def __init__(self, max_chunks=4):
+        self._queue = queue.Queue(max_chunks)
+        self._chunk = b''
+        self._offset = 0
+        self._eof = False
+
+    def write(self, chunk):
+        self._queue.put(chunk)
+
+    def close(self):
+        self._queue.put(None)
+
+    def read(self, size=-1):
+        pieces = []
+        while size != 0 and not self._eof:
+            if self._offset == len(self._chunk):
+                chunk = self._queue.get()
+                if chunk is None:
+                    self._eof = True
+                else:
+                    self._chunk, self._offset = chunk, 0
+                continue
+            end = len(self._chunk)
+            if size > 0:
+                end = min(end, self._offset + size)
+                size -= end - self._offset
+            pieces.append(self._chunk[self._offset:end])
+            self._offset = end
+        return b''.join(pieces)
+
+
+class _StreamingExtractor(object):
+    """Extracts a tar stream on a background thread as it is written.
+
+    Members are extracted into a staging directory, which is only merged into
+    |extract_dir| by commit(), so nothing from an archive that fails
+    verification ends up in place.
+    """
+    def __init__(self, extract_dir, validate_member, tar_filter):
+        os.makedirs(extract_dir, exist_ok=True)
+        self._extract_dir = extract_dir
+        self._staging_dir = tempfile.mkdtemp(dir=extract_dir, prefix='.gcs')
+        self._validate_member = validate_member
+        self._tar_filter = tar_filter
+        self._pipe = _ChunkPipe()
+        self._closed = False
+        self.members = None
+        self._error = None
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        try:
+            try:
+                tar = tarfile.open(fileobj=self._pipe, mode='r|*')
+            except tarfile.ReadError:
+                # Not an archive.
+                return
+            members = []
+            directories = []
+            with tar:
+                for member in tar:
+                    members.append(member)
+                    if not (_is_safe_member(member)
+                            and self._validate_member(member)):
+                        raise VerificationError('%s is not allowed in the '
+                                                'archive.' % member.name)
+                    if self._tar_filter:
+                        member = self._tar_filter(member, self._staging_dir)
+                        if member is None:
+                            continue
+                    # Like extractall(), set directory attributes last, in
+                    # case they aren't writable.
+                    if member.isdir():
+                        directories.append(member)
+                    tar.extract(member,
+                                self._staging_dir,
+                                set_attrs=not member.isdir(),
+                                filter=tarfile.fully_trusted_filter)
+                for member in reversed(directories):
+                    path = os.path.join(self._staging_dir, member.name)
+                    tar.utime(member, path)
+                    tar.chmod(member, path)
+            self.members = members
+        except BaseException as e:
+            self._error = e
+        finally:
+            # Consume the rest of the stream so the writer never blocks.
+            while self._pipe.read(1024 * 1024):
+                pass
+
+    def write(self, chunk):
+        if self._error:
+            raise self._error
+        self._pipe.write(chunk)
+
+    def finish(self):
+        """Waits for the extraction to finish and returns its members."""
+        if not self._closed:
+            self._closed = True
+            self._pipe.close()
+        self._thread.join()
+        if self._error:
+            raise self._error
+        return self.members
+
+    def commit(self):
+        _merge_tree(self._staging_dir, self._extract_dir)
+        self.abort()
+
+    def abort(self):
+        try:
+            self.finish()
+        except BaseException:
+            pass
+        shutil.rmtree(self._staging_dir, ignore_errors=True)
+
+
+class StreamingDownloader(object):
+    """Downloads Google Storage objects over HTTP(S), without gsutil.
+
+    Objects larger than one chunk are fetched with up to
+    `max_parallel_chunks` concurrent ranged requests, pinned to the
+    generation of the first response. Each thread keeps its own keep-alive
+    connection. Requests are anonymous unless an authenticator is given.
+    """
+
+    CHUNK_SIZE = 16 * 1024 * 1024
+    MAX_PARALLEL_CHUNKS = 4
+    MAX_TRIES = 5
+    RETRY_BASE_DELAY = 1.0
+    TIMEOUT = 300
+
+    def __init__(self,
+                 api_url=None,
+                 authenticator: Optional[auth.Authenticator] = None,
+                 chunk_size=CHUNK_SIZE,
+                 max_parallel_chunks=MAX_PARALLEL_CHUNKS):
+        self._api_url = urllib.parse.urlparse(
+            api_url or os.environ.get(GCS_API_URL_ENV_VAR) or GCS_API_URL)
+        self._authenticator = authenticator
+        self._chunk_size = chunk_size
+        self._max_parallel_chunks = max_parallel_chunks
+        self._local = threading.local()
+
+    def _get_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if self._api_url.scheme == 'https':
+                conn = http.client.HTTPSConnection(self._api_url.netloc,
+                                                   timeout=self.TIMEOUT)
+            else:
+                conn = http.client.HTTPConnection(self._api_url.netloc,
+                                                  timeout=self.TIMEOUT)
+            self._local.conn = conn
+        return conn
+
+    def _fetch(self, path, start, end=None):
+        """Returns the response and body of a ranged GET of |path|.
+
+        Transient errors are retried with an exponential backoff.
+        """
+        headers = {
+            'Range': 'bytes=%d-%s' % (start, '' if end is None else end - 1)
+        }
+        if self._authenticator:
+            headers['Authorization'] = (
+                'Bearer %s' % self._authenticator.get_access_token().token)
+        delay = self.RETRY_BASE_DELAY
+        for attempt in range(self.MAX_TRIES):
+            conn = self._get_connection()
+            try:
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                self._local.conn = None
+                error = DownloadError(None,
+                                      'Failed to fetch %s: %s' % (path, e))
+            else:
+                if response.status in (200, 206):
+                    return response, body
+                error = DownloadError(
+                    response.status, 'Failed to fetch %s: %d %s' %
+                    (path, response.status, response.reason))
+                if response.status < 500 and response.status != 429:
+                    raise error
+            if attempt < self.MAX_TRIES - 1:
+                time.sleep(delay)
+                delay *= 2
+        raise error
+
+    def _fetch_range(self, path, start, end):
+        response, body = self._fetch(path, start, end)
+        if response.status != 206 or len(body) != end - start:
+            raise DownloadError(
+                response.status, 'Unexpected response for bytes %d-%d of %s' %
+                (start, end - 1, path))
+        return body
+
+    def _iter_chunks(self, path, first_chunk, total_size):
+        yield first_chunk
+        starts = range(len(first_chunk), total_size, self._chunk_size)
+        if not starts:
+            return
+        with concurrent.futures.ThreadPoolExecutor(
+                self._max_parallel_chunks) as executor:
+            pending = collections.deque()
+            try:
+                for start in starts:
+                    end = min(start + self._chunk_size, total_size)
+                    pending.append(
+                        executor.submit(self._fetch_range, path, start, end))
+                    if len(pending) >= self._max_parallel_chunks:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def download(self,
+                 gs_url: str,
+                 output_filename: str,
+                 algorithms=('sha256', ),
+                 expected_digests: Optional[Dict[str, str]] = None,
+                 expected_size: Optional[int] = None,
+                 extract_dir: Optional[str] = None,
+                 validate_member: Optional[Callable[[tarfile.TarInfo],
+                                                    bool]] = None,
+                 validate_members: Optional[Callable[[List[tarfile.TarInfo]],
+                                                     bool]] = None,
+                 tar_filter=None,
+                 require_archive=False) -> DownloadResult:
+        """Downloads |gs_url| to |output_filename|.
+
+        Args:
+            gs_url: The gs://bucket/object URL to download.
+            output_filename: Where to write the object. It is only replaced
+                once the object has been verified.
+            algorithms: The hashlib algorithms to compute digests with.
+            expected_digests: Maps algorithms to the expected hex digests.
+            expected_size: The expected size of the object in bytes.
+            extract_dir: If set and the object is a tar archive, extract it
+                here while it is downloaded.
+            validate_member: Called on each archive member before it is
+                extracted. Returning False fails the download.
+            validate_members: Called with all archive members before the
+                extracted files are moved into place. Returning False fails
+                the download.
+            tar_filter: An extraction filter, as for TarFile.extract().
+            require_archive: Fail if the object isn't a tar archive.
+        Raises:
+            DownloadError on failure, including VerificationError when the
+            object doesn't match expectations. Nothing is left in place.
+        """
+        if not gs_url.startswith('gs://'):
+            raise DownloadError(None, '%s is not a gs:// URL' % gs_url)
+        bucket, _, object_name = gs_url[len('gs://'):].partition('/')
+        path = '%s/%s/%s' % (self._api_url.path.rstrip('/'), bucket,
+                             urllib.parse.quote(object_name))
+
+        response, first_chunk = self._fetch(path, 0, self._chunk_size)
+        total_size = len(first_chunk)
+        if response.status == 206:
+            total_size = int(
+                response.getheader('Content-Range', '').rpartition('/')[2])
+        executable = response.getheader('x-goog-meta-executable') == '1'
+        generation = response.getheader('x-goog-generation')
+        if generation:
+            path += '?generation=%s' % generation
+
+        hashes = {algorithm: hashlib.new(algorithm) for algorithm in algorithms}
+        size = 0
+        extractor = None
+        if extract_dir:
+            extractor = _StreamingExtractor(extract_dir, validate_member
+                                            or (lambda _: True), tar_filter)
+        temp_filename = '%s.%d.%d.tmp' % (output_filename, os.getpid(),
+                                          threading.get_ident())
+        try:
+            with open(temp_filename, 'wb') as f:
+                for chunk in self._iter_chunks(path, first_chunk, total_size):
+                    size += len(chunk)
+                    for h in hashes.values():
+                        h.update(chunk)
+                    f.write(chunk)
+                    if extractor:
+                        extractor.write(chunk)
+            members = extractor.finish() if extractor else None
+
+            digests = {
+                algorithm: h.hexdigest()
+                for algorithm, h in hashes.items()
+            }
+            if size != total_size:
+                raise VerificationError(
+                    'Downloaded %d bytes of %s, expected %d' %
+                    (size, gs_url, total_size))
+            if expected_size is not None and size != expected_size:
+                raise VerificationError('%s is %d bytes, expected %d' %
+                                        (gs_url, size, expected_size))
+            for algorithm, expected in (expected_digests or {}).items():
+                if digests[algorithm] != expected:
+                    raise VerificationError(
+                        '%s %s (%s) does not match expected %s (%s).' %
+                        (gs_url, algorithm, digests[algorithm], algorithm,
+                         expected))
+            if extractor and members is None and require_archive:
+                raise VerificationError('%s is not a tar archive.' % gs_url)
+            if members is not None and validate_members and (
+                    not validate_members(members)):
+                raise VerificationError('%s contains invalid entries.' %
+                                        gs_url)
+
+            if extractor:
+                extractor.commit()
+            os.replace(temp_filename, output_filename)
+        except BaseException:
+            if extractor:
+                extractor.abort()
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+            raise
+        return DownloadResult(size=size,
+                              digests=digests,
+                              executable=executable,
+                              members=members)
+
+
+def get_downloader():
+    """Returns a StreamingDownloader if native downloads are enabled.
+
+    Requests are authenticated with luci-auth credentials when there are any,
+    and are anonymous otherwise, which works for public buckets.
+    """
+    if os.environ.get(NATIVE_DOWNLOAD_ENV_VAR) != '1':
+        return None
+    authenticator = auth.Authenticator(scopes=OAUTH_SCOPE_READ_ONLY)
+    if not authenticator.has_cached_credentials():
+        authenticator = None
+    return StreamingDownloader(authenticator=authenticator)
@@ -1040,8 +1040,88 @@ class ReqParams(TypedDict):
     body: Optional[str]
 
 
+class HttpConnectionPool(object):
+    """A thread-safe pool of keep-alive httplib2.Http clients.
+
+    Each httplib2.Http keeps its connections open between requests, but is not
+    safe to share between threads. The pool hands out one client per request
+    and takes it back afterwards, so sequential and concurrent requests to the
+    same host reuse established connections instead of paying for a new TLS
+    handshake every time. At most `max_per_host` clients exist per host (and
+    timeout and proxy configuration); further requests block until one is
+    returned.
+    """
+
+    def __init__(self, max_per_host: int = MAX_CONCURRENT_CONNECTION):
+        self._max_per_host = max_per_host
+        self._cond = threading.Condition()
+        self._idle: Dict[Tuple, List[httplib2.Http]] = {}
+        self._counts: Dict[Tuple, int] = {}
+
+    @staticmethod
+    def _key(uri: str, timeout, proxy_info) -> Tuple:
+        parsed = urllib.parse.urlparse(uri)
+        return (parsed.scheme, parsed.netloc, timeout, proxy_info)
+
+    def _acquire(self, key: Tuple) -> httplib2.Http:
+        with self._cond:
+            while (not self._idle.get(key)
+                   and self._counts.get(key, 0) >= self._max_per_host):
+                self._cond.wait()
+            if self._idle.get(key):
+                return self._idle[key].pop()
+            self._counts[key] = self._counts.get(key, 0) + 1
+        _, _, timeout, proxy_info = key
+        return httplib2.Http(timeout=timeout, proxy_info=proxy_info)
+
+    def _release(self, key: Tuple, http: httplib2.Http, reuse: bool):
+        if not reuse:
+            http.close()
+        with self._cond:
+            if reuse:
+                self._idle.setdefault(key, []).append(http)
+            else:
+                self._counts[key] -= 1
+            self._cond.notify()
+
+    @contextlib.contextmanager
+    def connection(self, uri: str, timeout=None, proxy_info=None):
+        """Yields an httplib2.Http for |uri|, returning it to the pool after.
+
+        Clients whose request raised are closed rather than reused, since their
+        connections may be in an unknown state.
+        """
+        key = self._key(uri, timeout, proxy_info)
+        http = self._acquire(key)
+        reuse = False
+        try:
+            yield http
+            reuse = True
+        finally:
+            self._release(key, http, reuse)
+
+    def close(self):
+        """Closes all idle clients."""
+        with self._cond:
+            for key, idle in self._idle.items():
+                for http in idle:
+                    http.close()
+                self._counts[key] -= len(idle)
+            self._idle.clear()
+            self._cond.notify_all()
+
+
+# Shared by every HttpConn, so that all Gerrit requests made by this process
+# (e.g. ValidAccounts or owners_client.GerritClient) reuse connections.
+_HTTP_CONNECTION_POOL = HttpConnectionPool()
+
+
 class HttpConn(httplib2.Http):
-    """HttpConn is an httplib2.Http with additional request-specific fields."""
+    """HttpConn is an httplib2.Http with additional request-specific fields.
+
+    Requests are sent through the shared HttpConnectionPool rather than on
+    connections owned by the HttpConn itself.
+    """
 
     def __init__(self, *args, req_host: str, req_uri: str, req_method: str,
                  req_headers: Dict[str, str], req_body: Optional[str],
@@ -1053,6 +1133,16 @@ class HttpConn(httplib2.Http):
         self.req_body = req_body
         super().__init__(*args, **kwargs)
 
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        """Sends the request on a pooled keep-alive connection."""
+        with _HTTP_CONNECTION_POOL.connection(uri, self.timeout,
+                                              self.proxy_info) as http:
+            return http.request(uri,
+                                method=method,
+                                body=body,
+                                headers=headers,
+                                **kwargs)
+
     @property
     def req_params(self) -> ReqParams:
         return {
@@ -4,6 +4,7 @@
 # found in the LICENSE file.
 """A git command for managing a local cache of git repositories."""
 
+import concurrent.futures
 import contextlib
 import logging
 import optparse
@@ -346,6 +347,35 @@ class Mirror(object):
     def exists(self):
         return os.path.isfile(os.path.join(self.mirror_path, 'config'))
 
+    def estimated_size(self):
+        """Returns the size of the mirror's packs in bytes or, if the mirror
+        doesn't exist yet, of its bootstrap files, or None if unknown."""
+        if not self.exists():
+            return self._bootstrap_size()
+        pack_dir = os.path.join(self.mirror_path, 'objects', 'pack')
+        size = 0
+        if os.path.isdir(pack_dir):
+            for f in os.listdir(pack_dir):
+                try:
+                    size += os.path.getsize(os.path.join(pack_dir, f))
+                except OSError:
+                    pass
+        return size
+
+    def _bootstrap_size(self):
+        """Returns the size of the bootstrap files in bytes, or None if there
+        are none."""
+        if not self.bootstrap_bucket:
+            return None
+        gsutil = Gsutil(self.gsutil_exe, boto_path=None)
+        code, du_out, _ = gsutil.check_call('du', '-s', self._gs_path)
+        if code:
+            return None
+        try:
+            return int(du_out.split()[0])
+        except (IndexError, ValueError):
+            return None
+
     def supported_project(self):
         """Returns true if this repo is known to have a bootstrap zip file."""
         u = urllib.parse.urlparse(self.url)
@@ -680,6 +710,114 @@ class Mirror(object):
                 logging.warning('Unable to delete temporary pack file %s' % f)
 
 
+def _schedule_order(mirror):
+    # Mirrors which don't exist yet need a bootstrap or a full fetch, so they
+    # go first, starting with those without a bootstrap, which need a full
+    # fetch. Then the largest, whose downloads or fetches likely take longest.
+    size = mirror.estimated_size()
+    return (mirror.exists(), float('-inf') if size is None else -size)
+
+
+def populate_mirrors(urls,
+                     jobs,
+                     update_bootstrap=False,
+                     refs=None,
+                     commits=None,
+                     **populate_kwargs):
+    """Populates the mirrors of |urls| using up to |jobs| threads.
+
+    Each mirror is locked while it's populated, as by Mirror.populate, and
+    its output is prefixed with its cache directory. Mirrors are scheduled
+    longest expected first, so a long populate doesn't start last.
+
+    Returns a list of (url, exception) for the mirrors which failed.
+    """
+    print_lock = threading.Lock()
+
+    def print_line(line):
+        with print_lock:
+            print(line)
+            sys.stdout.flush()
+
+    def prefixed_printer(prefix):
+        return lambda line: print_line('[%s] %s' % (prefix, line))
+
+    # Several urls may share a mirror, e.g. with and without '.git'.
+    mirrors = {}
+    for url in urls:
+        basedir = Mirror.UrlToCacheDir(url)
+        if basedir not in mirrors:
+            mirrors[basedir] = Mirror(url,
+                                      refs=refs,
+                                      commits=commits,
+                                      print_func=prefixed_printer(basedir))
+    mirrors = list(mirrors.values())
+
+    def populate(mirror):
+        start = time.time()
+        mirror.populate(**populate_kwargs)
+        if update_bootstrap:
+            mirror.update_bootstrap()
+        return time.time() - start
+
+    failures = []
+    done = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        # Estimating the size of a new mirror asks Google Storage, so the
+        # estimates are made in parallel too.
+        orders = dict(zip(mirrors, executor.map(_schedule_order, mirrors)))
+        mirrors.sort(key=orders.get)
+        futures = {
+            executor.submit(populate, mirror): mirror
+            for mirror in mirrors
+        }
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                mirror = futures[future]
+                done += 1
+                try:
+                    elapsed = future.result()
+                except Exception as e:
+                    failures.append((mirror.url, e))
+                    print_line('[%d/%d] Failed to populate %s: %s' %
+                               (done, len(mirrors), mirror.url, e))
+                else:
+                    print_line('[%d/%d] Populated %s in %.1f minutes' %
+                               (done, len(mirrors), mirror.url,
+                                elapsed / 60.0))
+        except KeyboardInterrupt:
+            # Don't start the queued populates. Leaving the with block still
+            # waits for the running ones, whose git processes got the
+            # interrupt too.
+            for future in futures:
+                future.cancel()
+            raise
+    return failures
+
+
+def _read_manifest(path):
+    """Returns the urls listed in the manifest at |path|.
+
+    The manifest lists a url per line. Lines may also be `gclient revinfo`
+    output, i.e. '<path>: <url>@<revision>'. Empty lines and lines starting
+    with '#' are ignored.
+    """
+    urls = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            name, sep, url = line.partition(': ')
+            if sep:
+                # Strip the revision of a revinfo line, keeping the userinfo
+                # of the url, e.g. ssh://git@host/repo@revision.
+                urls.append(url.strip().rsplit('@', 1)[0])
+            else:
+                urls.append(name)
+    return urls
+
+
 @subcommand.usage('[url of repo to check for caching]')
 @metrics.collector.collect_metrics('git cache exists')
 def CMDexists(parser, args):
@@ -737,15 +875,7 @@ def CMDupdate_bootstrap(parser, args):
     return 0
 
 
-@subcommand.usage('[url of repo to add to or update in cache]')
-@metrics.collector.collect_metrics('git cache populate')
-def CMDpopulate(parser, args):
-    """Ensure that the cache has all up-to-date objects for the given repo."""
-    if gclient_utils.IsEnvCog():
-        print('populating cache is not supported in non-git environment.',
-              file=sys.stderr)
-        return 1
-
+def _add_populate_options(parser):
     parser.add_option('--depth',
                       type='int',
                       help='Only cache DEPTH commits of history')
@@ -782,16 +912,13 @@ def CMDpopulate(parser, args):
         default=False,
         help='Reset the fetch config before populating the cache.')
 
-    options, args = parser.parse_args(args)
-    if not len(args) == 1:
-        parser.error('git cache populate only takes exactly one repo url.')
+
+def _populate_kwargs(options):
+    """Returns the Mirror.populate() arguments for the populate options."""
     if options.ignore_locks:
         print('ignore_locks is no longer used. Please remove its usage.')
     if options.break_locks:
         print('break_locks is no longer used. Please remove its usage.')
-    url = args[0]
-
-    mirror = Mirror(url, refs=options.ref, commits=options.commit)
     kwargs = {
         'no_fetch_tags': options.no_fetch_tags,
         'verbose': options.verbose,
@@ -802,7 +929,76 @@ def CMDpopulate(parser, args):
     }
     if options.depth:
         kwargs['depth'] = options.depth
-    mirror.populate(**kwargs)
+    return kwargs
+
+
+@subcommand.usage('[url of repo to add to or update in cache]')
+@metrics.collector.collect_metrics('git cache populate')
+def CMDpopulate(parser, args):
+    """Ensure that the cache has all up-to-date objects for the given repo."""
+    if gclient_utils.IsEnvCog():
+        print('populating cache is not supported in non-git environment.',
+              file=sys.stderr)
+        return 1
+
+    _add_populate_options(parser)
+
+    options, args = parser.parse_args(args)
+    if not len(args) == 1:
+        parser.error('git cache populate only takes exactly one repo url.')
+    url = args[0]
+
+    mirror = Mirror(url, refs=options.ref, commits=options.commit)
+    mirror.populate(**_populate_kwargs(options))
+
+
+@subcommand.usage('[urls of repos to add to or update in cache]')
+@metrics.collector.collect_metrics('git cache populate-many')
+def CMDpopulate_many(parser, args):
+    """Populate the cache for many repos in parallel."""
+    if gclient_utils.IsEnvCog():
+        print('populating cache is not supported in non-git environment.',
+              file=sys.stderr)
+        return 1
+
+    _add_populate_options(parser)
+    parser.add_option('--manifest',
+                      action='append',
+                      default=[],
+                      help='File listing repo urls, one per line. The output '
+                      'of `gclient revinfo` may be used as well.')
+    parser.add_option('-j',
+                      '--jobs',
+                      type='int',
+                      default=8,
+                      help='Number of repos to populate at once '
+                      '(default: %default)')
+    parser.add_option('--update-bootstrap',
+                      action='store_true',
+                      help='Create and upload a bootstrap of each repo after '
+                      'populating it.')
+
+    options, args = parser.parse_args(args)
+    urls = list(args)
+    for manifest in options.manifest:
+        urls.extend(_read_manifest(manifest))
+    if not urls:
+        parser.error('git cache populate-many needs repo urls or a manifest.')
+    if options.update_bootstrap and sys.platform.startswith('win'):
+        parser.error('update bootstrap will not work on Windows.')
+
+    failures = populate_mirrors(urls,
+                                max(options.jobs, 1),
+                                update_bootstrap=options.update_bootstrap,
+                                refs=options.ref,
+                                commits=options.commit,
+                                **_populate_kwargs(options))
+    if failures:
+        print('Failed to populate:', file=sys.stderr)
+        for url, e in failures:
+            print('  %s: %s' % (url, e), file=sys.stderr)
+        return 1
+    return 0
 
 
 @subcommand.usage('Fetch new commits into cache and current checkout')
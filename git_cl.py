@@ -173,6 +173,11 @@ assert len(_KNOWN_GERRIT_TO_SHORT_URLS) == len(
 # at once. Picked arbitrarily.
 _MAX_STACKED_BRANCHES_UPLOAD = 20
 
+# How long, in seconds, CL statuses fetched by get_cl_statuses are reused.
+_CL_STATUS_CACHE_TTL = 60
+# Maximum number of changes get_cl_statuses queries Gerrit for at once.
+_CL_STATUS_BATCH_SIZE = 25
+
 _NO_BRANCH_ERROR = (
     'Unable to determine base commit in detached HEAD state. '
     'Get on a branch or run `git cl upload --no-squash <base>` to '
@@ -1783,7 +1788,8 @@ class Changelist(object):
                 files: Optional[Sequence[str]] = None,
                 resultdb: Optional[bool] = None,
                 realm: Optional[str] = None,
-                end_commit: Optional[str] = None) -> Mapping[str, Any]:
+                end_commit: Optional[str] = None,
+                profile: Optional[str] = None) -> Mapping[str, Any]:
         """Calls sys.exit() if the hook fails; returns a HookResults otherwise."""
         args = self._GetCommonPresubmitArgs(verbose, upstream)
         args.append('--commit' if committing else '--upload')
@@ -1800,6 +1806,8 @@ class Changelist(object):
             args.append('--source_controlled_only')
         if files or all_files:
             args.append('--no_diffs')
+        if profile:
+            args.extend(['--presubmit_profile', profile])
 
         if resultdb and not realm:
             # TODO (crbug.com/1113463): store realm somewhere and look it up so
@@ -2491,7 +2499,14 @@ class Changelist(object):
                 ['DETAILED_LABELS', 'CURRENT_REVISION', 'SUBMITTABLE'])
         except GerritChangeNotExists:
             return 'error'
+        return self.GetStatusFromChangeDetail(data)
+
+    @staticmethod
+    def GetStatusFromChangeDetail(data):
+        """Returns the status of a change, as described in GetStatus().
 
+        |data| must include detailed labels and messages.
+        """
         if data['status'] in ('ABANDONED', 'MERGED'):
             return 'closed'
 
@@ -4086,13 +4101,124 @@ def color_for_status(status):
     }.get(status, Fore.WHITE)
 
 
+def _GetCLStatusCachePath():
+    return os.path.join(
+        os.environ.get('XDG_CACHE_HOME')
+        or os.path.join(os.path.expanduser('~'), '.cache'), 'depot_tools',
+        'git_cl_statuses.json')
+
+
+def _ReadCLStatusCache():
+    """Returns the unexpired {'host/issue': [timestamp, status]} entries."""
+    try:
+        with open(_GetCLStatusCachePath()) as f:
+            cache = json.load(f)
+    except (IOError, ValueError):
+        return {}
+    if not isinstance(cache, dict):
+        return {}
+    now = time.time()
+    return {
+        key: entry
+        for key, entry in cache.items()
+        if isinstance(entry, list) and len(entry) == 2
+        and 0 <= now - entry[0] < _CL_STATUS_CACHE_TTL
+    }
+
+
+def _WriteCLStatusCache(cache):
+    path = _GetCLStatusCachePath()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cache, f)
+        os.replace(temp_path, path)
+    except OSError as e:
+        logging.debug('failed to write CL status cache: %s', e)
+
+
+def _FetchCLStatusesBatched(changes: List[Changelist], threads_count):
+    """Returns {cl: status} for the CLs whose status could be fetched in bulk.
+
+    The changes of each Gerrit host are fetched with a few QueryChanges calls
+    instead of one GetChangeDetail per CL, and the statuses are cached on disk
+    for _CL_STATUS_CACHE_TTL seconds. CLs missing from the result (e.g.
+    because a query failed) are left for the caller to fetch one by one.
+    """
+    cls_by_key = collections.defaultdict(list)
+    for cl in changes:
+        issue = cl.GetIssue()
+        host = issue and cl.GetGerritHost()
+        if host:
+            cls_by_key['%s/%d' % (host, issue)].append(cl)
+    if not cls_by_key:
+        return {}
+
+    cache = _ReadCLStatusCache()
+    issues_by_host = collections.defaultdict(list)
+    for key in cls_by_key:
+        if key not in cache:
+            host, _, issue = key.rpartition('/')
+            issues_by_host[host].append(int(issue))
+    batches = [(host, issues[i:i + _CL_STATUS_BATCH_SIZE])
+               for host, issues in issues_by_host.items()
+               for i in range(0, len(issues), _CL_STATUS_BATCH_SIZE)]
+
+    def query(batch):
+        host, issues = batch
+        try:
+            results = gerrit_util.QueryChanges(
+                host, [],
+                first_param=' OR '.join('change:%d' % i for i in issues),
+                limit=len(issues),
+                o_params=['DETAILED_LABELS', 'MESSAGES'])
+        except Exception:
+            logging.exception('failed to query statuses of CLs on %s', host)
+            return {}
+        statuses = {
+            change['_number']: Changelist.GetStatusFromChangeDetail(change)
+            for change in results
+        }
+        # Changes that can't be found are reported as errors, like
+        # GetStatus() does.
+        return {
+            '%s/%d' % (host, issue): statuses.get(issue, 'error')
+            for issue in issues
+        }
+
+    if len(batches) > 1:
+        pool = multiprocessing.pool.ThreadPool(min(threads_count,
+                                                   len(batches)))
+        try:
+            results = pool.map(query, batches)
+        finally:
+            pool.close()
+    else:
+        results = [query(batch) for batch in batches]
+
+    now = time.time()
+    for result in results:
+        for key, status in result.items():
+            cache[key] = [now, status]
+    if batches:
+        _WriteCLStatusCache(cache)
+
+    return {
+        cl: cache[key][1]
+        for key, cls in cls_by_key.items() if key in cache for cl in cls
+    }
+
+
 def get_cl_statuses(changes: List[Changelist],
                     fine_grained,
                     max_processes=None):
     """Returns a blocking iterable of (cl, status) for given branches.
 
-    If fine_grained is true, this will fetch CL statuses from the server.
-    Otherwise, simply indicate if there's a matching url for the given branches.
+    If fine_grained is true, this will fetch CL statuses from the server, in
+    batches per Gerrit host, reusing statuses fetched in the last
+    _CL_STATUS_CACHE_TTL seconds. Otherwise, simply indicate if there's a
+    matching url for the given branches.
 
     If max_processes is specified, it is used as the maximum number of processes
     to spawn to fetch CL status from the server. Otherwise 1 process per branch
@@ -4128,6 +4254,15 @@ def get_cl_statuses(changes: List[Changelist],
     threads_count = min(gerrit_util.MAX_CONCURRENT_CONNECTION, len(changes))
     if max_processes:
         threads_count = max(1, min(threads_count, max_processes))
+
+    statuses = _FetchCLStatusesBatched(changes, threads_count)
+    for cl in changes:
+        if cl in statuses:
+            yield cl, statuses[cl]
+    changes = [cl for cl in changes if cl not in statuses]
+    if not changes:
+        return
+
     logging.debug('querying %d CLs using %d threads', len(changes),
                   threads_count)
 
@@ -5085,6 +5220,12 @@ def CMDlint(parser, args):
         action='append',
         metavar='-x,+y',
         help='Comma-separated list of cpplint\'s category-filters')
+    parser.add_option(
+        '--cache-dir',
+        default=os.environ.get('CPPLINT_CACHE_DIR'),
+        help='Directory where cpplint caches the errors found in each file, '
+        'so that unchanged files aren\'t linted again. Defaults to '
+        '$CPPLINT_CACHE_DIR.')
     options, args = parser.parse_args(args)
     root_path, files = FindFilesForLint(options, args)
     if files is None:
@@ -5099,6 +5240,10 @@ def CMDlint(parser, args):
         # Process cpplint arguments, if any.
         filters = presubmit_canned_checks.GetCppLintFilters(options.filter)
         command = ['--filter=' + ','.join(filters)]
+        if options.cache_dir:
+            # cpplint runs from root_path.
+            command.append('--cache-dir=' +
+                           os.path.abspath(options.cache_dir))
         command.extend(files)
         files_to_lint = cpplint.ParseArguments(command)
     except ImportError:
@@ -5130,7 +5275,12 @@ def CMDlint(parser, args):
 @metrics.collector.collect_metrics('git cl presubmit')
 @subcommand.usage('[base branch]')
 def CMDpresubmit(parser, args):
-    """Runs presubmit tests on the current changelist."""
+    """Runs presubmit tests on the current changelist.
+
+    PRESUBMIT.py scripts are looked up among the files tracked by git, so an
+    untracked one only runs once it is added to the changelist or to the git
+    index, e.g. with `git add -N`.
+    """
     if gclient_utils.IsEnvCog():
         print('presubmit command is not supported in non-git environment. '
               'Please use the "Chromium PRESUBMITS" panel or the "Run '
@@ -5168,6 +5318,10 @@ def CMDpresubmit(parser, args):
     parser.add_option('-j',
                       '--json',
                       help='File to write JSON results to, or "-" for stdout')
+    parser.add_option('--presubmit-profile',
+                      help='File to write the time, CPU time, subprocesses and '
+                      'bytes read of every check to, as trace events. The '
+                      'slowest checks are printed as well.')
     options, args = parser.parse_args(args)
 
     if not options.force and git_common.is_dirty_git_tree('presubmit'):
@@ -5209,7 +5363,8 @@ def CMDpresubmit(parser, args):
                         all_files=options.all,
                         files=options.files,
                         resultdb=options.resultdb,
-                        realm=options.realm)
+                        realm=options.realm,
+                        profile=options.presubmit_profile)
     if options.json:
         write_json(options.json, result)
     return 0
@@ -30,6 +30,7 @@ import binascii
 import collections
 import contextlib
 import functools
+import heapq
 import logging
 import os
 import random
@@ -615,9 +616,25 @@ def get_branch_tree(use_limit=False):
     skipped = set()
     branch_tree = {}
 
+    upstreams = {}
+    data = run('for-each-ref',
+               '--format=%(refname:short)%00%(upstream)%00%(upstream:short)',
+               'refs/heads')
+    for line in data.splitlines():
+        branch, upstream_ref, parent = line.split('\0')
+        if parent:
+            upstreams[branch] = (upstream_ref, parent)
+    # Upstreams which were deleted, e.g. pruned by a fetch, are gone.
+    existing = set()
+    if upstreams:
+        existing.update(
+            run('for-each-ref', '--format=%(refname)',
+                *sorted({ref
+                         for ref, _ in upstreams.values()})).splitlines())
+
     for branch in branches(use_limit=use_limit):
-        parent = upstream(branch)
-        if not parent:
+        upstream_ref, parent = upstreams.get(branch, (None, None))
+        if upstream_ref not in existing:
             skipped.add(branch)
             continue
         branch_tree[branch] = parent
@@ -1352,46 +1369,381 @@ def get_num_commits(branch):
 
 
 def get_branches_info(include_tracking_status):
-    format_string = (
-        '--format=%(refname:short):%(objectname:short):%(upstream:short):')
-
-    # This is not covered by the depot_tools CQ which only has git version 1.8.
-    if (include_tracking_status and get_git_version() >=
-            MIN_UPSTREAM_TRACK_GIT_VERSION):  # pragma: no cover
-        format_string += '%(upstream:track)'
-
-    info_map = {}
-    data = run('for-each-ref', format_string, 'refs/heads')
-    assert isinstance(data, str)
-    BranchesInfo = collections.namedtuple('BranchesInfo',
-                                          'hash upstream commits behind')
-    for line in data.splitlines():
-        (branch, branch_hash, upstream_branch,
-         tracking_status) = line.split(':')
+    return RepoSnapshot.take(
+        include_tracking_status=include_tracking_status).get_branches_info(
+            include_tracking_status)
+
+
+SnapshotRef = collections.namedtuple(
+    'SnapshotRef', 'refname hash short_hash upstream ahead behind gone subject')
+
+
+class RepoSnapshot(object):
+    """An in-memory snapshot of the refs of a repo.
+
+    Reads every branch, remote branch and tag, with their upstreams, with a
+    single `for-each-ref`. The ahead/behind status of the branches and the
+    subjects of the refs are only read when asked for, as they make git
+    compute every branch's status and read every commit. Merge bases and
+    commit counts between branches, their upstreams and their configured
+    bases are computed on first use from a single `rev-list` of the commits
+    above the common ancestor of all of them.
+
+    The snapshot doesn't see changes made to the repo after it was taken.
+    """
+    FIELDS = [
+        '%(refname)', '%(refname:short)', '%(objectname)',
+        '%(objectname:short)', '%(upstream)', '%(upstream:short)', '%(HEAD)'
+    ]
+
+    def __init__(self, refs, branches, tags, current_branch, head_hash,
+                 short_head_hash):
+        # Map from the short name of each ref to its SnapshotRef.
+        self.refs = refs
+        self.branches = branches
+        self.tags = tags
+        self.current_branch = current_branch
+        self.head_hash = head_hash
+        self.short_head_hash = short_head_hash
+        self._graph = None
+        # Map from the short name of each peeled tag to its commit.
+        self._tag_commits = {}
+
+    @classmethod
+    def take(cls, include_tracking_status=False, include_subjects=False):
+        """Takes a snapshot of the refs of the repo.
 
-        commits = None
+        Args:
+            include_tracking_status: whether to read how far each branch is
+                ahead and behind its upstream.
+            include_subjects: whether to read the subject of the commit of
+                each ref.
+        """
+        fields = list(cls.FIELDS)
         if include_tracking_status:
-            commits = get_num_commits(branch)
-
-        behind_match = re.search(r'behind (\d+)', tracking_status)
-        behind = int(behind_match.group(1)) if behind_match else None
-
-        info_map[branch] = BranchesInfo(hash=branch_hash,
-                                        upstream=upstream_branch,
-                                        commits=commits,
-                                        behind=behind)
-
-    # Set None for upstreams which are not branches (e.g empty upstream, remotes
-    # and deleted upstream branches).
-    missing_upstreams = {}
-    for info in info_map.values():
-        if (info.upstream not in info_map
-                and info.upstream not in missing_upstreams):
-            missing_upstreams[info.upstream] = None
-
-    result = info_map.copy()
-    result.update(missing_upstreams)
-    return result
+            fields.append('%(upstream:track)')
+        if include_subjects:
+            fields.append('%(subject)')
+        rows = []
+        refnames = set()
+        data = run('for-each-ref', '--format=' + '%00'.join(fields),
+                   'refs/heads', 'refs/remotes', 'refs/tags')
+        for line in data.splitlines():
+            values = line.split('\0')
+            rows.append(values)
+            refnames.add(values[0])
+
+        refs = {}
+        branches = []
+        tags = set()
+        current = 'HEAD'
+        for values in rows:
+            (refname, name, objectname, short_objectname, upstream_ref,
+             upstream_branch, head) = values[:7]
+            track = values[7] if include_tracking_status else ''
+            ahead = re.search(r'ahead (\d+)', track)
+            behind = re.search(r'behind (\d+)', track)
+            refs[name] = SnapshotRef(
+                refname=refname,
+                hash=objectname,
+                short_hash=short_objectname,
+                upstream=upstream_branch,
+                ahead=int(ahead.group(1)) if ahead else None,
+                behind=int(behind.group(1)) if behind else None,
+                # The upstream ref was deleted, e.g. pruned by a fetch.
+                gone=bool(upstream_ref) and upstream_ref not in refnames,
+                subject=values[-1] if include_subjects else None)
+            if refname.startswith('refs/heads/'):
+                branches.append(name)
+                if head == '*':
+                    current = name
+            elif refname.startswith('refs/tags/'):
+                tags.add(name)
+
+        try:
+            head_hash, short_head_hash = run('rev-parse', 'HEAD', '--short',
+                                             'HEAD').splitlines()
+        except subprocess2.CalledProcessError:
+            head_hash = short_head_hash = None
+        return cls(refs, branches, tags, current, head_hash, short_head_hash)
+
+    def _tag_commit(self, tag):
+        """Returns the commit that |tag| points to, peeling annotated tags.
+
+        The tags which are upstreams of branches are peeled together, the
+        first time one is needed.
+        """
+        if tag not in self._tag_commits:
+            tags = {tag}
+            for branch in self.branches:
+                if self.refs[branch].upstream in self.tags:
+                    tags.add(self.refs[branch].upstream)
+            names = {self.refs[t].refname: t for t in tags}
+            data = run('for-each-ref',
+                       '--format=%(refname)%00%(objectname)%00%(*objectname)',
+                       *sorted(names))
+            for line in data.splitlines():
+                refname, objectname, peeled = line.split('\0')
+                if refname in names:
+                    self._tag_commits[names[refname]] = peeled or objectname
+        return self._tag_commits.get(tag, self.refs[tag].hash)
+
+    def hash(self, ref, short=False):
+        """Returns the hash of |ref|, or None if it isn't a branch, remote
+        branch or tag. Annotated tags are peeled to the commits they point to,
+        unless |short| is set."""
+        info = self.refs.get(ref)
+        if not info:
+            return None
+        if short:
+            return info.short_hash
+        if ref in self.tags:
+            return self._tag_commit(ref)
+        return info.hash
+
+    def upstream(self, branch):
+        """Returns the upstream of |branch|, or None if it doesn't have one or
+        it's gone. Like upstream()."""
+        info = self.refs.get(branch)
+        if not info or not info.upstream or info.gone:
+            return None
+        return info.upstream
+
+    def subject(self, ref):
+        """Returns the subject of the commit of |ref|, if the snapshot was
+        taken with include_subjects."""
+        info = self.refs.get(ref)
+        return info.subject if info else None
+
+    def get_branch_tree(self):
+        """Like get_branch_tree(), without the branch limit."""
+        skipped = set()
+        branch_tree = {}
+        for branch in self.branches:
+            parent = self.upstream(branch)
+            if not parent:
+                skipped.add(branch)
+                continue
+            branch_tree[branch] = parent
+        return skipped, branch_tree
+
+    def _load_graph(self):
+        """Loads the commits above the common ancestor of every branch, its
+        upstream and its configured base.
+
+        Returns None if they don't have a common ancestor.
+        """
+        if self._graph is not None:
+            return self._graph or None
+        self._graph = {}
+
+        tips = set()
+        for branch in self.branches:
+            tips.add(self.refs[branch].hash)
+            parent = self.upstream(branch)
+            if parent in self.refs:
+                tips.add(self.hash(parent))
+        if not tips:
+            return None
+        try:
+            root_hash = run('merge-base', '--octopus', *sorted(tips))
+        except subprocess2.CalledProcessError:
+            return None
+        # Configured bases which are not above the common ancestor are
+        # discarded by get_or_create_merge_base() anyway.
+        tips.update(v for v in branch_config_map('base').values() if v)
+
+        tips = sorted(tips)
+        data = run('rev-list',
+                   '--topo-order',
+                   '--parents',
+                   '--boundary',
+                   '--ignore-missing',
+                   '--stdin',
+                   indata=('\n'.join(tips + ['^' + root_hash]) +
+                           '\n').encode())
+        order = []
+        parents = {}
+        for line in data.splitlines():
+            tokens = line.split()
+            if tokens[0].startswith('-'):
+                # Boundary commits are ancestors of root_hash, which is a
+                # better common ancestor of any two tips.
+                if tokens[0][1:] == root_hash:
+                    order.append(root_hash)
+                continue
+            order.append(tokens[0])
+            parents[tokens[0]] = tokens[1:]
+        if root_hash not in order:
+            order.append(root_hash)
+
+        # A bit mask of the tips that each commit is reachable from.
+        reachable = dict.fromkeys(order, 0)
+        for i, tip in enumerate(tips):
+            if tip in reachable:
+                reachable[tip] |= 1 << i
+        bits = {tip: 1 << i for i, tip in enumerate(tips)}
+        for commit in order:
+            for parent in parents.get(commit, ()):
+                if parent in reachable:
+                    reachable[parent] |= reachable[commit]
+
+        self._graph = {
+            'order': order,
+            'index': {commit: i for i, commit in enumerate(order)},
+            'parents': parents,
+            'reachable': reachable,
+            'bits': bits,
+            'root': root_hash,
+        }
+        return self._graph
+
+    def _resolve(self, ref):
+        return self.hash(ref) or ref
+
+    def merge_base(self, a, b):
+        """Returns the merge base of two branches, upstreams or configured
+        bases."""
+        graph = self._load_graph()
+        a, b = self._resolve(a), self._resolve(b)
+        if not graph or a not in graph['bits'] or b not in graph['bits']:
+            return run('merge-base', a, b)
+        mask = graph['bits'][a] | graph['bits'][b]
+        for commit in graph['order']:
+            if graph['reachable'][commit] & mask == mask:
+                return commit
+        return graph['root']
+
+    def is_ancestor(self, a, b):
+        """Returns whether commit |a| is an ancestor of |b|."""
+        graph = self._load_graph()
+        b = self._resolve(b)
+        if graph and a in graph['reachable']:
+            if b in graph['bits']:
+                return bool(graph['reachable'][a] & graph['bits'][b])
+            if b in graph['reachable']:
+                count = self._count_in_graph(a, b)
+                if count is not None:
+                    return count == 0
+        return run_with_retcode('merge-base', '--is-ancestor', a, b) == 0
+
+    def _count_in_graph(self, branch, base):
+        """Returns the number of commits in |branch| that are not in |base|,
+        or None if it can't be computed from the loaded commits.
+
+        Like git's merge base computation, this walks down from both commits
+        in topological order and stops as soon as every commit left to visit
+        is in |base|, so it only visits the commits above their merge base.
+        """
+        graph = self._graph
+        index = graph['index']
+        parents = graph['parents']
+        BRANCH, BASE = 1, 2
+        flags = {branch: BRANCH}
+        flags[base] = flags.get(base, 0) | BASE
+        queue = [(index[commit], commit) for commit in flags]
+        heapq.heapify(queue)
+        # The number of commits in |queue| which are not in |base|.
+        pending = sum(1 for f in flags.values() if not f & BASE)
+        count = 0
+        while pending:
+            # The commits are visited after all of their children, so their
+            # flags are final.
+            _, commit = heapq.heappop(queue)
+            commit_flags = flags[commit]
+            if not commit_flags & BASE:
+                pending -= 1
+                # The parents of the common ancestor and of the boundary
+                # commits weren't loaded.
+                if commit not in parents:
+                    return None
+                count += 1
+            for parent in parents.get(commit, ()):
+                parent_flags = flags.get(parent)
+                if parent_flags is None:
+                    flags[parent] = commit_flags
+                    if not commit_flags & BASE:
+                        pending += 1
+                    heapq.heappush(queue,
+                                   (index.get(parent, len(index)), parent))
+                elif commit_flags & BASE and not parent_flags & BASE:
+                    flags[parent] = parent_flags | BASE
+                    pending -= 1
+        return count
+
+    def count_commits(self, branch, base):
+        """Returns the number of commits in |branch| that are not in |base|."""
+        graph = self._load_graph()
+        branch, base = self._resolve(branch), self._resolve(base)
+        if (graph and branch in graph['reachable']
+                and base in graph['reachable']):
+            count = self._count_in_graph(branch, base)
+            if count is not None:
+                return count
+        return int(run('rev-list', '--count', branch, '^%s' % base, '--'))
+
+    def get_or_create_merge_base(self, branch, parent=None):
+        """Like get_or_create_merge_base(), from the snapshot."""
+        base = branch_config(branch, 'base')
+        base_upstream = branch_config(branch, 'base-upstream')
+        parent = parent or self.upstream(branch)
+        if parent is None or branch is None:
+            return None
+        actual_merge_base = self.merge_base(parent, branch)
+
+        if base_upstream != parent:
+            base = None
+            base_upstream = None
+
+        if base and base != actual_merge_base:
+            if not self.is_ancestor(base, branch):
+                logging.debug('Found WRONG pre-set merge-base for %s: %s',
+                              branch, base)
+                base = None
+            elif self.is_ancestor(base, actual_merge_base):
+                logging.debug('Found OLD pre-set merge-base for %s: %s',
+                              branch, base)
+                base = None
+            else:
+                logging.debug('Found pre-set merge-base for %s: %s', branch,
+                              base)
+
+        if not base:
+            base = actual_merge_base
+            manual_merge_base(branch, base, parent)
+
+        return base
+
+    def get_num_commits(self, branch):
+        """Like get_num_commits(), from the snapshot."""
+        base = self.get_or_create_merge_base(branch)
+        if base:
+            return self.count_commits(branch, base) or None
+        return None
+
+    def get_branches_info(self, include_tracking_status):
+        """Like get_branches_info(), from the snapshot."""
+        BranchesInfo = collections.namedtuple('BranchesInfo',
+                                              'hash upstream commits behind')
+        info_map = {}
+        for branch in self.branches:
+            info = self.refs[branch]
+            commits = behind = None
+            if include_tracking_status:
+                commits = self.get_num_commits(branch)
+                behind = info.behind
+            info_map[branch] = BranchesInfo(hash=info.short_hash,
+                                            upstream=info.upstream,
+                                            commits=commits,
+                                            behind=behind)
+
+        # Set None for upstreams which are not branches (e.g empty upstream,
+        # remotes and deleted upstream branches).
+        result = info_map.copy()
+        for info in info_map.values():
+            if info.upstream not in info_map:
+                result[info.upstream] = None
+        return result
 
 
 def make_workdir_common(repository,
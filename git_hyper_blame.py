@@ -6,6 +6,7 @@
 """
 
 import argparse
+import bisect
 import collections
 import logging
 import os
@@ -184,12 +185,66 @@ def cache_diff_hunks(oldrev, newrev):
     return hunks
 
 
-def approx_lineno_across_revs(filename, newfilename, revision, newrevision,
-                              lineno):
-    """Computes the approximate movement of a line number between two revisions.
+class HunkMap(object):
+    """Maps line numbers across the hunks of a diff between two revisions.
+
+    Args:
+        hunks: A hunk list, as returned by cache_diff_hunks.
+    """
+    def __init__(self, hunks):
+        self.hunks = hunks
+        # The end of each hunk in the old revision, and the total line motion
+        # of the hunks before it.
+        self.oldends = []
+        self.offsets = []
+        offset = 0
+        for (oldstart, oldlength), (_, newlength) in hunks:
+            self.oldends.append(oldstart + oldlength)
+            self.offsets.append(offset)
+            offset += newlength - oldlength
+        self.total_offset = offset
+
+    def map_lineno(self, lineno):
+        # Find the first hunk that ends after lineno (if any). The ends are
+        # sorted, since the hunks are ordered and don't overlap.
+        i = bisect.bisect_right(self.oldends, lineno)
+        if i == len(self.hunks):
+            # Wasn't in a hunk. Move the line by the difference in length of
+            # all the hunks.
+            return lineno + self.total_offset
+
+        (oldstart, oldlength), (newstart, newlength) = self.hunks[i]
+        if lineno < oldstart:
+            # Between hunks. Move the line by the difference in length of the
+            # hunks before it.
+            return lineno + self.offsets[i]
+
+        # lineno is in [oldstart, oldlength] at revision; [newstart, newlength]
+        # at newrevision.
 
-    Consider line |lineno| in |filename| at |revision|. This function computes
-    the line number of that line in |newfilename| at |newrevision|. This is
+        # If newlength == 0, newstart will be the line before the deleted hunk.
+        # Since the line must have been deleted, just return that as the nearest
+        # line in the new file. Caution: newstart can be 0 in this case.
+        if newlength == 0:
+            return max(1, newstart)
+
+        newend = newstart + newlength - 1
+
+        # Move lineno based on the amount the entire hunk shifted.
+        lineno = lineno + newstart - oldstart
+        # Constrain the output within the range [newstart, newend].
+        return min(newend, max(newstart, lineno))
+
+    def map_linenos(self, linenos):
+        return [self.map_lineno(lineno) for lineno in linenos]
+
+
+def approx_linenos_across_revs(filename, newfilename, revision, newrevision,
+                               linenos):
+    """Computes the approximate movement of line numbers between two revisions.
+
+    Consider lines |linenos| in |filename| at |revision|. This function computes
+    the line numbers of those lines in |newfilename| at |newrevision|. This is
     necessarily approximate.
 
     Args:
@@ -198,10 +253,10 @@ def approx_lineno_across_revs(filename, newfilename, revision, newrevision,
         revision: A git revision.
         newrevision: Another git revision. Note: Can be ahead or behind
             |revision|.
-        lineno: Line number within |filename| at |revision|.
+        linenos: Line numbers within |filename| at |revision|.
 
     Returns:
-        Line number within |newfilename| at |newrevision|.
+        Line numbers within |newfilename| at |newrevision|.
     """
     # This doesn't work that well if there are a lot of line changes within the
     # hunk (demonstrated by
@@ -213,117 +268,170 @@ def approx_lineno_across_revs(filename, newfilename, revision, newrevision,
     # the only way to diff a file that has been renamed.
     old = '%s:%s' % (revision, filename)
     new = '%s:%s' % (newrevision, newfilename)
-    hunks = cache_diff_hunks(old, new)
+    return HunkMap(cache_diff_hunks(old, new)).map_linenos(linenos)
 
-    cumulative_offset = 0
 
-    # Find the hunk containing lineno (if any).
-    for (oldstart, oldlength), (newstart, newlength) in hunks:
-        cumulative_offset += newlength - oldlength
+def approx_lineno_across_revs(filename, newfilename, revision, newrevision,
+                              lineno):
+    """Computes the approximate movement of a line number between two revisions.
 
-        if lineno >= oldstart + oldlength:
-            # Not there yet.
-            continue
+    See approx_linenos_across_revs.
+    """
+    return approx_linenos_across_revs(filename, newfilename, revision,
+                                      newrevision, [lineno])[0]
 
-        if lineno < oldstart:
-            # Gone too far.
-            break
 
-        # lineno is in [oldstart, oldlength] at revision; [newstart, newlength]
-        # at newrevision.
+class BlameEngine(object):
+    """Blames several files at once, looking through |ignored| commits.
 
-        # If newlength == 0, newstart will be the line before the deleted hunk.
-        # Since the line must have been deleted, just return that as the nearest
-        # line in the new file. Caution: newstart can be 0 in this case.
-        if newlength == 0:
-            return max(1, newstart)
+    The files are blamed in rounds. Each round replaces the lines blamed on an
+    ignored commit by the lines of the blame of its parent. The blames and diff
+    hunks that a round needs are computed once for all the files and lines that
+    need them, with a pool of |jobs| worker threads.
+    """
+    def __init__(self, ignored, jobs=None):
+        self.ignored = set(ignored)
+        self.jobs = jobs
+        # Map from (filename, commithash) to its parsed blame.
+        self.blames = {}
 
-        newend = newstart + newlength - 1
+    def _cache_blames(self, pool, keys):
+        missing = sorted(set(keys) - set(self.blames))
 
-        # Move lineno based on the amount the entire hunk shifted.
-        lineno = lineno + newstart - oldstart
-        # Constrain the output within the range [newstart, newend].
-        return min(newend, max(newstart, lineno))
+        def parse(key):
+            try:
+                return get_parsed_blame(*key)
+            except subprocess2.CalledProcessError as e:
+                return e
+
+        for key, parsed in zip(missing, pool.map(parse, missing)):
+            self.blames[key] = parsed
+
+    def _is_ignored(self, line):
+        # You can't ignore the commit that added this file.
+        return (line.commit.commithash in self.ignored
+                and line.commit.previous is not None)
+
+    def blame(self, filenames, revision):
+        """Blames |filenames| at |revision|.
+
+        Returns a list with the list of BlameLines of each file, or the
+        subprocess2.CalledProcessError if it couldn't be blamed.
+        """
+        commithash = git_common.hash_one(revision)
+        with git_common.ScopedPool(self.jobs, kind='threads') as pool:
+            self._cache_blames(pool, [(f, commithash) for f in filenames])
+            results = []
+            pending = []
+            for filename in filenames:
+                parsed = self.blames[(filename, commithash)]
+                if isinstance(parsed, subprocess2.CalledProcessError):
+                    results.append(parsed)
+                    continue
+                lines = list(parsed)
+                results.append(lines)
+                pending.extend((lines, i) for i, line in enumerate(lines)
+                               if self._is_ignored(line))
+
+            while pending:
+                pending = self._blame_parents(pool, pending)
+        return results
+
+    def _blame_parents(self, pool, pending):
+        """Replaces each of the |pending| (lines, index) pairs by the line it
+        came from in the parent of its commit.
+
+        Returns the pairs which are still blamed on an ignored commit.
+        """
+        # Group the lines by the commit and file they are blamed on.
+        groups = collections.defaultdict(list)
+        for lines, i in pending:
+            commit = lines[i].commit
+            previouscommit, previousfilename = commit.previous.split(' ', 1)
+            groups[(commit.commithash, commit.filename, previouscommit,
+                    previousfilename)].append((lines, i))
+        groups = list(groups.items())
+        self._cache_blames(pool, [(previousfilename, previouscommit)
+                                  for (_, _, previouscommit,
+                                       previousfilename), _ in groups])
+
+        def map_group(item):
+            key, group = item
+            commithash, filename, previouscommit, previousfilename = key
+            # lineno_then is the line number in question at commithash. We
+            # need to translate those line numbers so that they refer to the
+            # position of the same lines on previouscommit.
+            return approx_linenos_across_revs(
+                filename, previousfilename, commithash, previouscommit,
+                [lines[i].lineno_then for lines, i in group])
+
+        still_pending = []
+        for item, linenos_previous in zip(groups, pool.map(map_group, groups)):
+            (commithash, _, previouscommit, previousfilename), group = item
+            parent_blame = self.blames[(previousfilename, previouscommit)]
+            if isinstance(parent_blame, subprocess2.CalledProcessError):
+                raise parent_blame
 
-    # Wasn't in a hunk. Figure out the line motion based on the difference in
-    # length between the hunks seen so far.
-    return lineno + cumulative_offset
+            if len(parent_blame) == 0:
+                # The previous version of this file was empty, therefore, you
+                # can't ignore this commit.
+                continue
+
+            for (lines, i), lineno_previous in zip(group, linenos_previous):
+                line = lines[i]
+                logging.debug('ignore commit %s on line p%d/t%d/n%d',
+                              commithash, lineno_previous, line.lineno_then,
+                              line.lineno_now)
+
+                # Get the line at lineno_previous in the parent commit.
+                assert 1 <= lineno_previous <= len(parent_blame)
+                newline = parent_blame[lineno_previous - 1]
+
+                # Replace the commit and lineno_then, but not the lineno_now or
+                # context.
+                line = BlameLine(newline.commit, line.context,
+                                 newline.lineno_then, line.lineno_now, True)
+                logging.debug('    replacing with %r', line)
+                lines[i] = line
+                if self._is_ignored(line):
+                    still_pending.append((lines, i))
+        return still_pending
 
 
 def hyper_blame(outbuf, ignored, filename, revision):
-    # Map from commit to parsed blame from that commit.
-    blame_from = {}
-    filename = os.path.normpath(filename)
+    return hyper_blame_files(outbuf, ignored, [filename], revision)
 
-    def cache_blame_from(filename, commithash):
-        try:
-            return blame_from[commithash]
-        except KeyError:
-            parsed = get_parsed_blame(filename, commithash)
-            blame_from[commithash] = parsed
-            return parsed
 
+def hyper_blame_files(outbuf, ignored, filenames, revision, jobs=None):
+    """Blames |filenames| at |revision| looking through |ignored| commits, and
+    prints the blames to |outbuf|.
+
+    Filenames are shown in the output when more than one file is blamed.
+    """
+    filenames = [os.path.normpath(f) for f in filenames]
     try:
-        parsed = cache_blame_from(filename, git_common.hash_one(revision))
+        results = BlameEngine(ignored, jobs).blame(filenames, revision)
     except subprocess2.CalledProcessError as e:
         sys.stderr.write(e.stderr.decode())
         return e.returncode
 
-    new_parsed = []
-
-    # We don't show filenames in blame output unless we have to.
-    show_filenames = False
-
-    for line in parsed:
-        # If a line references an ignored commit, blame that commit's parent
-        # repeatedly until we find a non-ignored commit.
-        while line.commit.commithash in ignored:
-            if line.commit.previous is None:
-                # You can't ignore the commit that added this file.
-                break
-
-            previouscommit, previousfilename = line.commit.previous.split(
-                ' ', 1)
-            parent_blame = cache_blame_from(previousfilename, previouscommit)
-
-            if len(parent_blame) == 0:
-                # The previous version of this file was empty, therefore, you
-                # can't ignore this commit.
-                break
+    retval = 0
+    for filename, lines in zip(filenames, results):
+        if isinstance(lines, subprocess2.CalledProcessError):
+            sys.stderr.write(lines.stderr.decode())
+            retval = lines.returncode
+            continue
 
-            # line.lineno_then is the line number in question at line.commit. We
-            # need to translate that line number so that it refers to the
-            # position of the same line on previouscommit.
-            lineno_previous = approx_lineno_across_revs(line.commit.filename,
-                                                        previousfilename,
-                                                        line.commit.commithash,
-                                                        previouscommit,
-                                                        line.lineno_then)
-            logging.debug('ignore commit %s on line p%d/t%d/n%d',
-                          line.commit.commithash, lineno_previous,
-                          line.lineno_then, line.lineno_now)
-
-            # Get the line at lineno_previous in the parent commit.
-            assert 1 <= lineno_previous <= len(parent_blame)
-            newline = parent_blame[lineno_previous - 1]
-
-            # Replace the commit and lineno_then, but not the lineno_now or
-            # context.
-            line = BlameLine(newline.commit, line.context, newline.lineno_then,
-                             line.lineno_now, True)
-            logging.debug('    replacing with %r', line)
-
-        # If any line has a different filename to the file's current name, turn
-        # on filename display for the entire blame output. Use normpath to make
+        # We don't show filenames in blame output unless we have to. If any
+        # line has a different filename to the file's current name, turn on
+        # filename display for the entire blame output. Use normpath to make
         # variable consistent across platforms.
-        if os.path.normpath(line.commit.filename) != filename:
-            show_filenames = True
-
-        new_parsed.append(line)
-
-    pretty_print(outbuf, new_parsed, show_filenames=show_filenames)
+        show_filenames = len(filenames) > 1 or any(
+            os.path.normpath(line.commit.filename) != filename
+            for line in lines)
+        pretty_print(outbuf, lines, show_filenames=show_filenames)
 
-    return 0
+    return retval
 
 
 def parse_ignore_file(ignore_file):
@@ -333,6 +441,20 @@ def parse_ignore_file(ignore_file):
             yield line
 
 
+def is_revision_argument(arg):
+    """Returns whether the first of several arguments is a revision rather
+    than a file.
+
+    Like git, an argument that names a commit is a revision. One that names
+    neither a commit nor an existing file is a revision too, so that git
+    reports it as unknown.
+    """
+    if git_common.run_with_retcode('rev-parse', '--verify', '--quiet',
+                                   arg + '^{commit}') == 0:
+        return True
+    return not os.path.exists(arg)
+
+
 def main(args, outbuf):
     if gclient_utils.IsEnvCog():
         print('hyper-blame command is not supported in non-git environment.',
@@ -356,13 +478,22 @@ def main(args, outbuf):
         dest='no_default_ignores',
         action='store_true',
         help='Do not ignore commits from .git-blame-ignore-revs.')
-    parser.add_argument('revision',
-                        nargs='?',
-                        default='HEAD',
-                        metavar='REVISION',
-                        help='revision to look at')
-    parser.add_argument('filename', metavar='FILE', help='filename to blame')
-
+    parser.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        help='the number of blames to run in parallel '
+                        '(default: the number of CPUs)')
+    parser.add_argument('positional',
+                        nargs='*',
+                        metavar='[REVISION] [--] FILE',
+                        help='the revision to look at (default: HEAD) and '
+                        'the files to blame')
+
+    # Like git blame, everything after '--' is a file.
+    separated_filenames = None
+    if '--' in args:
+        separator = args.index('--')
+        args, separated_filenames = args[:separator], args[separator + 1:]
     args = parser.parse_args(args)
     try:
         repo_root = git_common.repo_root()
@@ -370,14 +501,30 @@ def main(args, outbuf):
         sys.stderr.write(e.stderr.decode())
         return e.returncode
 
-    # Make filename relative to the repository root, and cd to the root dir (so
-    # all filenames throughout this script are relative to the root).
-    filename = os.path.relpath(args.filename, repo_root)
+    revision = 'HEAD'
+    if separated_filenames is not None:
+        if len(args.positional) > 1:
+            parser.error('only one revision can be given before --')
+        if args.positional:
+            revision = args.positional[0]
+        filenames = separated_filenames
+    elif len(args.positional) > 1 and is_revision_argument(
+            args.positional[0]):
+        revision = args.positional[0]
+        filenames = args.positional[1:]
+    else:
+        filenames = args.positional
+    if not filenames:
+        parser.error('no file to blame given')
+
+    # Make filenames relative to the repository root, and cd to the root dir
+    # (so all filenames throughout this script are relative to the root).
+    filenames = [os.path.relpath(f, repo_root) for f in filenames]
     os.chdir(repo_root)
 
-    # Normalize filename so we can compare it to other filenames git gives us.
-    filename = os.path.normpath(filename)
-    filename = os.path.normcase(filename)
+    # Normalize filenames so we can compare them to other filenames git gives
+    # us.
+    filenames = [os.path.normcase(os.path.normpath(f)) for f in filenames]
 
     ignored_list = list(args.ignored)
     if not args.no_default_ignores and \
@@ -398,7 +545,11 @@ def main(args, outbuf):
             # inappropriate).
             sys.stderr.write('warning: unknown revision \'%s\'.\n' % c)
 
-    return hyper_blame(outbuf, ignored, filename, args.revision)
+    return hyper_blame_files(outbuf,
+                             ignored,
+                             filenames,
+                             revision,
+                             jobs=args.jobs)
 
 
 if __name__ == '__main__':  # pragma: no cover
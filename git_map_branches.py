@@ -29,9 +29,8 @@ import metrics
 import subprocess2
 import sys
 
-from git_common import current_branch, upstream, tags, get_branches_info
 from git_common import get_git_version, MIN_UPSTREAM_TRACK_GIT_VERSION, hash_one
-from git_common import get_config, run
+from git_common import get_config, run, RepoSnapshot
 
 import gclient_utils
 import git_common
@@ -109,6 +108,7 @@ class BranchMapper(object):
     """A class which constructs output representing the tree's branch structure.
 
     Attributes:
+        __snapshot: a RepoSnapshot of the refs of the repo.
         __branches_info: a map of branches to their BranchesInfo objects which
             consist of the branch hash, upstream and ahead/behind status.
         __gone_branches: a set of upstreams which are not fetchable by git
@@ -120,6 +120,7 @@ class BranchMapper(object):
         self.hide_dormant = False
         self.output = OutputManager()
         self.__gone_branches = set()
+        self.__snapshot = None
         self.__branches_info = None
         self.__parent_map = collections.defaultdict(list)
         self.__current_branch = None
@@ -130,7 +131,10 @@ class BranchMapper(object):
 
     def start(self):
         self.__root = git_common.root()
-        self.__branches_info = get_branches_info(
+        self.__snapshot = RepoSnapshot.take(
+            include_tracking_status=self.verbosity >= 1,
+            include_subjects=self.show_subject)
+        self.__branches_info = self.__snapshot.get_branches_info(
             include_tracking_status=self.verbosity >= 1)
         if (self.verbosity >= 2):
             # Avoid heavy import unless necessary.
@@ -165,15 +169,15 @@ class BranchMapper(object):
                 # branch like origin/main or it may be gone. Determine which it
                 # is, but don't re-query the same parent multiple times.
                 if parent not in roots:
-                    if not upstream(branch):
+                    if not self.__snapshot.upstream(branch):
                         self.__gone_branches.add(parent)
                     roots.add(parent)
 
             self.__parent_map[parent].append(branch)
 
-        self.__current_branch = current_branch()
-        self.__current_hash = hash_one('HEAD', short=True)
-        self.__tag_set = tags()
+        self.__current_branch = self.__snapshot.current_branch
+        self.__current_hash = self.__snapshot.short_head_hash or ''
+        self.__tag_set = self.__snapshot.tags
 
         if roots:
             for root in sorted(roots):
@@ -240,6 +244,8 @@ class BranchMapper(object):
         branch_info = self.__branches_info[branch]
         if branch_info:
             branch_hash = branch_info.hash
+        elif branch in self.__snapshot.refs:
+            branch_hash = self.__snapshot.hash(branch, short=True)
         else:
             try:
                 branch_hash = hash_one(branch, short=True)
@@ -316,7 +322,9 @@ class BranchMapper(object):
 
         # The subject of the most recent commit on the branch.
         if self.show_subject:
-            if not self.__is_invalid_parent(branch):
+            if branch in self.__snapshot.refs:
+                line.append(self.__snapshot.subject(branch))
+            elif not self.__is_invalid_parent(branch):
                 line.append(run('log', '-n1', '--format=%s', branch, '--'))
             else:
                 line.append('')
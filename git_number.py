@@ -17,12 +17,15 @@ any pair of the commits, one is an ancestor of the other.
 
 Since calculating the generation number of a commit requires walking that
 commit's entire history, this script caches all calculated data inside the git
-repo that it operates on in the ref 'refs/number/commits'.
+repo that it operates on in the ref 'refs/number/commits'. Commits that git
+already recorded in a commit-graph file (see `git help commit-graph`) are read
+from there instead, and aren't cached again.
 """
 
 import binascii
 import collections
 import logging
+import mmap
 import optparse
 import os
 import struct
@@ -48,6 +51,10 @@ PREFIX_LEN = 1
 # Set this to 'threads' to gather coverage data while testing.
 POOL_KIND = 'procs'
 
+# The commit-graph of the repo, if it has a usable one. Set by
+# load_commit_graph().
+COMMIT_GRAPH = None
+
 
 def pathlify(hash_prefix):
     """Converts a binary object hash prefix into a posix path, one folder per
@@ -59,6 +66,142 @@ def pathlify(hash_prefix):
     return '/'.join('%02x' % b for b in hash_prefix)
 
 
+class CommitGraphFile(object):
+    """A memory-mapped commit-graph file.
+
+    See Documentation/gitformat-commit-graph.txt in git for the format.
+    """
+    HEADER_FMT = '!4sBBBB'
+    CHUNK_FMT = '!4sQ'
+    SIGNATURE = b'CGPH'
+    HASH_LEN = 20
+    # Topological levels of 0 weren't computed, and the largest one marks
+    # an overflow.
+    GENERATION_ZERO = 0
+    GENERATION_MAX = 0x3FFFFFFF
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            signature, version, hash_version, num_chunks, _ = (
+                struct.unpack_from(self.HEADER_FMT, self._data, 0))
+            if (signature, version, hash_version) != (self.SIGNATURE, 1, 1):
+                raise ValueError('unsupported commit-graph %s' % path)
+            chunks = {}
+            offset = struct.calcsize(self.HEADER_FMT)
+            for _ in range(num_chunks):
+                chunk_id, chunk_offset = struct.unpack_from(
+                    self.CHUNK_FMT, self._data, offset)
+                chunks[chunk_id] = chunk_offset
+                offset += struct.calcsize(self.CHUNK_FMT)
+            self._fanout = struct.unpack_from('!256L', self._data,
+                                              chunks[b'OIDF'])
+            self._oids = chunks[b'OIDL']
+            self._commit_data = chunks[b'CDAT']
+        except (KeyError, ValueError, struct.error):
+            self.close()
+            raise ValueError('corrupt commit-graph %s' % path)
+
+    def close(self):
+        self._data.close()
+
+    def get_num(self, commit_hash):
+        """Returns the generation number of |commit_hash|, or None if it isn't
+        in this file."""
+        first = commit_hash[0]
+        lo = self._fanout[first - 1] if first else 0
+        hi = self._fanout[first]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = self._oids + mid * self.HASH_LEN
+            oid = self._data[offset:offset + self.HASH_LEN]
+            if oid < commit_hash:
+                lo = mid + 1
+            elif oid > commit_hash:
+                hi = mid
+            else:
+                # Each entry is the tree id, two parent positions, and the
+                # topological level in the upper 30 bits of the last 8 bytes.
+                offset = (self._commit_data + mid * (self.HASH_LEN + 16) +
+                          self.HASH_LEN + 8)
+                level = struct.unpack_from('!L', self._data, offset)[0] >> 2
+                if level in (self.GENERATION_ZERO, self.GENERATION_MAX):
+                    return None
+                # git counts root commits as level 1.
+                return level - 1
+        return None
+
+
+class CommitGraph(object):
+    """The commit-graph files of a repo, either a single file or a chain of
+    them."""
+    def __init__(self, files):
+        self.files = files
+
+    @classmethod
+    def load(cls, objects_dir):
+        """Returns the commit-graph of |objects_dir|, or None if it doesn't
+        have one."""
+        info_dir = os.path.join(objects_dir, 'info')
+        paths = [os.path.join(info_dir, 'commit-graph')]
+        graphs_dir = os.path.join(info_dir, 'commit-graphs')
+        try:
+            with open(os.path.join(graphs_dir, 'commit-graph-chain')) as f:
+                paths.extend(
+                    os.path.join(graphs_dir, 'graph-%s.graph' % line.strip())
+                    for line in f if line.strip())
+        except OSError:
+            pass
+        files = []
+        for path in paths:
+            if not os.path.isfile(path):
+                continue
+            try:
+                files.append(CommitGraphFile(path))
+            except (OSError, ValueError) as e:
+                logging.warning('Ignoring commit-graph: %s', e)
+        return cls(files) if files else None
+
+    def close(self):
+        for f in self.files:
+            f.close()
+        self.files = []
+
+    def get_num(self, commit_hash):
+        for f in self.files:
+            num = f.get_num(commit_hash)
+            if num is not None:
+                return num
+        return None
+
+
+def load_commit_graph():
+    """Loads the commit-graph of the current repo into COMMIT_GRAPH.
+
+    Like git itself, doesn't use it in shallow repos or repos with replace
+    refs, where the parents in the commit-graph may differ from the parents
+    that rev-list sees.
+    """
+    global COMMIT_GRAPH
+    if COMMIT_GRAPH is not None:
+        return
+    objects_dir, shallow = git.run('rev-parse', '--git-path', 'objects',
+                                   '--is-shallow-repository').splitlines()
+    if shallow == 'true':
+        return
+    if git.run('for-each-ref', '--count=1', 'refs/replace/'):
+        return
+    COMMIT_GRAPH = CommitGraph.load(objects_dir)
+
+
+def parse_number_tree(raw):
+    """Parses a git-number registry blob into a number tree."""
+    return dict(
+        struct.unpack_from(CHUNK_FMT, raw, i * CHUNK_SIZE)
+        for i in range(len(raw) // CHUNK_SIZE))
+
+
 @git.memoize_one(threadsafe=False)
 def get_number_tree(prefix_bytes):
     """Returns a dictionary of the git-number registry specified by
@@ -73,9 +216,7 @@ def get_number_tree(prefix_bytes):
 
     try:
         raw = git.run('cat-file', 'blob', ref, autostrip=False, decode=False)
-        return dict(
-            struct.unpack_from(CHUNK_FMT, raw, i * CHUNK_SIZE)
-            for i in range(len(raw) // CHUNK_SIZE))
+        return parse_number_tree(raw)
     except subprocess2.CalledProcessError:
         return {}
 
@@ -87,13 +228,21 @@ def get_num(commit_hash):
     Returns None if the generation number for this commit hasn't been calculated
     yet (see load_generation_numbers()).
     """
+    if COMMIT_GRAPH is not None:
+        num = COMMIT_GRAPH.get_num(commit_hash)
+        if num is not None:
+            return num
     return get_number_tree(commit_hash[:PREFIX_LEN]).get(commit_hash)
 
 
 def clear_caches(on_disk=False):
     """Clears in-process caches for e.g. unit testing."""
+    global COMMIT_GRAPH
     get_number_tree.clear()
     get_num.clear()
+    if COMMIT_GRAPH is not None:
+        COMMIT_GRAPH.close()
+        COMMIT_GRAPH = None
     if on_disk:
         git.run('update-ref', '-d', REF)
 
@@ -179,9 +328,33 @@ def finalize(targets):
     DIRTY_TREES.clear()
 
 
-def preload_tree(prefix):
-    """Returns the prefix and parsed tree object for the specified prefix."""
-    return prefix, get_number_tree(prefix)
+def preload_trees(prefixes):
+    """Returns the prefix and parsed tree object for each of |prefixes|.
+
+    All of the trees are read by a single `git cat-file --batch`.
+    """
+    prefixes = list(prefixes)
+    indata = ''.join('%s:%s\n' % (REF, pathlify(p)) for p in prefixes)
+    raw = git.run('cat-file',
+                  '--batch',
+                  indata=indata.encode(),
+                  autostrip=False,
+                  decode=False)
+    trees = []
+    pos = 0
+    for prefix in prefixes:
+        eol = raw.index(b'\n', pos)
+        header = raw[pos:eol].split()
+        pos = eol + 1
+        if len(header) != 3:
+            # '<object> missing'
+            trees.append((prefix, {}))
+            continue
+        size = int(header[2])
+        trees.append((prefix, parse_number_tree(raw[pos:pos + size])))
+        # The contents are followed by a newline.
+        pos += size + 1
+    return trees
 
 
 def all_prefixes(depth=PREFIX_LEN):
@@ -195,6 +368,40 @@ def all_prefixes(depth=PREFIX_LEN):
             yield x
 
 
+def rev_list_unnumbered(cmd, targets, inc):
+    """Returns the (commit, parents) of the ancestors of |targets| that don't
+    have a generation number yet, parents first.
+
+    The commits that have a number are closed under ancestry, so |cmd|, a
+    `rev-list --topo-order` of |targets|, is only read until every commit
+    without a number was seen. git walks the commit-graph incrementally in
+    that case, so this avoids walking the whole history.
+    """
+    pending = {t for t in targets if get_num(t) is None}
+    rev_list = []
+    proc = subprocess2.Popen([git.GIT_EXE] + cmd,
+                             stdout=subprocess2.PIPE,
+                             stderr=subprocess2.DEVNULL)
+    try:
+        for line in proc.stdout:
+            tokens = [binascii.unhexlify(token) for token in line.split()]
+            if tokens[0] not in pending:
+                continue
+            pending.remove(tokens[0])
+            pending.update(p for p in tokens[1:] if get_num(p) is None)
+            rev_list.append((tokens[0], tokens[1:]))
+            inc()
+            if not pending:
+                break
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+    rev_list.reverse()
+    return rev_list
+
+
 def load_generation_numbers(targets):
     """Populates the caches of get_num and get_number_tree so they contain
     the results for |targets|.
@@ -207,6 +414,7 @@ def load_generation_numbers(targets):
     """
     # In case they pass us a generator, listify targets.
     targets = list(targets)
+    load_commit_graph()
 
     if all(get_num(t) is not None for t in targets):
         return
@@ -227,28 +435,23 @@ def load_generation_numbers(targets):
             empty)
         git.run('update-ref', REF, commit_hash)
 
-    with git.ScopedPool(kind=POOL_KIND) as pool:
-        preload_iter = pool.imap_unordered(preload_tree, all_prefixes())
-
-        rev_list = []
+    get_number_tree.update(preload_trees(all_prefixes()))
 
-        with git.ProgressPrinter('Loading commits: %(count)d') as inc:
+    with git.ProgressPrinter('Loading commits: %(count)d') as inc:
+        revs = ['^' + REF
+                ] + [binascii.hexlify(target).decode() for target in targets]
+        cmd = ['rev-list', '--topo-order', '--parents']
+        if COMMIT_GRAPH is None:
             # Curiously, buffering the list into memory seems to be the fastest
             # approach in python (as opposed to iterating over the lines in the
             # stdout as they're produced). GIL strikes again :/
-            cmd = [
-                'rev-list',
-                '--topo-order',
-                '--parents',
-                '--reverse',
-                '^' + REF,
-            ] + [binascii.hexlify(target).decode() for target in targets]
-            for line in git.run(*cmd).splitlines():
+            rev_list = []
+            for line in git.run(*(cmd + ['--reverse'] + revs)).splitlines():
                 tokens = [binascii.unhexlify(token) for token in line.split()]
                 rev_list.append((tokens[0], tokens[1:]))
                 inc()
-
-        get_number_tree.update(preload_iter)
+        else:
+            rev_list = rev_list_unnumbered(cmd + revs, targets, inc)
 
     with git.ProgressPrinter('Counting: %%(count)d/%d' % len(rev_list)) as inc:
         for commit_hash, pars in rev_list:
@@ -8,8 +8,11 @@ Tool to update all branches to have the latest changes from their upstreams.
 
 import argparse
 import collections
+import io
 import logging
+import multiprocessing
 import sys
+import tempfile
 import textwrap
 import os
 
@@ -148,7 +151,8 @@ def remove_empty_branches(branch_tree):
 def format_branch_name(branch):
     return BRIGHT + branch + RESET
 
-def rebase_branch(branch, parent, start_hash, no_squash):
+def rebase_branch(branch, parent, start_hash, no_squash,
+                  update_merge_base=True):
     logging.debug('considering %s(%s) -> %s(%s) : %s', branch,
                   git.hash_one(branch), parent, git.hash_one(parent),
                   start_hash)
@@ -238,12 +242,169 @@ def rebase_branch(branch, parent, start_hash, no_squash):
     else:
         print('%s up-to-date' % format_branch_name(branch))
 
-    git.remove_merge_base(branch)
-    git.get_or_create_merge_base(branch)
+    if update_merge_base:
+        git.remove_merge_base(branch)
+        git.get_or_create_merge_base(branch)
 
     return True
 
 
+def split_subtrees(branch_tree):
+    """Splits |branch_tree| into subtrees which can be rebased independently.
+
+    Returns a list of subtrees, each a list of (branch, parent) pairs in
+    topological order. No branch in one subtree is the parent of a branch in
+    another.
+    """
+    roots = {}
+    subtrees = collections.OrderedDict()
+    for branch, parent in git.topo_iter(branch_tree):
+        roots[branch] = roots.get(parent, branch)
+        subtrees.setdefault(roots[branch], []).append((branch, parent))
+    return list(subtrees.values())
+
+
+# The worktree of a rebase_subtree() worker process.
+_WORKTREE = None
+
+
+def add_worktrees(tempdir, count):
+    """Adds |count| worktrees to |tempdir|, one at a time, as concurrent
+    `git worktree add` runs race on .git/worktrees.
+
+    Returns a queue of their paths, which the workers take one each from.
+    """
+    worktrees = multiprocessing.Queue()
+    for i in range(count):
+        worktree = os.path.join(tempdir, 'worktree%d' % i)
+        git.run('worktree', 'add', '--detach', worktree)
+        worktrees.put(worktree)
+    return worktrees
+
+
+def _init_worker(worktrees):
+    """Takes the worktree of this rebase_subtree() worker from |worktrees|."""
+    global _WORKTREE
+    _WORKTREE = worktrees.get()
+
+
+def remove_worktrees(tempdir):
+    """Removes the worktrees of the rebase_subtree() workers in |tempdir|.
+
+    Also prunes those left behind by an interrupted add.
+    """
+    for name in os.listdir(tempdir):
+        git.run_with_retcode('worktree', 'remove', '--force',
+                             os.path.join(tempdir, name))
+    gclient_utils.rmtree(tempdir)
+    git.run_with_retcode('worktree', 'prune')
+
+
+def rebase_subtree(args):
+    """Rebases the branches of one subtree in the worktree of this worker.
+
+    Runs in a worker process of rebase_subtrees(). Rebasing updates the branch
+    refs, which the worktrees share with the main one. Failed rebases are
+    aborted, so the worktree can be reused for the next subtree.
+
+    Returns a list of (branch, success, output) for the considered branches;
+    success is None for dormant branches.
+    """
+    subtree, branches_to_rebase, merge_base, no_squash, keep_going = args
+    results = []
+    cwd = os.getcwd()
+    orig_stdout = sys.stdout
+    try:
+        os.chdir(_WORKTREE)
+        for branch, parent in subtree:
+            if branches_to_rebase and branch not in branches_to_rebase:
+                continue
+            sys.stdout = output = io.StringIO()
+            try:
+                if git.is_dormant(branch):
+                    print('Skipping dormant branch', format_branch_name(branch))
+                    ret = None
+                else:
+                    ret = rebase_branch(branch,
+                                        parent,
+                                        merge_base[branch],
+                                        no_squash,
+                                        update_merge_base=False)
+                    if not ret and keep_going:
+                        print('--keep-going set, continuing with next branch.')
+            finally:
+                sys.stdout = orig_stdout
+            results.append((branch, ret, output.getvalue()))
+            if ret is False:
+                if git.in_rebase():
+                    git.run_with_retcode('rebase', '--abort')
+                if not keep_going:
+                    break
+        # Don't keep the branches checked out in the worktree.
+        git.run('checkout', '--detach')
+    finally:
+        sys.stdout = orig_stdout
+        os.chdir(cwd)
+    return results
+
+
+def rebase_subtrees(branch_tree, branches_to_rebase, merge_base, opts):
+    """Rebases the independent subtrees of |branch_tree| concurrently.
+
+    Each worker rebases subtrees in its own temporary worktree, added before
+    the workers start. The worktrees are removed when done or interrupted. A
+    failure stops only the subtree it happened in. Without --keep-going, the
+    first failed rebase is then redone in this worktree, leaving it mid-rebase
+    as a serial rebase-update would.
+
+    Returns (retcode, unrebased_branches).
+    """
+    subtrees = split_subtrees(branch_tree)
+    # A branch can't be rebased in a worktree while another has it checked
+    # out. freeze() has already committed any local changes.
+    git.run('checkout', '--detach')
+    tempdir = tempfile.mkdtemp(prefix='git-rebase-update')
+    args = [(subtree, branches_to_rebase, merge_base, opts.no_squash,
+             opts.keep_going) for subtree in subtrees]
+    jobs = min(opts.jobs, len(subtrees)) or 1
+    rebased = []
+    failed = []
+    try:
+        worktrees = add_worktrees(tempdir, jobs)
+        with git.ScopedPool(jobs,
+                            kind='procs',
+                            initializer=_init_worker,
+                            initargs=(worktrees, )) as pool:
+            for results in pool.imap(rebase_subtree, args):
+                for branch, ret, output in results:
+                    if ret is False and not opts.keep_going:
+                        failed.append(branch)
+                        continue
+                    sys.stdout.write(output)
+                    if ret:
+                        rebased.append(branch)
+                    elif ret is False:
+                        failed.append(branch)
+    finally:
+        remove_worktrees(tempdir)
+    sys.stdout.flush()
+
+    for branch in rebased:
+        git.remove_merge_base(branch)
+        git.get_or_create_merge_base(branch)
+
+    if not failed:
+        return 0, []
+    if opts.keep_going:
+        return 1, failed
+    # The rebases of the other failed subtrees were aborted, so report them
+    # like --keep-going would.
+    branch = failed.pop(0)
+    rebase_branch(branch, branch_tree[branch], merge_base[branch],
+                  opts.no_squash)
+    return 1, failed
+
+
 def with_downstream_branches(base_branches, branch_tree):
     """Returns a set of base_branches and all downstream branches."""
     downstream_branches = set()
@@ -291,6 +452,13 @@ def main(args=None):
         '--no-squash',
         action='store_true',
         help='Will not try to squash branches if rebasing fails.')
+    parser.add_argument(
+        '--jobs',
+        '-j',
+        type=int,
+        default=1,
+        help='Rebase up to this many independent subtrees of branches '
+        'concurrently, in a temporary worktree per job.')
 
     opts = parser.parse_args(args)
 
@@ -340,41 +508,48 @@ def main(args=None):
     if not opts.no_fetch:
         fetch_remotes(branch_tree)
 
+    # The snapshot is taken after fetching, so the merge bases are computed
+    # against the fetched upstreams.
+    snapshot = git.RepoSnapshot.take()
     merge_base = {}
     for branch, parent in branch_tree.items():
-        merge_base[branch] = git.get_or_create_merge_base(branch, parent)
+        merge_base[branch] = snapshot.get_or_create_merge_base(branch, parent)
 
     logging.debug('branch_tree: %s' % pformat(branch_tree))
     logging.debug('merge_base: %s' % pformat(merge_base))
 
     retcode = 0
     unrebased_branches = []
-    # Rebase each branch starting with the root-most branches and working
-    # towards the leaves.
-    for branch, parent in git.topo_iter(branch_tree):
-        # Only rebase specified branches, unless none specified.
-        if branches_to_rebase and branch not in branches_to_rebase:
-            continue
-        if git.is_dormant(branch):
-            print('Skipping dormant branch', format_branch_name(branch))
-        else:
-            ret = rebase_branch(branch, parent, merge_base[branch],
-                                opts.no_squash)
-            if not ret:
-                retcode = 1
-
-                if opts.keep_going:
-                    print('--keep-going set, continuing with next branch.')
-                    unrebased_branches.append(branch)
-                    if git.in_rebase():
-                        git.run_with_retcode('rebase', '--abort')
-                    if git.in_rebase():  # pragma: no cover
-                        print(
-                            'Failed to abort rebase. Something is really wrong.'
-                        )
+    if opts.jobs > 1:
+        retcode, unrebased_branches = rebase_subtrees(branch_tree,
+                                                      branches_to_rebase,
+                                                      merge_base, opts)
+    else:
+        # Rebase each branch starting with the root-most branches and working
+        # towards the leaves.
+        for branch, parent in git.topo_iter(branch_tree):
+            # Only rebase specified branches, unless none specified.
+            if branches_to_rebase and branch not in branches_to_rebase:
+                continue
+            if git.is_dormant(branch):
+                print('Skipping dormant branch', format_branch_name(branch))
+            else:
+                ret = rebase_branch(branch, parent, merge_base[branch],
+                                    opts.no_squash)
+                if not ret:
+                    retcode = 1
+
+                    if opts.keep_going:
+                        print('--keep-going set, continuing with next branch.')
+                        unrebased_branches.append(branch)
+                        if git.in_rebase():
+                            git.run_with_retcode('rebase', '--abort')
+                        if git.in_rebase():  # pragma: no cover
+                            print('Failed to abort rebase. Something is '
+                                  'really wrong.')
+                            break
+                    else:
                         break
-                else:
-                    break
 
     if unrebased_branches:
         print()
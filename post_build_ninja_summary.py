@@ -48,12 +48,22 @@ of tasks that were running in parallel. This makes it an excellent approximation
 of how "important" a slow step was. A link that is entirely or mostly serialized
 will have a weighted time that is the same or similar to its elapsed time. A
 compile that runs in parallel with 999 other compiles will have a weighted time
-that is tiny."""
+that is tiny.
+
+With --timeline, the report instead shows how many of the build slots were idle
+over time and the critical path: the chain of serial steps that bounded the
+build, found with the dependencies in build.ninja when it is present.
+--trace-json writes the build steps as Chrome trace-event JSON."""
 
 import argparse
+import array
+import bisect
 import errno
 import fnmatch
+import heapq
+import json
 import os
+import re
 import subprocess
 import sys
 
@@ -65,112 +75,209 @@ long_count = 10
 long_ext_count = 10
 
 
-class Target:
-    """Represents a single line read for a .ninja_log file."""
-    def __init__(self, start, end):
-        """Creates a target object by passing in the start/end times in seconds
-        as a float."""
-        self.start = start
-        self.end = end
-        # A list of targets, appended to by the owner of this object.
-        self.targets = []
-        self.weighted_duration = 0.0
-
-    def Duration(self):
-        """Returns the task duration in seconds as a float."""
-        return self.end - self.start
-
-    def SetWeightedDuration(self, weighted_duration):
-        """Sets the duration, in seconds, passed in as a float."""
-        self.weighted_duration = weighted_duration
-
-    def WeightedDuration(self):
-        """Returns the task's weighted duration in seconds as a float.
-
-        Weighted_duration takes the elapsed time of the task and divides it
-        by how many other tasks were running at the same time. Thus, it
-        represents the approximate impact of this task on the total build time,
-        with serialized or serializing steps typically ending up with much
-        longer weighted durations.
-        weighted_duration should always be the same or shorter than duration.
-        """
-        # Allow for modest floating-point errors
-        epsilon = 0.000002
-        if self.weighted_duration > self.Duration() + epsilon:
-            print("%s > %s?" % (self.weighted_duration, self.Duration()))
-        assert self.weighted_duration <= self.Duration() + epsilon
-        return self.weighted_duration
-
-    def DescribeTargets(self):
-        """Returns a printable string that summarizes the targets."""
+class NinjaLog:
+    """The build steps read from a .ninja_log file, stored column by column.
+
+    Step i ran from starts[i] to ends[i], in seconds, and produced the files
+    in outputs[i]. Its weighted duration is filled in by
+    ComputeWeightedDurations.
+    """
+    def __init__(self):
+        self.starts = array.array("d")
+        self.ends = array.array("d")
+        self.outputs = []
+        self.weighted_durations = array.array("d")
+        # Maps the command hash of each step to its index.
+        self._steps_by_cmdhash = {}
+
+    def __len__(self):
+        return len(self.outputs)
+
+    def Duration(self, step):
+        """Returns the duration of |step| in seconds as a float."""
+        return self.ends[step] - self.starts[step]
+
+    def DescribeOutputs(self, step):
+        """Returns a printable string that summarizes the outputs of |step|."""
         # Some build steps generate dozens of outputs - handle them sanely.
         # The max_length was chosen so that it can fit most of the long
         # single-target names, while minimizing word wrapping.
-        result = ", ".join(self.targets)
+        result = ", ".join(self.outputs[step])
         max_length = 65
         if len(result) > max_length:
             result = result[:max_length] + "..."
         return result
 
 
+def _ParseLine(line):
+    """Returns the (start, end, name, cmdhash) of a .ninja_log line.
+
+    Returns None for a corrupt line."""
+    parts = line.strip().split("\t")
+    if len(parts) != 5:
+        # If ninja.exe is rudely halted then the .ninja_log file may be
+        # corrupt. Silently continue.
+        return None
+    start, end, _, name, cmdhash = parts  # Ignore restat.
+    # Convert from integral milliseconds to float seconds.
+    return int(start) / 1000.0, int(end) / 1000.0, name, cmdhash
+
+
+def _ReadLinesBackwards(log, block_size=1 << 20):
+    """Yields the remaining lines of |log| from the last one to the first.
+
+    The lines of a file are read backwards |block_size| bytes at a time, so
+    that only the end of a large file is read when the caller stops early.
+    """
+    buffer = getattr(log, "buffer", None)
+    if buffer is None or not buffer.seekable():
+        # Not a file, e.g. an in-memory stream.
+        yield from reversed(log.readlines())
+        return
+    stop = log.tell()
+    position = buffer.seek(0, os.SEEK_END)
+    partial = b""
+    while position > stop:
+        size = min(block_size, position - stop)
+        position -= size
+        buffer.seek(position)
+        lines = (buffer.read(size) + partial).split(b"\n")
+        partial = lines[0]
+        for line in reversed(lines[1:]):
+            yield line.decode(log.encoding, log.errors)
+    yield partial.decode(log.encoding, log.errors)
+
+
+def _ParseLastBuild(lines):
+    """Returns the parsed lines of the last build, given the |lines| of a log
+    from the last one to the first.
+
+    An earlier end time than the one of the line before means that a new build,
+    possibly an incremental build, started. Records are written to the
+    .ninja_log file when commands complete, so end times are otherwise in
+    order. Only the lines of the last build and the one before it are parsed.
+    """
+    records = []
+    for line in lines:
+        parsed = _ParseLine(line)
+        if not parsed:
+            continue
+        if records and records[-1][1] < parsed[1]:
+            break
+        records.append(parsed)
+    records.reverse()
+    return records
+
+
 # Copied with some modifications from ninjatracing
-def ReadTargets(log, show_all):
-    """Reads all targets from .ninja_log file |log_file|, sorted by duration.
+def ReadNinjaLog(log, show_all):
+    """Reads the build steps of .ninja_log file |log| into a NinjaLog.
 
-    The result is a list of Target objects."""
+    Unless |show_all| is set, only the steps of the last build are read."""
+    result = NinjaLog()
     header = log.readline()
-    # Handle empty ninja_log gracefully by silently returning an empty list of
-    # targets.
+    # Handle empty ninja_log gracefully by silently returning no steps.
     if not header:
-        return []
+        return result
     assert header in ("# ninja log v5\n", "# ninja log v6\n"), (
         "unrecognized ninja log version %r" % header)
-    targets_dict = {}
-    last_end_seen = 0.0
-    for line in log:
-        parts = line.strip().split("\t")
-        if len(parts) != 5:
-            # If ninja.exe is rudely halted then the .ninja_log file may be
-            # corrupt. Silently continue.
-            continue
-        start, end, _, name, cmdhash = parts  # Ignore restat.
-        # Convert from integral milliseconds to float seconds.
-        start = int(start) / 1000.0
-        end = int(end) / 1000.0
-        if not show_all and end < last_end_seen:
-            # An earlier time stamp means that this step is the first in a new
-            # build, possibly an incremental build. Throw away the previous
-            # data so that this new build will be displayed independently.
-            # This has to be done by comparing end times because records are
-            # written to the .ninja_log file when commands complete, so end
-            # times are guaranteed to be in order, but start times are not.
-            targets_dict = {}
-        target = None
-        if cmdhash in targets_dict:
-            target = targets_dict[cmdhash]
-            if not show_all and (target.start != start or target.end != end):
-                # If several builds in a row just run one or two build steps
-                # then the end times may not go backwards so the last build may
-                # not be detected as such. However in many cases there will be a
-                # build step repeated in the two builds and the changed
-                # start/stop points for that command, identified by the hash,
-                # can be used to detect and reset the target dictionary.
-                targets_dict = {}
-                target = None
-        if not target:
-            targets_dict[cmdhash] = target = Target(start, end)
-        last_end_seen = end
-        target.targets.append(name)
-    return list(targets_dict.values())
-
-
-def GetExtension(target, extra_patterns):
-    """Return the file extension that best represents a target.
-
-    For targets that generate multiple outputs it is important to return a
+    if show_all:
+        records = filter(None, map(_ParseLine, log))
+    else:
+        records = _ParseLastBuild(_ReadLinesBackwards(log))
+
+    for start, end, name, cmdhash in records:
+        step = result._steps_by_cmdhash.get(cmdhash)
+        if step is not None and not show_all and (
+                result.starts[step] != start or result.ends[step] != end):
+            # If several builds in a row just run one or two build steps then
+            # the end times may not go backwards so the last build may not be
+            # detected as such. However in many cases there will be a build
+            # step repeated in the two builds and the changed start/stop points
+            # for that command, identified by the hash, can be used to detect
+            # and reset the steps.
+            result = NinjaLog()
+            step = None
+        if step is None:
+            step = len(result.outputs)
+            result._steps_by_cmdhash[cmdhash] = step
+            result.starts.append(start)
+            result.ends.append(end)
+            result.outputs.append([])
+        result.outputs[step].append(name)
+    return result
+
+
+def ComputeWeightedDurations(ninja_log):
+    """Computes the weighted duration of each step of |ninja_log|.
+
+    The weighted duration of a step is its elapsed time divided by how many
+    steps were running at the same time. Thus, it represents the approximate
+    impact of the step on the total build time, with serialized or serializing
+    steps typically ending up with much longer weighted durations.
+
+    Returns:
+        The sum of the weighted durations.
+    """
+    starts = ninja_log.starts
+    ends = ninja_log.ends
+    num_steps = len(starts)
+    weighted_durations = array.array("d", bytes(8 * num_steps))
+    ninja_log.weighted_durations = weighted_durations
+    if not num_steps:
+        return 0.0
+
+    # Sweep over the start and stop times of all steps in order. If a step
+    # starts and stops at the same time then the start comes first, which is
+    # important for making this work correctly. Steps starting or stopping at
+    # the same time are processed in the order they were read.
+    start_order = sorted(range(num_steps), key=starts.__getitem__)
+    stop_order = sorted(range(num_steps), key=ends.__getitem__)
+    # The accumulated weighted time when each running step started, so that
+    # its own weighted time can easily be calculated when it stops.
+    started_at = array.array("d", bytes(8 * num_steps))
+    num_running = 0
+    weighted_total = 0.0
+    last_weighted_time = 0.0
+    last_time = starts[start_order[0]]
+    next_start = 0
+    for next_stop in stop_order:
+        stop_time = ends[next_stop]
+        while next_start < num_steps:
+            step = start_order[next_start]
+            time = starts[step]
+            if time > stop_time:
+                break
+            if num_running:
+                last_weighted_time += (time - last_time) / float(num_running)
+            started_at[step] = last_weighted_time
+            num_running += 1
+            last_time = time
+            next_start += 1
+        if num_running:
+            last_weighted_time += (stop_time - last_time) / float(num_running)
+        weighted_duration = last_weighted_time - started_at[next_stop]
+        weighted_durations[next_stop] = weighted_duration
+        weighted_total += weighted_duration
+        num_running -= 1
+        last_time = stop_time
+    assert num_running == 0
+
+    # Allow for modest floating-point errors. weighted_duration should always
+    # be the same or shorter than duration.
+    epsilon = 0.000002
+    for step in range(num_steps):
+        assert weighted_durations[step] <= ends[step] - starts[step] + epsilon
+    return weighted_total
+
+
+def GetExtension(outputs, extra_patterns):
+    """Return the file extension that best represents a build step's outputs.
+
+    For steps that generate multiple outputs it is important to return a
     consistent 'canonical' extension. Ultimately the goal is to group build
     steps by type."""
-    for output in target.targets:
+    for output in outputs:
         if extra_patterns:
             for fn_pattern in extra_patterns.split(";"):
                 if fnmatch.fnmatch(output, "*" + fn_pattern + "*"):
@@ -211,65 +318,20 @@ def GetExtension(target, extra_patterns):
     return extension
 
 
-def SummarizeEntries(entries, extra_step_types, elapsed_time_sorting):
-    """Print a summary of the passed in list of Target objects."""
-
-    # Create a list that is in order by time stamp and has entries for the
-    # beginning and ending of each build step (one time stamp may have multiple
-    # entries due to multiple steps starting/stopping at exactly the same time).
-    # Iterate through this list, keeping track of which tasks are running at all
-    # times. At each time step calculate a running total for weighted time so
-    # that when each task ends its own weighted time can easily be calculated.
-    task_start_stop_times = []
+def SummarizeNinjaLog(ninja_log, extra_step_types, elapsed_time_sorting):
+    """Print a summary of the build steps of the passed in NinjaLog."""
+    starts = ninja_log.starts
+    ends = ninja_log.ends
+    num_steps = len(ninja_log)
 
-    earliest = -1
-    latest = 0
-    total_cpu_time = 0
-    for target in entries:
-        if earliest < 0 or target.start < earliest:
-            earliest = target.start
-        if target.end > latest:
-            latest = target.end
-        total_cpu_time += target.Duration()
-        task_start_stop_times.append((target.start, "start", target))
-        task_start_stop_times.append((target.end, "stop", target))
+    earliest = min(starts)
+    latest = max(0, max(ends))
     length = latest - earliest
-    weighted_total = 0.0
-
-    # Sort by the time/type records and ignore |target|
-    task_start_stop_times.sort(key=lambda times: times[:2])
-    # Now we have all task start/stop times sorted by when they happen. If a
-    # task starts and stops on the same time stamp then the start will come
-    # first because of the alphabet, which is important for making this work
-    # correctly.
-    # Track the tasks which are currently running.
-    running_tasks = {}
-    # Record the time we have processed up to so we know how to calculate time
-    # deltas.
-    last_time = task_start_stop_times[0][0]
-    # Track the accumulated weighted time so that it can efficiently be added
-    # to individual tasks.
-    last_weighted_time = 0.0
-    # Scan all start/stop events.
-    for event in task_start_stop_times:
-        time, action_name, target = event
-        # Accumulate weighted time up to now.
-        num_running = len(running_tasks)
-        if num_running > 0:
-            # Update the total weighted time up to this moment.
-            last_weighted_time += (time - last_time) / float(num_running)
-        if action_name == "start":
-            # Record the total weighted task time when this task starts.
-            running_tasks[target] = last_weighted_time
-        if action_name == "stop":
-            # Record the change in the total weighted task time while this task
-            # ran.
-            weighted_duration = last_weighted_time - running_tasks[target]
-            target.SetWeightedDuration(weighted_duration)
-            weighted_total += weighted_duration
-            del running_tasks[target]
-        last_time = time
-    assert len(running_tasks) == 0
+    total_cpu_time = 0
+    for step in range(num_steps):
+        total_cpu_time += ends[step] - starts[step]
+    weighted_total = ComputeWeightedDurations(ninja_log)
+    weighted_durations = ninja_log.weighted_durations
 
     # Warn if the sum of weighted times is off by more than half a second.
     if abs(length - weighted_total) > 500:
@@ -280,27 +342,27 @@ def SummarizeEntries(entries, extra_step_types, elapsed_time_sorting):
     # Print the slowest build steps:
     print("    Longest build steps:")
     if elapsed_time_sorting:
-        entries.sort(key=lambda x: x.Duration())
+        order = sorted(range(num_steps), key=ninja_log.Duration)
     else:
-        entries.sort(key=lambda x: x.WeightedDuration())
-    for target in entries[-long_count:]:
+        order = sorted(range(num_steps), key=weighted_durations.__getitem__)
+    for step in order[-long_count:]:
         print("      %8.1f weighted s to build %s (%.1f s elapsed time)" % (
-            target.WeightedDuration(),
-            target.DescribeTargets(),
-            target.Duration(),
+            weighted_durations[step],
+            ninja_log.DescribeOutputs(step),
+            ninja_log.Duration(step),
         ))
 
     # Sum up the time by file extension/type of the output file
     count_by_ext = {}
     time_by_ext = {}
     weighted_time_by_ext = {}
-    # Scan through all of the targets to build up per-extension statistics.
-    for target in entries:
-        extension = GetExtension(target, extra_step_types)
+    # Scan through all of the steps to build up per-extension statistics.
+    for step in order:
+        extension = GetExtension(ninja_log.outputs[step], extra_step_types)
         time_by_ext[extension] = (time_by_ext.get(extension, 0) +
-                                  target.Duration())
+                                  ends[step] - starts[step])
         weighted_time_by_ext[extension] = (
-            weighted_time_by_ext.get(extension, 0) + target.WeightedDuration())
+            weighted_time_by_ext.get(extension, 0) + weighted_durations[step])
         count_by_ext[extension] = count_by_ext.get(extension, 0) + 1
 
     print("    Time by build-step type:")
@@ -325,7 +387,313 @@ def SummarizeEntries(entries, extra_step_types, elapsed_time_sorting):
           "parallelism)" %
           (length, total_cpu_time, total_cpu_time * 1.0 / length))
     print("    %d build steps completed, average of %1.2f/s" %
-          (len(entries), len(entries) / (length)))
+          (num_steps, num_steps / (length)))
+
+
+# Matches a path, or one of the separators, of a build statement in a
+# build.ninja file.
+_BUILD_TOKEN_RE = re.compile(r"((?:\$.|[^\s$:|])+)|(\|\||\|@|\||:)")
+
+
+def _UnescapePath(path):
+    """Removes the $ escapes of a path from a build.ninja file."""
+    if "$" not in path:
+        return path
+    return re.sub(r"\$(.)", r"\1", path)
+
+
+def _ReadNinjaStatements(build_dir, path, seen):
+    """Yields the build statements of build.ninja file |path| and of the files
+    it includes, with their continuation lines joined."""
+    if path in seen:
+        return
+    seen.add(path)
+    with open(os.path.join(build_dir, path), "r", errors="replace") as f:
+        statement = ""
+        for line in f:
+            line = line.rstrip("\n")
+            # A $ at the end of a line, which isn't itself escaped, continues
+            # the statement on the next line.
+            escapes = len(line) - len(line.rstrip("$"))
+            if escapes % 2:
+                statement += line[:-1]
+                continue
+            statement += line
+            if statement.startswith(("subninja ", "include ")):
+                yield from _ReadNinjaStatements(
+                    build_dir,
+                    _UnescapePath(statement.split(None, 1)[1].strip()), seen)
+            elif statement.startswith("build "):
+                yield statement
+            statement = ""
+
+
+def ReadBuildGraph(build_ninja):
+    """Reads the build statements of |build_ninja| and the files it includes.
+
+    Paths are relative to the directory of |build_ninja|, like in .ninja_log.
+    Variables in paths aren't expanded, which is fine for GN generated files.
+
+    Returns:
+        A dict mapping each output to the list of inputs of the statement
+        that builds it, including implicit and order-only inputs.
+    """
+    inputs_by_output = {}
+    build_dir, path = os.path.split(build_ninja)
+    for statement in _ReadNinjaStatements(build_dir, path, set()):
+        outputs = []
+        inputs = []
+        current = outputs
+        rule_expected = False
+        for match in _BUILD_TOKEN_RE.finditer(statement, len("build ")):
+            path, separator = match.groups()
+            if separator == ":":
+                current = inputs
+                rule_expected = True
+            elif separator == "|@":
+                # Validations don't need to be built before the outputs.
+                break
+            elif separator:
+                continue
+            elif rule_expected:
+                rule_expected = False
+            else:
+                current.append(_UnescapePath(path))
+        for output in outputs:
+            inputs_by_output[output] = inputs
+    return inputs_by_output
+
+
+def _GetPredecessors(ninja_log, inputs_by_output, step, step_by_output):
+    """Returns the steps of |ninja_log| that |step| depends on.
+
+    Inputs that weren't built by this build, like phony targets and files
+    that were up to date, are followed to the steps that built their inputs.
+    """
+    predecessors = set()
+    pending = [
+        path for output in ninja_log.outputs[step]
+        for path in inputs_by_output.get(output, ())
+    ]
+    visited = set()
+    while pending:
+        path = pending.pop()
+        if path in visited:
+            continue
+        visited.add(path)
+        if path in step_by_output:
+            predecessors.add(step_by_output[path])
+        else:
+            pending.extend(inputs_by_output.get(path, ()))
+    predecessors.discard(step)
+    return predecessors
+
+
+def FindCriticalPath(ninja_log, inputs_by_output=None):
+    """Returns the chain of serial steps that bounded the build, in order.
+
+    The chain ends with the step that finished last. Each step before is the
+    one that finished last among those the next step waited for: its
+    dependencies according to |inputs_by_output|, as returned by
+    ReadBuildGraph, or else all the steps that finished before it started.
+    """
+    starts = ninja_log.starts
+    ends = ninja_log.ends
+    num_steps = len(ninja_log)
+    if not num_steps:
+        return []
+    if inputs_by_output is not None:
+        step_by_output = {}
+        for step, outputs in enumerate(ninja_log.outputs):
+            for output in outputs:
+                step_by_output[output] = step
+    else:
+        stop_order = sorted(range(num_steps), key=ends.__getitem__)
+        sorted_ends = [ends[step] for step in stop_order]
+
+    step = max(range(num_steps), key=ends.__getitem__)
+    path = [step]
+    while True:
+        if inputs_by_output is not None:
+            candidates = _GetPredecessors(ninja_log, inputs_by_output, step,
+                                          step_by_output)
+            candidates = [
+                candidate for candidate in candidates
+                if ends[candidate] <= starts[step]
+            ]
+            if not candidates:
+                break
+            step = max(candidates, key=lambda c: (ends[c], -c))
+        else:
+            index = bisect.bisect_right(sorted_ends, starts[step])
+            if not index:
+                break
+            step = stop_order[index - 1]
+        path.append(step)
+    path.reverse()
+    return path
+
+
+def ComputeConcurrency(ninja_log):
+    """Returns the concurrency curve of the build.
+
+    Returns:
+        A list of (time, running) tuples, in order, where |running| is the
+        number of steps running from |time| until the next time of the list.
+    """
+    starts = sorted(ninja_log.starts)
+    ends = sorted(ninja_log.ends)
+    curve = []
+    running = 0
+    next_start = 0
+    for end in ends:
+        # Steps start before others stop at the same time, like in
+        # ComputeWeightedDurations. Only the last count of a time is kept.
+        while next_start < len(starts) and starts[next_start] <= end:
+            running += 1
+            time = starts[next_start]
+            next_start += 1
+            if curve and curve[-1][0] == time:
+                curve[-1] = (time, running)
+            else:
+                curve.append((time, running))
+        running -= 1
+        if curve and curve[-1][0] == end:
+            curve[-1] = (end, running)
+        else:
+            curve.append((end, running))
+    return curve
+
+
+def _AssignLanes(ninja_log):
+    """Returns a lane for each step so that steps in a lane don't overlap."""
+    starts = ninja_log.starts
+    ends = ninja_log.ends
+    lanes = [0] * len(ninja_log)
+    free_lanes = []
+    running = []
+    for step in sorted(range(len(ninja_log)), key=starts.__getitem__):
+        while running and running[0][0] <= starts[step]:
+            heapq.heappush(free_lanes, heapq.heappop(running)[1])
+        if free_lanes:
+            lane = heapq.heappop(free_lanes)
+        else:
+            lane = len(running)
+        lanes[step] = lane
+        heapq.heappush(running, (ends[step], lane))
+    return lanes
+
+
+def WriteTraceEvents(ninja_log, critical_path, extra_step_types, f):
+    """Writes the steps of |ninja_log| to |f| as Chrome trace-event JSON.
+
+    Each step runs on one of the threads of the build process, and the steps
+    of |critical_path| are repeated on a thread of their own."""
+    events = [{
+        "name": "thread_name",
+        "ph": "M",
+        "pid": 1,
+        "tid": 0,
+        "args": {
+            "name": "critical path"
+        },
+    }]
+    critical_steps = set(critical_path)
+    lanes = _AssignLanes(ninja_log)
+    for step in range(len(ninja_log)):
+        event = {
+            "name": ninja_log.DescribeOutputs(step),
+            "cat": GetExtension(ninja_log.outputs[step], extra_step_types),
+            "ph": "X",
+            "ts": round(ninja_log.starts[step] * 1000000),
+            "dur": round(ninja_log.Duration(step) * 1000000),
+            "pid": 1,
+            "tid": lanes[step] + 1,
+            "args": {
+                "outputs": ninja_log.outputs[step],
+                "critical_path": step in critical_steps,
+            },
+        }
+        if ninja_log.weighted_durations:
+            event["args"]["weighted_duration"] = (
+                ninja_log.weighted_durations[step])
+        events.append(event)
+        if step in critical_steps:
+            events.append(dict(event, tid=0))
+    json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def SummarizeTimeline(ninja_log, critical_path, uses_deps, slots,
+                      num_windows):
+    """Print how busy the build was over time and what bounded it.
+
+    Args:
+        ninja_log: The NinjaLog of the build.
+        critical_path: The steps returned by FindCriticalPath.
+        uses_deps: Whether the critical path was found with build.ninja deps.
+        slots: The number of steps that could run in parallel, or None to use
+            the peak concurrency.
+        num_windows: The number of time windows to report idle slots for.
+    """
+    starts = ninja_log.starts
+    ends = ninja_log.ends
+    earliest = min(starts)
+    length = max(ends) - earliest
+    curve = ComputeConcurrency(ninja_log)
+    peak = max(running for _, running in curve)
+    slots = slots or peak
+    total_cpu_time = 0
+    for step in range(len(ninja_log)):
+        total_cpu_time += ends[step] - starts[step]
+
+    print("    Build timeline (%.1f s, %d slots):" % (length, slots))
+    print("      Concurrency: peak %d, average %.1f, %.1f%% of the slots "
+          "idle" % (peak, total_cpu_time / length if length else 0,
+                    _IdlePercent(total_cpu_time, slots * length)))
+
+    # Add up the time the steps ran within each window.
+    window_length = length / num_windows
+    busy_by_window = [0.0] * num_windows
+    if window_length:
+        for step in range(len(ninja_log)):
+            start = starts[step] - earliest
+            end = ends[step] - earliest
+            first = min(int(start / window_length), num_windows - 1)
+            last = min(int(end / window_length), num_windows - 1)
+            for window in range(first, last + 1):
+                window_start = window * window_length
+                busy_by_window[window] += (
+                    min(end, window_start + window_length) -
+                    max(start, window_start))
+    print("      Idle slots by time window:")
+    for window, busy in enumerate(busy_by_window):
+        print("        %8.1f - %8.1f s  %5.1f%% idle" %
+              (window * window_length, (window + 1) * window_length,
+               _IdlePercent(busy, slots * window_length)))
+
+    path_time = sum(ninja_log.Duration(step) for step in critical_path)
+    print("    Critical path (%.1f s of steps, %d steps, %s):" %
+          (path_time, len(critical_path),
+           "from build.ninja deps" if uses_deps else "from step times only"))
+    for step in critical_path[-long_count:]:
+        print("      %8.1f s at %8.1f s to build %s" %
+              (ninja_log.Duration(step), starts[step] - earliest,
+               ninja_log.DescribeOutputs(step)))
+
+
+def _IdlePercent(busy, capacity):
+    """Returns the percentage of |capacity| that isn't |busy|."""
+    if capacity <= 0:
+        return 0.0
+    return max(0.0, 100.0 * (1 - busy / capacity))
+
+
+def _PositiveInt(value):
+    """Parses a command line argument that must be an integer above 0."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("must be at least 1: %s" % value)
+    return number
 
 
 def main():
@@ -347,10 +715,37 @@ def main():
     )
     parser.add_argument("--log-file",
                         help="specific ninja log file to analyze.")
+    parser.add_argument(
+        "--timeline",
+        action="store_true",
+        help="Report the concurrency over time, the idle slots and the "
+        "critical path of the build instead of the time by build-step type",
+    )
+    parser.add_argument(
+        "--timeline-windows",
+        type=_PositiveInt,
+        default=10,
+        help="Number of time windows to report idle slots for "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "-j",
+        dest="jobs",
+        type=_PositiveInt,
+        help="Number of build slots the timeline is compared to. Defaults to "
+        "the peak number of steps that ran in parallel.",
+    )
+    parser.add_argument(
+        "--trace-json",
+        help="Write the build steps and the critical path to this file as "
+        "Chrome trace-event JSON, viewable in chrome://tracing or Perfetto",
+    )
     args, _extra_args = parser.parse_known_args()
+    build_ninja = "build.ninja"
     if args.build_directory:
         log_file = os.path.join(args.build_directory, log_file)
         metrics_file = os.path.join(args.build_directory, metrics_file)
+        build_ninja = os.path.join(args.build_directory, build_ninja)
     if args.log_file:
         log_file = args.log_file
     if not args.step_types:
@@ -377,13 +772,31 @@ def main():
 
     try:
         with open(log_file, "r") as log:
-            entries = ReadTargets(log, False)
-            if entries:
-                SummarizeEntries(entries, args.step_types,
-                                 args.elapsed_time_sorting)
+            ninja_log = ReadNinjaLog(log, False)
     except IOError:
         print("Log file %r not found, no build summary created." % log_file)
         return errno.ENOENT
+    if not ninja_log:
+        return 0
+
+    if not args.timeline:
+        SummarizeNinjaLog(ninja_log, args.step_types,
+                          args.elapsed_time_sorting)
+    if args.timeline or args.trace_json:
+        inputs_by_output = None
+        if os.path.exists(build_ninja):
+            inputs_by_output = ReadBuildGraph(build_ninja)
+        critical_path = FindCriticalPath(ninja_log, inputs_by_output)
+        if args.timeline:
+            SummarizeTimeline(ninja_log, critical_path,
+                              inputs_by_output is not None, args.jobs,
+                              args.timeline_windows)
+        if args.trace_json:
+            if not ninja_log.weighted_durations:
+                ComputeWeightedDurations(ninja_log)
+            with open(args.trace_json, "w") as f:
+                WriteTraceEvents(ninja_log, critical_path, args.step_types, f)
+    return 0
 
 
 if __name__ == "__main__":
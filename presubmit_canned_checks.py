@@ -7,7 +7,9 @@ import datetime
 import functools
 import io as _io
 import os as _os
+import re as _re
 import time
+import weakref as _weakref
 
 import metadata.discover
 import metadata.validate
@@ -70,6 +72,110 @@ OFF_UNLESS_MANUALLY_ENABLED_LINT_FILTERS = [
 
 _CORP_LINK_KEYWORD = '.corp.google'
 
+### Per-line rules
+
+
+class _LineRule(object):
+    """A per-line rule for _FindNewViolationsOfRule().
+
+    |pattern| is a regular expression which matches every line that could
+    violate the rule; |predicate| takes a file extension and a line and returns
+    True if the rule is satisfied. The pattern is searched in the lines joined
+    with line breaks, in MULTILINE mode. It must not match line breaks, except
+    for a leading one which stands for the start of the line: with re, '\\n.'
+    is much faster to search than '^.'.
+
+    A _LineRule can be used as a plain callable rule, too.
+    """
+    def __init__(self, name, pattern, predicate):
+        self.name = name
+        self.pattern = pattern
+        self.predicate = predicate
+        self._regex = _re.compile(pattern, _re.MULTILINE)
+
+    def __call__(self, extension, line):
+        return self.predicate(extension, line)
+
+    def Violates(self, lines, text, extension):
+        """Returns True if some of |lines| violates the rule.
+
+        |text| is the lines joined with line breaks, after a leading one.
+        """
+        index = -1  # Of the line the last match is in.
+        counted = 0  # Up to where the line breaks were counted.
+        pos = 0
+        while True:
+            m = self._regex.search(text, pos)
+            if not m:
+                return False
+            index += text.count('\n', counted, m.start() + 1)
+            counted = m.start() + 1
+            if not self.predicate(extension, lines[index]):
+                return True
+            # Resume at the line break before the next line.
+            pos = text.find('\n', counted)
+            if pos < 0:
+                return False
+
+
+# The registered rules, by name. The line scanner evaluates all of them at
+# once.
+_LINE_RULES = {}
+
+
+def _RegisterLineRule(name, pattern, predicate):
+    """Registers a per-line rule, replacing any rule with the same name.
+
+    Returns the _LineRule, to pass to _FindNewViolationsOfRule().
+    """
+    rule = _LineRule(name, pattern, predicate)
+    _LINE_RULES[name] = rule
+    return rule
+
+
+class _LineScanner(object):
+    """Evaluates all the registered rules on a file at once.
+
+    The first time a rule is evaluated on a file, all the registered rules
+    which weren't yet are: the new contents are read and joined once, each
+    pattern is searched in them, and only the lines it matches are passed to
+    the predicate. The results are kept for as long as the file object lives
+    so, like AffectedFile.NewContents(), this assumes the files don't change
+    during a presubmit run.
+    """
+    def __init__(self):
+        # {file: {(extension, rule name): True if some line violates it}}
+        self._results = _weakref.WeakKeyDictionary()
+
+    def Violates(self, f, extension, rule):
+        """Returns True if some line of the new contents of |f| violates
+        |rule|."""
+        results = self._results.setdefault(f, {})
+        key = (extension, rule.name)
+        if key not in results:
+            rules = {
+                name: r
+                for name, r in _LINE_RULES.items()
+                if (extension, name) not in results
+            }
+            rules[rule.name] = rule
+            lines = list(f.NewContents())
+            text = '\n' + '\n'.join(lines)
+            if text.count('\n') != len(lines):
+                # Some lines have line breaks, which the patterns don't account
+                # for, so check every line.
+                for name, r in rules.items():
+                    results[(extension, name)] = not all(
+                        r.predicate(extension, line) for line in lines)
+            else:
+                for name, r in rules.items():
+                    results[(extension, name)] = r.Violates(
+                        lines, text, extension)
+        return results[key]
+
+
+_LINE_SCANNER = _LineScanner()
+
 ### Description checks
 
 
@@ -237,33 +343,46 @@ def CheckAuthorizedAuthor(input_api, output_api, bot_allowlist=None):
     return []
 
 
+# Keyword is concatenated to avoid presubmit check rejecting the CL.
+_DO_NOT_SUBMIT_KEYWORD = 'DO NOT ' + 'SUBMIT'
+
+
+def _DoNotSubmitRule(extension, line):
+    try:
+        return _DO_NOT_SUBMIT_KEYWORD not in line
+    # Fallback to True for non-text content
+    except UnicodeDecodeError:
+        return True
+
+
+_DO_NOT_SUBMIT_RULE = _RegisterLineRule('do-not-submit',
+                                        _re.escape(_DO_NOT_SUBMIT_KEYWORD),
+                                        _DoNotSubmitRule)
+
+
 def CheckDoNotSubmitInFiles(input_api, output_api):
     """Checks that the user didn't add 'DO NOT ''SUBMIT' to any files."""
     # We want to check every text file, not just source files.
     file_filter = lambda x: x
 
-    # Keyword is concatenated to avoid presubmit check rejecting the CL.
-    keyword = 'DO NOT ' + 'SUBMIT'
-
-    def DoNotSubmitRule(extension, line):
-        try:
-            return keyword not in line
-        # Fallback to True for non-text content
-        except UnicodeDecodeError:
-            return True
-
-    errors = _FindNewViolationsOfRule(DoNotSubmitRule, input_api, file_filter)
-    text = '\n'.join('Found %s in %s' % (keyword, loc) for loc in errors)
+    errors = _FindNewViolationsOfRule(_DO_NOT_SUBMIT_RULE, input_api,
+                                      file_filter)
+    text = '\n'.join('Found %s in %s' % (_DO_NOT_SUBMIT_KEYWORD, loc)
+                     for loc in errors)
     if text:
         return [output_api.PresubmitError(text)]
     return []
 
 
+_CORP_LINK_RULE = _RegisterLineRule(
+    'corp-link', _re.escape(_CORP_LINK_KEYWORD),
+    lambda _, line: _CORP_LINK_KEYWORD not in line)
+
+
 def CheckCorpLinksInFiles(input_api, output_api, source_file_filter=None):
     """Checks that files do not contain a corp link."""
-    errors = _FindNewViolationsOfRule(
-        lambda _, line: _CORP_LINK_KEYWORD not in line, input_api,
-        source_file_filter)
+    errors = _FindNewViolationsOfRule(_CORP_LINK_RULE, input_api,
+                                      source_file_filter)
     text = '\n'.join('Found corp link in %s' % loc for loc in errors)
     if text:
         return [output_api.PresubmitPromptWarning(text)]
@@ -296,8 +415,15 @@ def CheckChangeLintsClean(input_api,
                           output_api,
                           source_file_filter=None,
                           lint_filters=None,
-                          verbose_level=None):
-    """Checks that all '.cc' and '.h' files pass cpplint.py."""
+                          verbose_level=None,
+                          jobs=None,
+                          cache_dir=None):
+    """Checks that all '.cc' and '.h' files pass cpplint.py.
+
+    The files are linted by |jobs| processes, defaulting to one per CPU.
+    The errors found are cached in |cache_dir|, defaulting to
+    $CPPLINT_CACHE_DIR, so that files that didn't change aren't linted again.
+    """
     _RE_IS_TEST = input_api.re.compile(r'.*tests?.(cc|h)$')
     result = []
 
@@ -307,6 +433,8 @@ def CheckChangeLintsClean(input_api,
     cpplint._cpplint_state.ResetErrorCounts()
 
     cpplint._SetFilters(','.join(GetCppLintFilters(lint_filters)))
+    cpplint._SetCacheDir(cache_dir
+                         or input_api.environ.get('CPPLINT_CACHE_DIR'))
 
     # Use VS error format on Windows to make it easier to step through the
     # results.
@@ -329,6 +457,7 @@ def CheckChangeLintsClean(input_api,
         f.AbsoluteLocalPath()
         for f in input_api.AffectedSourceFiles(source_file_filter)
     ]
+    verbose_levels = []
     for file_name in files:
         if _RE_IS_TEST.match(file_name):
             level = 5
@@ -336,7 +465,8 @@ def CheckChangeLintsClean(input_api,
             level = 4
 
         verbose_level = verbose_level or level
-        cpplint.ProcessFile(file_name, verbose_level)
+        verbose_levels.append(verbose_level)
+    cpplint.ProcessFiles(files, verbose_levels, jobs or input_api.cpu_count)
 
     if cpplint._cpplint_state.error_count > 0:
         # cpplint errors currently cannot be counted as errors during upload
@@ -477,6 +607,8 @@ def _FindNewViolationsOfRuleForList(callable_rule,
     Arguments:
         callable_rule: a callable taking a file extension and line of input and
             returning True if the rule is satisfied and False if there was a problem.
+            If it is a _LineRule, the new contents are checked by the line
+            scanner, together with the other registered rules.
         file_ext_list: a list of input (file, extension) tuples, as returned by
             _GenerateAffectedFileExtList().
         error_formatter: a callable taking (filename, line_number, line) and
@@ -491,7 +623,10 @@ def _FindNewViolationsOfRuleForList(callable_rule,
         # out to the SCM to determine the changed region can be quite expensive
         # on Win32.  Assuming that most files will be kept problem-free, we can
         # skip the SCM operations most of the time.
-        if all(callable_rule(extension, line) for line in f.NewContents()):
+        if isinstance(callable_rule, _LineRule):
+            if not _LINE_SCANNER.Violates(f, extension, callable_rule):
+                continue
+        elif all(callable_rule(extension, line) for line in f.NewContents()):
             continue  # No violation found in full text: can skip considering diff.
 
         for line_num, line in f.ChangedContents():
@@ -526,6 +661,9 @@ def _FindNewViolationsOfRule(callable_rule,
         error_formatter)
 
 
+_TAB_RULE = _RegisterLineRule('tab', r'\t', lambda _, line: '\t' not in line)
+
+
 def CheckChangeHasNoTabs(input_api, output_api, source_file_filter=None):
     """Checks that there are no tab characters in any of the text files to be
     submitted.
@@ -541,8 +679,7 @@ def CheckChangeHasNoTabs(input_api, output_api, source_file_filter=None):
                      or basename.endswith('.mk'))
                 and source_file_filter(affected_file))
 
-    tabs = _FindNewViolationsOfRule(lambda _, line: '\t' not in line, input_api,
-                                    filter_more)
+    tabs = _FindNewViolationsOfRule(_TAB_RULE, input_api, filter_more)
 
     if tabs:
         return [
@@ -552,26 +689,34 @@ def CheckChangeHasNoTabs(input_api, output_api, source_file_filter=None):
     return []
 
 
+_UNOWNED_TODO_RE = _re.compile('TODO(?!(%s|%s))' % (
+    '\\s*\\(.+\\)\\s*:',  # Legacy TODO
+    ':\\s*[^\\s]+\\s*\\-'  # Modern TODO
+))
+_UNOWNED_TODO_RULE = _RegisterLineRule(
+    'unowned-todo', 'TODO', lambda _, x: not _UNOWNED_TODO_RE.search(x))
+
+
 def CheckChangeTodoHasOwner(input_api, output_api, source_file_filter=None):
     """Checks that TODO comments have the issue number."""
-    legacyTODO = '\\s*\\(.+\\)\\s*:'
-    modernTODO = ':\\s*[^\\s]+\\s*\\-'
-    unowned_todo = input_api.re.compile('TODO(?!(%s|%s))' %
-                                        (legacyTODO, modernTODO))
-    errors = _FindNewViolationsOfRule(lambda _, x: not unowned_todo.search(x),
-                                      input_api, source_file_filter)
+    errors = _FindNewViolationsOfRule(_UNOWNED_TODO_RULE, input_api,
+                                      source_file_filter)
     errors = ['Found TODO with no issue number in ' + x for x in errors]
     if errors:
         return [output_api.PresubmitPromptWarning('\n'.join(errors))]
     return []
 
 
+_STRAY_WHITESPACE_RULE = _RegisterLineRule(
+    'stray-whitespace', r'[^\S\n]$', lambda _, line: line.rstrip() == line)
+
+
 def CheckChangeHasNoStrayWhitespace(input_api,
                                     output_api,
                                     source_file_filter=None):
     """Checks that there is no stray whitespace at source lines end."""
-    errors = _FindNewViolationsOfRule(lambda _, line: line.rstrip() == line,
-                                      input_api, source_file_filter)
+    errors = _FindNewViolationsOfRule(_STRAY_WHITESPACE_RULE, input_api,
+                                      source_file_filter)
     if errors:
         return [
             output_api.PresubmitPromptWarning(
@@ -726,7 +871,11 @@ def CheckLongLines(input_api, output_api, maxlen, source_file_filter=None):
         x for x in file_ext_list if x[1] not in PY_FILE_EXTS
     ]
     if non_py_file_ext_list:
-        errors += _FindNewViolationsOfRuleForList(no_long_lines,
+        # Only the lines longer than the smallest limit can be too long.
+        long_line_rule = _RegisterLineRule(
+            'long-line-%d' % maxlen, '\\n.{%d}' % (min(maxlens.values()) + 1),
+            no_long_lines)
+        errors += _FindNewViolationsOfRuleForList(long_line_rule,
                                                   non_py_file_ext_list,
                                                   error_formatter=format_error)
 
@@ -1212,7 +1361,9 @@ def GetUnitTestsRecursively(input_api,
     to_run = found = 0
     for filepath in input_api.change.AllFiles(directory):
         found += 1
-        if check(filepath):
+        # Tracked files deleted from the checkout are listed too.
+        if check(filepath) and input_api.os_path.isfile(
+                input_api.os_path.join(directory, filepath)):
             to_run += 1
             tests.append(filepath)
     input_api.logging.debug('Found %d files, running %d' % (found, to_run))
@@ -1319,6 +1470,34 @@ def _FetchAllFiles(input_api, files_to_check, files_to_skip):
                 return True
         return False
 
+    if getattr(input_api.change, 'scm', None) == 'git':
+        # Use the files tracked by git rather than walking the checkout.
+        skipped_dirs = {}
+
+        def IsSkippedDir(dirpath):
+            if not dirpath:
+                return False
+            if dirpath not in skipped_dirs:
+                parent = input_api.os_path.dirname(dirpath)
+                skipped_dirs[dirpath] = (IsSkippedDir(parent)
+                                         or Find(dirpath, files_to_skip))
+            return skipped_dirs[dirpath]
+
+        files = []
+        for filepath in input_api.change.AllFiles(
+                input_api.PresubmitLocalPath()):
+            filepath = input_api.os_path.normpath(filepath)
+            if IsSkippedDir(input_api.os_path.dirname(filepath)):
+                continue
+            if (Find(filepath, files_to_check)
+                    and not Find(filepath, files_to_skip)
+                    # Tracked files deleted from the checkout are listed too.
+                    and input_api.os_path.isfile(
+                        input_api.os_path.join(
+                            input_api.PresubmitLocalPath(), filepath))):
+                files.append(filepath)
+        return files
+
     files = []
     path_len = len(input_api.PresubmitLocalPath())
     for dirpath, dirnames, filenames in input_api.os_walk(
@@ -2833,10 +3012,10 @@ def CheckInclusiveLanguage(input_api,
 
     excluded_paths = set(excluded_paths)
     for f in input_api.AffectedFiles():
+        if IsExcludedFile(f, excluded_paths):
+            continue
         for line_num, line in f.ChangedContents():
             for term, message, error in non_inclusive_terms:
-                if IsExcludedFile(f, excluded_paths):
-                    continue
                 CheckForMatch(f, line_num, line, term, message, error)
 
     result = []
@@ -13,11 +13,14 @@ __version__ = '2.0.0'
 
 import argparse
 import ast  # Exposed through the API.
+import bisect
+import concurrent.futures
 import contextlib
 import cpplint
 import fnmatch  # Exposed through the API.
 import glob
 import inspect
+import io
 import json  # Exposed through the API.
 import logging
 import mimetypes
@@ -25,6 +28,10 @@ import multiprocessing
 import os  # Somewhat exposed through the API.
 import random
 import re  # Exposed through the API.
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
 import shutil
 import signal
 import sys  # Parts exposed through API.
@@ -88,6 +95,9 @@ class CommandData(object):
         self.kwargs['stdin'] = subprocess.PIPE
         self.message = message
         self.info = None
+        # The (name, presubmit path) of the check that queued the test, when
+        # profiling.
+        self.profile_parent = None
 
 
 # Adapted from
@@ -170,8 +180,9 @@ class Timer(object):
 
 
 class ThreadPool(object):
-    def __init__(self, pool_size=None, timeout=None):
+    def __init__(self, pool_size=None, timeout=None, profiler=None):
         self.timeout = timeout
+        self.profiler = profiler
         self._pool_size = pool_size or multiprocessing.cpu_count()
         if sys.platform == 'win32':
             # TODO(crbug.com/1190269) - we can't use more than 56 child
@@ -223,6 +234,15 @@ class ThreadPool(object):
         This function converts invocation of .py files and invocations of 'python'
         to vpython invocations.
         """
+        if self.profiler:
+            with self.profiler.measure('test',
+                                       test.name,
+                                       parent=test.profile_parent,
+                                       concurrent=True):
+                return self._CallCommand(test, show_callstack)
+        return self._CallCommand(test, show_callstack)
+
+    def _CallCommand(self, test, show_callstack):
         cmd = self._GetCommand(test)
         try:
             start = time_time()
@@ -247,6 +267,10 @@ class ThreadPool(object):
                              show_callstack=show_callstack)
 
     def AddTests(self, tests, parallel=True):
+        if self.profiler:
+            # The tests may run after the check that queued them returned.
+            for test in tests:
+                test.profile_parent = self.profiler.current()
         if parallel:
             self._tests.extend(tests)
         else:
@@ -959,7 +983,9 @@ class InputApi(object):
             file_item = file_item.AbsoluteLocalPath()
         if not file_item.startswith(self.change.RepositoryRoot()):
             raise IOError('Access outside the repository root is denied.')
-        return gclient_utils.FileRead(file_item, mode)
+        # The contents are shared with the AffectedFiles of the change, and the
+        # other checks; |mode| doesn't matter, as FileRead() ignores it.
+        return self.change._content_cache.Read(file_item)
 
     def CreateTemporaryFile(self, **kwargs):
         """Returns a named temporary file that must be removed with a call to
@@ -1131,6 +1157,40 @@ class _ProvidedDiffCache(_DiffCache):
                 return ''
 
 
+class _FileContentCache(object):
+    """Caches the contents of the files read by the presubmit checks.
+
+    A change shares one between its AffectedFiles and InputApi.ReadFile(), so
+    that each file is read, and split into lines, once per presubmit run
+    whichever check reads it first.
+    """
+    def __init__(self):
+        self._contents = {}
+        self._lines = {}
+
+    def Read(self, path):
+        """Returns the contents of the file at |path|."""
+        contents = self._contents.get(path)
+        if contents is None:
+            contents = gclient_utils.FileRead(path)
+            self._contents[path] = contents
+        return contents
+
+    def ReadLines(self, path):
+        """Returns the lines of the file at |path|, without line breaks, as a
+        tuple which is shared by all the callers."""
+        lines = self._lines.get(path)
+        if lines is None:
+            lines = tuple(self.Read(path).splitlines())
+            self._lines[path] = lines
+        return lines
+
+    def Flush(self, path):
+        """Forgets the contents of the file at |path|."""
+        self._contents.pop(path, None)
+        self._lines.pop(path, None)
+
+
 class AffectedFile(object):
     """Representation of a file in a change."""
 
@@ -1138,13 +1198,20 @@ class AffectedFile(object):
 
     # Method could be a function
     # pylint: disable=no-self-use
-    def __init__(self, path, action, repository_root, diff_cache):
+    def __init__(self,
+                 path,
+                 action,
+                 repository_root,
+                 diff_cache,
+                 content_cache=None):
         self._path = path
         self._action = action
         self._local_root = repository_root
         self._diff_cache = diff_cache
+        self._content_cache = content_cache or _FileContentCache()
         self._cached_changed_contents = None
         self._cached_new_contents = None
+        self._cached_old_contents = None
         self._extension = None
         self._is_testable_file = None
         logging.debug('%s(%s)', self.__class__.__name__, self._path)
@@ -1202,8 +1269,11 @@ class AffectedFile(object):
         Contents will be empty if the file is a directory or does not exist.
         Note: The carriage returns (LF or CR) are stripped off.
         """
-        return self._diff_cache.GetOldContents(self.LocalPath(),
-                                               self._local_root).splitlines()
+        if self._cached_old_contents is None:
+            self._cached_old_contents = tuple(
+                self._diff_cache.GetOldContents(self.LocalPath(),
+                                                self._local_root).splitlines())
+        return list(self._cached_old_contents)
 
     def NewContents(self, flush_cache=False):
         """Returns an iterator over the lines in the new version of file.
@@ -1217,10 +1287,12 @@ class AffectedFile(object):
         Note: The carriage returns (LF or CR) are stripped off.
         """
         if self._cached_new_contents is None or flush_cache:
-            self._cached_new_contents = []
+            self._cached_new_contents = ()
+            if flush_cache:
+                self._content_cache.Flush(self.AbsoluteLocalPath())
             try:
-                self._cached_new_contents = gclient_utils.FileRead(
-                    self.AbsoluteLocalPath(), 'rU').splitlines()
+                self._cached_new_contents = self._content_cache.ReadLines(
+                    self.AbsoluteLocalPath())
             except IOError:
                 pass  # File not found?  That's fine; maybe it was deleted.
             except UnicodeDecodeError as e:
@@ -1229,7 +1301,7 @@ class AffectedFile(object):
                 print('Error reading %s: %s' % (self.AbsoluteLocalPath(), e))
                 raise
 
-        return self._cached_new_contents[:]
+        return list(self._cached_new_contents)
 
     def ChangedContents(self, keeplinebreaks=False):
         """Returns a list of tuples (line number, line text) of all new lines.
@@ -1350,9 +1422,11 @@ class Change(object):
                    for f in files), files
 
         diff_cache = self._diff_cache()
+        self._content_cache = _FileContentCache()
         self._affected_files = [
             self._AFFECTED_FILES(path, action.strip(), self._local_root,
-                                 diff_cache) for action, path in files
+                                 diff_cache, self._content_cache)
+            for action, path in files
         ]
 
     def _diff_cache(self):
@@ -1490,6 +1564,10 @@ class Change(object):
         """List all files under source control in the repo."""
         raise NotImplementedError()
 
+    def _file_index(self):
+        """Returns the _GitFileIndex of the repo, if there is one."""
+        return None
+
     def AffectedFiles(self, include_deletes=True, file_filter=None):
         """Returns a list of AffectedFile instances for all files in the change.
 
@@ -1614,10 +1692,18 @@ class GitChange(Change):
     def AllFiles(self, root=None):
         """List all files under source control in the repo."""
         root = root or self.RepositoryRoot()
+        file_index = self._file_index()
+        if file_index:
+            files = file_index.FilesUnder(root)
+            if files is not None:
+                return files
         return subprocess.check_output(
             ['git', '-c', 'core.quotePath=false', 'ls-files', '--', '.'],
             cwd=root).decode('utf-8', 'ignore').splitlines()
 
+    def _file_index(self):
+        return _GitFileIndex.Get(self.RepositoryRoot())
+
     def AffectedFiles(self, include_deletes=True, file_filter=None):
         """Returns a list of AffectedFile instances for all files in the change.
 
@@ -1655,7 +1741,130 @@ class ProvidedDiffChange(Change):
         return scm.DIFF.GetAllFiles(root)
 
 
-def ListRelevantPresubmitFiles(files, root):
+def _IsPresubmitFile(name):
+    """Returns True if |name| is the name of a presubmit script."""
+    return bool(
+        re.match(r'PRESUBMIT.*\.py$', name)
+        and not name.startswith('PRESUBMIT_test'))
+
+
+class _GitFileIndex(object):
+    """The files tracked in a git checkout, as listed by git ls-files.
+
+    The locations of the presubmit scripts are also cached in the git
+    directory, keyed by HEAD and the state of the git index, so that finding
+    them doesn't list the files again until either changes.
+    """
+    _CACHE_NAME = 'presubmit-index.json'
+
+    # The index of each checkout root, reused while its key is unchanged.
+    _INDEXES = {}
+
+    def __init__(self, root, key, cache_path):
+        self._root = root
+        self._key = key
+        self._cache_path = cache_path
+        self._files = None
+        self._file_set = None
+        self._presubmit_files = None
+
+    @classmethod
+    def Get(cls, root):
+        """Returns the index of the git checkout at |root|, or None if it can't
+        be indexed."""
+        try:
+            head, index_path, cache_path = scm.GIT.Capture(
+                [
+                    'rev-parse', 'HEAD', '--git-path', 'index', '--git-path',
+                    cls._CACHE_NAME
+                ],
+                cwd=root).splitlines()
+            index_stat = os.stat(os.path.join(root, index_path))
+        except (subprocess.CalledProcessError, OSError, ValueError):
+            return None
+        key = [root, head, index_stat.st_mtime_ns, index_stat.st_size]
+        index = cls._INDEXES.get(root)
+        if index is None or index._key != key:
+            index = cls(root, key, os.path.join(root, cache_path))
+            cls._INDEXES[root] = index
+        return index
+
+    def _Files(self):
+        if self._files is None:
+            # Sorted, so that the files under a directory are a range of it.
+            self._files = sorted(scm.GIT.GetAllFiles(self._root))
+            self._file_set = set(self._files)
+        return self._files
+
+    def _RelativePath(self, directory):
+        """Returns the path of |directory| relative to the root, with '/'
+        separators, or None if it is outside the checkout."""
+        path = os.path.relpath(directory, self._root)
+        if path == os.pardir or path.startswith(os.pardir + os.sep):
+            return None
+        if path == os.curdir:
+            return ''
+        return path.replace(os.sep, '/')
+
+    def FilesUnder(self, directory):
+        """Returns the tracked files under |directory|, relative to it, like
+        git ls-files run there, or None if they aren't indexed."""
+        path = self._RelativePath(os.path.abspath(directory))
+        if path is None:
+            return None
+        files = self._Files()
+        if not path:
+            return list(files)
+        # The files of submodules aren't indexed.
+        parts = path.split('/')
+        for i in range(1, len(parts) + 1):
+            if '/'.join(parts[:i]) in self._file_set:
+                return None
+        prefix = path + '/'
+        # '0' is the character after '/', so this is the end of the range.
+        start = bisect.bisect_left(files, prefix)
+        end = bisect.bisect_left(files, path + '0', start)
+        return [f[len(prefix):] for f in files[start:end]]
+
+    def PresubmitFiles(self, directory):
+        """Returns the names of the tracked presubmit scripts in |directory|,
+        or None if it is outside the checkout."""
+        path = self._RelativePath(directory)
+        if path is None:
+            return None
+        if self._presubmit_files is None:
+            self._presubmit_files = self._ReadCache()
+        if self._presubmit_files is None:
+            self._presubmit_files = {}
+            for f in self._Files():
+                dirname, _, name = f.rpartition('/')
+                if _IsPresubmitFile(name):
+                    self._presubmit_files.setdefault(dirname, []).append(name)
+            self._WriteCache()
+        return self._presubmit_files.get(path, [])
+
+    def _ReadCache(self):
+        try:
+            cache = json.loads(gclient_utils.FileRead(self._cache_path))
+        except (IOError, ValueError):
+            return None
+        if not isinstance(cache, dict) or cache.get('key') != self._key:
+            return None
+        return cache.get('presubmit_files')
+
+    def _WriteCache(self):
+        try:
+            gclient_utils.FileWrite(
+                self._cache_path,
+                json.dumps({
+                    'key': self._key,
+                    'presubmit_files': self._presubmit_files
+                }))
+        except IOError as e:
+            logging.debug('Failed to write %s: %s', self._cache_path, e)
+
+
+def ListRelevantPresubmitFiles(files, root, file_index=None):
     """Finds all presubmit files that apply to a given set of source files.
 
     If inherit-review-settings-ok is present right under root, looks for
@@ -1664,6 +1873,8 @@ def ListRelevantPresubmitFiles(files, root):
     Args:
         files: An iterable container containing file paths.
         root: Path where to stop searching.
+        file_index: a _GitFileIndex of the checkout, to look up the presubmit
+            scripts in instead of listing the directories.
 
     Return:
         List of absolute paths of the existing PRESUBMIT.py scripts.
@@ -1692,18 +1903,31 @@ def ListRelevantPresubmitFiles(files, root):
                 break
             directory = parent_dir
 
+    # The presubmit scripts added by the change may not be tracked yet.
+    added_presubmit_files = {}
+    if file_index:
+        for f in files:
+            directory, name = os.path.split(f)
+            added_presubmit_files.setdefault(directory, set()).add(name)
+
     # Look for PRESUBMIT.py in all candidate directories.
     results = []
     for directory in sorted(list(candidates)):
-        try:
-            for f in os.listdir(directory):
-                p = os.path.join(directory, f)
-                if os.path.isfile(p) and re.match(
-                        r'PRESUBMIT.*\.py$',
-                        f) and not f.startswith('PRESUBMIT_test'):
-                    results.append(p)
-        except OSError:
-            pass
+        names = None
+        if file_index:
+            names = file_index.PresubmitFiles(directory)
+        if names is None:
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+        else:
+            names = sorted(
+                added_presubmit_files.get(directory, set()).union(names))
+        for f in names:
+            p = os.path.join(directory, f)
+            if os.path.isfile(p) and _IsPresubmitFile(f):
+                results.append(p)
 
     logging.debug('Presubmit files: %s', ','.join(results))
     return results
@@ -1773,7 +1997,8 @@ def DoPostUploadExecuter(change, gerrit_obj, verbose):
     """
     sys.stdout.write('Running post upload checks ...\n')
     presubmit_files = ListRelevantPresubmitFiles(
-        change.LocalPaths() + change.LocalSubmodules(), change.RepositoryRoot())
+        change.LocalPaths() + change.LocalSubmodules(), change.RepositoryRoot(),
+        change._file_index())
     if not presubmit_files and verbose:
         sys.stdout.write('Warning, no PRESUBMIT.py found.\n')
     results = []
@@ -1818,7 +2043,8 @@ class PresubmitExecuter(object):
                  dry_run=None,
                  thread_pool=None,
                  parallel=False,
-                 no_diffs=False):
+                 no_diffs=False,
+                 profiler=None):
         """
         Args:
             change: The Change object.
@@ -1830,6 +2056,8 @@ class PresubmitExecuter(object):
                 PRESUBMIT files will be run in parallel.
             no_diffs: if true, implies that --files or --all was specified so some
                 checks can be skipped, and some errors will be messages.
+            profiler: if set, a _CheckProfiler recording the resource usage of
+                each presubmit function.
         """
         self.change = change
         self.committing = committing
@@ -1840,8 +2068,12 @@ class PresubmitExecuter(object):
         self.thread_pool = thread_pool
         self.parallel = parallel
         self.no_diffs = no_diffs
+        self.profiler = profiler
 
-    def ExecPresubmitScript(self, script_text, presubmit_path):
+    def ExecPresubmitScript(self,
+                            script_text,
+                            presubmit_path,
+                            check_names=None):
         """Executes a single presubmit script.
         Caller is responsible for validating whether the hook should be executed
         and should only call this function if it should be.
@@ -1850,6 +2082,8 @@ class PresubmitExecuter(object):
             script_text: The text of the presubmit script.
             presubmit_path: The path to the presubmit file (this will be
                 reported via input_api.PresubmitLocalPath()).
+            check_names: If set, only these Check* functions of a
+                PRESUBMIT_VERSION 2 script are run.
 
         Return:
             A list of result objects, empty if no problems.
@@ -1860,13 +2094,16 @@ class PresubmitExecuter(object):
         try:
             os.chdir(presubmit_dir)
             return self._execute_with_local_working_directory(
-                script_text, presubmit_dir, presubmit_path)
+                script_text, presubmit_dir, presubmit_path, check_names)
         finally:
             # Return the process to the original working directory.
             os.chdir(main_path)
 
-    def _execute_with_local_working_directory(self, script_text, presubmit_dir,
-                                              presubmit_path):
+    def _execute_with_local_working_directory(self,
+                                              script_text,
+                                              presubmit_dir,
+                                              presubmit_path,
+                                              check_names=None):
         # Load the presubmit script into context.
         input_api = InputApi(self.change,
                              presubmit_path,
@@ -1929,6 +2166,9 @@ class PresubmitExecuter(object):
                             continue
                         if function_name.endswith('Upload') and self.committing:
                             continue
+                        if (check_names is not None
+                                and function_name not in check_names):
+                            continue
                         logging.debug('Running %s in %s', function_name,
                                       presubmit_path)
                         results.extend(
@@ -1993,7 +2233,12 @@ class PresubmitExecuter(object):
         event_thread.start()
 
         try:
-            result = eval(function_name + '(*__args)', context)
+            if self.profiler:
+                with self.profiler.measure('check', function_name,
+                                           presubmit_path):
+                    result = eval(function_name + '(*__args)', context)
+            else:
+                result = eval(function_name + '(*__args)', context)
             self._check_result_type(result)
         except Exception:
             _, e_value, _ = sys.exc_info()
@@ -2029,6 +2274,143 @@ class PresubmitExecuter(object):
                 'output_api.PresubmitResult')
 
 
+def _ListCheckFunctions(script_text, presubmit_path, committing):
+    """Lists the Check* functions PresubmitExecuter would run in a script.
+
+    Returns None unless the script is a PRESUBMIT_VERSION 2 script whose
+    Check* functions are all plain top-level definitions, so that they can be
+    listed without running the script.
+    """
+    try:
+        tree = ast.parse(script_text, presubmit_path)
+    except SyntaxError:
+        return None
+    version = None
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef):
+            if node.name.startswith('Check') and node.name not in names:
+                names.append(node.name)
+            continue
+        if (isinstance(node, ast.Assign) and len(node.targets) == 1
+                and isinstance(node.targets[0], ast.Name)
+                and node.targets[0].id == 'PRESUBMIT_VERSION'
+                and isinstance(node.value, ast.Constant)
+                and isinstance(node.value.value, str)):
+            version = node.value.value
+            continue
+        # Check* functions bound in any other way, e.g. imported, would only
+        # be found by running the script.
+        for child in ast.walk(node):
+            if isinstance(child, ast.alias):
+                bound = (child.asname or child.name).split('.')[0]
+            elif isinstance(child, ast.Name) and isinstance(
+                    child.ctx, ast.Store):
+                bound = child.id
+            elif isinstance(child, (ast.FunctionDef, ast.ClassDef)):
+                bound = child.name
+            else:
+                continue
+            if bound.startswith('Check') or bound == '*':
+                return None
+    try:
+        if [int(x) for x in version.split('.')] < [2, 0, 0]:
+            return None
+    except (AttributeError, ValueError):
+        return None
+    suffix = 'Upload' if committing else 'Commit'
+    return [name for name in names if not name.endswith(suffix)]
+
+
+# The PresubmitExecuter of the presubmit worker processes. They inherit it
+# when they are forked, so the change doesn't need to be pickled.
+_WORKER_EXECUTER = None
+
+
+def _ExecPresubmitScriptInWorker(args):
+    """Runs a presubmit script, or some of its checks, in a worker process.
+
+    Returns the results, including those of the tests the script queued, the
+    CCs it added, what it wrote to stdout and stderr and its profile records.
+    The subprocesses of the checks inherit stdout and stderr, so they are
+    redirected at the file descriptor level.
+    """
+    script_text, presubmit_path, check_names = args
+    executer = _WORKER_EXECUTER
+    executer.more_cc = []
+    if executer.profiler:
+        executer.profiler.records = []
+    executer.thread_pool = ThreadPool(profiler=executer.profiler)
+    streams = (sys.stdout, sys.stderr)
+    for stream in streams:
+        stream.flush()
+    outputs = (tempfile.TemporaryFile(), tempfile.TemporaryFile())
+    saved_fds = (os.dup(1), os.dup(2))
+    os.dup2(outputs[0].fileno(), 1)
+    os.dup2(outputs[1].fileno(), 2)
+    sys.stdout, sys.stderr = (io.TextIOWrapper(output,
+                                               encoding='utf-8',
+                                               errors='replace',
+                                               line_buffering=True)
+                              for output in outputs)
+    try:
+        results = executer.ExecPresubmitScript(script_text, presubmit_path,
+                                               check_names)
+        results += executer.thread_pool.RunAsync()
+    finally:
+        for wrapper in (sys.stdout, sys.stderr):
+            wrapper.flush()
+            wrapper.detach()
+        sys.stdout, sys.stderr = streams
+        for fd, saved_fd in zip((1, 2), saved_fds):
+            os.dup2(saved_fd, fd)
+            os.close(saved_fd)
+    texts = []
+    for output in outputs:
+        output.seek(0)
+        texts.append(output.read().decode('utf-8', 'replace'))
+        output.close()
+    records = executer.profiler.records if executer.profiler else []
+    return results, executer.more_cc, texts[0], texts[1], records
+
+
+def _ExecPresubmitScriptsInParallel(executer, tasks, jobs):
+    """Runs (script_text, presubmit_path, check_names) tasks in |jobs|
+    processes.
+
+    Each process has its own working directory, so the scripts don't race on
+    chdir. Outputs and results are merged in the order of |tasks|.
+
+    The workers aren't daemonic, so that checks can start processes of their
+    own, like cpplint does.
+    """
+    global _WORKER_EXECUTER
+    _WORKER_EXECUTER = executer
+    results = []
+    more_cc = set(executer.more_cc)
+    # The workers are forked, so they would print what is still buffered.
+    sys.stdout.flush()
+    sys.stderr.flush()
+    try:
+        with concurrent.futures.ProcessPoolExecutor(
+                min(jobs, len(tasks)),
+                mp_context=multiprocessing.get_context('fork')) as pool:
+            for (task_results, task_more_cc, stdout, stderr,
+                 records) in pool.map(_ExecPresubmitScriptInWorker, tasks):
+                sys.stdout.write(stdout)
+                sys.stdout.flush()
+                sys.stderr.write(stderr)
+                sys.stderr.flush()
+                results += task_results
+                more_cc.update(task_more_cc)
+                if executer.profiler:
+                    executer.profiler.records += records
+    finally:
+        _WORKER_EXECUTER = None
+    executer.more_cc = sorted(more_cc)
+    return results
+
+
 def RDBStatusFrom(result):
     """Returns the status and failure reason for a PresubmitResult."""
     failure_reason = None
@@ -2055,7 +2437,10 @@ def DoPresubmitChecks(change,
                       dry_run=None,
                       parallel=False,
                       json_output=None,
-                      no_diffs=False):
+                      no_diffs=False,
+                      jobs=1,
+                      parallel_checks=False,
+                      profile_output=None):
     """Runs all presubmit checks that apply to the files in the change.
 
     This finds all PRESUBMIT.py files in directories enclosing the files in the
@@ -2078,10 +2463,23 @@ def DoPresubmitChecks(change,
             PRESUBMIT files will be run in parallel.
         no_diffs: if true, implies that --files or --all was specified so some
             checks can be skipped, and some errors will be messages.
+        jobs: if more than 1, the PRESUBMIT files are run in up to that many
+            processes, on Linux only.
+        parallel_checks: if true, the Check* functions of PRESUBMIT_VERSION 2
+            files are run in separate processes too.
+        profile_output: if set, the file to write the resource usage of each
+            presubmit function and canned check to, as trace events. The
+            slowest ones are printed as well.
     Return:
         1 if presubmit checks failed or 0 otherwise.
     """
-    with setup_environ({'PYTHONDONTWRITEBYTECODE': '1'}):
+    # The workers are forked, which isn't safe with the system frameworks of
+    # macOS and isn't supported on Windows.
+    if not sys.platform.startswith('linux'):
+        jobs = 1
+    profiler = _CheckProfiler() if profile_output else None
+    with setup_environ({'PYTHONDONTWRITEBYTECODE': '1'}), \
+            profile_canned_checks(profiler):
         running_msg = 'Running presubmit '
         running_msg += 'commit ' if committing else 'upload '
         running_msg += 'checks '
@@ -2093,19 +2491,21 @@ def DoPresubmitChecks(change,
         start_time = time_time()
         presubmit_files = ListRelevantPresubmitFiles(
             change.AbsoluteLocalPaths() + change.AbsoluteLocalSubmodules(),
-            change.RepositoryRoot())
+            change.RepositoryRoot(), change._file_index())
         if not presubmit_files and verbose:
             sys.stdout.write('Warning, no PRESUBMIT.py found.\n')
         results = []
-        thread_pool = ThreadPool()
+        thread_pool = ThreadPool(profiler=profiler)
         executer = PresubmitExecuter(change, committing, verbose, gerrit_obj,
-                                     dry_run, thread_pool, parallel, no_diffs)
+                                     dry_run, thread_pool, parallel, no_diffs,
+                                     profiler)
         if default_presubmit:
             if verbose:
                 sys.stdout.write('Running default presubmit script.\n')
             fake_path = os.path.join(change.RepositoryRoot(), 'PRESUBMIT.py')
             results += executer.ExecPresubmitScript(default_presubmit,
                                                     fake_path)
+        tasks = []
         for filename in presubmit_files:
             filename = os.path.abspath(filename)
             # Accept CRLF presubmit script.
@@ -2113,7 +2513,21 @@ def DoPresubmitChecks(change,
                 '\r\n', '\n')
             if verbose:
                 sys.stdout.write('Running %s\n' % filename)
-            results += executer.ExecPresubmitScript(presubmit_script, filename)
+            if jobs <= 1:
+                results += executer.ExecPresubmitScript(
+                    presubmit_script, filename)
+                continue
+            check_names = None
+            if parallel_checks:
+                check_names = _ListCheckFunctions(presubmit_script, filename,
+                                                  committing)
+            if check_names is None:
+                tasks.append((presubmit_script, filename, None))
+            else:
+                tasks.extend((presubmit_script, filename, [name])
+                             for name in check_names)
+        if tasks:
+            results += _ExecPresubmitScriptsInParallel(executer, tasks, jobs)
 
         results += thread_pool.RunAsync()
 
@@ -2172,6 +2586,9 @@ def DoPresubmitChecks(change,
         if total_time > 1.0:
             sys.stdout.write('Presubmit checks took %.1fs to calculate.\n' %
                              total_time)
+        if profiler:
+            profiler.PrintSlowest()
+            profiler.WriteTraceEvents(profile_output)
 
         if not should_prompt and not presubmits_failed:
             sys.stdout.write('presubmit checks passed.\n\n')
@@ -2437,6 +2854,198 @@ def setup_environ(kv: Mapping[str, str]):
             os.environ.pop(k, None)
 
 
+class _CheckProfiler(object):
+    """Records the resource usage of presubmit functions and canned checks.
+
+    Each record holds the wall and CPU time, including that of the waited for
+    child processes, the number of subprocesses started and the bytes read by
+    this process, where /proc/self/io is available. The CPU time and bytes
+    read of the records of code running concurrently with other measured
+    code, like the tests run by --parallel, are unknown.
+    """
+    # The number of records printed by PrintSlowest().
+    TOP_N = 20
+
+    def __init__(self):
+        self.records = []
+        self.subprocesses = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @staticmethod
+    def _cpu_time():
+        if resource is None:
+            return time.process_time()
+        total = 0.0
+        for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+            usage = resource.getrusage(who)
+            total += usage.ru_utime + usage.ru_stime
+        return total
+
+    @staticmethod
+    def _bytes_read():
+        try:
+            with open('/proc/self/io') as f:
+                for line in f:
+                    if line.startswith('rchar:'):
+                        return int(line.split()[1])
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def count_subprocess(self):
+        """Counts a subprocess started by this thread."""
+        with self._lock:
+            self.subprocesses += 1
+        self._local.subprocesses = getattr(self._local, 'subprocesses', 0) + 1
+
+    def current(self):
+        """Returns the (name, presubmit path) of the innermost measure of this
+        thread, or None."""
+        stack = self._local.__dict__.setdefault('stack', [])
+        return stack[-1] if stack else None
+
+    @contextlib.contextmanager
+    def measure(self,
+                kind,
+                name,
+                presubmit_path=None,
+                parent=None,
+                concurrent=False):
+        """Records the usage of the enclosed code as a |kind| record.
+
+        The record of a nested measure has the name of the enclosing one, or
+        of |parent|, a value returned by current(), as parent and, by default,
+        its presubmit path.
+
+        If |concurrent|, other threads may run measured code at the same time,
+        so only the subprocesses started by this thread are counted, and the
+        process-wide CPU time and bytes read are left unknown.
+        """
+        stack = self._local.__dict__.setdefault('stack', [])
+        parent = parent or self.current()
+        if parent:
+            parent, parent_path = parent
+            presubmit_path = presubmit_path or parent_path
+        stack.append((name, presubmit_path))
+        start = time_time()
+        start_cpu = self._cpu_time()
+        start_read = self._bytes_read()
+        start_subprocesses = self.subprocesses
+        start_thread_subprocesses = getattr(self._local, 'subprocesses', 0)
+        try:
+            yield
+        finally:
+            stack.pop()
+            if concurrent:
+                cpu = bytes_read = None
+                subprocesses = (getattr(self._local, 'subprocesses', 0) -
+                                start_thread_subprocesses)
+            else:
+                cpu = self._cpu_time() - start_cpu
+                bytes_read = self._bytes_read()
+                if bytes_read is not None and start_read is not None:
+                    bytes_read -= start_read
+                subprocesses = self.subprocesses - start_subprocesses
+            self.records.append({
+                'kind': kind,
+                'name': name,
+                'presubmit': presubmit_path,
+                'parent': parent,
+                'pid': os.getpid(),
+                'tid': threading.get_ident(),
+                'start': start,
+                'wall': time_time() - start,
+                'cpu': cpu,
+                'subprocesses': subprocesses,
+                'bytes_read': bytes_read,
+            })
+
+    def WriteTraceEvents(self, path):
+        """Writes the records to |path| in the Chrome trace event format, for
+        chrome://tracing or Perfetto."""
+        events = []
+        for record in self.records:
+            events.append({
+                'name': record['name'],
+                'cat': record['kind'],
+                'ph': 'X',
+                'ts': int(record['start'] * 1e6),
+                'dur': int(record['wall'] * 1e6),
+                'pid': record['pid'],
+                'tid': record['tid'],
+                'args': {
+                    k: record[k]
+                    for k in ('presubmit', 'parent', 'cpu', 'subprocesses',
+                              'bytes_read')
+                },
+            })
+        gclient_utils.FileWrite(path,
+                                json.dumps({'traceEvents': events}, indent=2))
+
+    def PrintSlowest(self):
+        """Prints the TOP_N slowest records, by wall time."""
+        if not self.records:
+            return
+        records = sorted(self.records, key=lambda r: r['wall'], reverse=True)
+        sys.stdout.write('** Slowest presubmit checks **\n')
+        sys.stdout.write('%8s %8s %6s %10s  %s\n' %
+                         ('wall', 'cpu', 'procs', 'read', 'check'))
+        for record in records[:self.TOP_N]:
+            name = record['name']
+            if record['kind'] in ('canned', 'test'):
+                name = '%s %s (from %s)' % (record['kind'], name,
+                                            record['parent'])
+            cpu = record['cpu']
+            bytes_read = record['bytes_read']
+            sys.stdout.write('%7.2fs %8s %6d %10s  %s in %s\n' %
+                             (record['wall'],
+                              '-' if cpu is None else '%.2fs' % cpu,
+                              record['subprocesses'],
+                              '-' if bytes_read is None else bytes_read, name,
+                              record['presubmit']))
+
+
+@contextlib.contextmanager
+def profile_canned_checks(profiler):
+    """Records the canned checks and the subprocesses started while enabled
+    in |profiler|, if set."""
+    if not profiler:
+        yield
+        return
+    wrapped = {}
+
+    def _wrap(method_name, method):
+        def _profiled(*args, **kwargs):
+            with profiler.measure('canned', method_name):
+                return method(*args, **kwargs)
+
+        return _profiled
+
+    # The standard Popen, which subprocess2.Popen derives from, so that every
+    # subprocess is counted.
+    popen_class = subprocess.subprocess.Popen
+    popen_init = popen_class.__init__
+
+    def _counting_init(*args, **kwargs):
+        profiler.count_subprocess()
+        popen_init(*args, **kwargs)
+
+    try:
+        for method_name, method in list(vars(presubmit_canned_checks).items()):
+            if (method_name.startswith(('Check', 'Run'))
+                    and inspect.isfunction(method)):
+                wrapped[method_name] = method
+                setattr(presubmit_canned_checks, method_name,
+                        _wrap(method_name, method))
+        popen_class.__init__ = _counting_init
+        yield
+    finally:
+        popen_class.__init__ = popen_init
+        for method_name, method in wrapped.items():
+            setattr(presubmit_canned_checks, method_name, method)
+
+
 @contextlib.contextmanager
 def canned_check_filter(method_names):
     filtered = {}
@@ -2528,6 +3137,21 @@ def main(argv=None):
                         action='store_true',
                         help='Run all tests specified by input_api.RunTests in '
                         'all PRESUBMIT files in parallel.')
+    parser.add_argument('--jobs',
+                        type=int,
+                        default=1,
+                        help='Run the PRESUBMIT files in up to this many '
+                        'processes. Only supported on Linux.')
+    parser.add_argument('--parallel_checks',
+                        action='store_true',
+                        help='With --jobs, also run the checks of '
+                        'PRESUBMIT_VERSION 2 files in separate processes.')
+    parser.add_argument('--presubmit_profile',
+                        '--presubmit-profile',
+                        dest='presubmit_profile',
+                        help='Write the time, CPU time, subprocesses and bytes '
+                        'read of every check to this file, as trace events, '
+                        'and print the slowest checks.')
     parser.add_argument('--json_output',
                         help='Write presubmit results to json output. If \'-\' '
                         'is provided, the results will be writting to stdout.')
@@ -2576,7 +3200,9 @@ def main(argv=None):
                                      options.default_presubmit,
                                      options.may_prompt, gerrit_obj,
                                      options.dry_run, options.parallel,
-                                     options.json_output, options.no_diffs)
+                                     options.json_output, options.no_diffs,
+                                     options.jobs, options.parallel_checks,
+                                     options.presubmit_profile)
     except PresubmitFailure as e:
         import utils
         print(e, file=sys.stderr)
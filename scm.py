@@ -6,6 +6,8 @@
 from __future__ import annotations
 
 import abc
+import atexit
+import collections
 import contextlib
 import os
 import pathlib
@@ -17,7 +19,7 @@ from collections import defaultdict
 from itertools import chain
 from typing import Any
 from typing import Collection, Iterable, Iterator, Literal, Dict
-from typing import Optional, Sequence, Mapping
+from typing import NamedTuple, Optional, Sequence, Mapping
 
 import gclient_utils
 import git_common
@@ -632,6 +634,118 @@ class GitConfigStateTest(GitConfigStateBase):
             cfg[key] = [v for v in cur if not pat.match(v)]
 
 
+class GitObjectInfo(NamedTuple):
+    """Object description printed by `git cat-file --batch[-check]`."""
+    sha: str
+    type: str
+    size: int
+
+
+class GitCatFileBatch(object):
+    """Answers object queries for one repository over long-lived
+    `git cat-file --batch-check` and `git cat-file --batch` coprocesses.
+
+    Each query costs a round-trip over a pipe instead of a fork/exec of git.
+    The coprocesses are started lazily and restarted if they die. Methods of
+    this class are thread safe; queries of the same kind are serialized.
+
+    Use GIT.GetCatFileBatch to share instances across callers.
+    """
+
+    def __init__(self, cwd: str):
+        self.cwd = cwd
+        # Maps the cat-file mode to its process and the lock guarding it.
+        self._procs: Dict[str, Optional[subprocess2.Popen]] = {
+            '--batch-check': None,
+            '--batch': None,
+        }
+        self._locks = {mode: threading.Lock() for mode in self._procs}
+
+    def _start(self, mode: str) -> subprocess2.Popen:
+        return subprocess2.Popen(
+            (git_common.GIT_EXE, '-c', 'color.ui=never', 'cat-file', mode),
+            cwd=self.cwd,
+            env=GIT.ApplyEnvVars({}),
+            shell=False,
+            stdin=subprocess2.PIPE,
+            stdout=subprocess2.PIPE,
+            stderr=subprocess2.DEVNULL)
+
+    def _stop(self, mode: str):
+        proc = self._procs[mode]
+        self._procs[mode] = None
+        if proc is None:
+            return
+        try:
+            # cat-file exits once its input is closed.
+            proc.stdin.close()
+        except OSError:
+            proc.kill()
+        proc.wait()
+        proc.stdout.close()
+
+    def _request(self, mode: str,
+                 rev: str) -> Optional[tuple[GitObjectInfo, bytes]]:
+        """Sends one object name to the `mode` coprocess.
+
+        Returns the object info and, in --batch mode, its contents; or None if
+        the object doesn't exist or the name is ambiguous.
+        """
+        if '\n' in rev:
+            # Can't be sent over the line-oriented protocol, and isn't a valid
+            # object name anyway.
+            return None
+        with self._locks[mode]:
+            for attempt in range(2):
+                if self._procs[mode] is None:
+                    self._procs[mode] = self._start(mode)
+                proc = self._procs[mode]
+                try:
+                    proc.stdin.write(rev.encode('utf-8') + b'\n')
+                    proc.stdin.flush()
+                    header = proc.stdout.readline()
+                    if not header:
+                        raise EOFError('git cat-file exited unexpectedly')
+                    parts = header.decode('utf-8', 'replace').split()
+                    if len(parts) != 3:
+                        # '<rev> missing' or '<rev> ambiguous'.
+                        return None
+                    info = GitObjectInfo(parts[0], parts[1], int(parts[2]))
+                    contents = b''
+                    if mode == '--batch':
+                        # The contents are followed by a newline.
+                        contents = proc.stdout.read(info.size + 1)
+                        if len(contents) != info.size + 1:
+                            raise EOFError('git cat-file exited unexpectedly')
+                        contents = contents[:-1]
+                    return info, contents
+                except (OSError, EOFError, ValueError):
+                    self._stop(mode)
+                    if attempt:
+                        raise
+        return None
+
+    def Info(self, rev: str) -> Optional[GitObjectInfo]:
+        """Returns the sha, type and size of the object named rev, or None if
+        there is no such object."""
+        result = self._request('--batch-check', rev)
+        return result[0] if result else None
+
+    def Contents(self, rev: str) -> Optional[tuple[GitObjectInfo, bytes]]:
+        """Returns the info and raw contents of the object named rev, or None
+        if there is no such object."""
+        return self._request('--batch', rev)
+
+    def Exists(self, rev: str) -> bool:
+        return self.Info(rev) is not None
+
+    def Close(self):
+        """Stops the coprocesses. They are restarted on the next query."""
+        for mode, lock in self._locks.items():
+            with lock:
+                self._stop(mode)
+
+
 class GIT(object):
     current_version = None
     rev_parse_cache = {}
@@ -643,6 +757,15 @@ class GIT(object):
     _CONFIG_CACHE: Dict[pathlib.Path, Optional[CachedGitConfigState]] = {}
     _CONFIG_CACHE_LOCK = threading.Lock()
 
+    # Maps cwd -> GitCatFileBatch shared by all the object queries in cwd, in
+    # least recently used order. Each batch keeps up to two processes running,
+    # so only the most recently used ones are kept, to stay well within the
+    # file descriptor limits of gclient sync'ing hundreds of repositories.
+    _CAT_FILE_BATCHES: collections.OrderedDict[
+        pathlib.Path, GitCatFileBatch] = collections.OrderedDict()
+    _CAT_FILE_BATCHES_LOCK = threading.Lock()
+    _MAX_CAT_FILE_BATCHES = 16
+
     @classmethod
     def drop_config_cache(cls):
         """Completely purges all cached git config data.
@@ -685,6 +808,41 @@ class GIT(object):
                         'default', {})
         return state
 
+    @classmethod
+    def GetCatFileBatch(cls, cwd: str) -> GitCatFileBatch:
+        """Returns the GitCatFileBatch shared by all the callers in cwd."""
+        key = pathlib.Path(cwd).absolute()
+        evicted = []
+        with cls._CAT_FILE_BATCHES_LOCK:
+            batch = cls._CAT_FILE_BATCHES.get(key)
+            if batch is None:
+                batch = GitCatFileBatch(str(key))
+                cls._CAT_FILE_BATCHES[key] = batch
+                while len(cls._CAT_FILE_BATCHES) > cls._MAX_CAT_FILE_BATCHES:
+                    evicted.append(
+                        cls._CAT_FILE_BATCHES.popitem(last=False)[1])
+            else:
+                cls._CAT_FILE_BATCHES.move_to_end(key)
+        # Closing waits for the queries in flight, so it's done without
+        # holding the lock.
+        for evicted_batch in evicted:
+            evicted_batch.Close()
+        return batch
+
+    @classmethod
+    def CloseCatFileBatches(cls, under: Optional[str] = None):
+        """Stops the cat-file coprocesses running in `under` or any of its
+        subdirectories, or all of them if `under` is None.
+
+        Must be called before deleting or moving a checkout, since Windows
+        doesn't allow it while processes use it.
+        """
+        root = pathlib.Path(under).absolute() if under else None
+        with cls._CAT_FILE_BATCHES_LOCK:
+            for key in list(cls._CAT_FILE_BATCHES):
+                if root is None or key == root or root in key.parents:
+                    cls._CAT_FILE_BATCHES.pop(key).Close()
+
     @staticmethod
     def ApplyEnvVars(kwargs):
         env = kwargs.pop('env', None) or os.environ.copy()
@@ -1009,6 +1167,14 @@ class GIT(object):
         if platform.system() == 'Windows':
             # git show <sha>:<path> wants a posix path.
             filename = filename.replace('\\', '/')
+        result = GIT.GetCatFileBatch(cwd).Contents('%s:%s' %
+                                                   (branch, filename))
+        if not result:
+            return ''
+        info, contents = result
+        if info.type == 'blob':
+            return contents.decode('utf-8', 'replace')
+        # Let `git show` format anything else, e.g. a tree listing.
         command = ['show', '%s:%s' % (branch, filename)]
         try:
             return GIT.Capture(command, cwd=cwd, strip_out=False)
@@ -1144,22 +1310,26 @@ class GIT(object):
 
     @staticmethod
     def ResolveCommit(cwd, rev):
+        """Returns the full sha of the object named rev.
+
+        Raises subprocess2.CalledProcessError if there is no such object in the
+        local repository.
+        """
         cache_key = None
-        # We do this instead of rev-parse --verify rev^{commit}, since on
-        # Windows git can be either an executable or batch script, each of which
-        # requires escaping the caret (^) a different way.
         if gclient_utils.IsFullGitSha(rev):
             # Only cache full SHAs
             cache_key = hash(cwd + rev)
             if val := GIT.rev_parse_cache.get(cache_key):
                 return val
 
-            # git-rev parse --verify FULL_GIT_SHA always succeeds, even if we
-            # don't have FULL_GIT_SHA locally. Removing the last character
-            # forces git to check if FULL_GIT_SHA refers to an object in the
-            # local database.
-            rev = rev[:-1]
-        res = GIT.Capture(['rev-parse', '--quiet', '--verify', rev], cwd=cwd)
+        # Unlike `git rev-parse --verify`, cat-file checks that full SHAs refer
+        # to an object in the local database.
+        info = GIT.GetCatFileBatch(cwd).Info(rev)
+        if info is None:
+            raise subprocess2.CalledProcessError(
+                1, ['cat-file', '--batch-check'], cwd, b'',
+                b'fatal: Needed a single revision')
+        res = info.sha
         if cache_key:
             # We don't expect concurrent execution, so we don't lock anything.
             GIT.rev_parse_cache[cache_key] = res
@@ -1182,6 +1352,9 @@ class GIT(object):
         return True
 
 
+atexit.register(GIT.CloseCatFileBatches)
+
+
 class DIFF(object):
 
     @staticmethod
@@ -72,6 +72,7 @@ class MockInputApi(object):
         self.platform = sys.platform
         self.python_executable = sys.executable
         self.platform = sys.platform
+        self.environ = {}
         self.subprocess = subprocess
         self.sys = sys
         self.files = []
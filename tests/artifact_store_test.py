@@ -0,0 +1,143 @@
+#!/usr/bin/env vpython3
+# Copyright 2026 The Chromium Authors
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+"""Unit tests for artifact_store.py."""
+
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import unittest
+
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import artifact_store
+import lockfile
+
+
+class ArtifactStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.store = artifact_store.ArtifactStore(
+            os.path.join(self.temp_dir, 'store'), max_size=10)
+        self.checkout = os.path.join(self.temp_dir, 'checkout')
+        os.makedirs(self.checkout)
+
+    def _write(self, name, contents):
+        path = os.path.join(self.checkout, name)
+        with open(path, 'w') as f:
+            f.write(contents)
+        return path
+
+    def _read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def testFetchMissing(self):
+        output = os.path.join(self.checkout, 'output')
+        self.assertFalse(self.store.fetch('sha1', 'ab' * 20, output))
+        self.assertEqual([], os.listdir(self.checkout))
+
+    def testAddAndFetch(self):
+        path = self._write('a', 'aaa')
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        self.assertTrue(self.store.add('sha256', 'AA11', path))
+        self.assertTrue(self.store.contains('sha256', 'aa11'))
+        self.assertFalse(self.store.contains('sha1', 'aa11'))
+
+        output = self._write('output', 'old')
+        self.assertTrue(self.store.fetch('sha256', 'aa11', output))
+        self.assertEqual('aaa', self._read(output))
+        self.assertTrue(os.stat(output).st_mode & stat.S_IEXEC)
+        self.assertEqual(['a', 'output'], sorted(os.listdir(self.checkout)))
+
+    def testFetchPreservesModificationTime(self):
+        path = self._write('a', 'aaa')
+        os.utime(path, ns=(0, 1234567890123456789))
+        self.store.add('sha1', 'aa11', path)
+        output = os.path.join(self.checkout, 'output')
+        self.store.fetch('sha1', 'aa11', output)
+        self.store.fetch('sha1', 'aa11', output)
+        self.assertEqual(1234567890123456789, os.stat(path).st_mtime_ns)
+
+    def testReflinkOrCopyFallsBack(self):
+        path = self._write('a', 'aaa')
+        with mock.patch('artifact_store._reflink', side_effect=OSError):
+            self.store.add('sha1', 'aa11', path)
+            output = os.path.join(self.checkout, 'output')
+            self.assertTrue(self.store.fetch('sha1', 'aa11', output))
+        self.assertEqual('aaa', self._read(output))
+        self.assertNotEqual(os.stat(path).st_ino, os.stat(output).st_ino)
+
+    def testEditingCheckoutDoesNotChangeStore(self):
+        path = self._write('a', 'aaa')
+        self.store.add('sha1', 'aa11', path)
+        output = os.path.join(self.checkout, 'output')
+        self.store.fetch('sha1', 'aa11', output)
+        for edited in (path, output):
+            with open(edited, 'w') as f:
+                f.write('bbb')
+            os.chmod(edited, 0o700)
+        self.store.fetch('sha1', 'aa11', output)
+        self.assertEqual('aaa', self._read(output))
+
+    def testRemove(self):
+        self.store.add('sha1', 'aa11', self._write('a', 'aaaa'))
+        self.store.remove('sha1', 'aa11')
+        self.assertFalse(self.store.contains('sha1', 'aa11'))
+        # Removing a missing object is not fatal.
+        self.store.remove('sha1', 'aa11')
+        # The removed object no longer counts towards the size.
+        self.store.add('sha1', 'bb22', self._write('b', 'bbbb'))
+        self.store.add('sha1', 'cc33', self._write('c', 'cccc'))
+        self.assertTrue(self.store.contains('sha1', 'bb22'))
+        self.assertTrue(self.store.contains('sha1', 'cc33'))
+
+    def testAddDoesNotScanStore(self):
+        self.store.add('sha1', 'aa11', self._write('a', 'aaaa'))
+        with mock.patch('os.walk') as walk:
+            self.store.add('sha1', 'bb22', self._write('b', 'bbbb'))
+        walk.assert_not_called()
+        # The store is scanned when it grows beyond its size.
+        self.store.add('sha1', 'cc33', self._write('c', 'cccc'))
+        self.assertFalse(self.store.contains('sha1', 'aa11'))
+
+    def testEvictsLeastRecentlyUsed(self):
+        self.store.add('sha1', 'aa11', self._write('a', 'aaaa'))
+        self.store.add('sha1', 'bb22', self._write('b', 'bbbb'))
+        # Use 'aa11' after 'bb22' was added.
+        objects = os.path.join(self.store.root, 'sha1')
+        os.utime(os.path.join(objects, 'bb', 'bb22'), (1000, 1000))
+        os.utime(os.path.join(objects, 'aa', 'aa11'), (2000, 2000))
+        self.store.add('sha1', 'cc33', self._write('c', 'cccc'))
+        self.assertTrue(self.store.contains('sha1', 'aa11'))
+        self.assertFalse(self.store.contains('sha1', 'bb22'))
+        self.assertTrue(self.store.contains('sha1', 'cc33'))
+
+    def testAddFailureIsNotFatal(self):
+        path = self._write('a', 'aaa')
+        with mock.patch('lockfile.lock', side_effect=lockfile.LockError('')):
+            self.assertFalse(self.store.add('sha1', 'aa11', path))
+        self.assertFalse(self.store.contains('sha1', 'aa11'))
+
+    def testFromEnvironment(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertIsNone(
+                artifact_store.ArtifactStore.from_environment())
+        with mock.patch.dict(
+                os.environ, {
+                    artifact_store.ARTIFACT_STORE_DIR_ENV_VAR: self.temp_dir,
+                    artifact_store.ARTIFACT_STORE_MAX_SIZE_ENV_VAR: '100',
+                }):
+            store = artifact_store.ArtifactStore.from_environment()
+        self.assertEqual(self.temp_dir, store.root)
+        self.assertEqual(100, store.max_size)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# Copyright 2026 The Chromium Authors
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import cpplint
+
+# Lines which the checks using the elided line index report errors on, and
+# lines they skip.
+_SOURCE = '''// Copyright 2026 The Chromium Authors
+#include <mutex>
+#include <tr1/memory>
+
+#define ALIGNED std::aligned_union
+#if defined(A)
+class Foo {
+  #else
+class Foo : public Bar {
+#endif
+ public:
+  int operator==(const Foo& other) const;
+  int a=b;
+  bool c = (a==b);
+  int d = x<<y;
+  bool e = ! c;
+  int f = (int)g;
+  int* h = (int*)&i;
+};
+
+void Bar() {
+  foo( a, b);
+  char* token = strtok(s, ",");
+  std::alignment_of<int> j;
+  std::vector<int> k;
+  int l = 0;
+};
+'''
+
+
+class _EveryCharacter(object):
+    """Stands for the characters of a line which has them all."""
+    def __contains__(self, char):
+        return True
+
+    def isdisjoint(self, chars):
+        return False
+
+
+class CpplintTest(unittest.TestCase):
+    def _Lint(self, source):
+        errors = []
+
+        def error(filename, linenum, category, confidence, message):
+            errors.append((linenum, category, confidence, message))
+
+        cpplint.ProcessFileData('foo.cc', 'cc', source.split('\n'), error)
+        return errors
+
+    def testElidedLineIndex(self):
+        errors = self._Lint(_SOURCE)
+        # The class declarations in the #if and #else branches don't leave
+        # an incomplete declaration behind.
+        self.assertEqual([
+            (2, 'build/c++11'),
+            (3, 'build/c++tr1'),
+            (3, 'build/include_order'),
+            (5, 'build/c++11'),
+            (13, 'whitespace/operators'),
+            (14, 'whitespace/operators'),
+            (15, 'whitespace/operators'),
+            (16, 'whitespace/operators'),
+            (17, 'readability/casting'),
+            (18, 'readability/casting'),
+            (22, 'whitespace/parens'),
+            (23, 'runtime/threadsafe_fn'),
+            (24, 'build/c++11'),
+            (27, 'readability/braces'),
+        ], sorted((linenum, category) for linenum, category, _, _ in errors))
+
+        # Without the index, every line looks like it may match every check.
+        cleansed_lines_init = cpplint.CleansedLines.__init__
+
+        def init_without_index(clean_lines, lines):
+            cleansed_lines_init(clean_lines, lines)
+            clean_lines.elided_chars = ([_EveryCharacter()] *
+                                        clean_lines.NumLines())
+            clean_lines.is_preprocessor = [True] * clean_lines.NumLines()
+
+        with mock.patch.object(cpplint.CleansedLines, '__init__',
+                               init_without_index):
+            self.assertEqual(errors, self._Lint(_SOURCE))
+
+    def testProfileChecks(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        paths = []
+        for name in ('a.cc', 'b.cc'):
+            paths.append(os.path.join(temp_dir, name))
+            with open(paths[-1], 'w') as f:
+                f.write(_SOURCE)
+        cmd = [sys.executable, os.path.join(ROOT_DIR, 'cpplint.py')]
+
+        expected = subprocess.run(cmd + paths,
+                                  stderr=subprocess.PIPE,
+                                  text=True).stderr
+        for jobs in ('1', '2'):
+            output = subprocess.run(cmd + ['--profile-checks', '--jobs', jobs] +
+                                    paths,
+                                    stderr=subprocess.PIPE,
+                                    text=True).stderr
+            self.assertTrue(output.startswith(expected))
+            profile = output[len(expected):].splitlines()
+            self.assertEqual(['Check', 'Calls', 'Time', '(ms)'],
+                             profile[0].split())
+            calls = {
+                row.split()[0]: int(row.split()[1])
+                for row in profile[1:]
+            }
+            self.assertEqual(2, calls['CleansedLines'])
+            self.assertEqual(2, calls['CheckForCopyright'])
+            self.assertEqual(calls['CheckStyle'],
+                             calls['NestingState.Update'])
+            self.assertGreater(calls['CheckOperatorSpacing'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,12 +14,17 @@ import sys
 import tarfile
 import tempfile
 import threading
+import time
 import unittest
 
+from unittest import mock
+
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import artifact_store
 import upload_to_google_storage
 import download_from_google_storage
+import gcs_download
 
 # ../third_party/gsutil/gsutil
 GSUTIL_DEFAULT_PATH = os.path.join(
@@ -88,6 +93,13 @@ class GstoolsUnitTests(unittest.TestCase):
         self.temp_dir = tempfile.mkdtemp(prefix='gstools_test')
         self.base_path = os.path.join(self.temp_dir, 'test_files')
         shutil.copytree(os.path.join(TEST_DIR, 'gstools'), self.base_path)
+        self.hash_cache_dir = os.path.join(self.temp_dir, 'hash_cache')
+        mock.patch.dict(
+            os.environ, {
+                download_from_google_storage.HASH_CACHE_DIR_ENV_VAR:
+                self.hash_cache_dir
+            }).start()
+        self.addCleanup(mock.patch.stopall)
 
     def tearDown(self):
         shutil.rmtree(self.temp_dir)
@@ -162,6 +174,79 @@ class GstoolsUnitTests(unittest.TestCase):
         self.assertEqual(download_from_google_storage.get_sha1(lorem_ipsum),
                          '7871c8e24da15bad8b0be2c36edc9dc77e37727f')
 
+    def _make_old_file(self, contents, name='old_file'):
+        filename = os.path.join(self.temp_dir, name)
+        with open(filename, 'w') as f:
+            f.write(contents)
+        old = time.time() - 3600
+        os.utime(filename, (old, old))
+        return filename
+
+    def _hash_cache_entries(self):
+        return [
+            name for name in os.listdir(self.hash_cache_dir)
+            if not name.startswith('.')
+        ]
+
+    def test_get_digest_cached(self):
+        filename = self._make_old_file('lorem ipsum')
+        self.assertEqual(download_from_google_storage.get_sha1(filename),
+                         'bfb7759a67daeb65410490b4d98bb9da7d1ea2ce')
+        self.assertEqual(1, len(self._hash_cache_entries()))
+        with mock.patch('download_from_google_storage._hash_file') as hash_file:
+            self.assertEqual(
+                download_from_google_storage.get_sha1(filename),
+                'bfb7759a67daeb65410490b4d98bb9da7d1ea2ce')
+            hash_file.return_value = 'sha256'
+            self.assertEqual(
+                download_from_google_storage.get_digest(filename, 'sha256'),
+                'sha256')
+            self.assertEqual(
+                download_from_google_storage.get_sha1(filename),
+                'bfb7759a67daeb65410490b4d98bb9da7d1ea2ce')
+            hash_file.assert_called_once_with(filename, 'sha256')
+
+    def test_get_digest_stat_changed(self):
+        filename = self._make_old_file('lorem ipsum')
+        download_from_google_storage.get_sha1(filename)
+        with open(filename, 'w') as f:
+            f.write('LOREM IPSUM')
+        self.assertEqual(download_from_google_storage.get_sha1(filename),
+                         '1fb809cd71db152135c52039f63486e5b999dc27')
+
+    def test_get_digest_recently_modified(self):
+        filename = os.path.join(self.temp_dir, 'new_file')
+        with open(filename, 'w') as f:
+            f.write('lorem ipsum')
+        self.assertEqual(download_from_google_storage.get_sha1(filename),
+                         'bfb7759a67daeb65410490b4d98bb9da7d1ea2ce')
+        self.assertFalse(os.path.exists(self.hash_cache_dir))
+
+    def test_get_digest_cache_pruned(self):
+        filename = self._make_old_file('lorem ipsum')
+        download_from_google_storage.get_sha1(filename)
+        os.remove(filename)
+        # The cache is pruned at most once a day.
+        other_filename = self._make_old_file('other', 'other_file')
+        download_from_google_storage.get_sha1(other_filename)
+        self.assertEqual(2, len(self._hash_cache_entries()))
+
+        # Entries of deleted files are removed.
+        old = time.time() - 2 * 24 * 60 * 60
+        os.utime(os.path.join(self.hash_cache_dir, '.pruned'), (old, old))
+        download_from_google_storage.get_digest(other_filename, 'sha256')
+        self.assertEqual(1, len(self._hash_cache_entries()))
+
+    def test_get_digest_cache_disabled(self):
+        filename = self._make_old_file('lorem ipsum')
+        with mock.patch.dict(os.environ, {
+                download_from_google_storage.HASH_CACHE_DIR_ENV_VAR: ''
+        }):
+            self.assertEqual(
+                download_from_google_storage.get_sha1(filename),
+                'bfb7759a67daeb65410490b4d98bb9da7d1ea2ce')
+        self.assertFalse(os.path.exists(self.hash_cache_dir))
+
     def test_get_md5(self):
         lorem_ipsum = os.path.join(self.base_path, 'lorem_ipsum.txt')
         self.assertEqual(upload_to_google_storage.get_md5(lorem_ipsum),
@@ -198,6 +283,12 @@ class DownloadTests(unittest.TestCase):
         self.base_path = os.path.join(self.temp_dir, 'download_test_data')
         shutil.copytree(self.checkout_test_files, self.base_path)
         self.base_url = 'gs://sometesturl'
+        mock.patch.dict(
+            os.environ, {
+                download_from_google_storage.HASH_CACHE_DIR_ENV_VAR:
+                os.path.join(self.temp_dir, 'hash_cache')
+            }).start()
+        self.addCleanup(mock.patch.stopall)
         self.parser = optparse.OptionParser()
         self.queue = queue.Queue()
         self.ret_codes = queue.Queue()
@@ -263,6 +354,128 @@ class DownloadTests(unittest.TestCase):
         self.assertEqual(self.gsutil.history, expected_calls)
         self.assertEqual(list(self.ret_codes.queue), expected_ret_codes)
 
+    def test_download_worker_streaming(self):
+        sha1_hash = self.lorem_ipsum_sha1
+        output_filename = os.path.join(self.base_path,
+                                       'uploaded_lorem_ipsum.txt')
+        downloader = mock.Mock()
+        downloader.download.return_value = gcs_download.DownloadResult(
+            size=0, digests={'sha1': sha1_hash}, executable=False)
+        self.queue.put((sha1_hash, output_filename))
+        self.queue.put((None, None))
+        stdout_queue = queue.Queue()
+        download_from_google_storage._downloader_worker_thread(
+            0,
+            self.queue,
+            False,
+            self.base_url,
+            self.gsutil,
+            stdout_queue,
+            self.ret_codes,
+            True,
+            False,
+            downloader=downloader)
+        downloader.download.assert_called_once_with(
+            '%s/%s' % (self.base_url, sha1_hash),
+            output_filename,
+            algorithms=('sha1', ),
+            expected_digests={'sha1': sha1_hash},
+            extract_dir=None,
+            validate_member=mock.ANY,
+            require_archive=True)
+        self.assertEqual([], self.gsutil.history)
+        self.assertEqual(list(self.ret_codes.queue), [])
+
+    def test_download_worker_streaming_fails(self):
+        sha1_hash = self.lorem_ipsum_sha1
+        output_filename = os.path.join(self.base_path,
+                                       'uploaded_lorem_ipsum.txt')
+        downloader = mock.Mock()
+        downloader.download.side_effect = gcs_download.VerificationError(
+            'sha1 mismatch')
+        self.queue.put((sha1_hash, output_filename))
+        self.queue.put((None, None))
+        download_from_google_storage._downloader_worker_thread(
+            0,
+            self.queue,
+            False,
+            self.base_url,
+            self.gsutil,
+            queue.Queue(),
+            self.ret_codes,
+            True,
+            False,
+            downloader=downloader)
+        self.assertEqual([(20, 'sha1 mismatch')], list(self.ret_codes.queue))
+
+    def test_download_worker_artifact_store(self):
+        sha1_hash = self.lorem_ipsum_sha1
+        output_filename = os.path.join(self.base_path,
+                                       'uploaded_lorem_ipsum.txt')
+        store = artifact_store.ArtifactStore(
+            os.path.join(self.temp_dir, 'artifact_store'))
+        self.gsutil.add_expected(
+            0, '', '',
+            lambda: shutil.copyfile(self.lorem_ipsum, output_filename))  # cp
+        for _ in range(2):
+            self.queue.put((sha1_hash, output_filename))
+            self.queue.put((None, None))
+            download_from_google_storage._downloader_worker_thread(
+                0,
+                self.queue,
+                True,
+                self.base_url,
+                self.gsutil,
+                queue.Queue(),
+                self.ret_codes,
+                True,
+                False,
+                artifact_store=store)
+        # The second download comes from the store.
+        self.assertEqual(1, [call[1][0] for call in self.gsutil.history
+                             ].count('cp'))
+        self.assertTrue(store.contains('sha1', sha1_hash))
+        self.assertEqual(sha1_hash,
+                         download_from_google_storage.get_sha1(output_filename))
+        self.assertEqual(list(self.ret_codes.queue), [])
+
+    def test_download_worker_corrupt_artifact_store(self):
+        sha1_hash = self.lorem_ipsum_sha1
+        output_filename = os.path.join(self.base_path,
+                                       'uploaded_lorem_ipsum.txt')
+        store = artifact_store.ArtifactStore(
+            os.path.join(self.temp_dir, 'artifact_store'))
+        corrupt_filename = os.path.join(self.temp_dir, 'corrupt')
+        with open(corrupt_filename, 'w') as f:
+            f.write('corrupt')
+        store.add('sha1', sha1_hash, corrupt_filename)
+        self.gsutil.add_expected(
+            0, '', '',
+            lambda: shutil.copyfile(self.lorem_ipsum, output_filename))  # cp
+        self.queue.put((sha1_hash, output_filename))
+        self.queue.put((None, None))
+        download_from_google_storage._downloader_worker_thread(
+            0,
+            self.queue,
+            True,
+            self.base_url,
+            self.gsutil,
+            queue.Queue(),
+            self.ret_codes,
+            True,
+            False,
+            artifact_store=store)
+        # The corrupt object was replaced with the downloaded one.
+        self.assertEqual(1, [call[1][0] for call in self.gsutil.history
+                             ].count('cp'))
+        self.assertEqual(list(self.ret_codes.queue), [])
+        self.assertEqual(sha1_hash,
+                         download_from_google_storage.get_sha1(output_filename))
+        os.remove(output_filename)
+        self.assertTrue(store.fetch('sha1', sha1_hash, output_filename))
+        self.assertEqual(sha1_hash,
+                         download_from_google_storage.get_sha1(output_filename))
+
     def test_download_worker_skips_file(self):
         sha1_hash = 'e6c4fbd4fe7607f3e6ebf68b2ea4ef694da7b4fe'
         output_filename = os.path.join(self.base_path, 'rootfolder_text.txt')
@@ -0,0 +1,122 @@
+#!/usr/bin/env vpython3
+# Copyright 2026 The Chromium Authors
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+"""Microbenchmark for gclient_eval condition evaluation.
+
+Evaluates the conditions of every dep and hook of a DEPS file, e.g.
+chromium/src/DEPS, the way gclient does for a sync:
+  - uncached: parses and walks each condition on every evaluation.
+  - cached: EvaluateCondition, reusing compiled conditions.
+  - batch: EvaluateConditions, evaluating each distinct condition once.
+
+Usage:
+  vpython3 tests/gclient_eval_benchmark.py path/to/src/DEPS \\
+      [--target-os android] [--target-cpu arm64]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics_utils
+# We have to disable monitoring before importing gclient.
+metrics_utils.COLLECT_METRICS = False
+
+import gclient
+import gclient_eval
+import gclient_utils
+
+
+def _get_variables(local_scope, target_os, target_cpu):
+    """Returns the variables gclient evaluates the conditions with."""
+    variables = dict(local_scope.get('vars', {}))
+    variables.update(
+        gclient.Dependency.get_builtin_vars(
+            types.SimpleNamespace(target_os=target_os,
+                                  target_cpu=target_cpu)))
+    return variables
+
+
+def _get_conditions(local_scope):
+    """Returns the conditions of all the deps and hooks, in DEPS order."""
+    conditions = []
+    for dep_value in local_scope.get('deps', {}).values():
+        if dep_value and dep_value.get('condition'):
+            conditions.append(dep_value['condition'])
+    for hook in (local_scope.get('hooks', []) +
+                 local_scope.get('pre_deps_hooks', [])):
+        if hook.get('condition'):
+            conditions.append(hook['condition'])
+    return conditions
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('deps_file', help='Path to the DEPS file to use.')
+    parser.add_argument('--target-os',
+                        action='append',
+                        default=[],
+                        help='target_os to evaluate for, can be repeated. '
+                        'Defaults to the host OS.')
+    parser.add_argument('--target-cpu',
+                        action='append',
+                        default=[],
+                        help='target_cpu to evaluate for, can be repeated. '
+                        'Defaults to the host CPU.')
+    parser.add_argument('-n',
+                        '--iterations',
+                        type=int,
+                        default=20,
+                        help='Number of timed iterations (default: %(default)s)')
+    options = parser.parse_args(args)
+
+    target_os = options.target_os or [
+        gclient.GClient.DEPS_OS_CHOICES.get(sys.platform, 'unix')
+    ]
+    target_cpu = options.target_cpu or [
+        gclient.detect_host_arch.HostArch()
+    ]
+    content = gclient_utils.FileRead(options.deps_file)
+    builtin_vars = _get_variables({}, target_os, target_cpu)
+    local_scope = gclient_eval.Parse(content, options.deps_file, None,
+                                     builtin_vars)
+    variables = _get_variables(local_scope, target_os, target_cpu)
+    conditions = _get_conditions(local_scope)
+
+    uncompiled = gclient_eval.CompileCondition.__wrapped__
+
+    def uncached():
+        return [uncompiled(c)(variables) for c in conditions]
+
+    def cached():
+        return [
+            gclient_eval.EvaluateCondition(c, variables) for c in conditions
+        ]
+
+    def batch():
+        results = gclient_eval.EvaluateConditions(conditions, variables)
+        return [results[c] for c in conditions]
+
+    expected = uncached()
+    if cached() != expected or batch() != expected:
+        print('Results differ between evaluators!', file=sys.stderr)
+        return 1
+
+    print('%s: %d conditions (%d distinct), %d iterations' %
+          (options.deps_file, len(conditions), len(
+              set(conditions)), options.iterations))
+    for name, fn in (('uncached', uncached), ('cached', cached), ('batch',
+                                                                  batch)):
+        elapsed = timeit.timeit(fn, number=options.iterations)
+        print('  %-8s %8.3f ms/iteration' %
+              (name, elapsed * 1000 / options.iterations))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -7,6 +7,8 @@ import itertools
 import logging
 import os
 import sys
+import tempfile
+import time
 import unittest
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -438,6 +440,60 @@ class EvaluateConditionTest(unittest.TestCase):
                                            {'s_var': Str("foo")}))
 
 
+class CompileConditionTest(unittest.TestCase):
+    def test_cached(self):
+        self.assertIs(gclient_eval.CompileCondition('foo and bar'),
+                      gclient_eval.CompileCondition('foo and bar'))
+
+    def test_referenced_names(self):
+        compiled = gclient_eval.CompileCondition(
+            'foo and not (bar == "baz") and True and qux in ("a", "b")')
+        self.assertEqual({'foo', 'bar', 'qux'}, compiled.referenced_names)
+
+    def test_evaluate(self):
+        compiled = gclient_eval.CompileCondition('foo and bar != "baz"')
+        self.assertTrue(compiled({'foo': True, 'bar': 'qux'}))
+        self.assertFalse(compiled({'foo': 'bar == "baz"', 'bar': 'baz'}))
+
+    def test_errors_raised_on_evaluation(self):
+        compiled = gclient_eval.CompileCondition('1 + 2')
+        with self.assertRaises(ValueError) as cm:
+            compiled({})
+        self.assertIn('unexpected AST node', str(cm.exception))
+
+    def test_operands_evaluated_before_operator_error(self):
+        with self.assertRaises(ValueError) as cm:
+            gclient_eval.EvaluateCondition('foo < bar', {'foo': 'foo'})
+        self.assertIn('invalid cyclic reference', str(cm.exception))
+
+    def test_syntax_error_not_cached(self):
+        for _ in range(2):
+            with self.assertRaises(SyntaxError):
+                gclient_eval.CompileCondition('foo and')
+
+    def test_evaluate_conditions(self):
+        variables = {'foo': True, 'bar': 'not foo'}
+        self.assertEqual(
+            {
+                'foo': True,
+                'bar': False,
+                'foo and bar': False,
+                'foo or bar': True,
+            },
+            gclient_eval.EvaluateConditions(
+                ['foo', 'bar', 'foo and bar', 'foo', 'foo or bar'],
+                variables))
+
+    def test_evaluate_conditions_error(self):
+        with self.assertRaises(ValueError) as cm:
+            gclient_eval.EvaluateConditions(['foo', 'bar'], {
+                'foo': True,
+                'bar': 'bar'
+            })
+        self.assertIn('invalid cyclic reference to \'bar\' (inside \'bar\')',
+                      str(cm.exception))
+
+
 class VarTest(unittest.TestCase):
     def assert_adds_var(self, before, after):
         local_scope = gclient_eval.Exec(file_join(before))
@@ -1318,6 +1374,105 @@ class ParseTest(unittest.TestCase):
             }, local_scope)
 
 
+class ParseCacheTest(unittest.TestCase):
+    DEPS_CONTENT = file_join([
+        'vars = {',
+        '  "foo": "bar",',
+        '  "const": Str("{baz}"),',
+        '}',
+        'deps = {',
+        '  "a_dep": "a{foo}b",',
+        '  "b_dep": {',
+        '    "url": "b_url",',
+        '    "condition": "checkout_b",',
+        '  },',
+        '}',
+        'recursedeps = [("a_dep", "DEPS.alt")]',
+    ])
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(gclient_utils.rmtree, self.cache_dir)
+        self.cache = gclient_eval.ParseCache(self.cache_dir)
+
+    def parseAndSet(self, vars_override=None, builtin_vars=None):
+        result = gclient_eval.Parse(self.DEPS_CONTENT, 'DEPS', vars_override,
+                                    builtin_vars)
+        self.cache.Set(self.DEPS_CONTENT, 'DEPS', vars_override, builtin_vars,
+                       result)
+        return result
+
+    def test_miss(self):
+        self.assertIsNone(self.cache.Get(self.DEPS_CONTENT, 'DEPS'))
+
+    def test_round_trip(self):
+        result = self.parseAndSet({'foo': 'baz'}, {'checkout_b': True})
+        cached = self.cache.Get(self.DEPS_CONTENT, 'DEPS', {'foo': 'baz'},
+                                {'checkout_b': True})
+        self.assertEqual(result, cached)
+        self.assertIsInstance(cached['vars']['const'],
+                              gclient_eval.ConstantString)
+        self.assertEqual(('a_dep', 'DEPS.alt'), cached['recursedeps'][0])
+        self.assertEqual(['vars', 'deps', 'recursedeps'], list(cached))
+
+    def test_invalidated_by_content(self):
+        self.parseAndSet()
+        self.assertIsNone(
+            self.cache.Get(self.DEPS_CONTENT + '\n', 'DEPS'))
+
+    def test_invalidated_by_vars(self):
+        self.parseAndSet({'foo': 'baz'}, {'checkout_b': True})
+        self.assertIsNone(
+            self.cache.Get(self.DEPS_CONTENT, 'DEPS', {'foo': 'qux'},
+                           {'checkout_b': True}))
+        self.assertIsNone(
+            self.cache.Get(self.DEPS_CONTENT, 'DEPS', {'foo': 'baz'},
+                           {'checkout_b': False}))
+
+    def test_entry_per_file(self):
+        self.parseAndSet()
+        self.assertIsNone(self.cache.Get(self.DEPS_CONTENT, 'other/DEPS'))
+
+    def test_corrupted_entry(self):
+        self.parseAndSet()
+        for name in os.listdir(self.cache_dir):
+            with open(os.path.join(self.cache_dir, name), 'w') as f:
+                f.write('{')
+        self.assertIsNone(self.cache.Get(self.DEPS_CONTENT, 'DEPS'))
+
+    def test_prune(self):
+        deps_dir = tempfile.mkdtemp()
+        self.addCleanup(gclient_utils.rmtree, deps_dir)
+        kept, removed = (os.path.join(deps_dir, name, 'DEPS')
+                         for name in ('kept', 'removed'))
+        for path in (kept, removed):
+            os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                f.write(self.DEPS_CONTENT)
+            self.cache.Set(self.DEPS_CONTENT, path, None, None,
+                           gclient_eval.Parse(self.DEPS_CONTENT, path))
+        os.remove(removed)
+        old = time.time() - 2 * self.cache.PRUNE_SECONDS
+        for name in ('old.tmp', 'new.tmp'):
+            with open(os.path.join(self.cache_dir, name), 'w'):
+                pass
+        os.utime(os.path.join(self.cache_dir, 'old.tmp'), (old, old))
+
+        # The cache was pruned by the first Set().
+        self.cache.Prune()
+        self.assertIsNotNone(self.cache.Get(self.DEPS_CONTENT, removed))
+
+        os.utime(os.path.join(self.cache_dir, '.pruned'), (old, old))
+        self.cache.Prune()
+        self.assertIsNotNone(self.cache.Get(self.DEPS_CONTENT, kept))
+        self.assertIsNone(self.cache.Get(self.DEPS_CONTENT, removed))
+        self.assertEqual(
+            sorted([
+                '.pruned', 'new.tmp',
+                os.path.basename(self.cache._EntryPath(kept))
+            ]), sorted(os.listdir(self.cache_dir)))
+
+
 if __name__ == '__main__':
     level = logging.DEBUG if '-v' in sys.argv else logging.FATAL
     logging.basicConfig(level=level,
@@ -0,0 +1,174 @@
+#!/usr/bin/env vpython3
+# Copyright 2026 The Chromium Authors
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+"""Benchmark for the clone strategies of gclient_scm.GitWrapper.
+
+Clones a generated fake repository the way gclient does for a new dep, and
+reports the wall time and the bytes written to the checkout per strategy:
+  - full: a plain clone of the remote.
+  - shared: a --shared clone of an already populated git cache mirror.
+  - filter: a partial clone of the remote, with --filter=blob:none.
+  - sparse: a plain clone, checking out a single directory.
+  - filter+sparse: a partial clone, checking out a single directory.
+
+Usage:
+  vpython3 tests/gclient_scm_benchmark.py [--dirs 20] [--files 50] \\
+      [--file-size 4096]
+"""
+
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gclient_scm
+import git_cache
+import subprocess2
+from testing_support import fake_repos
+
+
+class _GeneratedRepo(fake_repos.FakeReposBase):
+    """A single repository of |dirs| directories of |files| files each."""
+    def __init__(self, dirs, files, file_size):
+        super(_GeneratedRepo, self).__init__()
+        self.dirs = dirs
+        self.files = files
+        self.file_size = file_size
+
+    def populateGit(self):
+        tree = {}
+        for d in range(self.dirs):
+            for f in range(self.files):
+                # Distinct contents, so that git can't deduplicate the blobs.
+                line = 'dir%d/file%d ' % (d, f)
+                tree['dir%d/file%d' % (d, f)] = (
+                    line * (self.file_size // len(line) + 1))[:self.file_size]
+        self._commit_git('repo_1', tree)
+        subprocess2.check_call(
+            ['git', 'config', 'uploadpack.allowFilter', 'true'],
+            cwd=os.path.join(self.git_base, 'repo_1'))
+
+
+def _options():
+    return types.SimpleNamespace(verbose=False,
+                                 revision=None,
+                                 force=False,
+                                 reset=False,
+                                 no_history=False,
+                                 upstream=False,
+                                 merge=False,
+                                 jobs=1,
+                                 break_repo_locks=False,
+                                 delete_unversioned_trees=False,
+                                 patch_ref=None,
+                                 patch_repo=None,
+                                 auto_rebase=False,
+                                 nohooks=False,
+                                 deps_os=None,
+                                 cache_dir=None)
+
+
+def _bytes_written(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            st = os.lstat(os.path.join(dirpath, filename))
+            total += st.st_size
+    return total
+
+
+def _clone(url, cache_dir, **kwargs):
+    """Clones |url| into a new directory; returns (seconds, bytes)."""
+    root_dir = tempfile.mkdtemp(prefix='gclient_scm_benchmark')
+    try:
+        git_cache.Mirror.SetCachePath(cache_dir)
+        wrapper = gclient_scm.GitWrapper(url,
+                                         root_dir,
+                                         'checkout',
+                                         out_fh=io.StringIO(),
+                                         **kwargs)
+        start = time.time()
+        wrapper.update(_options(), (), [])
+        elapsed = time.time() - start
+        return elapsed, _bytes_written(os.path.join(root_dir, 'checkout'))
+    finally:
+        git_cache.Mirror.SetCachePath(None)
+        shutil.rmtree(root_dir)
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dirs',
+                        type=int,
+                        default=20,
+                        help='Directories in the repository '
+                        '(default: %(default)s)')
+    parser.add_argument('--files',
+                        type=int,
+                        default=50,
+                        help='Files per directory (default: %(default)s)')
+    parser.add_argument('--file-size',
+                        type=int,
+                        default=4096,
+                        help='Bytes per file (default: %(default)s)')
+    parser.add_argument('-n',
+                        '--iterations',
+                        type=int,
+                        default=3,
+                        help='Clones per strategy; the fastest is reported '
+                        '(default: %(default)s)')
+    options = parser.parse_args(args)
+
+    repos = _GeneratedRepo(options.dirs, options.files, options.file_size)
+    if not repos.set_up_git():
+        print('git is not available', file=sys.stderr)
+        return 1
+    url = os.path.join(repos.git_base, 'repo_1')
+    # git ignores filters when cloning a local path.
+    file_url = 'file://' + url.replace(os.sep, '/')
+    cache_dir = tempfile.mkdtemp(prefix='gclient_scm_benchmark_cache')
+    try:
+        # Populate the mirror, so the shared clone measures only the clone.
+        _clone(url, cache_dir)
+
+        strategies = (
+            ('full', url, None, {}),
+            ('shared', url, cache_dir, {}),
+            ('filter', file_url, None, {
+                'clone_filter': 'blob:none'
+            }),
+            ('sparse', url, None, {
+                'sparse_checkout': ['dir0']
+            }),
+            ('filter+sparse', file_url, None, {
+                'clone_filter': 'blob:none',
+                'sparse_checkout': ['dir0']
+            }),
+        )
+        print('%d directories of %d files of %d bytes, %d iterations' %
+              (options.dirs, options.files, options.file_size,
+               options.iterations))
+        for name, strategy_url, strategy_cache_dir, kwargs in strategies:
+            results = [
+                _clone(strategy_url, strategy_cache_dir, **kwargs)
+                for _ in range(options.iterations)
+            ]
+            elapsed = min(r[0] for r in results)
+            written = results[-1][1]
+            print('  %-14s %8.3f s %12d bytes written' %
+                  (name, elapsed, written))
+    finally:
+        # The repository itself is removed at exit by fake_repos.
+        shutil.rmtree(cache_dir)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -430,6 +430,34 @@ class ManagedGitWrapperTestCase(BaseGitWrapperTestCase):
         del os.environ['GCLIENT_SUPPRESS_SUBMODULE_WARNING']
         sys.stdout.close()
 
+    def testUpdateSparseCheckout(self):
+        if not self.enabled:
+            return
+        options = self.Options()
+        # The directories are set again only when they change.
+        for sparse_checkout, expected, changed in (
+            (['d'], ['d'], True),
+            (['d', 'e/'], ['d', 'e'], True),
+            (['e', 'd'], ['d', 'e'], False),
+        ):
+            git_wrapper = gclient_scm.GitWrapper(
+                self.url,
+                self.root_dir,
+                self.relpath,
+                sparse_checkout=sparse_checkout)
+            with mock.patch.object(
+                    git_wrapper,
+                    '_SetSparseCheckout',
+                    wraps=git_wrapper._SetSparseCheckout) as set_sparse:
+                git_wrapper.update(options, (), [])
+            self.assertEqual(changed, set_sparse.called)
+            self.assertEqual(
+                expected,
+                sorted(
+                    git_wrapper._Capture(['sparse-checkout',
+                                          'list']).splitlines()))
+        sys.stdout.close()
+
     def testUpdateMerge(self):
         if not self.enabled:
             return
@@ -834,6 +862,63 @@ class UnmanagedGitWrapperTestCase(BaseGitWrapperTestCase):
         self.checkInStdout(
             'Checked out refs/remotes/origin/main to a detached HEAD')
 
+    def testUpdateCloneSparse(self):
+        if not self.enabled:
+            return
+        options = self.Options()
+
+        origin_root_dir = self.root_dir
+        self.addCleanup(gclient_utils.rmtree, origin_root_dir)
+        for dirname in ('d', 'e'):
+            os.mkdir(join(origin_root_dir, dirname))
+            with open(join(origin_root_dir, dirname, 'c'), 'w') as f:
+                f.write(dirname)
+        scm.GIT.Capture(['add', 'd', 'e'], cwd=origin_root_dir)
+        scm.GIT.Capture(['commit', '-m', 'Add d and e'], cwd=origin_root_dir)
+
+        self.root_dir = tempfile.mkdtemp()
+        self.relpath = '.'
+        self.base_path = join(self.root_dir, self.relpath)
+
+        git_wrapper = gclient_scm.GitWrapper(origin_root_dir,
+                                             self.root_dir,
+                                             self.relpath,
+                                             sparse_checkout=['e'])
+        options.revision = 'unmanaged'
+        git_wrapper.update(options, (), [])
+
+        self.assertEqual(['.git', 'a', 'b', 'e'],
+                         sorted(os.listdir(self.base_path)))
+
+    def testUpdateCloneFilter(self):
+        if not self.enabled:
+            return
+        options = self.Options()
+
+        origin_root_dir = self.root_dir
+        self.addCleanup(gclient_utils.rmtree, origin_root_dir)
+        scm.GIT.Capture(['config', 'uploadpack.allowFilter', 'true'],
+                        cwd=origin_root_dir)
+
+        self.root_dir = tempfile.mkdtemp()
+        self.relpath = '.'
+        self.base_path = join(self.root_dir, self.relpath)
+
+        # A file:// url, as git ignores filters for clones of local paths.
+        git_wrapper = gclient_scm.GitWrapper(
+            'file://' + origin_root_dir.replace(os.sep, '/'),
+            self.root_dir,
+            self.relpath,
+            clone_filter='blob:none')
+        options.revision = 'unmanaged'
+        git_wrapper.update(options, (), [])
+
+        self.assertEqual(['.git', 'a', 'b'], sorted(os.listdir(self.base_path)))
+        self.assertEqual(
+            'blob:none',
+            scm.GIT.GetConfig(self.base_path,
+                              'remote.origin.partialclonefilter'))
+
     def testUpdateCloneOnCommit(self):
         if not self.enabled:
             return
@@ -61,7 +61,9 @@ class SCMMock(object):
                  name,
                  out_fh=None,
                  out_cb=None,
-                 print_outbuf=False):
+                 print_outbuf=False,
+                 clone_filter=None,
+                 sparse_checkout=None):
         self.unit_test.assertTrue(parsed_url.startswith('svn://example.com/'),
                                   parsed_url)
         self.unit_test.assertTrue(root_dir.startswith(self.unit_test.root_dir),
@@ -307,6 +309,76 @@ class GclientTest(trial_dir.TestCase):
         str_obj = str(obj)
         self.assertEqual(322, len(str_obj), '%d\n%s' % (len(str_obj), str_obj))
 
+    def testDepsToObjectsNotProcessed(self):
+        parser = gclient.OptionParser()
+        options, _ = parser.parse_args([])
+        obj = gclient.GClient('foo', options)
+        dep = gclient.Dependency(parent=obj,
+                                 name='foo',
+                                 url='svn://example.com/foo',
+                                 managed=None,
+                                 custom_deps=None,
+                                 custom_vars=None,
+                                 custom_hooks=None,
+                                 deps_file='DEPS',
+                                 should_process=False,
+                                 should_recurse=True,
+                                 relative=False,
+                                 condition=None,
+                                 protocol='https',
+                                 print_outbuf=True)
+        # The condition would fail to evaluate, since the variable isn't
+        # defined, but the deps of a dependency which isn't processed don't
+        # need it.
+        deps = dep._deps_to_objects(
+            {
+                'foo/bar': {
+                    'url': 'svn://example.com/bar',
+                    'dep_type': 'git',
+                    'condition': 'checkout_linux and undefined_var',
+                },
+            }, False)
+        self.assertEqual(['foo/bar'], [d.name for d in deps])
+        self.assertFalse(deps[0].should_process)
+
+    def testGitDependencyToLines(self):
+        parser = gclient.OptionParser()
+        options, _ = parser.parse_args([])
+        obj = gclient.GClient('foo', options)
+        dep = gclient.Dependency(parent=obj,
+                                 name='foo',
+                                 url='svn://example.com/foo',
+                                 managed=None,
+                                 custom_deps=None,
+                                 custom_vars=None,
+                                 custom_hooks=None,
+                                 deps_file='DEPS',
+                                 should_process=True,
+                                 should_recurse=True,
+                                 relative=False,
+                                 condition=None,
+                                 protocol='https',
+                                 print_outbuf=True)
+        deps = dep._deps_to_objects(
+            {
+                'foo/bar': {
+                    'url': 'svn://example.com/bar',
+                    'dep_type': 'git',
+                    'clone_filter': 'blob:none',
+                    'sparse_checkout': ['baz', 'qux'],
+                },
+            }, False)
+        # gclient flatten keeps the keys.
+        self.assertEqual([
+            '  # "foo" -> "foo/bar"',
+            '  "foo/bar": {',
+            '    "url": "https://example.com/bar",',
+            '    "clone_filter": "blob:none",',
+            '    "sparse_checkout": ["baz", "qux"],',
+            '  },',
+            '',
+        ], deps[0].ToLines())
+
     def testHooks(self):
         hooks = [{'pattern': '.', 'action': ['cmd1', 'arg1', 'arg2']}]
 
@@ -701,6 +773,49 @@ class GclientTest(trial_dir.TestCase):
             ('foo/bar', 'svn://example.com/foo/c-d'),
         ], [(dep.name, dep.url) for dep in sol.dependencies])
 
+    def testDepsCache(self):
+        """Verifies that unchanged DEPS files are not parsed again."""
+        write(
+            '.gclient', 'solutions = [\n'
+            '  { "name": "foo",\n'
+            '    "url": "svn://example.com/foo",\n'
+            '  },]\n')
+        write(
+            os.path.join('foo', 'DEPS'), 'vars = {\n'
+            '  "path": Str("a-b"),\n'
+            '}\n'
+            'deps = {\n'
+            '  "foo/bar": "svn://example.com/foo/" + Var("path"),\n'
+            '}')
+        parser = gclient.OptionParser()
+
+        def run(args):
+            options, _ = parser.parse_args(['--jobs', '1'] + args)
+            obj = gclient.GClient.LoadCurrentConfig(options)
+            obj.RunOnDeps('None', [])
+            self._get_processed()
+            return [(dep.name, dep.url)
+                    for dep in obj.dependencies[0].dependencies]
+
+        expected = [('foo/bar', 'svn://example.com/foo/a-b')]
+        self.assertEqual(expected, run([]))
+        self.assertTrue(os.path.isdir(gclient.DEPS_CACHE_DIR))
+
+        with mock.patch('gclient_eval.Parse') as parse:
+            self.assertEqual(expected, run([]))
+            parse.assert_not_called()
+
+        with mock.patch('gclient_eval.Parse',
+                        side_effect=gclient_eval.Parse) as parse:
+            self.assertEqual(expected, run(['--no-deps-cache']))
+            parse.assert_called_once()
+
+        write(
+            os.path.join('foo', 'DEPS'), 'deps = {\n'
+            '  "foo/bar": "svn://example.com/foo/c-d",\n'
+            '}')
+        self.assertEqual([('foo/bar', 'svn://example.com/foo/c-d')], run([]))
+
     def testDepsOsOverrideDepsInDepsFile(self):
         """Verifies that a 'deps_os' path cannot override a 'deps' path. Also
         see testUpdateWithOsDeps above.
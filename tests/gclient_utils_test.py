@@ -416,6 +416,103 @@ class GClientUtilsTest(trial_dir.TestCase):
         self.assertEqual('(foo or bar) and (baz)',
                          gclient_utils.merge_conditions('foo or bar', 'baz'))
 
+class ExecutionQueueTestCase(unittest.TestCase):
+    class Item(gclient_utils.WorkItem):
+        def __init__(self, name, requirements=(), resources=(), children=()):
+            super().__init__(name)
+            self.requirements = tuple(requirements)
+            self.resources = list(resources)
+            self.children = children
+
+        def run(self, log, work_queue):
+            with work_queue.ready_cond:
+                log.append(('start', self.name))
+            for child in self.children:
+                work_queue.enqueue(child)
+            with work_queue.ready_cond:
+                log.append(('end', self.name))
+
+    def _flush(self, items, jobs):
+        log = []
+        work_queue = gclient_utils.ExecutionQueue(jobs, None, False)
+        for item in items:
+            work_queue.enqueue(item)
+        work_queue.flush(log)
+        return work_queue, log
+
+    def testRequirementsOrder(self):
+        for jobs in (1, 4):
+            items = [
+                self.Item('c', requirements=['a', 'b']),
+                self.Item('b', requirements=['a']),
+                self.Item('a'),
+            ]
+            work_queue, log = self._flush(items, jobs)
+            self.assertEqual(['a', 'b', 'c'], work_queue.ran)
+            self.assertEqual(6, len(log))
+            self.assertFalse(work_queue.queued)
+
+    def testSerialOrderFollowsEnqueueOrder(self):
+        items = [self.Item(name) for name in 'dcba']
+        work_queue, _ = self._flush(items, 1)
+        self.assertEqual(['d', 'c', 'b', 'a'], work_queue.ran)
+
+    def testChildrenEnqueuedWhileRunning(self):
+        for jobs in (1, 4):
+            child = self.Item('p/c', requirements=['p'])
+            items = [self.Item('p', children=[child])]
+            work_queue, _ = self._flush(items, jobs)
+            self.assertEqual(['p', 'p/c'], work_queue.ran)
+
+    def testRequirementsGrowAfterEnqueue(self):
+        late = self.Item('late')
+        blocked = self.Item('blocked')
+
+        class First(self.Item):
+            def run(self, log, work_queue):
+                # Adds a requirement to an item that was already enqueued,
+                # which must be honored before it starts.
+                blocked.requirements = ('late', )
+                work_queue.enqueue(late)
+
+        work_queue, _ = self._flush([First('first'), blocked], 1)
+        self.assertEqual(['first', 'late', 'blocked'], work_queue.ran)
+
+    def testResourcesAreNotShared(self):
+        items = [
+            self.Item('a', resources=['url']),
+            self.Item('b', resources=['url']),
+            self.Item('c', resources=['other']),
+            self.Item('d', resources=['url']),
+        ]
+        _, log = self._flush(items, 4)
+        holding = None
+        for event, name in log:
+            if name == 'c':
+                continue
+            if event == 'start':
+                self.assertIsNone(holding)
+                holding = name
+            else:
+                self.assertEqual(holding, name)
+                holding = None
+        self.assertEqual(8, len(log))
+
+    def testExceptionDropsQueuedItems(self):
+        class Failing(self.Item):
+            def run(self, log, work_queue):
+                raise gclient_utils.Error('boom')
+
+        work_queue = gclient_utils.ExecutionQueue(4, None, False)
+        work_queue.enqueue(Failing('a'))
+        work_queue.enqueue(self.Item('b', requirements=['a']))
+        with mock.patch('sys.stderr', io.StringIO()):
+            with self.assertRaises(gclient_utils.Error):
+                work_queue.flush([])
+        self.assertEqual(['a'], work_queue.ran)
+        self.assertFalse(work_queue.queued)
+
+
 if __name__ == '__main__':
     unittest.main()
 
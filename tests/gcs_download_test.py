@@ -0,0 +1,243 @@
+#!/usr/bin/env vpython3
+# Copyright 2026 The Chromium Authors
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+"""Unit tests for gcs_download.py."""
+
+import hashlib
+import http.server
+import io
+import os
+import re
+import shutil
+import sys
+import tarfile
+import tempfile
+import threading
+import unittest
+import urllib.parse
+
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gcs_download
+
+
+class _FakeGcsHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        parsed = urllib.parse.urlparse(self.path)
+        server.requests.append((parsed.path, parsed.query,
+                                self.headers.get('Range')))
+        if server.failures.get(parsed.path):
+            server.failures[parsed.path] -= 1
+            return self._respond(503, b'')
+        if parsed.path not in server.objects:
+            return self._respond(404, b'')
+        data, headers = server.objects[parsed.path]
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if not match:
+            return self._respond(200, data, headers)
+        start = int(match.group(1))
+        end = int(match.group(2)) + 1 if match.group(2) else len(data)
+        end = min(end, len(data))
+        headers = dict(headers)
+        headers['Content-Range'] = 'bytes %d-%d/%d' % (start, end - 1,
+                                                       len(data))
+        self._respond(206, data[start:end], headers)
+
+    def _respond(self, status, body, headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _make_tarball(files):
+    f = io.BytesIO()
+    with tarfile.open(fileobj=f, mode='w:gz') as tar:
+        for name, contents in files.items():
+            tarinfo = tarfile.TarInfo(name)
+            tarinfo.size = len(contents)
+            tar.addfile(tarinfo, io.BytesIO(contents))
+    return f.getvalue()
+
+
+class StreamingDownloaderTest(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                      _FakeGcsHandler)
+        self.server.daemon_threads = True
+        self.server.objects = {}
+        self.server.failures = {}
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.output = os.path.join(self.temp_dir, 'output')
+        self.extract_dir = os.path.join(self.temp_dir, 'extracted')
+        mock.patch('time.sleep').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _add_object(self, name, data, **headers):
+        headers.setdefault('x-goog-generation', '42')
+        self.server.objects['/bucket/' + name] = (data, headers)
+
+    def _downloader(self, **kwargs):
+        return gcs_download.StreamingDownloader(
+            api_url='http://127.0.0.1:%d' % self.server.server_address[1],
+            **kwargs)
+
+    def testDownloadSmallObject(self):
+        data = b'lorem ipsum'
+        self._add_object('dir/small', data, **{'x-goog-meta-executable': '1'})
+        result = self._downloader().download('gs://bucket/dir/small',
+                                             self.output,
+                                             algorithms=('sha1', 'sha256'))
+        self.assertEqual(len(data), result.size)
+        self.assertEqual(
+            {
+                'sha1': hashlib.sha1(data).hexdigest(),
+                'sha256': hashlib.sha256(data).hexdigest(),
+            }, result.digests)
+        self.assertTrue(result.executable)
+        self.assertIsNone(result.members)
+        with open(self.output, 'rb') as f:
+            self.assertEqual(data, f.read())
+        self.assertEqual(1, len(self.server.requests))
+        self.assertEqual([self.output], [
+            os.path.join(self.temp_dir, name)
+            for name in os.listdir(self.temp_dir)
+        ])
+
+    def testDownloadInParallelChunks(self):
+        data = bytes(range(95))
+        self._add_object('large', data)
+        result = self._downloader(chunk_size=10,
+                                  max_parallel_chunks=3).download(
+                                      'gs://bucket/large', self.output)
+        self.assertEqual(hashlib.sha256(data).hexdigest(),
+                         result.digests['sha256'])
+        with open(self.output, 'rb') as f:
+            self.assertEqual(data, f.read())
+        self.assertEqual(10, len(self.server.requests))
+        self.assertEqual(('/bucket/large', '', 'bytes=0-9'),
+                         self.server.requests[0])
+        self.assertEqual(
+            sorted(
+                ('/bucket/large', 'generation=42', 'bytes=%d-%d' %
+                 (start, min(start + 9, 94))) for start in range(10, 95, 10)),
+            sorted(self.server.requests[1:]))
+
+    def testDownloadAndExtract(self):
+        data = _make_tarball({'dir/a': b'a', 'dir/sub/b': b'bb'})
+        self._add_object('archive.tar.gz', data)
+        os.makedirs(os.path.join(self.extract_dir, 'dir'))
+        with open(os.path.join(self.extract_dir, 'dir', 'a'), 'w') as f:
+            f.write('old')
+        with open(os.path.join(self.extract_dir, 'other'), 'w') as f:
+            f.write('kept')
+
+        result = self._downloader(chunk_size=100).download(
+            'gs://bucket/archive.tar.gz',
+            self.output,
+            expected_digests={'sha256': hashlib.sha256(data).hexdigest()},
+            expected_size=len(data),
+            extract_dir=self.extract_dir,
+            require_archive=True)
+        self.assertEqual(['dir/a', 'dir/sub/b'],
+                         [member.name for member in result.members])
+        self.assertEqual(['dir', 'other'], sorted(os.listdir(self.extract_dir)))
+        with open(os.path.join(self.extract_dir, 'dir', 'a')) as f:
+            self.assertEqual('a', f.read())
+        with open(os.path.join(self.extract_dir, 'dir', 'sub', 'b')) as f:
+            self.assertEqual('bb', f.read())
+
+    def testDigestMismatch(self):
+        self._add_object('archive.tar.gz', _make_tarball({'dir/a': b'a'}))
+        with self.assertRaises(gcs_download.VerificationError):
+            self._downloader().download('gs://bucket/archive.tar.gz',
+                                        self.output,
+                                        expected_digests={'sha256': 'bad'},
+                                        extract_dir=self.extract_dir)
+        self.assertEqual(['extracted'], os.listdir(self.temp_dir))
+        self.assertEqual([], os.listdir(self.extract_dir))
+
+    def testUnsafeMember(self):
+        self._add_object('archive.tar.gz',
+                         _make_tarball({
+                             'dir/a': b'a',
+                             'dir/../../evil': b'evil'
+                         }))
+        with self.assertRaises(gcs_download.VerificationError):
+            self._downloader().download('gs://bucket/archive.tar.gz',
+                                        self.output,
+                                        extract_dir=self.extract_dir)
+        self.assertEqual(['extracted'], os.listdir(self.temp_dir))
+        self.assertEqual([], os.listdir(self.extract_dir))
+
+    def testValidateMember(self):
+        self._add_object('archive.tar.gz', _make_tarball({'dir/a': b'a'}))
+        with self.assertRaises(gcs_download.VerificationError):
+            self._downloader().download(
+                'gs://bucket/archive.tar.gz',
+                self.output,
+                extract_dir=self.extract_dir,
+                validate_member=lambda member: member.name.startswith('x/'))
+        self.assertEqual([], os.listdir(self.extract_dir))
+
+    def testRequireArchive(self):
+        self._add_object('file', b'not an archive')
+        with self.assertRaises(gcs_download.VerificationError):
+            self._downloader().download('gs://bucket/file',
+                                        self.output,
+                                        extract_dir=self.extract_dir,
+                                        require_archive=True)
+        self.assertFalse(os.path.exists(self.output))
+
+    def testNotFound(self):
+        with self.assertRaises(gcs_download.DownloadError) as cm:
+            self._downloader().download('gs://bucket/missing', self.output)
+        self.assertEqual(404, cm.exception.status)
+        self.assertEqual(1, len(self.server.requests))
+
+    def testRetriesServerErrors(self):
+        self._add_object('flaky', b'data')
+        self.server.failures['/bucket/flaky'] = 2
+        result = self._downloader().download('gs://bucket/flaky',
+                                             self.output,
+                                             algorithms=('sha1', ))
+        self.assertEqual(hashlib.sha1(b'data').hexdigest(),
+                         result.digests['sha1'])
+        self.assertEqual(3, len(self.server.requests))
+
+    def testAuthorization(self):
+        self._add_object('private', b'data')
+        authenticator = mock.Mock()
+        authenticator.get_access_token.return_value = mock.Mock(token='tok')
+        headers = []
+        with mock.patch.object(_FakeGcsHandler,
+                               'do_GET',
+                               autospec=True,
+                               side_effect=lambda handler: (
+                                   headers.append(handler.headers.get(
+                                       'Authorization')),
+                                   handler._respond(200, b'data'))):
+            self._downloader(authenticator=authenticator).download(
+                'gs://bucket/private', self.output)
+        self.assertEqual(['Bearer tok'], headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
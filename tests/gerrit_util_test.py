@@ -4,12 +4,15 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
+import http.server
 import json
 import os
 import socket
 import subprocess
 import sys
 import textwrap
+import threading
+import time
 import unittest
 
 from io import StringIO
@@ -757,6 +760,76 @@ class GerritUtilTest(unittest.TestCase):
         httpConnKwargs = mockCreateHttpConn.call_args[1]
         self.assertIsNone(httpConnKwargs.get('reauth_context', None))
 
+
+class _StubGerritHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.client_ports.append(self.client_address[1])
+        time.sleep(self.server.delay)
+        body = b")]}'\n" + json.dumps({'path': self.path}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        super(HttpConnectionPoolTest, self).setUp()
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                      _StubGerritHandler)
+        self.server.daemon_threads = True
+        self.server.client_ports = []
+        self.server.delay = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.host = '127.0.0.1:%d' % self.server.server_address[1]
+
+        self.pool = gerrit_util.HttpConnectionPool(max_per_host=2)
+        self.addCleanup(self.pool.close)
+        mock.patch('gerrit_util._HTTP_CONNECTION_POOL', self.pool).start()
+        mock.patch('gerrit_util.GERRIT_PROTOCOL', 'http').start()
+        authenticator = mock.Mock(spec=gerrit_util._Authenticator)
+        mock.patch('gerrit_util._Authenticator.get',
+                   return_value=authenticator).start()
+        mock.patch('metrics.collector').start()
+        mock.patch.dict(os.environ, {'no_proxy': '*'}).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def testReusesConnection(self):
+        for change in ('1', '2', '3'):
+            self.assertEqual(
+                {'path': '/a/changes/%s' % change},
+                gerrit_util.ReadHttpJsonResponse(
+                    gerrit_util.CreateHttpConn(self.host,
+                                               'changes/%s' % change)))
+        self.assertEqual(3, len(self.server.client_ports))
+        self.assertEqual(1, len(set(self.server.client_ports)))
+
+    def testBoundsConcurrentConnections(self):
+        self.server.delay = 0.05
+        accounts = ['user%d@example.com' % i for i in range(6)]
+        valid = gerrit_util.ValidAccounts(self.host, accounts, max_threads=6)
+        self.assertEqual(sorted(accounts), sorted(valid))
+        self.assertEqual(6, len(self.server.client_ports))
+        self.assertLessEqual(len(set(self.server.client_ports)), 2)
+
+    def testDiscardsClientOnError(self):
+        uri = 'http://%s/a/changes/1' % self.host
+        with self.assertRaises(ValueError):
+            with self.pool.connection(uri) as broken:
+                raise ValueError()
+        with self.pool.connection(uri) as http:
+            self.assertIsNot(broken, http)
+        with self.pool.connection(uri) as reused:
+            self.assertIs(http, reused)
+
+
 class SSOAuthenticatorTest(unittest.TestCase):
 
     @classmethod
@@ -4,6 +4,7 @@
 # found in the LICENSE file.
 """Unit tests for git_cache.py"""
 
+import concurrent.futures
 from io import StringIO
 import logging
 import os
@@ -11,6 +12,7 @@ import shutil
 import subprocess
 import sys
 import tempfile
+import threading
 import unittest
 from unittest import mock
 
@@ -224,6 +226,145 @@ class GitCacheTest(unittest.TestCase):
         mirror.populate(reset_fetch_config=True)
 
 
+    def _makeOrigin(self, name):
+        origin_dir = os.path.join(self.origin_dir, name)
+        os.mkdir(origin_dir)
+        self.git(['init', '-q'], cwd=origin_dir)
+        with open(os.path.join(origin_dir, 'foo'), 'w') as f:
+            f.write(name)
+        self.git(['add', 'foo'], cwd=origin_dir)
+        self.git([
+            '-c', 'user.name=Test user', '-c', 'user.email=joj@test.com',
+            'commit', '-m', name
+        ],
+                 cwd=origin_dir)
+        return origin_dir
+
+    @mock.patch('time.sleep')
+    @mock.patch('sys.stdout', StringIO())
+    def testPopulateMirrors(self, _):
+        origins = [self._makeOrigin(name) for name in ('a', 'b', 'c')]
+        missing = os.path.join(self.origin_dir, 'missing')
+
+        failures = git_cache.populate_mirrors(origins + [missing, origins[0]],
+                                              jobs=2)
+
+        self.assertEqual([missing], [url for url, _ in failures])
+        for origin in origins:
+            self.assertTrue(git_cache.Mirror(origin).exists())
+        output = sys.stdout.getvalue()
+        self.assertEqual(4, output.count('/4] '))
+        self.assertIn('Failed to populate %s' % missing, output)
+
+    def testPopulateMirrorsOrder(self):
+        small, large, new = [self._makeOrigin(name) for name in 'abc']
+        git_cache.Mirror(small).populate()
+        git_cache.Mirror(large).populate()
+        with open(
+                os.path.join(git_cache.Mirror(large).mirror_path, 'objects',
+                             'pack', 'extra.pack'), 'wb') as f:
+            f.write(b'x' * 10000)
+
+        populated = []
+        with mock.patch.object(git_cache.Mirror,
+                               'populate',
+                               autospec=True,
+                               side_effect=lambda m, **_: populated.append(
+                                   m.url)), \
+                mock.patch('sys.stdout', StringIO()):
+            git_cache.populate_mirrors([small, large, new], jobs=1)
+        self.assertEqual([new, large, small], populated)
+
+    def testPopulateMirrorsOrderBootstrap(self):
+        small, large, unknown, existing = [
+            self._makeOrigin(name) for name in 'abcd'
+        ]
+        git_cache.Mirror(existing).populate()
+        sizes = {small: 10, large: 1000}
+
+        def du(gsutil, *args):
+            for url, size in sizes.items():
+                if args[-1].endswith(git_cache.Mirror.UrlToCacheDir(url)):
+                    return 0, '%d  %s\n' % (size, args[-1]), ''
+            return 1, '', 'No URLs matched'
+
+        populated = []
+        with mock.patch.dict('os.environ',
+                             {'OVERRIDE_BOOTSTRAP_BUCKET': 'bucket'}), \
+                mock.patch.object(git_cache.Gsutil,
+                                  'check_call',
+                                  autospec=True,
+                                  side_effect=du), \
+                mock.patch.object(git_cache.Mirror,
+                                  'populate',
+                                  autospec=True,
+                                  side_effect=lambda m, **_: populated.append(
+                                      m.url)), \
+                mock.patch('sys.stdout', StringIO()):
+            git_cache.populate_mirrors([existing, small, unknown, large],
+                                       jobs=2)
+        self.assertEqual([unknown, large, small, existing], populated)
+
+    def testPopulateMirrorsInterrupted(self):
+        origins = [self._makeOrigin(name) for name in 'abc']
+        started = threading.Event()
+        release = threading.Event()
+        populated = []
+
+        def populate(mirror, **_):
+            populated.append(mirror.url)
+            started.set()
+            # Only wait for a while, in case the populates aren't cancelled.
+            release.wait(10)
+
+        populates = []
+
+        def interrupt(futures):
+            populates.extend(futures)
+            started.wait()
+            raise KeyboardInterrupt()
+
+        cancel = concurrent.futures.Future.cancel
+
+        def cancel_last(future):
+            cancelled = cancel(future)
+            if populates and future is populates[-1]:
+                # Let the running populate finish once every populate was
+                # cancelled.
+                release.set()
+            return cancelled
+
+        with mock.patch.object(git_cache.Mirror,
+                               'populate',
+                               autospec=True,
+                               side_effect=populate), \
+                mock.patch('concurrent.futures.as_completed',
+                           side_effect=interrupt), \
+                mock.patch.object(concurrent.futures.Future,
+                                  'cancel',
+                                  autospec=True,
+                                  side_effect=cancel_last):
+            with self.assertRaises(KeyboardInterrupt):
+                git_cache.populate_mirrors(origins, jobs=1)
+        self.assertEqual(1, len(populated))
+
+    def testReadManifest(self):
+        manifest = os.path.join(self.cache_dir, 'manifest')
+        with open(manifest, 'w') as f:
+            f.write('# Comment\n'
+                    'https://example.com/a.git\n'
+                    '\n'
+                    'src/b: https://example.com/b.git@1234\n'
+                    'https://user@example.com/c.git\n'
+                    'src/d: ssh://git@example.com/d.git@refs/heads/main\n')
+        self.assertEqual([
+            'https://example.com/a.git',
+            'https://example.com/b.git',
+            'https://user@example.com/c.git',
+            'ssh://git@example.com/d.git',
+        ], git_cache._read_manifest(manifest))
+
+
 class GitCacheDirTest(unittest.TestCase):
     def setUp(self):
         try:
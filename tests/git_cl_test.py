@@ -222,6 +222,79 @@ class TestGitClBasic(unittest.TestCase):
         actual = set(git_cl.get_cl_statuses(changes, True))
         self.assertEqual(set(zip(changes, statuses)), actual)
 
+    def _batched_status_changes(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        mock.patch('git_cl._GetCLStatusCachePath',
+                   return_value=os.path.join(cache_dir, 'statuses')).start()
+        mock.patch('git_cl.Changelist.EnsureAuthenticated').start()
+        mock.patch('git_cl.Changelist.GetGerritHost',
+                   lambda cl: cl.host).start()
+        changes = []
+        for host, issue in [('a-review', 1), ('a-review', 2), ('a-review', 1),
+                            ('b-review', 3)]:
+            cl = git_cl.Changelist(issue=issue)
+            cl.host = host
+            changes.append(cl)
+        return changes
+
+    def _change(self, number, status='NEW', cq_votes=()):
+        return {
+            '_number': number,
+            'status': status,
+            'owner': {
+                '_account_id': 1
+            },
+            'labels': {
+                'Commit-Queue': {
+                    'all': [{
+                        'value': vote
+                    } for vote in cq_votes]
+                }
+            },
+        }
+
+    @mock.patch('git_cl.Changelist.GetStatus')
+    @mock.patch('gerrit_util.QueryChanges')
+    def test_get_cl_statuses_batched(self, query_changes, get_status):
+        changes = self._batched_status_changes()
+        query_changes.side_effect = lambda host, *args, **kwargs: {
+            'a-review': [self._change(1, 'MERGED'),
+                         self._change(2, cq_votes=[1, 2])],
+            'b-review': [],
+        }[host]
+
+        for _ in range(2):
+            actual = list(git_cl.get_cl_statuses(changes, True))
+            self.assertEqual(
+                list(zip(changes, ['closed', 'commit', 'closed', 'error'])),
+                actual)
+        # The second call is served from the cache.
+        self.assertEqual([
+            mock.call('a-review', [],
+                      first_param='change:1 OR change:2',
+                      limit=2,
+                      o_params=['DETAILED_LABELS', 'MESSAGES']),
+            mock.call('b-review', [],
+                      first_param='change:3',
+                      limit=1,
+                      o_params=['DETAILED_LABELS', 'MESSAGES']),
+        ], sorted(query_changes.mock_calls, key=lambda call: call.args[0]))
+        get_status.assert_not_called()
+
+    @mock.patch('git_cl.Changelist.GetStatus', lambda cl: 'waiting')
+    @mock.patch('gerrit_util.QueryChanges')
+    def test_get_cl_statuses_batched_fallback(self, query_changes):
+        changes = self._batched_status_changes()
+        query_changes.side_effect = lambda host, *args, **kwargs: {
+            'a-review': [self._change(1), self._change(2)],
+        }[host]
+
+        actual = set(git_cl.get_cl_statuses(changes, True))
+        self.assertEqual(
+            set(zip(changes, ['unsent', 'unsent', 'unsent', 'waiting'])),
+            actual)
+
     def test_upload_to_non_default_branch_no_retry(self):
         m = mock.patch('git_cl.Changelist._CMDUploadChange',
                        side_effect=[git_cl.GitPushError(), None]).start()
@@ -3653,6 +3726,57 @@ class ChangelistTest(unittest.TestCase):
             'exit_code': 0,
         })
 
+    def testRunHook_Profile(self):
+        expected_results = {
+            'more_cc': [],
+            'errors': [],
+            'notifications': [],
+            'warnings': [],
+        }
+        gclient_utils.FileRead.return_value = json.dumps(expected_results)
+        git_cl.time_time.side_effect = [100, 200, 300, 400]
+        mockProcess = mock.Mock()
+        mockProcess.wait.return_value = 0
+        subprocess2.Popen.return_value = mockProcess
+
+        git_cl.Changelist.GetAuthor.return_value = None
+        git_cl.Changelist.GetIssue.return_value = None
+        git_cl.Changelist.GetPatchset.return_value = None
+
+        cl = git_cl.Changelist()
+        results = cl.RunHook(committing=False,
+                             may_prompt=False,
+                             verbose=0,
+                             parallel=False,
+                             upstream='upstream',
+                             description='description',
+                             all_files=False,
+                             resultdb=False,
+                             profile='profile.json')
+
+        self.assertEqual(expected_results, results)
+        subprocess2.Popen.assert_any_call([
+            'vpython3',
+            'PRESUBMIT_SUPPORT',
+            '--root',
+            'root',
+            '--upstream',
+            'upstream',
+            '--gerrit_url',
+            'https://chromium-review.googlesource.com',
+            '--gerrit_project',
+            'project',
+            '--gerrit_branch',
+            'refs/heads/main',
+            '--upload',
+            '--presubmit_profile',
+            'profile.json',
+            '--json_output',
+            '/tmp/fake-temp2',
+            '--description_file',
+            '/tmp/fake-temp1',
+        ])
+
     def testRunHook_FewerOptionsResultDB(self):
         expected_results = {
             'more_cc': ['cc@example.com', 'more@example.com'],
@@ -4280,7 +4404,8 @@ class CMDPresubmitTestCase(CMDTestCaseBase):
             all_files=None,
             files=None,
             resultdb=None,
-            realm=None)
+            realm=None,
+            profile=None)
 
     def testNoIssue(self):
         git_cl.Changelist.GetIssue.return_value = None
@@ -4295,7 +4420,8 @@ class CMDPresubmitTestCase(CMDTestCaseBase):
             all_files=None,
             files=None,
             resultdb=None,
-            realm=None)
+            realm=None,
+            profile=None)
 
     def testCustomBranch(self):
         self.assertEqual(0, git_cl.main(['presubmit', 'custom_branch']))
@@ -4309,14 +4435,16 @@ class CMDPresubmitTestCase(CMDTestCaseBase):
             all_files=None,
             files=None,
             resultdb=None,
-            realm=None)
+            realm=None,
+            profile=None)
 
     def testOptions(self):
         self.assertEqual(
             0,
             git_cl.main([
                 'presubmit', '-v', '-v', '--all', '--parallel', '-u',
-                '--resultdb', '--realm', 'chromium:public'
+                '--resultdb', '--realm', 'chromium:public',
+                '--presubmit-profile', 'profile.json'
             ]))
         git_cl.Changelist.RunHook.assert_called_once_with(
             committing=False,
@@ -4328,7 +4456,8 @@ class CMDPresubmitTestCase(CMDTestCaseBase):
             all_files=True,
             files=None,
             resultdb=True,
-            realm='chromium:public')
+            realm='chromium:public',
+            profile='profile.json')
 
     @mock.patch('git_cl.write_json')
     def testJson(self, mock_write_json):
@@ -5573,6 +5702,34 @@ class CMDLintTestCase(CMDTestCaseBase):
         self.assertIn('pdf.cc:3:  (cpplint) Do not indent within a namespace',
                       git_cl.sys.stderr.getvalue())
 
+    def testLintCache(self, *_mock):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        codecs.open().read.return_value = self.bad_indent
+        self.assertEqual(
+            1, git_cl.main(['lint', '--cache-dir', cache_dir, 'pdf.h']))
+        output = git_cl.sys.stderr.getvalue()
+        self.assertIn('pdf.h:3:  (cpplint) Do not indent within a namespace',
+                      output)
+
+        git_cl.sys.stderr.truncate(0)
+        git_cl.sys.stderr.seek(0)
+        with mock.patch('cpplint.ProcessFileData') as process_file_data:
+            self.assertEqual(
+                1, git_cl.main(['lint', '--cache-dir', cache_dir, 'pdf.h']))
+        process_file_data.assert_not_called()
+        self.assertEqual(output, git_cl.sys.stderr.getvalue())
+
+        # Changing the filters invalidates the cached errors.
+        git_cl.sys.stderr.truncate(0)
+        git_cl.sys.stderr.seek(0)
+        git_cl.main([
+            'lint', '--cache-dir', cache_dir,
+            '--filter=-runtime/indentation_namespace', 'pdf.h'
+        ])
+        self.assertNotIn('Do not indent within a namespace',
+                         git_cl.sys.stderr.getvalue())
+
     @unittest.skipIf(gclient_utils.IsEnvCog(),
                     'not supported in non-git environment')
     @mock.patch('git_cl.Changelist.GetAffectedFiles',
@@ -8,6 +8,7 @@
 import binascii
 import collections
 import datetime
+import heapq
 import os
 import shutil
 import signal
@@ -767,6 +768,136 @@ class GitMutableStructuredTest(git_test_utils.GitRepoReadWriteTestBase,
                 'root_X': ['branch_Z', 'root_A'],
             })
 
+    def _checkSnapshot(self):
+        snapshot = self.repo.run(self.gc.RepoSnapshot.take,
+                                 include_subjects=True)
+        self.assertEqual(self.repo.run(self.gc.get_branch_tree),
+                         snapshot.get_branch_tree())
+        self.assertEqual('branch_L', snapshot.current_branch)
+        self.assertEqual(self.repo['L'], snapshot.head_hash)
+        self.assertEqual(self.repo['K'], snapshot.hash('branch_K'))
+        self.assertEqual('K', snapshot.subject('branch_K'))
+        self.assertIsNone(snapshot.upstream('root_X'))
+
+        self.assertEqual(
+            self.repo['B'],
+            self.repo.run(snapshot.get_or_create_merge_base, 'branch_K'))
+        self.assertEqual(
+            self.repo['J'],
+            self.repo.run(snapshot.get_or_create_merge_base, 'branch_L'))
+        self.assertEqual(4, self.repo.run(snapshot.get_num_commits,
+                                          'branch_K'))
+        self.assertEqual(1, self.repo.run(snapshot.get_num_commits,
+                                          'branch_L'))
+
+        # A pre-set merge base is used if it's still an ancestor.
+        self.repo.run(self.gc.manual_merge_base, 'branch_K', self.repo['I'],
+                      'branch_G')
+        snapshot = self.repo.run(self.gc.RepoSnapshot.take)
+        self.assertEqual(
+            self.repo['I'],
+            self.repo.run(snapshot.get_or_create_merge_base, 'branch_K'))
+        self.assertEqual(2, self.repo.run(snapshot.get_num_commits,
+                                          'branch_K'))
+
+        # A pre-set merge base that isn't an ancestor is discarded.
+        self.repo.run(self.gc.manual_merge_base, 'branch_K', self.repo['C'],
+                      'branch_G')
+        snapshot = self.repo.run(self.gc.RepoSnapshot.take)
+        self.assertEqual(
+            self.repo['B'],
+            self.repo.run(snapshot.get_or_create_merge_base, 'branch_K'))
+        self.repo.run(self.gc.remove_merge_base, 'branch_K')
+        self.repo.run(self.gc.remove_merge_base, 'branch_L')
+
+    def testRepoSnapshot(self):
+        self.repo.git('checkout', 'branch_L')
+        # The branches don't have a common ancestor, so the merge bases are
+        # computed by git.
+        self._checkSnapshot()
+
+    def testRepoSnapshotCommonAncestor(self):
+        self.repo.git('checkout', 'branch_L')
+        self.repo.git('branch', '--unset-upstream', 'root_A')
+        for branch in ('main', 'root_X', 'branch_Z', 'branch_DOG',
+                       'root_CAT'):
+            self.repo.git('branch', '-D', branch)
+        with mock.patch('git_common.run_with_retcode') as run_with_retcode:
+            self._checkSnapshot()
+        run_with_retcode.assert_not_called()
+
+    def testRepoSnapshotStaleBranch(self):
+        self.repo.git('checkout', 'branch_L')
+        self.repo.git('branch', '--unset-upstream', 'root_A')
+        for branch in ('main', 'root_X', 'branch_Z', 'branch_DOG',
+                       'root_CAT'):
+            self.repo.git('branch', '-D', branch)
+        # A branch of the first commit moves the common ancestor down.
+        self.repo.git('checkout', '-t', '-b', 'stale', 'root_A')
+        self.repo.git('reset', '--hard', self.repo['A'])
+        self.repo.git('commit', '--allow-empty', '-m', 'stale')
+        self.repo.git('checkout', 'branch_L')
+
+        snapshot = self.repo.run(self.gc.RepoSnapshot.take)
+        self.assertEqual(1, self.repo.run(snapshot.get_num_commits, 'stale'))
+        # Only the commits above the merge base are visited.
+        with mock.patch('heapq.heappop', wraps=heapq.heappop) as heappop:
+            self.assertEqual(
+                1, self.repo.run(snapshot.get_num_commits, 'branch_L'))
+        self.assertLessEqual(heappop.call_count, 2)
+        for branch in ('stale', 'branch_G', 'branch_K', 'branch_L'):
+            base = self.repo.run(snapshot.get_or_create_merge_base, branch)
+            expected = self.repo.git('rev-list', '--count', branch,
+                                     '^' + base, '--').stdout
+            self.assertEqual(
+                int(expected),
+                self.repo.run(snapshot.count_commits, branch, base))
+            self.assertTrue(
+                self.repo.run(snapshot.is_ancestor, base, branch))
+
+    def testRepoSnapshotReadsOnlyRefs(self):
+        # A branch tracking an annotated tag, and one whose upstream is gone.
+        self.repo.git('tag', '-a', '-m', 'annotated', 'tag_K', 'branch_K')
+        self.repo.git('branch', 'on_tag', 'branch_K')
+        self.repo.git('config', 'branch.on_tag.remote', '.')
+        self.repo.git('config', 'branch.on_tag.merge', 'refs/tags/tag_K')
+        self.repo.git('branch', 'doomed', 'root_X')
+        self.repo.git('branch', '-t', 'orphan', 'doomed')
+        self.repo.git('branch', '-D', 'doomed')
+
+        with mock.patch('git_common.run', wraps=self.gc.run) as run:
+            skipped, tree = self.repo.run(self.gc.get_branch_tree)
+            snapshot = self.repo.run(self.gc.RepoSnapshot.take)
+        # Neither the tracking status nor any tag or commit object is read.
+        for call in run.call_args_list:
+            for arg in call.args:
+                if arg.startswith('--format='):
+                    self.assertNotIn('track', arg)
+                    self.assertNotIn('subject', arg)
+                    self.assertNotIn('*objectname', arg)
+
+        self.assertIn('orphan', skipped)
+        self.assertEqual('tag_K', tree['on_tag'])
+        self.assertEqual((skipped, tree), snapshot.get_branch_tree())
+        self.assertIsNone(snapshot.upstream('orphan'))
+        self.assertIsNone(snapshot.subject('branch_K'))
+        self.assertIsNone(snapshot.refs['branch_K'].behind)
+        # The tag is peeled when its commit is needed.
+        self.assertEqual(self.repo['K'],
+                         self.repo.run(snapshot.hash, 'tag_K'))
+        self.assertEqual(
+            self.repo['K'],
+            self.repo.run(snapshot.get_or_create_merge_base, 'on_tag'))
+
+        snapshot = self.repo.run(self.gc.RepoSnapshot.take,
+                                 include_tracking_status=True,
+                                 include_subjects=True)
+        self.assertEqual('K', snapshot.subject('branch_K'))
+        behind = self.repo.git('rev-list', '--count',
+                               'branch_K..branch_G').stdout
+        self.assertEqual(int(behind), snapshot.refs['branch_K'].behind)
+        self.assertGreater(int(behind), 0)
+
     def testGetDivergedBranches(self):
         # root_X and root_A don't actually have a common base commit due to the
         # test repo's structure, which causes get_diverged_branches to throw
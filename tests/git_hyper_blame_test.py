@@ -70,6 +70,9 @@ class GitHyperBlameMainTest(GitHyperBlameTestBase):
         'some/files/file': {
             'data': b'line 1\nline 2\n'
         },
+        'some/files/other': {
+            'data': b'other\n'
+        },
     }
 
     COMMIT_B = {
@@ -130,6 +133,24 @@ class GitHyperBlameMainTest(GitHyperBlameTestBase):
                          outbuf.getvalue().rstrip().split(b'\n'))
         self.assertEqual('', sys.stderr.getvalue())
 
+    def testMainMultipleFiles(self):
+        """Tests the main function with several files and no revision."""
+        expected_output = [
+            self.blame_line('A', '1) other', filename='some/files/other'),
+            self.blame_line('A', '1*) line 1.1', filename='some/files/file'),
+            self.blame_line('B', ' 2) line 2.1', filename='some/files/file'),
+        ]
+        for args in (['some/files/other', 'some/files/file'],
+                     ['HEAD', 'some/files/other', 'some/files/file'],
+                     ['--', 'some/files/other', 'some/files/file']):
+            outbuf = BytesIO()
+            retval = self.repo.run(self.git_hyper_blame.main,
+                                   ['-i', 'tag_C'] + args, outbuf)
+            self.assertEqual(0, retval)
+            self.assertEqual(expected_output,
+                             outbuf.getvalue().rstrip().split(b'\n'))
+        self.assertEqual('', sys.stderr.getvalue())
+
     def testBadRepo(self):
         """Tests the main function (not in a repo)."""
         # Make a temp dir that has no .git directory.
@@ -420,6 +441,42 @@ class GitHyperBlameSimpleTest(GitHyperBlameTestBase):
         self.assertEqual(0, retval)
         self.assertEqual(expected_output, output)
 
+    def testBlameMultipleFiles(self):
+        """Tests a blame of several files at once."""
+        # Expect the filenames to be displayed, and the blames of file2 to
+        # look through F and E.
+        expected_output = [
+            self.blame_line('A', '1) file1', filename='some/files/file1'),
+            self.blame_line('B', ' 1) file2 - vanilla',
+                            filename='some/files/file2'),
+            self.blame_line('C', '2*) file_y - merged',
+                            filename='some/files/file2'),
+        ]
+        outbuf = BytesIO()
+        retval = self.repo.run(self.git_hyper_blame.hyper_blame_files,
+                               outbuf, [self.repo['E'], self.repo['F']],
+                               ['some/files/file1', 'some/files/file2'],
+                               'tag_F',
+                               jobs=2)
+        self.assertEqual(0, retval)
+        self.assertEqual(expected_output,
+                         outbuf.getvalue().rstrip().split(b'\n'))
+
+    def testBlameMultipleFilesError(self):
+        """Tests a blame of several files, one of which doesn't exist."""
+        expected_output = [
+            self.blame_line('A', '1) file1', filename='some/files/file1'),
+        ]
+        outbuf = BytesIO()
+        retval = self.repo.run(self.git_hyper_blame.hyper_blame_files,
+                               outbuf, [],
+                               ['some/other/file2', 'some/files/file1'],
+                               'tag_D')
+        self.assertNotEqual(0, retval)
+        self.assertEqual(expected_output,
+                         outbuf.getvalue().rstrip().split(b'\n'))
+        self.assertNotEqual('', sys.stderr.getvalue())
+
     def testIgnoreInitialCommit(self):
         """Tests a blame with the initial commit ignored."""
         # Ignore A. Expect A to get blamed anyway.
@@ -558,6 +615,19 @@ class GitHyperBlameLineMotionTest(GitHyperBlameTestBase):
                                'file', 'file', 'tag_C', 'tag_B', 6)
         self.assertEqual(3, lineno)
 
+        # Test an unchanged line in between hunks, after a hunk that changed
+        # the length of the file. Should only be moved by the hunks before it.
+        lineno = self.repo.run(self.git_hyper_blame.approx_lineno_across_revs,
+                               'file', 'file', 'tag_C', 'tag_B', 5)
+        self.assertEqual(3, lineno)
+
+    def testApproxLinenosAcrossRevs(self):
+        """Tests mapping several lines at once."""
+        linenos = self.repo.run(self.git_hyper_blame.approx_linenos_across_revs,
+                                'file', 'file', 'tag_C', 'tag_B',
+                                [1, 2, 3, 4, 5, 6])
+        self.assertEqual([1, 1, 1, 2, 3, 3], linenos)
+
     def testInterHunkLineMotion(self):
         """Tests a blame with line motion in another hunk in the ignored commit."""
         # Blame from D, ignoring C.
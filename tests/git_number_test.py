@@ -37,6 +37,7 @@ class Basic(git_test_utils.GitRepoReadWriteTestBase):
 
     def tearDown(self):
         self.gn.clear_caches()
+        self.gn.DIRTY_TREES.clear()
         super(Basic, self).tearDown()
 
     def _git_number(self, refs, cache=False):
@@ -77,6 +78,50 @@ class Basic(git_test_utils.GitRepoReadWriteTestBase):
             None,
             self.repo.run(self.gn.get_num, binascii.unhexlify(self.repo['A'])))
 
+    def testCommitGraph(self):
+        self.repo.git('commit-graph', 'write', '--reachable')
+        self.assertEqual([4, 2], self._git_number([self.repo['E'],
+                                                   self.repo['F']]))
+        self.assertEqual(0, sum(self.gn.DIRTY_TREES.values()))
+        self.assertFalse(self.repo.run(self.gn.git.tree, self.gn.REF))
+
+    def testPartialCommitGraph(self):
+        self.repo.git('commit-graph',
+                      'write',
+                      '--stdin-commits',
+                      input=self.repo['B'].encode())
+        self.assertEqual([4], self._git_number([self.repo['E']]))
+        # A and B are in the commit-graph, only C, D and E were counted.
+        self.assertEqual(3, sum(self.gn.DIRTY_TREES.values()))
+        self.repo.run(self.gn.finalize, [binascii.unhexlify(self.repo['E'])])
+        self.gn.clear_caches()
+        self.assertEqual(
+            3, self.repo.run(self.gn.get_num,
+                             binascii.unhexlify(self.repo['D'])))
+        self.assertEqual(
+            None,
+            self.repo.run(self.gn.get_num, binascii.unhexlify(self.repo['B'])))
+        self.assertEqual([1], self._git_number([self.repo['B']]))
+
+    def testCorruptCommitGraph(self):
+        self.repo.git('commit-graph', 'write', '--reachable')
+        path = os.path.join(self.repo.repo_path, '.git', 'objects', 'info',
+                            'commit-graph')
+        os.chmod(path, 0o644)
+        with open(path, 'r+b') as f:
+            f.write(b'XXXX')
+        self.assertEqual([4], self._git_number([self.repo['E']]))
+
+    def testPreloadTrees(self):
+        self._git_number([self.repo['E']], cache=True)
+        self.gn.clear_caches()
+        prefixes = [binascii.unhexlify(self.repo[c])[:1] for c in 'AE']
+        trees = dict(self.repo.run(self.gn.preload_trees, prefixes))
+        self.assertEqual(
+            0, trees[prefixes[0]][binascii.unhexlify(self.repo['A'])])
+        self.assertEqual(
+            4, trees[prefixes[1]][binascii.unhexlify(self.repo['E'])])
+
 
 if __name__ == '__main__':
     sys.exit(
@@ -6,11 +6,13 @@
 
 import os
 import sys
+import tempfile
 from unittest import mock
 
 DEPOT_TOOLS_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, DEPOT_TOOLS_ROOT)
 
+import gclient_utils
 from testing_support import coverage_utils
 from testing_support import git_test_utils
 
@@ -245,6 +247,91 @@ class GitRebaseUpdateTest(git_test_utils.GitRepoReadWriteTestBase):
         _, branch_tree = self.repo.run(self.gc.get_branch_tree)
         self.assertEqual(branch_tree['sub_K'], 'foobar')
 
+    def testSplitSubtrees(self):
+        self.assertEqual(
+            [[('a', 'origin/main'), ('b', 'a'), ('d', 'a'), ('c', 'b')],
+             [('e', 'origin/main')], [('f', 'tag')]],
+            self.repo.run(
+                self.reup.split_subtrees, {
+                    'a': 'origin/main',
+                    'b': 'a',
+                    'c': 'b',
+                    'd': 'a',
+                    'e': 'origin/main',
+                    'f': 'tag',
+                }))
+
+    def testRebaseUpdateParallel(self):
+        self.repo.git('checkout', 'origin/main')
+        self.repo.run(self.nb.main, ['foobar'])
+        with self.repo.open('foobar', 'w') as f:
+            f.write('this is the foobar file')
+        self.repo.git('add', 'foobar')
+        self.repo.git_commit('foobar1')
+        self.repo.run(self.nb.main, ['--upstream-current', 'sub_foobar'])
+        with self.repo.open('foobar', 'w') as f:
+            f.write('some more foobaring')
+        self.repo.git_commit('foobar2')
+        self.repo.git('branch', '--set-upstream-to', 'origin/main',
+                      'branch_K')
+        self.repo.git('checkout', 'branch_L')
+
+        worktrees = []
+        remove_worktrees = self.reup.remove_worktrees
+
+        def RemoveWorktrees(tempdir):
+            worktrees.extend(os.listdir(tempdir))
+            remove_worktrees(tempdir)
+
+        with mock.patch.object(self.reup,
+                               'remove_worktrees',
+                               side_effect=RemoveWorktrees):
+            output, _ = self.repo.capture_stdio(self.reup.main, ['-j', '2'])
+        # One worktree is added per job, for the three subtrees.
+        self.assertEqual(['worktree0', 'worktree1'], sorted(worktrees))
+        self.assertIn('Rebasing: branch_K', output)
+        self.assertIn('Rebasing: branch_L', output)
+        self.assertIn('Rebasing: foobar', output)
+        self.assertIn('Rebasing: sub_foobar', output)
+        self.assertIn('Deleted branch branch_G', output)
+
+        self.assertSchema("""
+    A B C D E F G M N O H I J K L
+                      O foobar1 foobar2
+    """)
+        self.assertEqual('branch_L', self.repo.run(self.gc.current_branch))
+        # The temporary worktrees were removed.
+        self.assertEqual(
+            1,
+            self.repo.git('worktree', 'list',
+                          '--porcelain').stdout.count('worktree '))
+        self.assertEqual(self.origin['O'],
+                         self.repo.run(self.gc.get_or_create_merge_base,
+                                       'foobar'))
+
+        output, _ = self.repo.capture_stdio(self.reup.main, ['-j', '2'])
+        self.assertIn('branch_L up-to-date', output)
+        self.assertIn('sub_foobar up-to-date', output)
+
+    def testRemoveWorktrees(self):
+        # The worktrees of interrupted workers may still have branches checked
+        # out, or be half added.
+        tempdir = tempfile.mkdtemp()
+        self.repo.git('worktree', 'add', os.path.join(tempdir, 'worktree1'),
+                      'branch_K')
+        self.repo.git('worktree', 'add', '--detach',
+                      os.path.join(tempdir, 'worktree2'))
+        gclient_utils.rmtree(os.path.join(tempdir, 'worktree2'))
+
+        self.repo.run(self.reup.remove_worktrees, tempdir)
+        self.assertFalse(os.path.exists(tempdir))
+        self.assertEqual(
+            1,
+            self.repo.git('worktree', 'list',
+                          '--porcelain').stdout.count('worktree '))
+        self.repo.git('checkout', 'branch_K')
+        self.assertEqual('branch_K', self.repo.run(self.gc.current_branch))
+
     def testRebaseConflicts(self):
         # Pretend that branch_L landed
         self.origin.git('checkout', 'main')
@@ -327,6 +414,42 @@ class GitRebaseUpdateTest(git_test_utils.GitRepoReadWriteTestBase):
         self.assertIn('could not be cleanly rebased:', output)
         self.assertIn('  branch_K', output)
 
+    def testRebaseConflictsParallel(self):
+        # Add a commit to branch_K which conflicts with origin/main.
+        self.repo.git('checkout', 'branch_K')
+        with self.repo.open('M', 'w') as f:
+            f.write('NOPE')
+        self.repo.git('add', 'M')
+        self.repo.git_commit('K NOPE')
+        self.repo.git('checkout', 'origin/main')
+        self.repo.run(self.nb.main, ['foobar'])
+        with self.repo.open('foobar', 'w') as f:
+            f.write('this is the foobar file')
+        self.repo.git('add', 'foobar')
+        self.repo.git_commit('foobar1')
+
+        output, _ = self.repo.capture_stdio(self.reup.main,
+                                            ['-j', '2', '--no-squash'])
+        self.assertIn('Rebasing: foobar', output)
+        self.assertEqual(1, output.count('Rebasing: branch_K'))
+        self.assertNotIn('Rebasing: branch_L', output)
+        self.assertIn('branch.branch_K.dormant true', output)
+        self.assertTrue(self.repo.run(self.gc.in_rebase))
+        # The independent subtree was rebased regardless.
+        self.assertEqual(
+            self.origin['O'],
+            self.repo.git('rev-parse', 'foobar~').stdout.strip())
+
+        self.repo.git('rebase', '--abort')
+        self.repo.git('config', 'branch.branch_K.dormant', 'false')
+        output, _ = self.repo.capture_stdio(
+            self.reup.main, ['-j', '2', '-k', '-n', '--no-squash'])
+        self.assertIn('--keep-going set, continuing with next branch.', output)
+        self.assertIn('could not be cleanly rebased:', output)
+        self.assertIn('  branch_K', output)
+        self.assertIn('Rebasing: branch_L', output)
+        self.assertFalse(self.repo.run(self.gc.in_rebase))
+
     def testTrackTag(self):
         self.origin.git('tag', 'tag-to-track', self.origin['M'])
         self.repo.git('tag', 'tag-to-track', self.repo['D'])
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# Copyright 2026 The Chromium Authors
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import post_build_ninja_summary
+
+
+def _MakeLog(*builds):
+    """Returns a .ninja_log file with the (start, end, name, cmdhash) steps of
+    each build."""
+    lines = ['# ninja log v5\n']
+    for build in builds:
+        for start, end, name, cmdhash in build:
+            lines.append('%d\t%d\t0\t%s\t%s\n' % (start, end, name, cmdhash))
+    return io.StringIO(''.join(lines))
+
+
+class PostBuildNinjaSummaryTest(unittest.TestCase):
+    def testReadEmptyLog(self):
+        ninja_log = post_build_ninja_summary.ReadNinjaLog(io.StringIO(''),
+                                                          False)
+        self.assertEqual(0, len(ninja_log))
+
+    def testReadMultipleOutputs(self):
+        ninja_log = post_build_ninja_summary.ReadNinjaLog(
+            _MakeLog([
+                (0, 1000, 'a.o', 'h1'),
+                (0, 2000, 'b.so', 'h2'),
+                (0, 2000, 'b.so.TOC', 'h2'),
+            ]), False)
+        self.assertEqual(2, len(ninja_log))
+        self.assertEqual([0.0, 0.0], list(ninja_log.starts))
+        self.assertEqual([1.0, 2.0], list(ninja_log.ends))
+        self.assertEqual([['a.o'], ['b.so', 'b.so.TOC']], ninja_log.outputs)
+        self.assertEqual('b.so, b.so.TOC', ninja_log.DescribeOutputs(1))
+
+    def testReadLastBuild(self):
+        log = _MakeLog(
+            [(0, 1000, 'a.o', 'h1'), (0, 5000, 'b.o', 'h2')],
+            # The end times go backwards.
+            [(0, 3000, 'c.o', 'h3')],
+            # The command of c.o runs again.
+            [(6000, 7000, 'd.o', 'h4'), (6000, 8000, 'c.o', 'h3')],
+        )
+        ninja_log = post_build_ninja_summary.ReadNinjaLog(log, False)
+        self.assertEqual([['c.o']], ninja_log.outputs)
+        self.assertEqual([6.0], list(ninja_log.starts))
+
+        log.seek(0)
+        ninja_log = post_build_ninja_summary.ReadNinjaLog(log, True)
+        self.assertEqual(4, len(ninja_log))
+
+    def testReadLastBuildFromFile(self):
+        log = _MakeLog(
+            [(0, 1000, 'a.o', 'h1'), (0, 5000, 'b.o', 'h2')],
+            [(0, 3000, 'c.o', 'h3'), (0, 4000, 'd\u00e9.o', 'h4')],
+        ).getvalue()
+        build_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, build_dir)
+        path = os.path.join(build_dir, '.ninja_log')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(log)
+
+        # Lines span the blocks read backwards.
+        with open(path, encoding='utf-8') as f:
+            f.readline()
+            self.assertEqual(
+                list(reversed(log.split('\n')[1:])),
+                list(post_build_ninja_summary._ReadLinesBackwards(f, 7)))
+
+        with open(path, encoding='utf-8') as f:
+            ninja_log = post_build_ninja_summary.ReadNinjaLog(f, False)
+        self.assertEqual([['c.o'], ['d\u00e9.o']], ninja_log.outputs)
+
+    def testReadCorruptLines(self):
+        log = io.StringIO('# ninja log v5\n'
+                          '0\t1000\t0\ta.o\th1\n'
+                          'garbage\n'
+                          '0\t2000\t0\tb.o\th2\n')
+        ninja_log = post_build_ninja_summary.ReadNinjaLog(log, False)
+        self.assertEqual([['a.o'], ['b.o']], ninja_log.outputs)
+
+    def testComputeWeightedDurations(self):
+        ninja_log = post_build_ninja_summary.ReadNinjaLog(
+            _MakeLog([
+                (0, 10000, 'a.o', 'h1'),
+                (0, 10000, 'b.o', 'h2'),
+                (10000, 10000, 'c.stamp', 'h3'),
+                (10000, 20000, 'd.so', 'h4'),
+            ]), False)
+        weighted_total = post_build_ninja_summary.ComputeWeightedDurations(
+            ninja_log)
+        self.assertEqual([5.0, 5.0, 0.0, 10.0],
+                         list(ninja_log.weighted_durations))
+        self.assertEqual(20.0, weighted_total)
+
+    def testSummarizeNinjaLog(self):
+        ninja_log = post_build_ninja_summary.ReadNinjaLog(
+            _MakeLog([
+                (0, 10000, 'a.o', 'h1'),
+                (0, 10000, 'b.o', 'h2'),
+                (10000, 20000, 'c.so', 'h3'),
+            ]), False)
+        with mock.patch('sys.stdout', io.StringIO()) as stdout:
+            post_build_ninja_summary.SummarizeNinjaLog(ninja_log, None, False)
+        self.assertEqual(
+            '    Longest build steps:\n'
+            '           5.0 weighted s to build a.o (10.0 s elapsed time)\n'
+            '           5.0 weighted s to build b.o (10.0 s elapsed time)\n'
+            '          10.0 weighted s to build c.so (10.0 s elapsed time)\n'
+            '    Time by build-step type:\n'
+            '          10.0 s weighted time to generate 2 .o files '
+            '(20.0 s elapsed time sum)\n'
+            '          10.0 s weighted time to generate 1 .so (linking) files '
+            '(10.0 s elapsed time sum)\n'
+            '    20.0 s weighted time (30.0 s elapsed time sum, 1.5x '
+            'parallelism)\n'
+            '    3 build steps completed, average of 0.15/s\n',
+            stdout.getvalue())
+
+
+class TimelineTest(unittest.TestCase):
+    def setUp(self):
+        self.build_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.build_dir)
+        self.ninja_log = post_build_ninja_summary.ReadNinjaLog(
+            _MakeLog([
+                (0, 1000, 'gen/a.h', 'h1'),
+                (1000, 3000, 'obj/b c.o', 'h2'),
+                (1000, 5000, 'obj/a.o', 'h3'),
+                (5000, 9000, 'bin/app', 'h4'),
+            ]), False)
+
+    def _WriteFile(self, name, contents):
+        with open(os.path.join(self.build_dir, name), 'w') as f:
+            f.write(contents)
+
+    def _ReadBuildGraph(self):
+        self._WriteFile(
+            'build.ninja', 'rule cc\n'
+            '  command = cc $in -o $out\n'
+            'build gen/a.h: cc ../../a.idl\n'
+            'build obj/a.o: cc ../../a.cc | gen/a.h\n'
+            'subninja toolchain.ninja\n')
+        self._WriteFile(
+            'toolchain.ninja', 'build obj/b$ c.o: cc ../../b.cc || stamp\n'
+            'build stamp: phony gen/a.h\n'
+            'build bin/app: link obj/a.o $\n'
+            '    obj/b$ c.o |@ validate\n')
+        return post_build_ninja_summary.ReadBuildGraph(
+            os.path.join(self.build_dir, 'build.ninja'))
+
+    def testReadBuildGraph(self):
+        self.assertEqual(
+            {
+                'gen/a.h': ['../../a.idl'],
+                'obj/a.o': ['../../a.cc', 'gen/a.h'],
+                'obj/b c.o': ['../../b.cc', 'stamp'],
+                'stamp': ['gen/a.h'],
+                'bin/app': ['obj/a.o', 'obj/b c.o'],
+            }, self._ReadBuildGraph())
+
+    def testFindCriticalPathWithDeps(self):
+        self.assertEqual([0, 2, 3],
+                         post_build_ninja_summary.FindCriticalPath(
+                             self.ninja_log, self._ReadBuildGraph()))
+
+    def testFindCriticalPathWithoutDeps(self):
+        self.assertEqual([0, 2, 3],
+                         post_build_ninja_summary.FindCriticalPath(
+                             self.ninja_log))
+
+    def testComputeConcurrency(self):
+        self.assertEqual([(0.0, 1), (1.0, 2), (3.0, 1), (5.0, 1), (9.0, 0)],
+                         post_build_ninja_summary.ComputeConcurrency(
+                             self.ninja_log))
+
+    def testSummarizeTimeline(self):
+        with mock.patch('sys.stdout', io.StringIO()) as stdout:
+            post_build_ninja_summary.SummarizeTimeline(self.ninja_log,
+                                                       [0, 2, 3], True, 4, 3)
+        self.assertEqual(
+            '    Build timeline (9.0 s, 4 slots):\n'
+            '      Concurrency: peak 2, average 1.2, 69.4% of the slots idle\n'
+            '      Idle slots by time window:\n'
+            '             0.0 -      3.0 s   58.3% idle\n'
+            '             3.0 -      6.0 s   75.0% idle\n'
+            '             6.0 -      9.0 s   75.0% idle\n'
+            '    Critical path (9.0 s of steps, 3 steps, from build.ninja '
+            'deps):\n'
+            '           1.0 s at      0.0 s to build gen/a.h\n'
+            '           4.0 s at      1.0 s to build obj/a.o\n'
+            '           4.0 s at      5.0 s to build bin/app\n',
+            stdout.getvalue())
+
+    def testWriteTraceEvents(self):
+        f = io.StringIO()
+        post_build_ninja_summary.WriteTraceEvents(self.ninja_log, [0, 2, 3],
+                                                  None, f)
+        events = json.loads(f.getvalue())['traceEvents']
+        steps = [event for event in events if event['ph'] == 'X']
+        self.assertEqual(
+            [('gen/a.h', 0, 1000000, 1), ('obj/b c.o', 1000000, 2000000, 1),
+             ('obj/a.o', 1000000, 4000000, 2),
+             ('bin/app', 5000000, 4000000, 1)],
+            [(event['name'], event['ts'], event['dur'], event['tid'])
+             for event in steps if event['tid']])
+        self.assertEqual(['gen/a.h', 'obj/a.o', 'bin/app'],
+                         [event['name'] for event in steps if not event['tid']])
+
+    def testTimelineWindowsMustBePositive(self):
+        for value in ('0', '-1'):
+            with mock.patch('sys.argv', [
+                    'post_build_ninja_summary.py', '-C', self.build_dir,
+                    '--timeline', '--timeline-windows', value
+            ]), mock.patch('sys.stderr', io.StringIO()) as stderr:
+                with self.assertRaises(SystemExit):
+                    post_build_ninja_summary.main()
+            self.assertIn('must be at least 1', stderr.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
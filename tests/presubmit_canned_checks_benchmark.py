@@ -0,0 +1,159 @@
+#!/usr/bin/env vpython3
+# Copyright 2026 The Chromium Authors
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+"""Benchmark for the per-line rules of presubmit_canned_checks.
+
+Evaluates the registered per-line rules (tabs, stray whitespace, unowned
+TODOs, long lines, DO NOT SUBMIT and corp links) on a synthetic change:
+  - per-rule: one pass over each file per rule, with the rules as plain
+    callables.
+  - fused: the line scanner, a single pass over each file for all the rules.
+  - checks: the canned checks themselves, which use the line scanner.
+
+Usage:
+  vpython3 tests/presubmit_canned_checks_benchmark.py [--files 10000] \\
+      [--lines 100]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import presubmit_canned_checks
+from testing_support.presubmit_canned_checks_test_mocks import (
+    MockAffectedFile, MockInputApi, MockOutputApi)
+
+_LINES = (
+    '  int value = ComputeSomething(argument, other_argument);',
+    '  // A comment explaining what happens here.',
+    '  if (value > kThreshold) {',
+    '    return std::make_unique<Something>(value);',
+    '  }',
+    '',
+    '#include "base/files/file_path.h"',
+)
+
+# Lines violating one of the rules, each used for about one line in 2000.
+_VIOLATIONS = (
+    '\tint tabbed = 0;',
+    '  int stray = 0;  ',
+    '  // TODO: fix this.',
+    '  // ' + 'x' * 100,
+    '  // DO NOT ' + 'SUBMIT',
+    '  // http://go' + presubmit_canned_checks._CORP_LINK_KEYWORD,
+)
+
+
+def _generate_files(files, lines):
+    rand = random.Random(0)
+    result = []
+    for i in range(files):
+        contents = []
+        for _ in range(lines):
+            if rand.random() < 1 / 2000:
+                contents.append(rand.choice(_VIOLATIONS))
+            else:
+                contents.append(rand.choice(_LINES))
+        result.append(MockAffectedFile('dir%d/file%d.cc' % (i // 100, i),
+                                       contents))
+    return result
+
+
+def _per_rule(rules, file_ext_list):
+    errors = []
+    for rule in rules:
+        errors += presubmit_canned_checks._FindNewViolationsOfRuleForList(
+            rule.predicate, file_ext_list)
+    return errors
+
+
+def _fused(rules, file_ext_list):
+    presubmit_canned_checks._LINE_SCANNER = (
+        presubmit_canned_checks._LineScanner())
+    errors = []
+    for rule in rules:
+        errors += presubmit_canned_checks._FindNewViolationsOfRuleForList(
+            rule, file_ext_list)
+    return errors
+
+
+def _checks(input_api, output_api):
+    presubmit_canned_checks._LINE_SCANNER = (
+        presubmit_canned_checks._LineScanner())
+    results = []
+    results += presubmit_canned_checks.CheckLongLines(input_api, output_api,
+                                                      80)
+    results += presubmit_canned_checks.CheckChangeHasNoTabs(
+        input_api, output_api)
+    results += presubmit_canned_checks.CheckChangeHasNoStrayWhitespace(
+        input_api, output_api)
+    results += presubmit_canned_checks.CheckChangeTodoHasOwner(
+        input_api, output_api)
+    results += presubmit_canned_checks.CheckDoNotSubmitInFiles(
+        input_api, output_api)
+    results += presubmit_canned_checks.CheckCorpLinksInFiles(
+        input_api, output_api)
+    return results
+
+
+def _time(iterations, func, *args):
+    best = None
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files',
+                        type=int,
+                        default=10000,
+                        help='Files in the change (default: %(default)s)')
+    parser.add_argument('--lines',
+                        type=int,
+                        default=100,
+                        help='Lines per file (default: %(default)s)')
+    parser.add_argument('-n',
+                        '--iterations',
+                        type=int,
+                        default=3,
+                        help='Runs per strategy; the fastest is reported '
+                        '(default: %(default)s)')
+    options = parser.parse_args(args)
+
+    input_api = MockInputApi()
+    input_api.files = _generate_files(options.files, options.lines)
+    output_api = MockOutputApi()
+    # Registers the long line rule.
+    _checks(input_api, output_api)
+    rules = list(presubmit_canned_checks._LINE_RULES.values())
+    file_ext_list = list(
+        presubmit_canned_checks._GenerateAffectedFileExtList(input_api, None))
+
+    print('%d files of %d lines, %d rules, %d iterations' %
+          (options.files, options.lines, len(rules), options.iterations))
+    per_rule_time, per_rule_errors = _time(options.iterations, _per_rule,
+                                           rules, file_ext_list)
+    fused_time, fused_errors = _time(options.iterations, _fused, rules,
+                                     file_ext_list)
+    checks_time, _ = _time(options.iterations, _checks, input_api, output_api)
+    if per_rule_errors != fused_errors:
+        print('The fused rules found different violations', file=sys.stderr)
+        return 1
+    print('  %-9s %8.3f s' % ('per-rule', per_rule_time))
+    print('  %-9s %8.3f s' % ('fused', fused_time))
+    print('  %-9s %8.3f s' % ('checks', checks_time))
+    print('%d violations' % len(fused_errors))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -3,9 +3,12 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
+import io
 import os.path
+import shutil
 import subprocess
 import sys
+import tempfile
 import unittest
 from unittest import mock
 
@@ -15,6 +18,7 @@ sys.path.insert(0, ROOT_DIR)
 from testing_support.presubmit_canned_checks_test_mocks import (
     MockFile, MockAffectedFile, MockInputApi, MockOutputApi, MockChange)
 
+import cpplint
 import presubmit_canned_checks
 
 # TODO: Should fix these warnings.
@@ -660,5 +664,68 @@ class CheckNewDEPSHooksHasRequiredReviewersTest(unittest.TestCase):
                     self.assertEqual(0, len(results))
 
 
+class CheckChangeLintsCleanTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.input_api = MockInputApi()
+        self.input_api.cpplint = cpplint
+        self.input_api.cpu_count = 2
+        for i in range(6):
+            path = os.path.join(self.root, 'file%d.cc' % i)
+            contents = [
+                '#include <stdio.h>',
+                'int  f(){return %d;}  ' % i,
+                'int g() { int x = 1;  // NOLINT',
+                '}',
+            ]
+            if i == 3:
+                contents = ['int a;', '']
+            with open(path, 'w') as f:
+                f.write('\n'.join(contents) + '\n')
+            self.input_api.files.append(MockFile(path, contents))
+
+    def _runCheck(self, jobs):
+        with mock.patch('sys.stderr', io.StringIO()) as stderr:
+            results = presubmit_canned_checks.CheckChangeLintsClean(
+                self.input_api, MockOutputApi(), jobs=jobs)
+        # pylint: disable=protected-access
+        return (results, stderr.getvalue(), cpplint._cpplint_state.error_count)
+
+    def testParallelMatchesSerial(self):
+        results, output, error_count = self._runCheck(jobs=1)
+        self.assertEqual(1, len(results))
+        self.assertGreater(error_count, 0)
+
+        parallel_results, parallel_output, parallel_error_count = (
+            self._runCheck(jobs=2))
+        self.assertEqual(len(results), len(parallel_results))
+        self.assertEqual(output, parallel_output)
+        self.assertEqual(error_count, parallel_error_count)
+        # Errors are reported in the order of the files.
+        reported = [line.split(':')[0] for line in output.splitlines()]
+        self.assertEqual(sorted(reported), reported)
+
+    def testCache(self):
+        self.input_api.environ['CPPLINT_CACHE_DIR'] = os.path.join(
+            self.root, 'cache')
+        results, output, error_count = self._runCheck(jobs=1)
+
+        with mock.patch('cpplint.ProcessFileData') as process_file_data:
+            cached_results, cached_output, cached_error_count = (
+                self._runCheck(jobs=1))
+        process_file_data.assert_not_called()
+        self.assertEqual(len(results), len(cached_results))
+        self.assertEqual(output, cached_output)
+        self.assertEqual(error_count, cached_error_count)
+
+        # Only the files that changed are linted again.
+        with open(self.input_api.files[0].AbsoluteLocalPath(), 'a') as f:
+            f.write('int  x;\n')
+        with mock.patch('cpplint.ProcessFileData') as process_file_data:
+            self._runCheck(jobs=1)
+        self.assertEqual(1, process_file_data.call_count)
+
+
 if __name__ == '__main__':
     unittest.main()
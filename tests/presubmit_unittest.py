@@ -692,6 +692,142 @@ class PresubmitUnittest(PresubmitTestsBase):
         self.assertEqual(sys.stdout.getvalue().count('??'), 0)
         self.assertEqual(sys.stdout.getvalue().count(RUNNING_PY_CHECKS_TEXT), 1)
 
+    def testDoPresubmitChecksParallel(self):
+        root_path = os.path.join(self.fake_root_dir, 'PRESUBMIT.py')
+        haspresubmit_path = os.path.join(self.fake_root_dir, 'haspresubmit',
+                                         'PRESUBMIT.py')
+        scripts = {
+            root_path: ('def CheckChangeOnUpload(input_api, output_api):\n'
+                        '  print("root output")\n'
+                        '  output_api.more_cc = ["b@example.com"]\n'
+                        '  return [output_api.PresubmitNotifyResult("root")]\n'),
+            haspresubmit_path:
+            ('PRESUBMIT_VERSION = "2.0.0"\n'
+             'def CheckB(input_api, output_api):\n'
+             '  output_api.more_cc = ["a@example.com"]\n'
+             '  return [output_api.PresubmitError("B")]\n'
+             'def CheckA(input_api, output_api):\n'
+             '  return [output_api.PresubmitNotifyResult("A")]\n'
+             'def CheckOnCommit(input_api, output_api):\n'
+             '  return [output_api.PresubmitError("commit")]\n'),
+        }
+        os.path.isfile.side_effect = lambda f: f in scripts
+        os.listdir.return_value = ['PRESUBMIT.py']
+        gclient_utils.FileRead.side_effect = lambda f: scripts[f]
+        change = self.ExampleChange()
+
+        outputs = []
+        for kwargs in ({}, {
+                'jobs': 2
+        }, {
+                'jobs': 2,
+                'parallel_checks': True
+        }):
+            sys.stdout.truncate(0)
+            sys.stdout.seek(0)
+            self.assertEqual(
+                1,
+                presubmit.DoPresubmitChecks(change=change,
+                                            committing=False,
+                                            verbose=False,
+                                            default_presubmit=None,
+                                            may_prompt=False,
+                                            gerrit_obj=None,
+                                            json_output='-',
+                                            **kwargs))
+            outputs.append(sys.stdout.getvalue())
+
+        self.assertIn('root output', outputs[0])
+        result = json.loads(
+            outputs[0].split('**** Presubmit Results ****\n')[1].split(
+                '\n**** End')[0])
+        self.assertEqual(['root', 'A'],
+                         [n['message'] for n in result['notifications']])
+        self.assertEqual(['B'], [e['message'] for e in result['errors']])
+        self.assertEqual(['a@example.com', 'b@example.com'], result['more_cc'])
+        self.assertEqual([outputs[0]] * 3, outputs)
+
+    def testDoPresubmitChecksProfile(self):
+        root_path = os.path.join(self.fake_root_dir, 'PRESUBMIT.py')
+        os.path.isfile.side_effect = lambda f: f == root_path
+        os.listdir.return_value = ['PRESUBMIT.py']
+        gclient_utils.FileRead.return_value = (
+            'PRESUBMIT_VERSION = "2.0.0"\n'
+            'def CheckA(input_api, output_api):\n'
+            '  import subprocess, sys\n'
+            '  subprocess.check_call([sys.executable, "-c", ""])\n'
+            '  return input_api.canned_checks.CheckDoNotSubmitInDescription(\n'
+            '      input_api, output_api)\n')
+        change = self.ExampleChange()
+
+        for jobs in (1, 2):
+            gclient_utils.FileWrite.reset_mock()
+            sys.stdout.truncate(0)
+            sys.stdout.seek(0)
+            self.assertEqual(
+                0,
+                presubmit.DoPresubmitChecks(change=change,
+                                            committing=False,
+                                            verbose=False,
+                                            default_presubmit=None,
+                                            may_prompt=False,
+                                            gerrit_obj=None,
+                                            jobs=jobs,
+                                            profile_output='profile.json'))
+            self.assertIn('** Slowest presubmit checks **',
+                          sys.stdout.getvalue())
+            self.assertIn('canned CheckDoNotSubmitInDescription (from CheckA)',
+                          sys.stdout.getvalue())
+
+            gclient_utils.FileWrite.assert_called_once_with(
+                'profile.json', mock.ANY)
+            events = json.loads(
+                gclient_utils.FileWrite.call_args[0][1])['traceEvents']
+            self.assertEqual([('CheckDoNotSubmitInDescription', 'canned'),
+                              ('CheckA', 'check')],
+                             [(e['name'], e['cat']) for e in events])
+            self.assertEqual('X', events[1]['ph'])
+            self.assertEqual(root_path, events[1]['args']['presubmit'])
+            self.assertEqual(1, events[1]['args']['subprocesses'])
+            self.assertEqual('CheckA', events[0]['args']['parent'])
+            self.assertEqual(root_path, events[0]['args']['presubmit'])
+            self.assertEqual(0, events[0]['args']['subprocesses'])
+
+        # The canned checks are restored.
+        self.assertEqual(
+            'presubmit_canned_checks', presubmit.presubmit_canned_checks.
+            CheckDoNotSubmitInDescription.__module__)
+
+    def testListCheckFunctions(self):
+        script = ('PRESUBMIT_VERSION = "2.0.0"\n'
+                  'import os\n'
+                  'def CheckB(input_api, output_api): pass\n'
+                  'def CheckA(input_api, output_api): pass\n'
+                  'def CheckB(input_api, output_api): pass\n'
+                  'def CheckOnCommit(input_api, output_api): pass\n'
+                  'def CheckOnUpload(input_api, output_api): pass\n')
+        self.assertEqual(['CheckB', 'CheckA', 'CheckOnUpload'],
+                         presubmit._ListCheckFunctions(script, 'PRESUBMIT.py',
+                                                       False))
+        self.assertEqual(['CheckB', 'CheckA', 'CheckOnCommit'],
+                         presubmit._ListCheckFunctions(script, 'PRESUBMIT.py',
+                                                       True))
+        for script in (
+                # Not version 2.
+                'def CheckA(input_api, output_api): pass\n',
+                'PRESUBMIT_VERSION = "1.0.0"\n'
+                'def CheckA(input_api, output_api): pass\n',
+                # Check functions which are not plain definitions.
+                'PRESUBMIT_VERSION = "2.0.0"\n'
+                'from checks import CheckA\n',
+                'PRESUBMIT_VERSION = "2.0.0"\n'
+                'from checks import *\n',
+                'PRESUBMIT_VERSION = "2.0.0"\n'
+                'CheckA = lambda input_api, output_api: []\n',
+                'syntax error(\n'):
+            self.assertIsNone(
+                presubmit._ListCheckFunctions(script, 'PRESUBMIT.py', False))
+
     def testDoPresubmitChecksJsonOutput(self):
         fake_error = 'Missing LGTM'
         fake_error_items = '["!", "!!", "!!!"]'
@@ -1849,6 +1985,45 @@ class AffectedFileUnittest(PresubmitTestsBase):
                                                   None).Extension()
             self.assertEqual(expectedExtension, extension)
 
+    def testContentsReadOnce(self):
+        gclient_utils.FileRead.return_value = 'whatever\ncookie'
+        change = presubmit.Change('foo', 'foo', self.fake_root_dir,
+                                  [('M', 'foo/blat.cc'), ('M', 'foo/blat.h')],
+                                  0, 0, None)
+        input_api = presubmit.InputApi(change, './PRESUBMIT.py', False, None,
+                                       False)
+        af = change.AffectedFiles()[0]
+        path = os.path.join(self.fake_root_dir, 'foo', 'blat.cc')
+
+        lines = af.NewContents()
+        self.assertEqual(['whatever', 'cookie'], lines)
+        lines.append('modified by the caller')
+        self.assertEqual(['whatever', 'cookie'], af.NewContents())
+        self.assertEqual('whatever\ncookie', input_api.ReadFile(af, 'rb'))
+        self.assertEqual('whatever\ncookie', input_api.ReadFile(path))
+        gclient_utils.FileRead.assert_called_once_with(path)
+
+        # The other files of the change are read separately.
+        self.assertEqual(['whatever', 'cookie'],
+                         change.AffectedFiles()[1].NewContents())
+        self.assertEqual(2, gclient_utils.FileRead.call_count)
+
+        # Flushing the cache reads the file again, for all the readers.
+        gclient_utils.FileRead.return_value = 'flushed'
+        self.assertEqual(['flushed'], af.NewContents(flush_cache=True))
+        self.assertEqual('flushed', input_api.ReadFile(path))
+        self.assertEqual(3, gclient_utils.FileRead.call_count)
+
+    def testOldContentsCached(self):
+        diff_cache = mock.Mock()
+        diff_cache.GetOldContents.return_value = 'old\ncontents'
+        af = presubmit.AffectedFile('foo/blat.cc', 'M', self.fake_root_dir,
+                                    diff_cache)
+        self.assertEqual(['old', 'contents'], af.OldContents())
+        self.assertEqual(['old', 'contents'], af.OldContents())
+        diff_cache.GetOldContents.assert_called_once_with(
+            presubmit.normpath('foo/blat.cc'), self.fake_root_dir)
+
 
 class ChangeUnittest(PresubmitTestsBase):
 
@@ -2471,6 +2646,65 @@ class CannedChecksUnittest(PresubmitTestsBase):
             input_api, presubmit.OutputApi)
         self.assertEqual(len(results), 0)
 
+    def testLineRulesSinglePass(self):
+        change = presubmit.Change('foo1', 'foo1\n', self.fake_root_dir, None,
+                                  0, 0, None)
+        input_api = self.MockInputApi(change, False)
+        affected_file = mock.MagicMock(presubmit.GitAffectedFile)
+        affected_file.LocalPath.return_value = 'foo.cc'
+        affected_file.NewContents.return_value = [
+            'ok', 'a\ttab', 'stray ', 'TODO: fix', 'x' * 81
+        ]
+        affected_file.ChangedContents.return_value = [(2, 'a\ttab'),
+                                                      (3, 'stray ')]
+        input_api.AffectedFiles.return_value = [affected_file]
+
+        for check, expected in (
+            (presubmit_canned_checks.CheckChangeHasNoTabs, 'foo.cc:2'),
+            (presubmit_canned_checks.CheckChangeHasNoStrayWhitespace,
+             'foo.cc:3'),
+            (presubmit_canned_checks.CheckCorpLinksInFiles, None),
+            # The TODO has no owner, but it isn't a changed line.
+            (presubmit_canned_checks.CheckChangeTodoHasOwner, None),
+        ):
+            results = check(input_api, presubmit.OutputApi, None)
+            if expected:
+                self.assertEqual(1, len(results))
+                self.assertEqual(expected, results[0]._long_text)
+            else:
+                self.assertEqual([], results)
+        self.assertEqual(
+            [], presubmit_canned_checks.CheckDoNotSubmitInFiles(
+                input_api, presubmit.OutputApi))
+        # All the rules were evaluated the first time.
+        affected_file.NewContents.assert_called_once_with()
+
+    def testLineScannerMatchesRules(self):
+        lines = [
+            '', 'a', 'a\t', ' a ', 'a\x0b', 'TODO(me): x', 'TODO: x - y',
+            'TODOx', 'DO NOT ' + 'SUBMIT', 'go/.corp.google', 'x' * 80,
+            'y' * 81, 'z' * 101, '\ta\t', 'a　'
+        ]
+        rules = dict(presubmit_canned_checks._LINE_RULES)
+        rules['test-long-line'] = presubmit_canned_checks._RegisterLineRule(
+            'test-long-line', '\\n.{81}', lambda _, line: len(line) <= 80)
+        rules['test-start'] = presubmit_canned_checks._RegisterLineRule(
+            'test-start', '^a', lambda _, line: not line.startswith('a'))
+        try:
+            for i in range(len(lines)):
+                for contents in ([lines[i]], lines[i:], lines[:i + 1]):
+                    affected_file = mock.MagicMock(presubmit.GitAffectedFile)
+                    affected_file.NewContents.return_value = contents
+                    for rule in rules.values():
+                        self.assertEqual(
+                            not all(rule(None, line) for line in contents),
+                            presubmit_canned_checks._LINE_SCANNER.Violates(
+                                affected_file, None, rule),
+                            (rule.name, contents))
+        finally:
+            del presubmit_canned_checks._LINE_RULES['test-long-line']
+            del presubmit_canned_checks._LINE_RULES['test-start']
+
     def testCannedCheckChangeHasNoTabs(self):
         self.ContentTest(presubmit_canned_checks.CheckChangeHasNoTabs,
                          'blah blah', None, 'blah\tblah', None,
@@ -3631,6 +3865,203 @@ the current line as well!
             self.assertIsNone(commands[0].info)
 
 
+class ParallelPresubmitTest(unittest.TestCase):
+    def setUp(self):
+        super(ParallelPresubmitTest, self).setUp()
+        self.root = os.path.realpath(tempfile.mkdtemp())
+        self.addCleanup(gclient_utils.rmtree, self.root)
+        subprocess.check_call(['git', 'init', '-q'], cwd=self.root)
+        self.files = []
+        for directory in ('a', 'b'):
+            os.mkdir(os.path.join(self.root, directory))
+            gclient_utils.FileWrite(
+                os.path.join(self.root, directory, 'PRESUBMIT.py'),
+                'PRESUBMIT_VERSION = "2.0.0"\n'
+                'def CheckLint(input_api, output_api):\n'
+                '  return input_api.canned_checks.CheckChangeLintsClean(\n'
+                '      input_api, output_api, jobs=2)\n')
+            for name in ('x.cc', 'y.cc'):
+                gclient_utils.FileWrite(
+                    os.path.join(self.root, directory, name), 'int x;\n')
+                self.files.append(('M', directory + '/' + name))
+
+    def _run(self, jobs):
+        change = presubmit.Change('mychange', '', self.root, self.files, 0, 0,
+                                  None)
+        with mock.patch('sys.stdout', StringIO()), \
+                mock.patch('sys.stderr', StringIO()):
+            presubmit.DoPresubmitChecks(change=change,
+                                        committing=False,
+                                        verbose=False,
+                                        default_presubmit=None,
+                                        may_prompt=False,
+                                        gerrit_obj=None,
+                                        jobs=jobs)
+            return sys.stderr.getvalue()
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'Linux only')
+    def testLintInWorkers(self):
+        # cpplint starts processes of its own, and its output is in the order
+        # of the files in serial and in parallel alike.
+        serial = self._run(jobs=1)
+        self.assertEqual(['a/x.cc', 'a/y.cc', 'b/x.cc', 'b/y.cc'], [
+            os.path.relpath(line.split(':')[0], self.root)
+            for line in serial.splitlines()
+        ])
+        self.assertEqual(serial, self._run(jobs=2))
+
+
+class GitFileIndexTest(unittest.TestCase):
+    def setUp(self):
+        super(GitFileIndexTest, self).setUp()
+        self.root = os.path.realpath(tempfile.mkdtemp())
+        self.addCleanup(gclient_utils.rmtree, self.root)
+        self.addCleanup(presubmit._GitFileIndex._INDEXES.clear)
+        self._git('init', '-q')
+        self._add('PRESUBMIT.py', 'foo/PRESUBMIT.py', 'foo/PRESUBMIT_test.py',
+                  'foo/bar/baz.py', 'qux/PRESUBMIT_extra.py')
+        self._git('-c', 'user.name=a', '-c', 'user.email=a@example.com',
+                  'commit', '-q', '-m', 'init')
+
+    def _git(self, *args):
+        return subprocess.check_output(('git', ) + args, cwd=self.root)
+
+    def _add(self, *paths):
+        for path in paths:
+            full_path = os.path.join(self.root, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            gclient_utils.FileWrite(full_path, '')
+        self._git('add', *paths)
+
+    def _presubmit_files(self, files):
+        return presubmit.ListRelevantPresubmitFiles(
+            files, self.root, presubmit._GitFileIndex.Get(self.root))
+
+    def testListRelevantPresubmitFiles(self):
+        # An untracked presubmit script isn't listed, unless it is affected.
+        gclient_utils.FileWrite(os.path.join(self.root, 'foo', 'bar',
+                                             'PRESUBMIT.py'), '')
+        self.assertEqual([
+            os.path.join(self.root, 'PRESUBMIT.py'),
+            os.path.join(self.root, 'foo', 'PRESUBMIT.py'),
+        ], self._presubmit_files(['foo/bar/baz.py']))
+        self.assertEqual([
+            os.path.join(self.root, 'PRESUBMIT.py'),
+            os.path.join(self.root, 'foo', 'PRESUBMIT.py'),
+            os.path.join(self.root, 'foo', 'bar', 'PRESUBMIT.py'),
+        ], self._presubmit_files(['foo/bar/PRESUBMIT.py']))
+        self.assertEqual([
+            os.path.join(self.root, 'PRESUBMIT.py'),
+            os.path.join(self.root, 'qux', 'PRESUBMIT_extra.py'),
+        ], self._presubmit_files(['qux/a.py']))
+
+        # It is listed once it is added to the git index.
+        self._git('add', '-N', 'foo/bar/PRESUBMIT.py')
+        self.assertEqual([
+            os.path.join(self.root, 'PRESUBMIT.py'),
+            os.path.join(self.root, 'foo', 'PRESUBMIT.py'),
+            os.path.join(self.root, 'foo', 'bar', 'PRESUBMIT.py'),
+        ], self._presubmit_files(['foo/bar/baz.py']))
+
+    def testCachedUntilIndexChanges(self):
+        self._presubmit_files(['foo/a.py'])
+        cache_path = os.path.join(self.root, '.git', 'presubmit-index.json')
+        cache = json.loads(gclient_utils.FileRead(cache_path))
+        self.assertEqual(['PRESUBMIT.py'], cache['presubmit_files'][''])
+
+        # A fresh process reads the locations from the cache.
+        presubmit._GitFileIndex._INDEXES.clear()
+        with mock.patch('scm.GIT.GetAllFiles') as get_all_files:
+            self.assertEqual([os.path.join(self.root, 'PRESUBMIT.py')],
+                             self._presubmit_files(['a.py']))
+        get_all_files.assert_not_called()
+
+        # Adding a presubmit script to the index invalidates the cache.
+        self._add('qux/PRESUBMIT.py')
+        self.assertEqual([
+            os.path.join(self.root, 'PRESUBMIT.py'),
+            os.path.join(self.root, 'qux', 'PRESUBMIT.py'),
+            os.path.join(self.root, 'qux', 'PRESUBMIT_extra.py'),
+        ], self._presubmit_files(['qux/a.py']))
+
+    def testFilesUnder(self):
+        # Files next to foo which sort just before and after the files in it.
+        self._add('fo/a.py', 'foo-bar/a.py', 'foo.py', 'foo0/a.py', 'fooz.py')
+        index = presubmit._GitFileIndex.Get(self.root)
+        self.assertEqual(['PRESUBMIT.py', 'PRESUBMIT_test.py', 'bar/baz.py'],
+                         index.FilesUnder(os.path.join(self.root, 'foo')))
+        self.assertEqual(['baz.py'],
+                         index.FilesUnder(os.path.join(self.root, 'foo',
+                                                       'bar')))
+        self.assertEqual([], index.FilesUnder(os.path.join(self.root, 'fooz')))
+        self.assertEqual(10, len(index.FilesUnder(self.root)))
+        self.assertIsNone(index.FilesUnder(os.path.dirname(self.root)))
+
+    def testGitChangeAllFiles(self):
+        change = presubmit.GitChange('mychange',
+                                     '',
+                                     self.root, [],
+                                     0,
+                                     0,
+                                     None,
+                                     upstream=None,
+                                     end_commit=None)
+        self.assertEqual(['baz.py'],
+                         change.AllFiles(os.path.join(self.root, 'foo',
+                                                      'bar')))
+
+    def testFetchAllFiles(self):
+        change = presubmit.GitChange('mychange',
+                                     '',
+                                     self.root, [],
+                                     0,
+                                     0,
+                                     None,
+                                     upstream=None,
+                                     end_commit=None)
+        input_api = mock.Mock(change=change,
+                              os_path=os.path,
+                              re=re,
+                              platform=sys.platform)
+        input_api.PresubmitLocalPath.return_value = self.root
+        self.assertEqual(['foo/PRESUBMIT.py', 'qux/PRESUBMIT_extra.py'],
+                         presubmit_canned_checks._FetchAllFiles(
+                             input_api, [r'.*PRESUBMIT.*\.py$'],
+                             [r'.*_test\.py$', r'^PRESUBMIT\.py$']))
+        # Skipped directories aren't listed.
+        self.assertEqual(['foo/PRESUBMIT.py', 'foo/PRESUBMIT_test.py'],
+                         presubmit_canned_checks._FetchAllFiles(
+                             input_api, [r'foo/.*\.py$'], [r'foo/bar$']))
+        # Nor are tracked files deleted from the checkout.
+        os.remove(os.path.join(self.root, 'foo', 'PRESUBMIT_test.py'))
+        self.assertEqual(['foo/PRESUBMIT.py', 'foo/bar/baz.py'],
+                         presubmit_canned_checks._FetchAllFiles(
+                             input_api, [r'foo/.*\.py$'], []))
+
+    def testGetUnitTestsRecursivelySkipsDeletedFiles(self):
+        change = presubmit.GitChange('mychange',
+                                     '',
+                                     self.root, [],
+                                     0,
+                                     0,
+                                     None,
+                                     upstream=None,
+                                     end_commit=None)
+        input_api = mock.Mock(change=change, os_path=os.path, re=re)
+        os.remove(os.path.join(self.root, 'foo', 'PRESUBMIT_test.py'))
+        with mock.patch('presubmit_canned_checks.GetUnitTests') as unit_tests:
+            presubmit_canned_checks.GetUnitTestsRecursively(
+                input_api, mock.Mock(), os.path.join(self.root, 'foo'),
+                [r'.*\.py$'], [])
+        unit_tests.assert_called_once_with(
+            input_api, mock.ANY, ['PRESUBMIT.py', 'bar/baz.py'])
+
+    def testNotAGitCheckout(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(gclient_utils.rmtree, root)
+        self.assertIsNone(presubmit._GitFileIndex.Get(root))
+
+
 class ThreadPoolTest(unittest.TestCase):
     def setUp(self):
         super(ThreadPoolTest, self).setUp()
@@ -3674,6 +4105,57 @@ class ThreadPoolTest(unittest.TestCase):
             messages[1])
         self.assertEqual('5\n5 (0.00s) failed\nstdout', messages[2])
 
+    def testProfileQueuedTests(self):
+        subprocess.Popen.return_value = mock.Mock(returncode=0)
+        profiler = presubmit._CheckProfiler()
+        t = presubmit.ThreadPool(1, profiler=profiler)
+        test = presubmit.CommandData(name='test',
+                                     cmd=['test'],
+                                     kwargs={},
+                                     message=lambda x, **kwargs: x)
+        # Like a check calling input_api.RunTests with --parallel: the test
+        # only runs once the check has returned.
+        with profiler.measure('check', 'CheckA', '/a/PRESUBMIT.py'):
+            t.AddTests([test])
+        self.assertEqual([], t.RunAsync())
+
+        self.assertEqual(['CheckA', 'test'],
+                         [r['name'] for r in profiler.records])
+        record = profiler.records[1]
+        self.assertEqual('test', record['kind'])
+        self.assertEqual('CheckA', record['parent'])
+        self.assertEqual('/a/PRESUBMIT.py', record['presubmit'])
+
+    def testProfileConcurrentTests(self):
+        profiler = presubmit._CheckProfiler()
+        t = presubmit.ThreadPool(2, profiler=profiler)
+        both_started = threading.Barrier(2, timeout=10)
+
+        def RunWithTimeout(cmd, stdin, kwargs):
+            profiler.count_subprocess()
+            both_started.wait()
+            return 0, ''
+
+        t._RunWithTimeout = RunWithTimeout
+        t.AddTests([
+            presubmit.CommandData(name=name,
+                                  cmd=[name],
+                                  kwargs={},
+                                  message=lambda x, **kwargs: x)
+            for name in ('test1', 'test2')
+        ])
+        self.assertEqual([], t.RunAsync())
+
+        # Each test only counts the subprocess it started, and the process-wide
+        # counters can't tell the tests apart.
+        self.assertEqual(2, profiler.subprocesses)
+        self.assertEqual(['test1', 'test2'],
+                         sorted(r['name'] for r in profiler.records))
+        for record in profiler.records:
+            self.assertEqual(1, record['subprocesses'])
+            self.assertIsNone(record['cpu'])
+            self.assertIsNone(record['bytes_read'])
+
 
 if __name__ == '__main__':
     import unittest
@@ -199,6 +199,78 @@ class RealGitTest(fake_repos.FakeReposTestBase):
                                cwd=self.cwd))
         self.assertFalse(scm.GIT.IsAncestor(self.githash('repo_1', 1), 'zebra'))
 
+    def testGetOldContents(self):
+        self.assertEqual(
+            'some file with a space',
+            scm.GIT.GetOldContents(self.cwd, 'foo bar', branch='HEAD'))
+        self.assertEqual(
+            'git/repo_1@1\n',
+            scm.GIT.GetOldContents(self.cwd,
+                                   'origin',
+                                   branch=self.githash('repo_1', 1)))
+        self.assertEqual('',
+                         scm.GIT.GetOldContents(self.cwd, 'missing', 'HEAD'))
+
+    def testCatFileBatch(self):
+        batch = scm.GIT.GetCatFileBatch(self.cwd)
+        self.addCleanup(scm.GIT.CloseCatFileBatches, self.cwd)
+        self.assertIs(batch, scm.GIT.GetCatFileBatch(self.cwd))
+
+        head = batch.Info('HEAD')
+        self.assertEqual(self.githash('repo_1', 2), head.sha)
+        self.assertEqual('commit', head.type)
+        self.assertIsNone(batch.Info('zebra'))
+        self.assertIsNone(batch.Info('HEAD\nHEAD'))
+        self.assertTrue(batch.Exists(self.githash('repo_1', 1)))
+
+        info, contents = batch.Contents('HEAD:foo bar')
+        self.assertEqual('blob', info.type)
+        self.assertEqual(b'some file with a space', contents)
+        self.assertIsNone(batch.Contents('HEAD:missing'))
+
+        # The coprocesses are restarted after being closed.
+        scm.GIT.CloseCatFileBatches(self.cwd)
+        self.assertEqual(head, batch.Info('HEAD'))
+
+    @mock.patch('scm.GIT._MAX_CAT_FILE_BATCHES', 1)
+    def testCatFileBatchEviction(self):
+        self.addCleanup(scm.GIT.CloseCatFileBatches)
+        batch = scm.GIT.GetCatFileBatch(self.cwd)
+        self.assertTrue(batch.Exists('HEAD'))
+        proc = batch._procs['--batch-check']
+
+        # The least recently used batch is closed when another one is needed.
+        other_cwd = os.path.join(self.cwd, '.git')
+        other_batch = scm.GIT.GetCatFileBatch(other_cwd)
+        self.assertIsNone(batch._procs['--batch-check'])
+        self.assertIsNotNone(proc.returncode)
+        self.assertIs(other_batch, scm.GIT.GetCatFileBatch(other_cwd))
+        self.assertIsNot(batch, scm.GIT.GetCatFileBatch(self.cwd))
+
+    def testCatFileBatchThreads(self):
+        self.addCleanup(scm.GIT.CloseCatFileBatches, self.cwd)
+        expected = {
+            'HEAD': self.githash('repo_1', 2),
+            'HEAD~1': self.githash('repo_1', 1),
+        }
+        errors = []
+
+        def query():
+            try:
+                for _ in range(20):
+                    for rev, sha in expected.items():
+                        self.assertEqual(sha,
+                                         scm.GIT.ResolveCommit(self.cwd, rev))
+            except Exception as e:  # pylint: disable=broad-except
+                errors.append(e)
+
+        threads = [threading.Thread(target=query) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], errors)
+
     def testGetAllFiles(self):
         self.assertEqual(['DEPS', 'foo bar', 'origin'],
                          scm.GIT.GetAllFiles(self.cwd))
@@ -14,9 +14,11 @@ import sys
 import tarfile
 import tempfile
 import unittest
+from unittest import mock
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import download_from_google_storage
 import upload_to_google_storage_first_class
 from download_from_google_storage_unittest import GsutilMock
 from download_from_google_storage_unittest import ChangedWorkingDirectory
@@ -33,6 +35,12 @@ class UploadTests(unittest.TestCase):
     def setUp(self):
         self.gsutil = GsutilMock(GSUTIL_DEFAULT_PATH, None)
         self.temp_dir = tempfile.mkdtemp(prefix='gstools_test')
+        mock.patch.dict(
+            os.environ, {
+                download_from_google_storage.HASH_CACHE_DIR_ENV_VAR:
+                os.path.join(self.temp_dir, 'hash_cache')
+            }).start()
+        self.addCleanup(mock.patch.stopall)
         self.base_path = os.path.join(self.temp_dir, 'gstools')
         shutil.copytree(os.path.join(TEST_DIR, 'gstools'), self.base_path)
         self.base_url = 'gs://sometesturl'
@@ -4,7 +4,6 @@
 # found in the LICENSE file.
 """Uploads files to Google Storage and output DEPS blob."""
 
-import hashlib
 import optparse
 import os
 import json
@@ -14,6 +13,7 @@ import re
 import sys
 import tarfile
 
+from download_from_google_storage import get_digest
 from download_from_google_storage import Gsutil
 from download_from_google_storage import GSUTIL_DEFAULT_PATH
 from typing import List
@@ -99,16 +99,7 @@ def validate_archive_dirs(dirs: List[str]) -> bool:
 
 def get_sha256sum(filename: str) -> str:
     """Get the sha256sum of the file"""
-    sha = hashlib.sha256()
-    with open(filename, 'rb') as f:
-        while True:
-            # Read in 1mb chunks, so it doesn't all have to be loaded into
-            # memory.
-            chunk = f.read(1024 * 1024)
-            if not chunk:
-                break
-            sha.update(chunk)
-    return sha.hexdigest()
+    return get_digest(filename, 'sha256')
 
 
 def upload_to_google_storage(file: str, base_url: str, object_name: str,